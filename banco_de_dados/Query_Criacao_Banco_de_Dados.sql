@@ -19,6 +19,7 @@ GO
 -- Tabela de BSSID e estaes
 CREATE TABLE bssid_estacoes (
     id_esp_bssid INT IDENTITY(1,1) PRIMARY KEY,
+    bssid NVARCHAR(17) UNIQUE,
     nome_estacao NVARCHAR(100) NOT NULL,
     latitude NVARCHAR(50),
     longitude NVARCHAR(50)
@@ -32,6 +33,56 @@ CREATE TABLE tipo_de_funcionario (
 );
 GO
 
+-- Leituras de bateria dos dispositivos
+CREATE TABLE informacoes_bateria (
+    id INT IDENTITY(1,1) PRIMARY KEY,
+    data_hora DATETIME NOT NULL,
+    id_dispositivo INT NOT NULL,
+    nivel_bateria INT NOT NULL
+);
+GO
+
+-- Permanncias consolidadas (dispositivo em um AP de 'entrada' at 'saida')
+CREATE TABLE intervalos_permanencia (
+    id INT IDENTITY(1,1) PRIMARY KEY,
+    id_dispositivo INT NOT NULL,
+    id_esp_bssid INT NOT NULL,
+    id_tipo INT NOT NULL,
+    entrada DATETIME NOT NULL,
+    saida DATETIME NOT NULL
+);
+GO
+
+CREATE INDEX idx_permanencia_dispositivo_entrada
+    ON intervalos_permanencia (id_dispositivo, entrada);
+GO
+
+-- Ocupao por AP e categoria em baldes de tempo ('minuto', 'hora' ou 'dia'):
+-- mdia de agentes no balde = agente_segundos / largura do balde em segundos
+CREATE TABLE ocupacao_estacoes (
+    resolucao NVARCHAR(10) NOT NULL,
+    inicio DATETIME NOT NULL,
+    id_esp_bssid INT NOT NULL,
+    categoria NVARCHAR(50) NOT NULL,
+    agente_segundos FLOAT NOT NULL,
+    maximo INT NOT NULL,
+    PRIMARY KEY (resolucao, inicio, id_esp_bssid, categoria)
+);
+GO
+
+-- Leituras por perodo (consolidao do histrico e exportao por dia)
+CREATE INDEX idx_geolocalizacao_data
+    ON informacoes_geolocalizacao (data_hora);
+GO
+
+CREATE INDEX idx_bateria_data
+    ON informacoes_bateria (data_hora);
+GO
+
+CREATE INDEX idx_permanencia_entrada
+    ON intervalos_permanencia (entrada);
+GO
+
 -- Restries de chave estrangeira
 ALTER TABLE informacoes_geolocalizacao
     ADD CONSTRAINT FK_informacoes_dispositivo
@@ -47,3 +98,28 @@ ALTER TABLE informacoes_geolocalizacao
     ADD CONSTRAINT FK_informacoes_tipo
     FOREIGN KEY (id_tipo) REFERENCES tipo_de_funcionario(id_tipo);
 GO
+
+ALTER TABLE informacoes_bateria
+    ADD CONSTRAINT FK_bateria_dispositivo
+    FOREIGN KEY (id_dispositivo) REFERENCES estoque_dispositivos(id_dispositivo);
+GO
+
+ALTER TABLE intervalos_permanencia
+    ADD CONSTRAINT FK_permanencia_dispositivo
+    FOREIGN KEY (id_dispositivo) REFERENCES estoque_dispositivos(id_dispositivo);
+GO
+
+ALTER TABLE intervalos_permanencia
+    ADD CONSTRAINT FK_permanencia_bssid
+    FOREIGN KEY (id_esp_bssid) REFERENCES bssid_estacoes(id_esp_bssid);
+GO
+
+ALTER TABLE intervalos_permanencia
+    ADD CONSTRAINT FK_permanencia_tipo
+    FOREIGN KEY (id_tipo) REFERENCES tipo_de_funcionario(id_tipo);
+GO
+
+ALTER TABLE ocupacao_estacoes
+    ADD CONSTRAINT FK_ocupacao_bssid
+    FOREIGN KEY (id_esp_bssid) REFERENCES bssid_estacoes(id_esp_bssid);
+GO
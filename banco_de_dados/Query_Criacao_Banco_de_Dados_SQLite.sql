@@ -0,0 +1,82 @@
+-- Versão SQLite do banco de geolocalização (usada localmente e para testes offline)
+-- Mesmas tabelas do script do SQL Server, com IDENTITY trocado por AUTOINCREMENT
+
+-- Estoque de dispositivos
+CREATE TABLE IF NOT EXISTS estoque_dispositivos (
+    id_dispositivo INTEGER PRIMARY KEY,
+    numero_serial INTEGER NOT NULL,
+    status_ativo INTEGER NOT NULL
+);
+
+-- Tabela de BSSID e estações
+CREATE TABLE IF NOT EXISTS bssid_estacoes (
+    id_esp_bssid INTEGER PRIMARY KEY AUTOINCREMENT,
+    bssid TEXT UNIQUE,
+    nome_estacao TEXT NOT NULL,
+    latitude TEXT,
+    longitude TEXT
+);
+
+-- Tipo de funcionário
+CREATE TABLE IF NOT EXISTS tipo_de_funcionario (
+    id_tipo INTEGER PRIMARY KEY AUTOINCREMENT,
+    tipo_funcionario TEXT NOT NULL UNIQUE
+);
+
+-- Tabela principal de geolocalização
+CREATE TABLE IF NOT EXISTS informacoes_geolocalizacao (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    data_hora TEXT NOT NULL,
+    id_dispositivo INTEGER NOT NULL REFERENCES estoque_dispositivos(id_dispositivo),
+    id_esp_bssid INTEGER NOT NULL REFERENCES bssid_estacoes(id_esp_bssid),
+    id_tipo INTEGER NOT NULL REFERENCES tipo_de_funcionario(id_tipo)
+);
+
+-- Leituras de bateria dos dispositivos
+CREATE TABLE IF NOT EXISTS informacoes_bateria (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    data_hora TEXT NOT NULL,
+    id_dispositivo INTEGER NOT NULL REFERENCES estoque_dispositivos(id_dispositivo),
+    nivel_bateria INTEGER NOT NULL
+);
+
+-- Permanências consolidadas (dispositivo em um AP de 'entrada' até 'saida')
+CREATE TABLE IF NOT EXISTS intervalos_permanencia (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    id_dispositivo INTEGER NOT NULL REFERENCES estoque_dispositivos(id_dispositivo),
+    id_esp_bssid INTEGER NOT NULL REFERENCES bssid_estacoes(id_esp_bssid),
+    id_tipo INTEGER NOT NULL REFERENCES tipo_de_funcionario(id_tipo),
+    entrada TEXT NOT NULL,
+    saida TEXT NOT NULL
+);
+
+-- Ocupação por AP e categoria em baldes de tempo ('minuto', 'hora' ou 'dia'):
+-- média de agentes no balde = agente_segundos / largura do balde em segundos
+CREATE TABLE IF NOT EXISTS ocupacao_estacoes (
+    resolucao TEXT NOT NULL,
+    inicio TEXT NOT NULL,
+    id_esp_bssid INTEGER NOT NULL REFERENCES bssid_estacoes(id_esp_bssid),
+    categoria TEXT NOT NULL,
+    agente_segundos REAL NOT NULL,
+    maximo INTEGER NOT NULL,
+    PRIMARY KEY (resolucao, inicio, id_esp_bssid, categoria)
+);
+
+CREATE INDEX IF NOT EXISTS idx_geolocalizacao_dispositivo_data
+    ON informacoes_geolocalizacao (id_dispositivo, data_hora);
+
+CREATE INDEX IF NOT EXISTS idx_bateria_dispositivo_data
+    ON informacoes_bateria (id_dispositivo, data_hora);
+
+CREATE INDEX IF NOT EXISTS idx_permanencia_dispositivo_entrada
+    ON intervalos_permanencia (id_dispositivo, entrada);
+
+-- Leituras por período (consolidação do histórico e exportação por dia)
+CREATE INDEX IF NOT EXISTS idx_geolocalizacao_data
+    ON informacoes_geolocalizacao (data_hora);
+
+CREATE INDEX IF NOT EXISTS idx_bateria_data
+    ON informacoes_bateria (data_hora);
+
+CREATE INDEX IF NOT EXISTS idx_permanencia_entrada
+    ON intervalos_permanencia (entrada);
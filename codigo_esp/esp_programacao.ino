@@ -36,9 +36,16 @@ PubSubClient client(espClient);  // Cliente MQTT
 Preferences prefs;               
 String mqtt_client_id = "ESP32C6_2";
 
+// ===== Tópicos MQTT =====
+// Publica em esp32/<fatia>/<tópico>, com fatia = id % numFatias: a ingestão em vários processos
+// assina só as fatias de cada processo (numFatias igual a "fatias" em ingestao_distribuida.py)
+const int numFatias = 64;
+String mqtt_topic_prefix = "esp32/2/";
+
 // ===== Controle de tempo =====
 unsigned long lastScan = 0;
 const unsigned long scanInterval = 10000; // Intervalo de 10s para envio de dados
+const int maxAPsScan = 8;                  // Máximo de APs enviados em cada varredura (esp32/scan)
 
 // ===== SETUP =====
 void setup() {
@@ -54,6 +61,7 @@ void setup() {
   prefs.begin("mqtt", false);
   String idStr = prefs.getString("client_id", "0");
   mqtt_client_id = "ESP32C6_" + idStr;
+  mqtt_topic_prefix = "esp32/" + String(idStr.toInt() % numFatias) + "/";
   ssid = prefs.getString("ssid", ssid);
   password = prefs.getString("password", password);
   prefs.end();
@@ -70,6 +78,7 @@ void setup() {
 
   // Configura conexão com o servidor MQTT
   client.setServer(mqtt_server, mqtt_port);
+  client.setBufferSize(512);  // Comporta a varredura com vários APs (padrão é 256 bytes)
 
   // Conecta ao melhor ponto de acesso
   connectToBestAP();
@@ -105,7 +114,10 @@ void loop() {
   if (millis() - lastScan > scanInterval) {
     lastScan = millis();
     connectToBestAP();               // Reconecta se necessário
-    sendBSSIDViaMQTT();               // Envia BSSID via MQTT
+    // A varredura (RSSI dos APs da rede) já traz a localização; o BSSID só vai quando ela não pode ser enviada
+    if (!sendScanViaMQTT()) {
+      sendBSSIDViaMQTT();             // Envia BSSID via MQTT
+    }
     sendBatteryViaMQTT((int)percent); // Envia nível da bateria via MQTT
   }
 
@@ -227,7 +239,7 @@ void connectToMQTT() {
 void sendBSSIDViaMQTT() {
   if (WiFi.status() == WL_CONNECTED && client.connected()) {
     String payload = mqtt_client_id + "|" + WiFi.BSSIDstr();
-    client.publish("esp32/bssid", payload.c_str());
+    client.publish((mqtt_topic_prefix + "bssid").c_str(), payload.c_str());
   }
 }
 
@@ -235,6 +247,44 @@ void sendBSSIDViaMQTT() {
 void sendBatteryViaMQTT(int percent) {
   if (WiFi.status() == WL_CONNECTED && client.connected()) {
     String payload = mqtt_client_id + "|" + String(percent);
-    client.publish("esp32/battery", payload.c_str());
+    client.publish((mqtt_topic_prefix + "battery").c_str(), payload.c_str());
+  }
+}
+
+// ===== Envia a varredura (RSSI de cada AP da rede) via MQTT =====
+// Formato: "<client_id>|bssid=rssi;bssid=rssi;..." com os APs mais fortes primeiro.
+// Usa o resultado da última WiFi.scanNetworks() feita em connectToBestAP().
+// Retorna false quando não há varredura para enviar (o loop envia o BSSID no lugar).
+bool sendScanViaMQTT() {
+  if (WiFi.status() != WL_CONNECTED || !client.connected()) return false;
+  int numNetworks = WiFi.scanComplete();
+  if (numNetworks <= 0) return false;
+
+  // Índices das redes com o SSID configurado, ordenados por RSSI (mais forte primeiro)
+  int indices[maxAPsScan];
+  int total = 0;
+  for (int i = 0; i < numNetworks; i++) {
+    if (WiFi.SSID(i) != ssid) continue;
+    int pos;
+    if (total < maxAPsScan) {
+      pos = total++;
+    } else if (WiFi.RSSI(i) > WiFi.RSSI(indices[maxAPsScan - 1])) {
+      pos = maxAPsScan - 1;  // Substitui o mais fraco da lista
+    } else {
+      continue;
+    }
+    indices[pos] = i;
+    while (pos > 0 && WiFi.RSSI(indices[pos]) > WiFi.RSSI(indices[pos - 1])) {
+      int tmp = indices[pos]; indices[pos] = indices[pos - 1]; indices[pos - 1] = tmp;
+      pos--;
+    }
+  }
+  if (total == 0) return false;
+
+  String payload = mqtt_client_id + "|";
+  for (int j = 0; j < total; j++) {
+    if (j > 0) payload += ";";
+    payload += WiFi.BSSIDstr(indices[j]) + "=" + String(WiFi.RSSI(indices[j]));
   }
+  return client.publish((mqtt_topic_prefix + "scan").c_str(), payload.c_str());
 }
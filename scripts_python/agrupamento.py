@@ -0,0 +1,91 @@
+import numpy as np
+
+# Lado (px na tela) da célula da grade: agentes na mesma célula viram um único marcador
+tamanho_celula_px = 60
+
+# Zoom inicial do mapa e maior zoom permitido (no máximo as células não se dividem mais)
+zoom_padrao = 14
+zoom_maximo = 18
+
+# Agentes mostrados individualmente ao expandir um grupo no zoom máximo (o resto continua agrupado)
+limite_expansao = 30
+
+# Cor e ícone dos marcadores agrupados
+cor_grupo = "blue"
+icone_grupo = "users"
+
+
+# 📐 Coordenadas (lat, lon) em pixels do mapa Web Mercator no zoom (vetorizado)
+def pixels_mercator(lats, lons, zoom):
+    mundo = 256.0 * 2 ** zoom
+    seno = np.clip(np.sin(np.radians(lats)), -0.9999, 0.9999)
+    x = (np.asarray(lons) + 180.0) / 360.0 * mundo
+    y = (0.5 - np.log((1 + seno) / (1 - seno)) / (4 * np.pi)) * mundo
+    return x, y
+
+
+def _marcador_grupo(id_grupo, coords, categorias, zoom, restantes=False):
+    quantidade = len(categorias)
+    contagem = {}
+    for categoria in categorias:
+        contagem[categoria] = contagem.get(categoria, 0) + 1
+    linhas = [f"👥 {quantidade} agentes" + (" (não exibidos)" if restantes else "")]
+    linhas += [f"• {categoria}: {n}" for categoria, n in sorted(contagem.items(), key=lambda c: (-c[1], str(c[0])))]
+    if not restantes:
+        linhas.append("🔍 Clique para aproximar" if zoom < zoom_maximo else "🔍 Clique para expandir")
+    lat, lon = coords.mean(axis=0)
+    return (round(float(lat), 6), round(float(lon), 6)), {
+        "id": id_grupo, "tooltip": "\n".join(linhas), "cor": cor_grupo, "icone": icone_grupo, "quantidade": quantidade,
+    }
+
+
+# 🗺️ Agrupa os marcadores de agentes por célula da grade do zoom atual
+def agrupar_marcadores(elementos, zoom=zoom_padrao, expandido=None):
+    """
+    elementos: [(coord, dados)], no formato montado em gerar_mapa. Só os que
+    têm "categoria" nos dados (agentes) são agrupados; estações, trens e
+    incidentes passam direto.
+
+    A grade tem células de 'tamanho_celula_px' pixels da tela no zoom atual.
+    Célula com um agente mantém o marcador dele; com mais de um, vira um
+    marcador só (centro dos agentes, quantidade e contagem por categoria),
+    com id "grupo:<zoom>:<x>:<y>". Assim o número de marcadores depende do
+    número de células ocupadas, não do número de agentes. O grupo cujo id é
+    'expandido' (pedido ao clicar no zoom máximo) mostra até
+    'limite_expansao' agentes e agrupa o restante.
+
+    Retorna a lista [(coord, dados)] com os marcadores a desenhar.
+    """
+    saida = [(coord, dados) for coord, dados in elementos if "categoria" not in dados]
+    agentes = [(coord, dados) for coord, dados in elementos if "categoria" in dados]
+    if not agentes:
+        return saida
+
+    zoom = int(min(max(zoom, 0), zoom_maximo))
+    coords = np.array([coord for coord, _ in agentes], dtype=float).reshape(-1, 2)
+    x, y = pixels_mercator(coords[:, 0], coords[:, 1], zoom)
+    celula_x = np.floor(x / tamanho_celula_px).astype(np.int64)
+    celula_y = np.floor(y / tamanho_celula_px).astype(np.int64)
+    celulas, inverso, contagem = np.unique(celula_x * (1 << 32) + celula_y, return_inverse=True, return_counts=True)
+
+    # Agentes de cada célula em sequência: membros da célula j = ordem[inicios[j]:inicios[j] + contagem[j]]
+    ordem = np.argsort(inverso, kind="stable")
+    inicios = np.concatenate(([0], np.cumsum(contagem)[:-1]))
+    categorias = [dados["categoria"] for _, dados in agentes]
+
+    for j, celula in enumerate(celulas.tolist()):
+        membros = ordem[inicios[j]:inicios[j] + contagem[j]]
+        if len(membros) == 1:
+            saida.append(agentes[membros[0]])
+            continue
+        id_grupo = f"grupo:{zoom}:{celula >> 32}:{celula & 0xFFFFFFFF}"
+        restantes = False
+        if id_grupo == expandido:
+            saida.extend(agentes[i] for i in membros[:limite_expansao])
+            membros = membros[limite_expansao:]
+            if not len(membros):
+                continue
+            id_grupo += ":restantes"
+            restantes = True
+        saida.append(_marcador_grupo(id_grupo, coords[membros], [categorias[i] for i in membros], zoom, restantes))
+    return saida
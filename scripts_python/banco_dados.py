@@ -0,0 +1,317 @@
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+# Script de criação das tabelas na versão SQLite
+schema_sqlite = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "banco_de_dados", "Query_Criacao_Banco_de_Dados_SQLite.sql"
+)
+
+# Categoria usada quando o dispositivo ainda não foi categorizado no dash
+categoria_padrao = "não definida"
+
+# Marcador colocado na fila para encerrar a thread de gravação
+_FIM = object()
+
+
+# 🔹 Pool simples de conexões reaproveitadas entre gravações
+class PoolConexoes:
+    def __init__(self, criar_conexao, tamanho=2):
+        self._criar_conexao = criar_conexao
+        self.tamanho = tamanho
+        self._livres = queue.LifoQueue()
+        self._criadas = 0
+        self._trava = threading.Lock()
+
+    # Pega uma conexão livre (ou cria uma nova enquanto não atingir o tamanho do pool)
+    def _pegar(self):
+        try:
+            return self._livres.get_nowait()
+        except queue.Empty:
+            pass
+        with self._trava:
+            if self._criadas < self.tamanho:
+                self._criadas += 1
+                return self._criar_conexao()
+        return self._livres.get()
+
+    # Uso: "with pool.conexao() as con:" — faz commit no fim ou rollback em caso de erro
+    @contextmanager
+    def conexao(self):
+        con = self._pegar()
+        try:
+            yield con
+            con.commit()
+        except BaseException:
+            con.rollback()
+            raise
+        finally:
+            self._livres.put(con)
+
+    # Fecha as conexões que estão livres no pool
+    def fechar(self):
+        while True:
+            try:
+                self._livres.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+# 🗃️ Cria um pool de conexões SQLite (cria as tabelas se ainda não existirem)
+def criar_pool_sqlite(caminho, tamanho=2):
+    with open(schema_sqlite, "r", encoding="utf-8") as f:
+        script = f.read()
+
+    def criar_conexao():
+        con = sqlite3.connect(caminho, check_same_thread=False, timeout=30)
+        con.execute("PRAGMA journal_mode=WAL")     # Leitores (dash, Power BI) não bloqueiam a escrita
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute("PRAGMA foreign_keys=ON")
+        return con
+
+    con = criar_conexao()
+    con.executescript(script)
+    con.close()
+    return PoolConexoes(criar_conexao, tamanho)
+
+
+# Converte "ESP32C6_<id>" no número usado como id_dispositivo no banco
+def id_numerico_dispositivo(client_id):
+    encontrado = re.search(r"(\d+)$", client_id)
+    if encontrado:
+        return int(encontrado.group(1))
+    # IDs fora do padrão recebem um número estável derivado do nome
+    return zlib.crc32(client_id.encode()) & 0x7FFFFFFF
+
+
+# 🔹 Gravador em lote das leituras de localização e bateria
+class GravadorBanco:
+    """
+    Recebe os eventos do servidor MQTT em uma fila limitada e grava em lote
+    (executemany) nas tabelas informacoes_geolocalizacao e informacoes_bateria.
+
+    registrar_* nunca bloqueia: se a fila estiver cheia o evento é descartado
+    e contado em 'descartados', para não travar o loop de rede do MQTT.
+    'ao_gravar_lote(duracao, quantidade)', se informada, é chamada depois de
+    cada lote gravado (ex.: para métricas). Com um 'compactador'
+    (historico.CompactadorHistorico) só as leituras de localização que ele
+    liberar vão para a fila; as que ele ainda segura são gravadas no
+    encerramento.
+    """
+
+    def __init__(self, pool, tamanho_fila=20000, tamanho_lote=1000, intervalo=1.0, ao_gravar_lote=None,
+                 compactador=None):
+        self.pool = pool
+        self.ao_gravar_lote = ao_gravar_lote
+        self.compactador = compactador
+        self.fila = queue.Queue(maxsize=tamanho_fila)
+        self.tamanho_lote = tamanho_lote
+        self.intervalo = intervalo
+
+        # Caches de ids já resolvidos no banco
+        self._ids_bssid = {}
+        self._ids_tipo = {}
+        self._dispositivos = set()
+
+        # Contadores para diagnóstico
+        self.enfileirados = 0
+        self.descartados = 0
+        self.gravados = 0
+        self.lotes = 0
+        self.erros = 0
+
+        self._thread = None
+
+    # Cadastra (ou atualiza) os Access Points conhecidos na tabela bssid_estacoes
+    def sincronizar_aps(self, tabela_aps):
+        """
+        Lê a tabela uma única vez e só grava os APs novos ou alterados (em
+        executemany), para a partida e as recargas do catálogo continuarem
+        rápidas com milhares de BSSIDs.
+        """
+        with self.pool.conexao() as con:
+            cur = con.cursor()
+            cur.execute("SELECT bssid, id_esp_bssid, nome_estacao, latitude, longitude FROM bssid_estacoes WHERE bssid IS NOT NULL")
+            existentes = {bssid: (id_bssid, nome, lat, lon) for bssid, id_bssid, nome, lat, lon in cur.fetchall()}
+
+            inserir, atualizar = [], []
+            for bssid, ap in tabela_aps.items():
+                lat, lon = (str(c) for c in ap["coord"])
+                atual = existentes.get(bssid)
+                if atual is None:
+                    inserir.append((bssid, ap["nome"], lat, lon, bssid))
+                elif atual[1:] != (ap["nome"], lat, lon):
+                    atualizar.append((ap["nome"], lat, lon, atual[0]))
+
+            if atualizar:
+                cur.executemany(
+                    "UPDATE bssid_estacoes SET nome_estacao = ?, latitude = ?, longitude = ? WHERE id_esp_bssid = ?",
+                    atualizar,
+                )
+            if inserir:
+                # Outro processo da ingestão distribuída pode ter inserido o mesmo AP depois da leitura acima
+                cur.executemany(
+                    "INSERT INTO bssid_estacoes (bssid, nome_estacao, latitude, longitude) "
+                    "SELECT ?, ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM bssid_estacoes WHERE bssid = ?)",
+                    inserir,
+                )
+                cur.execute("SELECT bssid, id_esp_bssid FROM bssid_estacoes WHERE bssid IS NOT NULL")
+                ids = dict(cur.fetchall())
+            else:
+                ids = {bssid: dados[0] for bssid, dados in existentes.items()}
+        self._ids_bssid.update({bssid: ids[bssid] for bssid in tabela_aps})
+
+    # Enfileira uma leitura de localização (chamado pelo on_message)
+    def registrar_localizacao(self, data_hora, client_id, bssid, categoria=None):
+        categoria = categoria or categoria_padrao
+        if self.compactador is None:
+            return self._enfileirar(("localizacao", data_hora, client_id, bssid, categoria))
+        ok = True
+        for leitura in self.compactador.filtrar(data_hora, client_id, bssid, categoria):
+            ok = self._enfileirar(("localizacao",) + leitura) and ok
+        return ok
+
+    # Enfileira uma leitura de bateria (chamado pelo on_message)
+    def registrar_bateria(self, data_hora, client_id, nivel):
+        return self._enfileirar(("bateria", data_hora, client_id, nivel))
+
+    def _enfileirar(self, evento):
+        try:
+            self.fila.put_nowait(evento)
+        except queue.Full:
+            self.descartados += 1
+            return False
+        self.enfileirados += 1
+        return True
+
+    # Inicia a thread de gravação em segundo plano
+    def iniciar(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._executar, name="gravador_banco", daemon=True)
+            self._thread.start()
+        return self
+
+    # Esvazia a fila, grava o que falta e fecha as conexões
+    def encerrar(self):
+        if self._thread is not None:
+            if self.compactador is not None:
+                for leitura in self.compactador.pendentes():
+                    self.fila.put(("localizacao",) + leitura)
+            self.fila.put(_FIM)
+            self._thread.join()
+            self._thread = None
+        self.pool.fechar()
+
+    # Laço da thread: junta eventos até completar o lote ou estourar o intervalo
+    def _executar(self):
+        encerrar = False
+        while not encerrar:
+            evento = self.fila.get()
+            if evento is _FIM:
+                break
+            lote = [evento]
+            prazo = time.monotonic() + self.intervalo
+            while len(lote) < self.tamanho_lote:
+                restante = prazo - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    evento = self.fila.get(timeout=restante)
+                except queue.Empty:
+                    break
+                if evento is _FIM:
+                    encerrar = True
+                    break
+                lote.append(evento)
+            self._gravar_com_tratamento(lote)
+
+    def _gravar_com_tratamento(self, lote):
+        try:
+            self.gravar_lote(lote)
+        except Exception as e:
+            self.erros += 1
+            # A transação foi desfeita: esquece os ids criados nela
+            self._dispositivos.clear()
+            self._ids_tipo.clear()
+            log.error("❌ Erro ao gravar lote de %d eventos no banco: %s", len(lote), e)
+
+    # Grava um lote de eventos em uma única transação
+    def gravar_lote(self, lote):
+        inicio = time.monotonic()
+        localizacoes = []
+        baterias = []
+        with self.pool.conexao() as con:
+            cur = con.cursor()
+            for evento in lote:
+                if evento[0] == "localizacao":
+                    _, data_hora, client_id, bssid, categoria = evento
+                    id_bssid = self._ids_bssid.get(bssid)
+                    if id_bssid is None:
+                        continue  # AP não cadastrado em bssid_estacoes
+                    id_disp = self._id_dispositivo(cur, client_id)
+                    localizacoes.append((data_hora, id_disp, id_bssid, self._id_tipo(cur, categoria)))
+                else:
+                    _, data_hora, client_id, nivel = evento
+                    baterias.append((data_hora, self._id_dispositivo(cur, client_id), nivel))
+
+            if localizacoes:
+                cur.executemany(
+                    "INSERT INTO informacoes_geolocalizacao (data_hora, id_dispositivo, id_esp_bssid, id_tipo) VALUES (?, ?, ?, ?)",
+                    localizacoes,
+                )
+            if baterias:
+                cur.executemany(
+                    "INSERT INTO informacoes_bateria (data_hora, id_dispositivo, nivel_bateria) VALUES (?, ?, ?)",
+                    baterias,
+                )
+        self.gravados += len(localizacoes) + len(baterias)
+        self.lotes += 1
+        if self.ao_gravar_lote is not None:
+            self.ao_gravar_lote(time.monotonic() - inicio, len(lote))
+
+    # Garante que o dispositivo existe em estoque_dispositivos (consulta o banco só na primeira vez).
+    # Os cadastrados aqui entram inativos: só quem ativar no estoque passa a fazer parte do catálogo.
+    def _id_dispositivo(self, cur, client_id):
+        id_disp = id_numerico_dispositivo(client_id)
+        if id_disp not in self._dispositivos:
+            cur.execute("SELECT 1 FROM estoque_dispositivos WHERE id_dispositivo = ?", (id_disp,))
+            if cur.fetchone() is None:
+                cur.execute(
+                    "INSERT INTO estoque_dispositivos (id_dispositivo, numero_serial, status_ativo) VALUES (?, ?, 0)",
+                    (id_disp, id_disp),
+                )
+            self._dispositivos.add(id_disp)
+        return id_disp
+
+    # Resolve o id_tipo da categoria (cadastra a categoria se for nova)
+    def _id_tipo(self, cur, categoria):
+        id_tipo = self._ids_tipo.get(categoria)
+        if id_tipo is None:
+            cur.execute("SELECT id_tipo FROM tipo_de_funcionario WHERE tipo_funcionario = ?", (categoria,))
+            linha = cur.fetchone()
+            if linha is None:
+                cur.execute("INSERT INTO tipo_de_funcionario (tipo_funcionario) VALUES (?)", (categoria,))
+                cur.execute("SELECT id_tipo FROM tipo_de_funcionario WHERE tipo_funcionario = ?", (categoria,))
+                linha = cur.fetchone()
+            id_tipo = linha[0]
+            self._ids_tipo[categoria] = id_tipo
+        return id_tipo
+
+    # Resumo dos contadores
+    def estatisticas(self):
+        return {
+            "fila": self.fila.qsize(),
+            "enfileirados": self.enfileirados,
+            "descartados": self.descartados,
+            "gravados": self.gravados,
+            "lotes": self.lotes,
+            "erros": self.erros,
+        }
@@ -0,0 +1,123 @@
+import math
+
+# Constante de tempo (s) da média exponencial do nível: leituras mais antigas pesam menos
+constante_suavizacao_s = 600
+
+# Janela (s) de esquecimento da regressão do consumo: a reta acompanha a última hora, aproximadamente
+janela_consumo_s = 3600
+
+# Subida (pontos percentuais) acima do nível suavizado que indica recarga: a estimativa recomeça
+salto_recarga = 10
+
+# Peso mínimo das leituras e espalhamento mínimo (s) no tempo para confiar na taxa de consumo
+minimo_leituras = 3
+espalhamento_minimo_s = 60
+
+# Antecedência (min) padrão para o alerta de bateria acabando no dash
+minutos_alerta_bateria = 30
+
+
+# 🔋 Estimativa contínua da bateria de um dispositivo, atualizada em O(1) por mensagem
+class EstimadorBateria:
+    """
+    O ADC do ESP é ruidoso, então cada leitura atualiza:
+      - 'nivel': média exponencial no tempo (constante_suavizacao_s), que
+        não depende da frequência de envio;
+      - uma regressão linear com esquecimento exponencial (janela_consumo_s),
+        guardada só pelas somas ponderadas. O tempo é medido a partir da
+        leitura mais recente (as somas são deslocadas a cada leitura), o que
+        mantém os números pequenos mesmo depois de dias.
+
+    Da inclinação saem 'consumo' (pontos percentuais por hora, positivo
+    descarregando) e 'esgotamento_ts' (segundos desde a época em que o nível
+    suavizado chega a zero nesse ritmo). Ambos ficam None enquanto não há
+    leituras suficientes ou o nível não está caindo. Uma subida maior que
+    'salto_recarga' é tratada como recarga e recomeça a estimativa.
+    """
+
+    __slots__ = ("ultimo_ts", "nivel", "consumo", "esgotamento_ts", "_s0", "_st", "_sy", "_stt", "_sty")
+
+    def __init__(self):
+        self._reiniciar()
+
+    def _reiniciar(self):
+        self.ultimo_ts = None
+        self.nivel = None
+        self.consumo = None
+        self.esgotamento_ts = None
+        self._s0 = self._st = self._sy = self._stt = self._sty = 0.0
+
+    def atualizar(self, instante, valor):
+        if self.ultimo_ts is not None and instante <= self.ultimo_ts:
+            return self   # Leitura repetida ou fora de ordem
+        if self.nivel is not None and valor > self.nivel + salto_recarga:
+            self._reiniciar()
+
+        if self.ultimo_ts is None:
+            self.nivel = float(valor)
+        else:
+            dt = instante - self.ultimo_ts
+            self.nivel += (1.0 - math.exp(-dt / constante_suavizacao_s)) * (valor - self.nivel)
+
+            # Leva a origem do tempo para o instante novo e aplica o esquecimento
+            s0, st, sy = self._s0, self._st, self._sy
+            fator = math.exp(-dt / janela_consumo_s)
+            self._stt = (self._stt - 2 * dt * st + dt * dt * s0) * fator
+            self._sty = (self._sty - dt * sy) * fator
+            self._st = (st - dt * s0) * fator
+            self._sy = sy * fator
+            self._s0 = s0 * fator
+
+        # Leitura nova em t = 0: só S0 e Sy mudam
+        self._s0 += 1.0
+        self._sy += valor
+        self.ultimo_ts = instante
+        self._estimar()
+        return self
+
+    # Retoma a estimativa gravada no snapshot (ao reiniciar o servidor)
+    def retomar(self, instante, nivel, consumo=None):
+        """
+        As somas da regressão não vão para o snapshot: são refeitas com
+        'minimo_leituras' leituras fictícias sobre a reta gravada (o nível
+        suavizado no instante da última leitura, com a inclinação do
+        consumo), espaçadas o bastante para a previsão valer desde já. As
+        leituras novas substituem essas aos poucos, pelo esquecimento
+        exponencial. Sem consumo gravado, fica como depois de uma leitura.
+        """
+        self._reiniciar()
+        self.ultimo_ts = instante
+        self.nivel = float(nivel)
+        if consumo is None:
+            self._s0, self._sy = 1.0, self.nivel
+            return self
+        inclinacao = -consumo / 3600   # %/s
+        for i in range(minimo_leituras):
+            t = -2.0 * espalhamento_minimo_s * i
+            y = self.nivel + inclinacao * t
+            self._s0 += 1.0
+            self._st += t
+            self._sy += y
+            self._stt += t * t
+            self._sty += t * y
+        self._estimar()
+        return self
+
+    def _estimar(self):
+        self.consumo = self.esgotamento_ts = None
+        s0 = self._s0
+        variancia = self._stt / s0 - (self._st / s0) ** 2
+        if s0 < minimo_leituras or variancia < espalhamento_minimo_s ** 2:
+            return
+        inclinacao = (s0 * self._sty - self._st * self._sy) / (s0 * self._stt - self._st ** 2)   # %/s
+        self.consumo = round(-inclinacao * 3600, 3)
+        if inclinacao < 0:
+            self.esgotamento_ts = self.ultimo_ts + max(self.nivel, 0.0) / -inclinacao
+
+
+# Minutos até acabar para um registro do snapshot (None sem previsão)
+def minutos_restantes(esp, agora):
+    esgotamento_ts = esp.get("esgotamento_ts")
+    if esgotamento_ts is None:
+        return None
+    return max(0.0, (esgotamento_ts - agora) / 60)
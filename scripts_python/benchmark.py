@@ -0,0 +1,297 @@
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Tamanhos de frota medidos por padrão
+cenarios_padrao = (10, 1000, 10000)
+
+# Repetições de cada medição (rodadas de envio de todos os agentes)
+rodadas_padrao = 5
+
+# Mínimo de mensagens na rajada usada para medir a vazão da ingestão
+mensagens_rajada = 20000
+
+# Tempo máximo de espera por cada etapa antes de considerar o cenário travado
+timeout_etapa = 60.0
+
+# Métricas comparadas com a linha de base: True = quanto maior, melhor
+metricas_comparadas = {
+    "vazao_msgs_s": True,
+    "atraso_persistencia_s": False,
+    "atualizar_estado_novo_s": False,
+    "atualizar_tique_s": False,
+    "gerar_mapa_s": False,
+    "tabela_pagina_s": False,
+    "marcadores_mapa": False,
+}
+
+# Diferença mínima (s) para acusar regressão de latência: abaixo disso é ruído de medição
+diferenca_minima_s = 0.005
+
+# Prefixo da linha com o resultado JSON impresso pelo processo de cada cenário
+prefixo_resultado = "RESULTADO "
+
+
+# Mensagem no mesmo formato entregue pelo paho ao on_message
+class _Mensagem:
+    __slots__ = ("topic", "payload")
+
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+
+def _resumo(amostras):
+    return {"mediana": statistics.median(amostras), "max": max(amostras)}
+
+
+def _esperar(condicao, descricao):
+    limite = time.perf_counter() + timeout_etapa
+    while not condicao():
+        if time.perf_counter() > limite:
+            raise TimeoutError(f"Tempo esgotado esperando {descricao}")
+        time.sleep(0.001)
+    return time.perf_counter()
+
+
+# 🔬 Mede um cenário no processo atual (chamado em um subprocesso, dentro de um diretório temporário)
+def medir_cenario(quantidade, rodadas=rodadas_padrao, varredura=False):
+    """
+    Importa o servidor MQTT e o dash no mesmo processo, sem broker: as
+    mensagens geradas pelo simulador entram direto no on_message e o dash lê
+    o dados_esps.json gravado pelo servidor. Mede:
+      - vazão da ingestão (mensagens/s até todas serem aplicadas ao estado);
+      - atraso da persistência (do envio da última mensagem da rodada até o
+        arquivo JSON que a contém estar gravado);
+      - atualizar() com estado novo, atualizar() só com o tique do trem e
+        gerar_mapa() sem cache, com todos os dispositivos no mapa (e quantos
+        marcadores ele envia depois do agrupamento);
+      - uma página da tabela de dispositivos (filtrada e ordenada por última
+        mensagem) logo depois de um estado novo.
+    Com 'varredura' os agentes enviam RSSI (esp32/scan) e a ingestão inclui
+    o posicionamento.
+    """
+    import servidor_mqtt as servidor
+    from simulador_frota import SimuladorFrota
+
+    servidor.log.setLevel(logging.WARNING)
+
+    # Conta os eventos aplicados dentro da trava do estado e guarda, para cada
+    # gravação, quantos eventos o snapshot gravado já continha
+    aplicados = [0]
+    no_snapshot = [0]
+    gravacoes = []
+
+    get_esp_original = servidor.get_esp
+    def get_esp_contando(client_id):
+        aplicados[0] += 1
+        return get_esp_original(client_id)
+    servidor.get_esp = get_esp_contando
+
+    snapshot_original = servidor.persistencia.obter_snapshot
+    def snapshot_contando():
+        no_snapshot[0] = aplicados[0]
+        return snapshot_original()
+    servidor.persistencia.obter_snapshot = snapshot_contando
+
+    ao_gravar_original = servidor.persistencia.ao_gravar
+    def ao_gravar_contando():
+        gravacoes.append(no_snapshot[0])
+        ao_gravar_original()
+    servidor.persistencia.ao_gravar = ao_gravar_contando
+
+    servidor.diario.iniciar()
+    servidor.persistencia.iniciar()
+    servidor.gravador_banco.iniciar()
+    servidor.pipeline.iniciar()
+
+    simulador = SimuladorFrota(quantidade, padrao="linha", primeiro_id=1000, semente=42, varredura=varredura)
+    esperados = [0]
+
+    def enviar(mensagens):
+        esperados[0] += len(mensagens)
+        for topico, payload in mensagens:
+            servidor.on_message(None, None, _Mensagem(topico, payload))
+        return time.perf_counter()
+
+    def esperar_gravacao():
+        alvo = esperados[0]
+        _esperar(lambda: aplicados[0] >= alvo, "a aplicação das mensagens")
+        return _esperar(lambda: gravacoes and gravacoes[-1] >= alvo, "a gravação do JSON")
+
+    try:
+        # Estado inicial: todos os agentes conhecidos
+        enviar(simulador.rodada())
+        esperar_gravacao()
+
+        # Vazão: rajada de rodadas seguidas sem esperar entre elas
+        rajada = []
+        while len(rajada) < mensagens_rajada:
+            rajada.extend(simulador.rodada())
+        inicio = time.perf_counter()
+        enviar(rajada)
+        alvo = esperados[0]
+        fim = _esperar(lambda: aplicados[0] >= alvo, "a rajada")
+        vazao = len(rajada) / (fim - inicio)
+        esperar_gravacao()
+
+        # Dash importado depois de existir o JSON, no mesmo diretório
+        import dash_acompanhamento as dash
+
+        dash.armazem.definir_categorias({
+            agente.client_id: "manutencao" if i % 2 == 0 else "seguranca"
+            for i, agente in enumerate(simulador.agentes)
+        })
+        incidente = dash.armazem.registrar_incidente(dash.locations[0][0], "manutencao", "")["id"]
+        atualizar = getattr(dash.atualizar, "__wrapped__", dash.atualizar)   # Função original, sem o contexto do Dash
+
+        atrasos, estado_novo, tique, mapa, tabela = [], [], [], [], []
+        versao, assinatura, n = None, None, 0
+        for _ in range(rodadas):
+            enviado = enviar(simulador.rodada())
+            atrasos.append(esperar_gravacao() - enviado)
+
+            n += 1
+            inicio = time.perf_counter()
+            _, versao, _, assinatura = atualizar(n, None, None, None, 1, incidente, versao, assinatura)
+            estado_novo.append(time.perf_counter() - inicio)
+
+            n += 1
+            inicio = time.perf_counter()
+            resultado = atualizar(n, None, None, None, 1, incidente, versao, assinatura)
+            tique.append(time.perf_counter() - inicio)
+            versao = resultado[1]
+
+            agora = time.time()
+            esps = [e for e in dash.cache_estado.obter().esps if dash.status_dispositivo(e, agora) != "inativo"]
+            dash.calcular_marcadores.cache_clear()
+            dash.calcular_ranking_incidentes.cache_clear()
+            inicio = time.perf_counter()
+            _, marcadores = dash.gerar_mapa(esps, time.time() + n * dash.passo_trens, incidente)
+            mapa.append(time.perf_counter() - inicio)
+
+            inicio = time.perf_counter()
+            dash.consulta_dispositivos.consultar(
+                dash.cache_estado.obter(), time.time(), categoria="manutencao",
+                ordenacao=[{"column_id": "ultima", "direction": "desc"}], pagina=n % 7,
+            )
+            tabela.append(time.perf_counter() - inicio)
+    finally:
+        servidor.pipeline.encerrar()
+        servidor.persistencia.encerrar()
+        servidor.diario.encerrar()
+        servidor.gravador_banco.encerrar()
+
+    return {
+        "agentes": quantidade,
+        "vazao_msgs_s": vazao,
+        "atraso_persistencia_s": _resumo(atrasos),
+        "atualizar_estado_novo_s": _resumo(estado_novo),
+        "atualizar_tique_s": _resumo(tique),
+        "gerar_mapa_s": _resumo(mapa),
+        "tabela_pagina_s": _resumo(tabela),
+        "marcadores_mapa": len(marcadores),
+        "descartes": servidor.pipeline.descartados_entrada,
+    }
+
+
+# Roda cada cenário em um processo e diretório próprios (estado e arquivos limpos)
+def executar_cenario(quantidade, rodadas, varredura=False):
+    comando = [sys.executable, os.path.abspath(__file__), "--cenario", str(quantidade), "--rodadas", str(rodadas)]
+    if varredura:
+        comando.append("--varredura")
+    with tempfile.TemporaryDirectory(prefix="benchmark_") as diretorio:
+        processo = subprocess.run(comando, cwd=diretorio, capture_output=True, text=True)
+    for linha in reversed(processo.stdout.splitlines()):
+        if linha.startswith(prefixo_resultado):
+            return json.loads(linha[len(prefixo_resultado):])
+    raise RuntimeError(f"Cenário com {quantidade} agentes falhou:\n{processo.stderr[-2000:]}")
+
+
+def _valor(resultado, metrica):
+    valor = resultado[metrica]
+    return valor["mediana"] if isinstance(valor, dict) else valor
+
+
+# 📋 Tabela com os resultados de todos os cenários
+def imprimir_tabela(resultados):
+    print(f"{'agentes':>8} {'msgs/s':>10} {'atraso JSON':>12} {'atualizar':>10} {'tique':>10} {'gerar_mapa':>11} {'tabela':>10} {'marcadores':>11} {'descartes':>10}")
+    for r in resultados:
+        print(
+            f"{r['agentes']:>8} {r['vazao_msgs_s']:>10.0f} "
+            f"{_valor(r, 'atraso_persistencia_s') * 1000:>10.1f}ms "
+            f"{_valor(r, 'atualizar_estado_novo_s') * 1000:>8.1f}ms "
+            f"{_valor(r, 'atualizar_tique_s') * 1000:>8.1f}ms "
+            f"{_valor(r, 'gerar_mapa_s') * 1000:>9.1f}ms "
+            f"{_valor(r, 'tabela_pagina_s') * 1000:>8.1f}ms "
+            f"{r.get('marcadores_mapa', 0):>11} "
+            f"{r['descartes']:>10}"
+        )
+    print("(medianas das rodadas; o JSON de saída traz também os máximos)")
+
+
+# ⚠️ Compara com uma execução anterior e devolve a lista de regressões
+def comparar(resultados, base, tolerancia):
+    base_por_agentes = {r["agentes"]: r for r in base}
+    regressoes = []
+    for r in resultados:
+        anterior = base_por_agentes.get(r["agentes"])
+        if anterior is None:
+            continue
+        for metrica, maior_melhor in metricas_comparadas.items():
+            if metrica not in anterior:
+                continue  # Métrica criada depois da execução usada como base
+            atual, antes = _valor(r, metrica), _valor(anterior, metrica)
+            if maior_melhor:
+                piorou = atual < antes * (1 - tolerancia)
+            else:
+                piorou = atual > antes * (1 + tolerancia) and atual - antes > diferenca_minima_s
+            if piorou:
+                regressoes.append(f"{r['agentes']} agentes — {metrica}: {antes:.4g} → {atual:.4g}")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da ingestão MQTT e do dash com frotas simuladas")
+    parser.add_argument("--agentes", type=int, nargs="+", default=list(cenarios_padrao), help="Tamanhos de frota")
+    parser.add_argument("--rodadas", type=int, default=rodadas_padrao, help="Repetições de cada medição")
+    parser.add_argument("--varredura", action="store_true", help="Agentes enviam RSSI (esp32/scan) em vez do BSSID")
+    parser.add_argument("--saida", help="Grava os resultados neste arquivo JSON")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior usado como linha de base")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="Piora aceita em relação à base (0.25 = 25%%)")
+    parser.add_argument("--cenario", type=int, help=argparse.SUPPRESS)   # Uso interno: mede um cenário
+    args = parser.parse_args()
+
+    if args.cenario is not None:
+        print(prefixo_resultado + json.dumps(medir_cenario(args.cenario, args.rodadas, args.varredura)))
+        return
+
+    resultados = []
+    for quantidade in args.agentes:
+        print(f"⏱️ Medindo {quantidade} agentes...", flush=True)
+        resultados.append(executar_cenario(quantidade, args.rodadas, args.varredura))
+    imprimir_tabela(resultados)
+
+    if args.saida:
+        with open(args.saida, "w") as f:
+            json.dump(resultados, f, indent=2)
+
+    if args.comparar:
+        with open(args.comparar) as f:
+            regressoes = comparar(resultados, json.load(f), args.tolerancia)
+        if regressoes:
+            print("❌ Regressões encontradas:")
+            for r in regressoes:
+                print("  ", r)
+            sys.exit(1)
+        print("✅ Nenhuma regressão em relação à base")
+
+
+if __name__ == "__main__":
+    main()
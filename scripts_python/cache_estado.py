@@ -0,0 +1,157 @@
+import datetime
+import logging
+import os
+import threading
+from types import MappingProxyType
+
+from ingestao_distribuida import arquivos_particoes
+from registro_dispositivos import ler_snapshot
+
+log = logging.getLogger(__name__)
+
+# Formato de data/hora em last_seen nos snapshots antigos (antes de last_seen_ts)
+formato_last_seen = "%Y-%m-%d %H:%M:%S"
+
+# Formato de last_seen_formatado, exibido no dash
+formato_exibicao = "%d/%m/%Y %H:%M:%S"
+
+
+# 🔹 Snapshot imutável do estado dos dispositivos, compartilhado entre todas as sessões
+class SnapshotEstado:
+    __slots__ = ("esps", "por_client_id", "versao")
+
+    def __init__(self, esps, versao):
+        self.esps = esps                                            # Tupla de registros somente leitura
+        self.por_client_id = MappingProxyType({e["client_id"]: e for e in esps})
+        self.versao = versao                                        # Muda sempre que o conteúdo muda
+
+
+# 🔹 Cache único por processo do arquivo dados_esps.json
+class CacheEstado:
+    """
+    Todas as sessões do dash chamam obter(), mas o arquivo só é lido de novo
+    quando o servidor MQTT grava uma versão nova (mudança de mtime ou
+    tamanho). O servidor já grava last_seen_ts (segundos desde a época); aqui
+    só é montado o last_seen_formatado (uma vez por segundo distinto) e
+    juntada a categoria de cada ESP, então cada atualização das sessões não
+    faz nenhum parse.
+
+    O status de presença gravado no arquivo não é repassado: com o servidor
+    parado (ou sem mensagens novas) o arquivo não muda e o status ficaria
+    congelado. Quem exibe calcula a situação na hora com
+    tabela_dispositivos.status_dispositivo(esp, agora).
+
+    Com a ingestão distribuída, os snapshots das partições
+    (dados_esps.p<N>.json) são lidos junto com 'caminho' e mesclados: se um
+    dispositivo aparecer em mais de um, vale o registro visto por último.
+
+    'categorias' é o dicionário client_id -> categoria mantido pelo dash;
+    quem alterar esse dicionário deve chamar categorias_alteradas(). Se
+    'categorias' tiver um método versao() (ex.: CategoriasCompartilhadas),
+    alterações feitas por outros processos também remontam o snapshot.
+    """
+
+    def __init__(self, caminho, categorias, categoria_padrao="não definida"):
+        self.caminho = caminho
+        self.categorias = categorias
+        self.categoria_padrao = categoria_padrao
+
+        self.recargas = 0               # Quantas vezes o arquivo foi lido (útil para diagnóstico)
+        self._trava = threading.Lock()
+        self._assinatura = None         # (caminho, mtime_ns, tamanho) de cada arquivo carregado
+        self._versao_categorias = 0
+        self._versao_juntada = None     # Versão das categorias usada no snapshot atual
+        self._registros = ()            # Registros já convertidos, ainda sem categoria
+        self._snapshot = SnapshotEstado((), 0)
+
+    # Avisa que as categorias mudaram (o snapshot é remontado na próxima leitura)
+    def categorias_alteradas(self):
+        with self._trava:
+            self._versao_categorias += 1
+
+    def _versao_atual_categorias(self):
+        versao_externa = getattr(self.categorias, "versao", None)
+        return (self._versao_categorias, versao_externa() if versao_externa else None)
+
+    def _assinatura_arquivo(self):
+        assinatura = []
+        for caminho in [self.caminho] + arquivos_particoes(self.caminho):
+            try:
+                info = os.stat(caminho)
+            except FileNotFoundError:
+                continue
+            assinatura.append((caminho, info.st_mtime_ns, info.st_size))
+        return tuple(assinatura) or None
+
+    # Devolve o snapshot atual (recarrega só se o arquivo ou as categorias mudaram)
+    def obter(self):
+        assinatura = self._assinatura_arquivo()
+        versao_categorias = self._versao_atual_categorias()
+        if assinatura == self._assinatura and self._versao_juntada == versao_categorias:
+            return self._snapshot
+
+        with self._trava:
+            recarregou = False
+            if assinatura != self._assinatura:
+                try:
+                    self._registros = self._carregar()
+                    self._assinatura = assinatura
+                    self.recargas += 1
+                    recarregou = True
+                except (OSError, ValueError) as e:
+                    # Mantém o último estado válido se o arquivo estiver ilegível
+                    log.warning("⚠️ Não foi possível ler %s - %s", self.caminho, e)
+            if recarregou or self._versao_juntada != versao_categorias:
+                self._versao_juntada = versao_categorias
+                self._snapshot = SnapshotEstado(self._juntar_categorias(), self._snapshot.versao + 1)
+            return self._snapshot
+
+    # Lê os arquivos e formata as datas (cada segundo distinto é formatado uma única vez)
+    def _carregar(self):
+        formatadas = {}
+        aps = {}
+        registros = {}
+        esps = [esp for caminho in [self.caminho] + arquivos_particoes(self.caminho) for esp in ler_snapshot(caminho)]
+        for esp in esps:
+            if not esp.get("ap"):
+                continue  # Ainda sem localização conhecida: não há o que exibir
+            last_seen_ts = esp.get("last_seen_ts")
+            if last_seen_ts is None:
+                # Snapshot antigo: só o texto em last_seen
+                try:
+                    last_seen_ts = datetime.datetime.strptime(esp.get("last_seen") or "", formato_last_seen).timestamp()
+                except ValueError:
+                    continue
+            segundo = int(last_seen_ts)
+            formatada = formatadas.get(segundo)
+            if formatada is None:
+                formatada = datetime.datetime.fromtimestamp(segundo).strftime(formato_exibicao)
+                formatadas[segundo] = formatada
+            # Dados do AP compartilhados entre os registros e protegidos contra alteração
+            ap = aps.get(id(esp["ap"]))
+            if ap is None:
+                ap = MappingProxyType(dict(esp["ap"], coord=tuple(esp["ap"]["coord"])))
+                aps[id(esp["ap"])] = ap
+            anterior = registros.get(esp["client_id"])
+            if anterior is not None and anterior["last_seen_ts"] >= last_seen_ts:
+                continue
+            registros[esp["client_id"]] = {
+                "client_id": esp["client_id"],
+                "ap": ap,
+                # Posição exibida: a estimada por RSSI ou, sem varredura, a do AP
+                "coord": tuple(esp["coord"]) if esp.get("coord") else ap["coord"],
+                "bateria": esp.get("bateria"),
+                "bateria_suavizada": esp.get("bateria_suavizada"),
+                "consumo_bateria": esp.get("consumo_bateria"),
+                "esgotamento_ts": esp.get("esgotamento_ts"),
+                "last_seen_ts": last_seen_ts,
+                "last_seen_formatado": formatada,
+            }
+        return list(registros.values())
+
+    # Junta a categoria de cada dispositivo e congela os registros
+    def _juntar_categorias(self):
+        return tuple(
+            MappingProxyType(dict(r, categoria=self.categorias.get(r["client_id"], self.categoria_padrao)))
+            for r in self._registros
+        )
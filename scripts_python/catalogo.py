@@ -0,0 +1,240 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+log = logging.getLogger(__name__)
+
+# Arquivo de catálogo padrão (ao lado dos scripts, independente do diretório de execução)
+caminho_catalogo_padrao = os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalogo.json")
+
+# Prefixos usados para montar client_id e nome amigável dos dispositivos vindos do banco
+prefixo_client_id = "ESP32C6_"
+prefixo_nome_agente = "Agente_"
+
+_digitos_hex = frozenset("0123456789ABCDEF")
+
+
+# 🔤 Normaliza um BSSID para o formato "AA:BB:CC:DD:EE:FF" (aceita minúsculas, "-", "." ou sem separador)
+def normalizar_bssid(texto):
+    digitos = texto.strip().upper().replace(":", "").replace("-", "").replace(".", "")
+    if len(digitos) != 12 or not _digitos_hex.issuperset(digitos):
+        return None
+    return ":".join(digitos[i:i + 2] for i in range(0, 12, 2))
+
+
+# 🗂️ Catálogo imutável de APs, estações e dispositivos com os índices montados na carga
+class Catalogo:
+    """
+    Nunca é alterado depois de criado: uma recarga monta um Catalogo novo e
+    troca a referência de uma vez, então quem pegou o catálogo para tratar
+    uma mensagem enxerga sempre uma versão completa e consistente.
+
+    Índices (todos dicts, busca O(1)):
+      - por_bssid: BSSID normalizado -> dados do AP {"id", "nome", "coord", "bssid"};
+      - por_id: id do AP ("AP-1") -> dados do AP;
+      - estacoes_por_nome: nome da estação -> (lat, lon);
+      - nomes_dispositivos: client_id -> nome amigável.
+
+    'linhas' lista as linhas de trem ({"nome", "estacoes": [nomes em ordem],
+    "trens"}); sem linhas no arquivo, todas as estações formam uma linha
+    única com um trem.
+    """
+
+    __slots__ = ("aps", "por_bssid", "por_id", "estacoes", "estacoes_por_nome", "linhas", "nomes_dispositivos", "versao")
+
+    def __init__(self, aps, estacoes, dispositivos, linhas=None):
+        self.por_bssid = {}
+        self.por_id = {}
+        for ap in aps:
+            bssid = normalizar_bssid(ap["bssid"])
+            if bssid is None:
+                raise ValueError(f"BSSID inválido no catálogo: {ap['bssid']!r}")
+            if bssid in self.por_bssid:
+                raise ValueError(f"BSSID repetido no catálogo: {bssid}")
+            lat, lon = ap["coord"]
+            dados = {"id": ap["id"], "nome": ap["nome"], "coord": (float(lat), float(lon)), "bssid": bssid}
+            self.por_bssid[bssid] = dados
+            self.por_id[dados["id"]] = dados
+        self.aps = tuple(self.por_bssid.values())
+
+        self.estacoes = tuple((e["nome"], (float(e["coord"][0]), float(e["coord"][1]))) for e in estacoes)
+        self.estacoes_por_nome = dict(self.estacoes)
+        self.nomes_dispositivos = dict(dispositivos)
+
+        if linhas is None:
+            linhas = [{"nome": "Linha", "estacoes": [nome for nome, _ in self.estacoes], "trens": 1}] if len(self.estacoes) > 1 else []
+        self.linhas = tuple(
+            {"nome": linha["nome"], "estacoes": tuple(linha["estacoes"]), "trens": int(linha.get("trens", 1))}
+            for linha in linhas
+        )
+        for linha in self.linhas:
+            desconhecidas = [nome for nome in linha["estacoes"] if nome not in self.estacoes_por_nome]
+            if desconhecidas:
+                raise ValueError(f"Estações desconhecidas na linha {linha['nome']!r}: {desconhecidas}")
+
+        # Versão derivada do conteúdo: recarregar um arquivo igual não conta como mudança
+        conteudo = json.dumps(
+            [self.aps, self.estacoes, self.linhas, sorted(self.nomes_dispositivos.items())], sort_keys=True
+        )
+        self.versao = hashlib.sha1(conteudo.encode()).hexdigest()[:12]
+
+    # Busca o AP de um BSSID como veio na mensagem (só normaliza se não achar direto)
+    def ap_por_bssid(self, bssid):
+        ap = self.por_bssid.get(bssid)
+        if ap is None:
+            normalizado = normalizar_bssid(bssid)
+            if normalizado is not None:
+                ap = self.por_bssid.get(normalizado)
+        return ap
+
+    # Nome amigável do dispositivo (ou o próprio client_id se não estiver cadastrado)
+    def nome_dispositivo(self, client_id):
+        return self.nomes_dispositivos.get(client_id, client_id)
+
+
+# 📄 Lê o catálogo de um arquivo JSON {"aps": [...], "estacoes": [...], "linhas": [...], "dispositivos": {...}}
+def ler_catalogo_arquivo(caminho=caminho_catalogo_padrao):
+    with open(caminho, "r", encoding="utf-8") as f:
+        dados = json.load(f)
+    return Catalogo(dados.get("aps", []), dados.get("estacoes", []), dados.get("dispositivos", {}), dados.get("linhas"))
+
+
+# 🗄️ Lê APs (bssid_estacoes) e dispositivos ativos (estoque_dispositivos) do banco
+def ler_catalogo_banco(pool, base=None):
+    """
+    As tabelas não guardam as estações, as linhas nem apelidos de dispositivos:
+    esses vêm de 'base' (normalmente o catálogo do arquivo). Dispositivos
+    ativos do estoque sem apelido recebem "Agente_<id>". Os que o
+    GravadorBanco cadastra sozinhos ao receber a primeira leitura entram
+    inativos, então mantêm o client_id até alguém ativá-los no estoque.
+    """
+    with pool.conexao() as con:
+        cur = con.cursor()
+        cur.execute(
+            "SELECT id_esp_bssid, bssid, nome_estacao, latitude, longitude FROM bssid_estacoes "
+            "WHERE bssid IS NOT NULL AND latitude IS NOT NULL AND longitude IS NOT NULL ORDER BY id_esp_bssid"
+        )
+        aps = [
+            {"id": f"AP-{id_bssid}", "nome": nome, "coord": (lat, lon), "bssid": bssid}
+            for id_bssid, bssid, nome, lat, lon in cur.fetchall()
+        ]
+        cur.execute("SELECT id_dispositivo FROM estoque_dispositivos WHERE status_ativo = 1")
+        ids_ativos = [linha[0] for linha in cur.fetchall()]
+
+    dispositivos = {f"{prefixo_client_id}{i}": f"{prefixo_nome_agente}{i}" for i in ids_ativos}
+    estacoes, linhas = [], None
+    if base is not None:
+        dispositivos.update(base.nomes_dispositivos)
+        estacoes = [{"nome": nome, "coord": coord} for nome, coord in base.estacoes]
+        linhas = base.linhas
+    return Catalogo(aps, estacoes, dispositivos, linhas)
+
+
+# 🔄 Catálogo com recarga automática, compartilhado entre as threads do processo
+class CatalogoDinamico:
+    """
+    'carregar' é uma função sem argumentos que devolve um Catalogo novo.
+    'assinatura', se informada, devolve algo barato que muda quando a fonte
+    muda (ex.: mtime e tamanho do arquivo); sem ela a fonte é relida a cada
+    verificação e só conta como mudança se a versão do conteúdo mudar.
+
+    Quem usa o catálogo lê 'atual' uma vez por mensagem (ou lote) e usa essa
+    referência até o fim: a troca é uma única atribuição, sem trava no
+    caminho das mensagens. Se a fonte nova estiver inválida, o catálogo
+    anterior continua valendo. 'ao_recarregar(novo, anterior)' é chamada
+    depois de cada troca.
+    """
+
+    def __init__(self, carregar, assinatura=None, intervalo=2.0, ao_recarregar=None):
+        self.carregar = carregar
+        self.assinatura = assinatura
+        self.intervalo = intervalo
+        self.ao_recarregar = ao_recarregar
+
+        self.recargas = 0
+        self._assinatura = assinatura() if assinatura else None
+        self.atual = carregar()   # Sem catálogo válido na partida não há como continuar
+
+        self._parar = threading.Event()
+        self._thread = None
+
+    # Relê a fonte se ela mudou; devolve True se o catálogo foi trocado
+    def verificar(self):
+        if self.assinatura is not None:
+            assinatura = self.assinatura()
+            if assinatura == self._assinatura:
+                return False
+        try:
+            novo = self.carregar()
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.warning("⚠️ Catálogo inválido, mantendo a versão anterior: %s", e)
+            return False
+        finally:
+            if self.assinatura is not None:
+                self._assinatura = assinatura
+        if novo.versao == self.atual.versao:
+            return False
+
+        anterior, self.atual = self.atual, novo
+        self.recargas += 1
+        if self.ao_recarregar is not None:
+            self.ao_recarregar(novo, anterior)
+        return True
+
+    # Verifica a fonte a cada 'intervalo' segundos em uma thread própria
+    def iniciar(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._executar, name="catalogo", daemon=True)
+            self._thread.start()
+        return self
+
+    def _executar(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                self.verificar()
+            except Exception:
+                log.exception("❌ Erro ao recarregar o catálogo")
+
+    def encerrar(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def _assinatura_arquivo(caminho):
+    try:
+        info = os.stat(caminho)
+    except FileNotFoundError:
+        return None
+    return (info.st_mtime_ns, info.st_size)
+
+
+# Catálogo recarregado quando o arquivo JSON muda
+def catalogo_de_arquivo(caminho=caminho_catalogo_padrao, intervalo=2.0, ao_recarregar=None):
+    return CatalogoDinamico(
+        lambda: ler_catalogo_arquivo(caminho),
+        assinatura=lambda: _assinatura_arquivo(caminho),
+        intervalo=intervalo,
+        ao_recarregar=ao_recarregar,
+    )
+
+
+# Catálogo recarregado das tabelas do banco (estações e apelidos vêm do arquivo)
+def catalogo_do_banco(pool, caminho_base=caminho_catalogo_padrao, intervalo=30.0, ao_recarregar=None):
+    return CatalogoDinamico(
+        lambda: ler_catalogo_banco(pool, ler_catalogo_arquivo(caminho_base)),
+        intervalo=intervalo,
+        ao_recarregar=ao_recarregar,
+    )
+
+
+# Catálogo da fonte configurada ("arquivo" ou "banco"), a mesma no servidor MQTT e no dash
+def abrir_catalogo(fonte, pool=None, caminho=caminho_catalogo_padrao, ao_recarregar=None):
+    if fonte == "banco":
+        return catalogo_do_banco(pool, caminho, ao_recarregar=ao_recarregar)
+    if fonte == "arquivo":
+        return catalogo_de_arquivo(caminho, ao_recarregar=ao_recarregar)
+    raise ValueError(f"Fonte de catálogo desconhecida: {fonte!r} (use 'arquivo' ou 'banco')")
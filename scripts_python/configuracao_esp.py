@@ -1,6 +1,40 @@
+import argparse
+import csv
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import serial
 import serial.tools.list_ports
-import time
+
+# Velocidade da serial do firmware (Serial.begin(115200))
+baud_rate = 115200
+
+# Tempo máximo (s) de cada leitura bloqueante: a thread dorme na serial em vez de girar em in_waiting
+intervalo_leitura = 0.5
+
+# Tempo (s) para o ESP reiniciar depois de abrir a porta (a abertura costuma resetar a placa)
+tempo_boot = 3
+
+# Tempo máximo (s) de espera por cada resposta do ESP
+timeout_resposta = 15
+
+# Tentativas por porta no modo em lote e pausa (s) antes de cada nova tentativa
+tentativas_padrao = 3
+pausa_tentativa = 2
+
+# Trava para as mensagens das várias portas não se misturarem no terminal
+_trava_saida = threading.Lock()
+
+
+class ErroConfiguracao(Exception):
+    pass
+
+
+def _imprimir(texto):
+    with _trava_saida:
+        print(texto, flush=True)
+
 
 # === Lista todas as portas seriais disponíveis no sistema ===
 def listar_portas():
@@ -15,68 +49,190 @@ def escolher_porta(portas):
     return portas[idx].device  # Retorna o nome da porta escolhida
 
 # === Aguarda até receber uma mensagem específica do ESP via serial ===
-def esperar_mensagem(ser, mensagem_esperada, timeout=10):
+def esperar_mensagem(ser, mensagem_esperada, timeout=10, log=print):
+    """
+    Lê a porta serial linha a linha até encontrar 'mensagem_esperada' ou
+    estourar o tempo limite (timeout). Cada readline() bloqueia até chegar
+    uma linha ou passar ser.timeout, sem consumir CPU enquanto espera.
+    Devolve a linha encontrada (ou None se o tempo acabou).
+    """
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        linha = ser.readline().decode(errors='ignore').strip()  # Lê e decodifica
+        if not linha:
+            continue
+        log(f"ESP: {linha}")  # Mostra a mensagem recebida
+        if mensagem_esperada.lower() in linha.lower():  # Compara ignorando maiúsculas/minúsculas
+            return linha
+    return None  # Não recebeu a mensagem no tempo limite
+
+# === Abre a porta e espera o ESP terminar de reiniciar (se a abertura o resetou) ===
+def abrir_porta(porta_serial, log=print):
+    ser = serial.Serial(porta_serial, baud_rate, timeout=intervalo_leitura)
+    # A última linha do boot do firmware é a senha carregada; sem reset, segue depois de tempo_boot
+    esperar_mensagem(ser, "Senha carregada", tempo_boot, log)
+    ser.reset_input_buffer()
+    return ser
+
+# === Executa o diálogo de configuração do firmware: config -> ID -> SSID -> senha ===
+def configurar_esp(ser, novo_id, ssid, senha, timeout=timeout_resposta, log=print):
     """
-    Fica lendo a porta serial até encontrar 'mensagem_esperada' 
-    ou até estourar o tempo limite (timeout).
+    Lança ErroConfiguracao com a etapa que falhou. Depois de salvar, o ESP
+    reinicia e mostra o SSID carregado: se a linha aparecer, confere o SSID
+    gravado. Devolve True se a gravação foi confirmada assim, False se o
+    ESP salvou mas a confirmação não chegou (ex.: a porta USB sumiu no reinício).
     """
-    inicio = time.time()
-    while time.time() - inicio < timeout:
-        if ser.in_waiting:  # Se há dados disponíveis para leitura
-            linha = ser.readline().decode(errors='ignore').strip()  # Lê e decodifica
-            print("ESP:", linha)  # Mostra a mensagem recebida
-            if mensagem_esperada.lower() in linha.lower():  # Compara ignorando maiúsculas/minúsculas
-                return True
-    return False  # Retorna falso se não recebeu a mensagem no tempo limite
-
-# === Envia as configurações de ID, SSID e senha para o ESP ===
+    log(">> Enviando comando 'config' para o ESP")
+    ser.write(b'config\n')  # Envia como bytes
+    if not esperar_mensagem(ser, "Digite novo ID", timeout, log):
+        raise ErroConfiguracao("ESP não respondeu ao comando 'config'")
+
+    etapas = (
+        (novo_id, "Digite novo SSID", "ID"),
+        (ssid, "Digite nova senha", "SSID"),
+        (senha, "Configuração salva", "senha"),
+    )
+    for valor, proxima_mensagem, nome in etapas:
+        ser.write((valor + '\n').encode())  # Envia com quebra de linha
+        if not esperar_mensagem(ser, proxima_mensagem, timeout, log):
+            raise ErroConfiguracao(f"ESP não confirmou o envio do {nome}")
+
+    try:
+        linha = esperar_mensagem(ser, "SSID carregado", timeout, log)
+    except serial.SerialException:
+        return False
+    if linha is None:
+        return False
+    if f'"{ssid}"' not in linha:
+        raise ErroConfiguracao(f"SSID carregado após reiniciar não confere: {linha}")
+    return True
+
+# === Envia as configurações de ID, SSID e senha para o ESP (modo interativo) ===
 def enviar_dados_configuracao(porta_serial):
     try:
         # Abre a porta serial escolhida com baud rate 115200
-        with serial.Serial(porta_serial, 115200, timeout=2) as ser:
+        with abrir_porta(porta_serial) as ser:
             print("Conectado à porta:", porta_serial)
-            time.sleep(2)  # Dá tempo para estabilizar a comunicação
-
-            # Envia o comando para entrar no modo de configuração
-            print(">> Enviando comando 'config' para o ESP")
-            ser.write(b'config\n')  # Envia como bytes
-            time.sleep(1)
-
-            # Aguarda o ESP pedir o ID e envia
-            if esperar_mensagem(ser, "Digite novo ID"):
-                novo_id = input("Novo ID (apenas número): ")
-                ser.write((novo_id + '\n').encode())  # Envia com quebra de linha
-                time.sleep(1)
-
-            # Aguarda o ESP pedir o SSID e envia
-            if esperar_mensagem(ser, "Digite novo SSID"):
-                novo_ssid = input("Novo SSID: ")
-                ser.write((novo_ssid + '\n').encode())
-                time.sleep(1)
-
-            # Aguarda o ESP pedir a senha e envia
-            if esperar_mensagem(ser, "Digite nova senha"):
-                nova_senha = input("Nova senha: ")
-                ser.write((nova_senha + '\n').encode())
-                time.sleep(1)
-
-            # Aguarda mensagens finais de confirmação do ESP
+            novo_id = input("Novo ID (apenas número): ")
+            novo_ssid = input("Novo SSID: ")
+            nova_senha = input("Nova senha: ")
             print("\nAguardando confirmação do ESP...\n")
-            fim = time.time() + 5
-            while time.time() < fim:
-                if ser.in_waiting:
-                    linha = ser.readline().decode(errors='ignore').strip()
-                    print("ESP:", linha)
+            if configurar_esp(ser, novo_id, novo_ssid, nova_senha):
+                print("✅ Configuração finalizada com sucesso!")
+            else:
+                print("✅ Configuração salva (sem confirmação depois do reinício).")
 
-            print("✅ Configuração finalizada com sucesso!")
-
-    except Exception as e:
+    except (ErroConfiguracao, serial.SerialException) as e:
         # Captura e exibe erros de comunicação
         print("❌ Erro ao comunicar com o ESP:", e)
 
+# === Lê as atribuições do CSV: colunas id, ssid, senha e (opcional) porta ===
+def ler_atribuicoes(caminho):
+    with open(caminho, newline="", encoding="utf-8-sig") as f:
+        linhas = list(csv.DictReader(f))
+    atribuicoes = []
+    for numero, linha in enumerate(linhas, start=2):  # Linha 1 é o cabeçalho
+        novo_id = (linha.get("id") or "").strip()
+        ssid = (linha.get("ssid") or "").strip()
+        if not novo_id.isdigit() or not ssid or not linha.get("senha"):
+            raise ValueError(f"Linha {numero} do CSV inválida (id numérico, ssid e senha são obrigatórios)")
+        atribuicoes.append({
+            "porta": (linha.get("porta") or "").strip() or None,
+            "id": novo_id, "ssid": ssid, "senha": linha["senha"],
+        })
+    return atribuicoes
+
+# === Associa cada atribuição a uma porta: as com porta no CSV primeiro, depois as portas livres em ordem ===
+def distribuir_portas(atribuicoes, portas):
+    fixas = {a["porta"] for a in atribuicoes if a["porta"]}
+    livres = iter(sorted(p for p in portas if p not in fixas))
+    tarefas, sem_porta = [], []
+    for atribuicao in atribuicoes:
+        porta = atribuicao["porta"] or next(livres, None)
+        if porta is None:
+            sem_porta.append(atribuicao)
+        else:
+            tarefas.append(dict(atribuicao, porta=porta))
+    return tarefas, sem_porta
+
+# === Configura um ESP com novas tentativas; devolve o resultado da porta ===
+def configurar_porta(tarefa, tentativas=tentativas_padrao, timeout=timeout_resposta, detalhado=False):
+    porta = tarefa["porta"]
+
+    def log(texto):
+        if detalhado:
+            _imprimir(f"[{porta}] {texto}")
+
+    inicio = time.monotonic()
+    resultado = {"porta": porta, "id": tarefa["id"], "ssid": tarefa["ssid"], "ok": False,
+                 "confirmado": False, "tentativas": 0, "erro": ""}
+    for tentativa in range(1, tentativas + 1):
+        resultado["tentativas"] = tentativa
+        try:
+            # Reabrir a porta a cada tentativa reinicia o ESP e descarta um diálogo pela metade
+            with abrir_porta(porta, log) as ser:
+                resultado["confirmado"] = configurar_esp(ser, tarefa["id"], tarefa["ssid"], tarefa["senha"], timeout, log)
+            resultado["ok"] = True
+            resultado["erro"] = ""
+            break
+        except (ErroConfiguracao, serial.SerialException, OSError) as e:
+            resultado["erro"] = str(e)
+            _imprimir(f"⚠️ [{porta}] Tentativa {tentativa}/{tentativas} falhou: {e}")
+            if tentativa < tentativas:
+                time.sleep(pausa_tentativa)
+    resultado["duracao_s"] = round(time.monotonic() - inicio, 1)
+    return resultado
+
+# === Configura todas as portas ao mesmo tempo (uma thread por porta) ===
+def configurar_lote(tarefas, tentativas=tentativas_padrao, timeout=timeout_resposta, detalhado=False):
+    if not tarefas:
+        return []
+    with ThreadPoolExecutor(max_workers=len(tarefas)) as executor:
+        return list(executor.map(lambda t: configurar_porta(t, tentativas, timeout, detalhado), tarefas))
+
+# === Mostra (e opcionalmente grava em CSV) o resultado de cada porta ===
+def relatar_resultados(resultados, sem_porta, caminho_relatorio=None):
+    print("\n=== RESULTADO POR PORTA ===")
+    for r in resultados:
+        if r["ok"]:
+            situacao = "✅" if r["confirmado"] else "✅ (sem confirmação após reiniciar)"
+        else:
+            situacao = f"❌ {r['erro']}"
+        print(f"{r['porta']:<20} ID {r['id']:<6} tentativas: {r['tentativas']}  {r['duracao_s']:>5.1f}s  {situacao}")
+    for a in sem_porta:
+        print(f"{'(sem porta)':<20} ID {a['id']:<6} ⚠️ Nenhuma porta livre para esta linha do CSV")
+    ok = sum(1 for r in resultados if r["ok"])
+    print(f"\n{ok} de {len(resultados) + len(sem_porta)} dispositivos configurados.")
+
+    if caminho_relatorio:
+        campos = ["porta", "id", "ssid", "ok", "confirmado", "tentativas", "duracao_s", "erro"]
+        with open(caminho_relatorio, "w", newline="", encoding="utf-8") as f:
+            escritor = csv.DictWriter(f, fieldnames=campos, extrasaction="ignore")
+            escritor.writeheader()
+            escritor.writerows(resultados)
+            escritor.writerows({"porta": "", "id": a["id"], "ssid": a["ssid"], "ok": False, "erro": "sem porta"} for a in sem_porta)
+
 # === Função principal ===
 def main():
+    parser = argparse.ArgumentParser(description="Configurador serial para ESP32 (um por vez ou em lote)")
+    parser.add_argument("--lote", help="CSV com as colunas id, ssid, senha e (opcional) porta")
+    parser.add_argument("--portas", nargs="+", help="Portas usadas no lote (padrão: todas as detectadas)")
+    parser.add_argument("--tentativas", type=int, default=tentativas_padrao, help="Tentativas por porta")
+    parser.add_argument("--timeout", type=float, default=timeout_resposta, help="Espera máxima (s) por cada resposta do ESP")
+    parser.add_argument("--relatorio", help="Grava o resultado de cada porta neste CSV")
+    parser.add_argument("--detalhado", action="store_true", help="Mostra as mensagens de cada ESP")
+    args = parser.parse_args()
+
     print("=== CONFIGURADOR SERIAL PARA ESP32 ===\n")
+    if args.lote:
+        atribuicoes = ler_atribuicoes(args.lote)
+        portas = args.portas or [p.device for p in listar_portas()]
+        tarefas, sem_porta = distribuir_portas(atribuicoes, portas)
+        print(f"\nConfigurando {len(tarefas)} dispositivos em paralelo...")
+        resultados = configurar_lote(tarefas, args.tentativas, args.timeout, args.detalhado)
+        relatar_resultados(resultados, sem_porta, args.relatorio)
+        return
+
     portas = listar_portas()  # Lista portas disponíveis
 
     if not portas:  # Se não encontrou nenhuma
@@ -88,4 +244,4 @@ def main():
 
 # Corrige o nome especial para rodar o script
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
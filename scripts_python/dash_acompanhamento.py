@@ -1,62 +1,115 @@
 # IMPORTS E CONFIGURAÇÃO INICIAL
-import json  # Para manipular arquivos JSON (armazenar e carregar dados)
-import os    # Para operações com sistema de arquivos (ex.: verificar existência de arquivos)
-import math  # Funções matemáticas, embora não esteja muito usado aqui explicitamente
-from dash import Dash, dcc, html, Input, Output, State, ALL  # Framework Dash para criar app web interativo
+import math  # Arredondamento do número de páginas da tabela
+from dash import Dash, dcc, html, dash_table, Input, Output, State, no_update, ctx  # Framework Dash para criar app web interativo
+from flask import Response  # Resposta em fluxo para o canal de eventos (SSE)
 import dash_bootstrap_components as dbc  # Componentes Bootstrap para Dash (melhor aparência)
 import folium  # Biblioteca para gerar mapas interativos
-from folium import Marker, Icon, PolyLine, Map, DivIcon  # Elementos para manipulação de mapas Folium
-from geopy.distance import geodesic  # Para calcular distância geográfica entre coordenadas
+from folium import PolyLine, DivIcon  # Elementos para manipulação de mapas Folium
 from branca.element import Figure  # Elemento para conter o mapa Folium em HTML
 import datetime  # Manipulação de datas e horários
-
-import random  # Para deslocar os marcadores no mapa e evitar sobreposição visual
+import time  # Horário atual em segundos para comparar com last_seen_ts
+import threading  # Trava para iniciar o assinante de eventos uma única vez
+from functools import lru_cache  # Cache dos mapas já renderizados
+
+from cache_estado import CacheEstado  # Cache compartilhado do snapshot gravado pelo servidor MQTT
+from catalogo import abrir_catalogo  # Catálogo de APs e estações compartilhado com o servidor MQTT
+from banco_dados import criar_pool_sqlite  # Banco do histórico, fonte do catálogo quando fonte_catalogo = "banco"
+from eventos import CanalEventos, fluxo_sse, iniciar_assinante, publicar_evento  # Atualizações enviadas pelo servidor MQTT
+from estado_compartilhado import ArmazemDash  # Incidentes e categorias compartilhados entre os workers
+from despacho import MotorDespacho  # Busca vetorizada dos agentes mais próximos de cada incidente
+from rotas import rede_do_catalogo  # Posição dos trens ao longo das linhas (distância geodésica e tabela horária)
+from agrupamento import agrupar_marcadores, zoom_maximo, zoom_padrao  # Agentes agrupados por célula da grade do zoom
+from mapa_incremental import CamadaDinamica, HistoricoMarcadores, calcular_diff, js_enviar_diff, js_mover_trens, versao_marcadores
+from bateria import minutos_alerta_bateria
+from tabela_dispositivos import ConsultaDispositivos, diferenca_categorias, rotulos_status, status_dispositivo
+from metricas import configurar_log  # Log com nível e amostragem
+
+# Log do processo: recebe também os avisos das threads do catálogo e da leitura do snapshot
+configurar_log("dash_acompanhamento")
 
 # Arquivos de dados e variáveis globais
 data_file = "dados_esps.json"  # Arquivo JSON com dados dos dispositivos ESP (IoT)
-esp_categorias_file = "esp_categorias.json"  # Armazena categorias atribuídas a cada dispositivo
-incident_log = []  # Lista para guardar os incidentes reportados durante a execução
-
-# Carrega categorias de dispositivos se o arquivo existir, senão inicia vazio
-esp_categorias = {}
-if os.path.exists(esp_categorias_file):
-    try:
-        with open(esp_categorias_file, "r") as f:
-            esp_categorias = json.load(f)
-    except:
-        esp_categorias = {}
-
-# Lista fixa de Access Points (APs) com id, nome, coordenadas e BSSID (identificador WiFi)
-access_points = [
-    {"id": "AP-1", "nome": "São Paulo-Morumbi e Jardim Guedala", "coord": (-23.5995, -46.7152), "bssid": "7A:37:16:2B:8D:5D"},
-    {"id": "AP-2", "nome": "Jardim Guedala e Morumbi", "coord": (-23.6050, -46.7140), "bssid": "02:9B:CD:05:1E:BE"},
-    {"id": "AP-3", "nome": "Morumbi e Paraisópolis", "coord": (-23.6120, -46.7135), "bssid": "68:D4:0C:D5:2D:9F"},
-    {"id": "AP-4", "nome": "Paraisópolis e Américo Maurano", "coord": (-23.6225, -46.7136), "bssid": "C4:6E:1F:95:82:A7"},
-    {"id": "AP-5", "nome": "Vila Andrade e Jardim Jussara", "coord": (-23.6375, -46.7120), "bssid": "58:10:8C:96:6C:76"},
+estado_dash_file = "estado_dash.db"  # SQLite (WAL) com incidentes e categorias, compartilhado entre os workers
+esp_categorias_file = "esp_categorias.json"  # Categorias da versão antiga (importadas uma vez para o estado_dash.db)
+fonte_catalogo = "arquivo"  # Mesma fonte do servidor_mqtt.py: "arquivo" (catalogo.json) ou "banco" (tabelas do histórico)
+banco_file = "historico_geolocalizacao.db"  # Banco do histórico (usado só com fonte_catalogo = "banco")
+
+# Incidentes reportados e categorias dos dispositivos: ficam no banco para que todos os
+# processos do dash (ex.: workers do gunicorn) enxerguem o mesmo estado
+armazem = ArmazemDash(estado_dash_file)
+armazem.importar_categorias_json(esp_categorias_file)
+esp_categorias = armazem.categorias  # Somente leitura; alterações via armazem.definir_categorias
+
+# Cache único do estado dos dispositivos: todas as sessões recebem o mesmo snapshot
+# e o arquivo só é relido quando o servidor MQTT grava uma versão nova
+cache_estado = CacheEstado(data_file, esp_categorias)
+
+# Tabela de dispositivos paginada no servidor: o navegador só recebe a página visível
+consulta_dispositivos = ConsultaDispositivos(sem_categoria=cache_estado.categoria_padrao)
+tamanho_pagina_dispositivos = 20
+
+# Categorias que podem ser atribuídas aos dispositivos
+opcoes_categoria = [
+    {"label": "Manutenção", "value": "manutencao"},
+    {"label": "Segurança", "value": "seguranca"}
 ]
 
-# Lista de estações com nome e coordenadas geográficas (latitude, longitude)
-locations = [
-    ("São Paulo-Morumbi", (-23.5981, -46.7160)),
-    ("Jardim Guedala", (-23.6017, -46.7145)),
-    ("Morumbi", (-23.6095, -46.7132)),
-    ("Paraisópolis", (-23.6175, -46.7142)),
-    ("Américo Maurano", (-23.6260, -46.7138)),
-    ("Vila Andrade", (-23.6331, -46.7135)),
-    ("Jardim Jussara", (-23.6410, -46.7115)),
-]
+# Canal de eventos: recebe do servidor MQTT o aviso de que há dados novos
+canal_eventos = CanalEventos()
+assinante_eventos = None  # Cliente MQTT do canal (iniciado na primeira vez que é usado)
+trava_assinante = threading.Lock()
+
+# Intervalo (s) de atualização das abas sem vaga no canal de eventos (ligado pelo navegador só nesse caso)
+intervalo_sem_eventos = 10
+
+# Passo (s) do movimento dos trens no mapa, calculado no navegador sem chamar o servidor
+passo_animacao_trens = 1
+
+# Catálogo com os mesmos APs e estações usados pelo servidor MQTT (da fonte_catalogo).
+# Quando a fonte muda, é recarregado sem reiniciar o dash (ver aplicar_catalogo).
+catalogo = abrir_catalogo(fonte_catalogo, criar_pool_sqlite(banco_file) if fonte_catalogo == "banco" else None)
+
+# Access Points (APs) com id, nome, coordenadas e BSSID (identificador WiFi)
+access_points = list(catalogo.atual.aps)
+
+# Estações com nome e coordenadas geográficas (latitude, longitude)
+locations = list(catalogo.atual.estacoes)
 
-# Função que calcula a posição simulada do trem ao longo dos segmentos entre estações
-def calcular_posicao_trem(n):
-    segmento = n % (len(locations) - 1)  # Determina em qual segmento o trem está (entre estações)
-    progresso = (n % 5) / 5.0  # Progresso dentro do segmento (de 0 a 1)
-    _, inicio = locations[segmento]  # Coordenada da estação inicial do segmento
-    _, fim = locations[segmento + 1]  # Coordenada da estação final do segmento
-    lat = inicio[0] + (fim[0] - inicio[0]) * progresso  # Interpola latitude
-    lon = inicio[1] + (fim[1] - inicio[1]) * progresso  # Interpola longitude
-    return (lat, lon)
+# Motor de despacho com as distâncias AP x estação pré-calculadas
+motor_despacho = MotorDespacho({ap["nome"]: ap["coord"] for ap in access_points}, dict(locations))
+
+# Linhas e trens do catálogo, com as distâncias ao longo de cada linha pré-calculadas
+rede_trens = rede_do_catalogo(catalogo.atual)
+
+# Passo (s) da posição dos trens no despacho dos incidentes em trens: as sessões no mesmo
+# passo reaproveitam o mesmo ranking (no mapa, os trens são movidos pelo navegador)
+passo_trens = 10
+
+# Local dos incidentes reportados em um trem ("trem" sozinho, das versões antigas, é o primeiro trem)
+prefixo_local_trem = "trem:"
+
+# Calcula a posição de todos os trens no instante (no passo_trens): tupla de (id, (lat, lon))
+def calcular_posicoes_trens(instante):
+    instante = instante - instante % passo_trens
+    return tuple((id_trem, trem["coord"]) for id_trem, trem in rede_trens.estado(instante).items())
+
+# Trem em que está um incidente (None se o local é uma estação ou o trem não existe mais)
+def trem_incidente(local, ids_trens):
+    if local == "trem":
+        return ids_trens[0] if ids_trens else None
+    if local.startswith(prefixo_local_trem) and local[len(prefixo_local_trem):] in ids_trens:
+        return local[len(prefixo_local_trem):]
+    return None
+
+# Coordenada do local de um incidente: estação ou trem (None se não existe mais no catálogo)
+def coord_incidente(local, trens):
+    if local == "trem" or local.startswith(prefixo_local_trem):
+        id_trem = trem_incidente(local, [id_trem for id_trem, _ in trens])
+        return dict(trens).get(id_trem)
+    return dict(locations).get(local)
 
 # Função para deslocar coordenadas no eixo longitude para evitar sobreposição visual dos marcadores
+# (depois do agrupamento, só sobram na mesma coordenada estações, trens, incidentes e grupos expandidos)
 def deslocar_coord(coord, index, total):
     offset = 0.001  # Valor do deslocamento fixo
     if total % 2 == 1:
@@ -66,8 +119,19 @@ def deslocar_coord(coord, index, total):
     deslocamento = base_index * offset
     return (coord[0], coord[1] + deslocamento)
 
-# Função principal para gerar o mapa Folium, mostrando estações, dispositivos e incidentes
-def gerar_mapa(esps, n, incidente_id):
+# Quantidade máxima de conjuntos de marcadores mantidos em cache (LRU)
+tamanho_cache_mapa = 64
+
+# Agentes sugeridos para cada incidente (o mais próximo é destacado no mapa)
+agentes_por_incidente = 3
+
+# Últimos conjuntos de marcadores enviados, para mandar às sessões só o que mudou
+historico_marcadores = HistoricoMarcadores()
+
+# Mapa base (tiles, linha do metrô e nomes das estações): renderizado uma única vez.
+# Os marcadores dinâmicos chegam depois pela CamadaDinamica, sem recarregar o iframe.
+@lru_cache(maxsize=1)
+def renderizar_mapa_base():
     # Calcula centro médio do mapa com base nas estações
     media_lat = sum(coord[0] for _, coord in locations) / len(locations)
     media_lon = sum(coord[1] for _, coord in locations) / len(locations)
@@ -76,24 +140,21 @@ def gerar_mapa(esps, n, incidente_id):
     fig = Figure(width=700, height=500)
     mapa = folium.Map(
         location=(media_lat, media_lon),
-        zoom_start=14,
+        zoom_start=zoom_padrao,
+        max_zoom=zoom_maximo,
         tiles="CartoDB positron",  # Estilo do mapa
         zoom_control=True,
         scrollWheelZoom=False,
-        dragging=False
+        dragging=True  # Ao abrir um grupo o mapa aproxima nele; arrastar permite voltar ao resto da linha
     )
     fig.add_child(mapa)
 
-    # Desenha linha poligonal ligando as estações (linha do metrô)
-    PolyLine([coord for _, coord in locations], color="gold", weight=5).add_to(mapa)
+    # Desenha a linha poligonal de cada linha do metrô ligando as suas estações
+    for linha in rede_trens.linhas:
+        PolyLine(linha.coords.tolist(), color="gold", weight=5, tooltip=linha.nome).add_to(mapa)
 
-    elementos = []
-    # Adiciona marcadores para estações com ícone de trem vermelho e rótulos
+    # Rótulos com o nome de cada estação
     for nome, coord in locations:
-        elementos.append((coord, {
-            "tooltip": nome,
-            "icon": Icon(color="red", icon="train", prefix='fa')
-        }))
         folium.Marker(
             location=(coord[0] + 0.001, coord[1] + 0.001),  # Pequeno deslocamento para o texto
             icon=DivIcon(
@@ -103,10 +164,88 @@ def gerar_mapa(esps, n, incidente_id):
             )
         ).add_to(mapa)
 
+    # Camada que recebe as atualizações incrementais dos marcadores (e avisa a página do zoom e dos cliques nos grupos)
+    CamadaDinamica(zoom_maximo).add_to(mapa)
+
+    # Renderiza o HTML direto em memória: não há arquivo compartilhado entre sessões
+    return mapa.get_root().render()
+
+# 🚨 Agentes mais próximos de todos os incidentes abertos, em uma única chamada ao motor de despacho.
+# Devolve {id do incidente: ((client_id, distância em m, minutos), ...)}; no mesmo estado vem do cache.
+def despachar_incidentes(esps, instante):
+    agentes_chave = tuple(
+        (esp["client_id"], esp.get("categoria"), esp["ap"]["nome"], tuple(esp["ap"]["coord"]), tuple(esp["coord"]))
+        for esp in esps
+    )
+    incidentes_chave = tuple((i["id"], i["local"], i["categoria"]) for i in armazem.listar_incidentes())
+    return calcular_ranking_incidentes(agentes_chave, incidentes_chave, calcular_posicoes_trens(instante))
+
+@lru_cache(maxsize=tamanho_cache_mapa)
+def calcular_ranking_incidentes(agentes_chave, incidentes_chave, trens):
+    # A distância parte da posição estimada por RSSI, quando houver; senão, do AP em que o agente está
+    agentes = [
+        {"client_id": client_id, "categoria": categoria, "ap": ap_nome, "coord": ap_coord,
+         "posicao": coord if coord != ap_coord else None}
+        for client_id, categoria, ap_nome, ap_coord, coord in agentes_chave
+    ]
+    ranking = {}
+    incidentes = []
+    for id_incidente, local, categoria in incidentes_chave:
+        coord = coord_incidente(local, trens)
+        if coord is None:
+            ranking[id_incidente] = ()   # Local que não existe mais no catálogo
+        else:
+            incidentes.append({"id": id_incidente, "categoria": categoria, "local": local, "coord": coord})
+    for id_incidente, escolhidos in motor_despacho.top_k(agentes, incidentes, k=agentes_por_incidente).items():
+        ranking[id_incidente] = tuple(escolhidos)
+    return ranking
+
+# Função principal para gerar os marcadores do mapa, mostrando estações, dispositivos e incidentes.
+# Os agentes são agrupados pela grade do zoom da sessão; 'expandido' é o grupo aberto no zoom máximo.
+# 'ranking' é o resultado de despachar_incidentes (sem ele, é calculado com os próprios 'esps').
+def gerar_mapa(esps, instante, incidente_id, zoom=zoom_padrao, expandido=None, ranking=None):
+    # Monta uma chave só com o que aparece no mapa: se nada mudou desde a última
+    # atualização, os marcadores já calculados são reaproveitados do cache
+    esps_chave = tuple(
+        (esp["client_id"], esp.get("categoria"), esp["ap"]["nome"], tuple(esp["ap"]["coord"]),
+         tuple(esp.get("coord") or esp["ap"]["coord"]), esp.get("bateria"), esp["last_seen_formatado"])
+        for esp in esps
+    )
+    incidente = armazem.incidente(incidente_id)
+    incidente_chave = (incidente["local"], incidente["categoria"]) if incidente else None
+    atendimento = ()
+    if incidente:
+        if ranking is None:
+            ranking = despachar_incidentes(esps, instante)
+        atendimento = ranking.get(incidente["id"], ())
+
+    return calcular_marcadores(esps_chave, incidente_chave, tuple(rede_trens.ids), zoom, expandido, atendimento)
+
+# Calcula os marcadores {id: (lat, lon, tooltip, cor, icone)} e a versão correspondente (com cache LRU).
+# 'atendimento' são os agentes sugeridos para o incidente selecionado, do mais próximo ao mais distante.
+# Os marcadores dos trens não dependem do instante: o navegador os move (ver js_mover_trens).
+@lru_cache(maxsize=tamanho_cache_mapa)
+def calcular_marcadores(esps_chave, incidente_chave, ids_trens, zoom=zoom_padrao, expandido=None, atendimento=()):
+    esps = [
+        {"client_id": client_id, "categoria": categoria, "ap": {"nome": ap_nome, "coord": ap_coord},
+         "coord": coord, "bateria": bateria, "last_seen_formatado": last_seen_formatado}
+        for client_id, categoria, ap_nome, ap_coord, coord, bateria, last_seen_formatado in esps_chave
+    ]
+    incidente = {"local": incidente_chave[0], "categoria": incidente_chave[1]} if incidente_chave else None
+
+    elementos = []
+    # Adiciona marcadores para estações com ícone de trem vermelho
+    for nome, coord in locations:
+        elementos.append((coord, {
+            "id": f"estacao:{nome}",
+            "tooltip": nome,
+            "cor": "red", "icone": "train"
+        }))
+
     # Para cada dispositivo ESP, adiciona marcador com tooltip com informações relevantes
     for esp in esps:
         categoria = esp.get("categoria", "desconhecida")
-        coord = esp["ap"]["coord"]
+        coord = esp["coord"]  # Posição estimada por RSSI ou, sem varredura, a do AP
         nivel_bateria = f"{esp.get('bateria', '?')}%"
         tooltip = (
             f"{esp['client_id']} ({categoria})\n"
@@ -114,61 +253,72 @@ def gerar_mapa(esps, n, incidente_id):
             f"Bateria: {nivel_bateria}\n"
             f"Última: {esp['last_seen_formatado']}"
         )
-        icon = Icon(color="green", icon="microchip", prefix="fa")
-        elementos.append((coord, {"tooltip": tooltip, "icon": icon}))
+        elementos.append((coord, {
+            "id": f"esp:{esp['client_id']}", "tooltip": tooltip, "cor": "green", "icone": "microchip", "categoria": categoria
+        }))
 
-    # Marca a posição simulada do trem com ícone de metrô verde
-    trem_coord = calcular_posicao_trem(n)
-    elementos.append((trem_coord, {
-        "tooltip": "🚇 Trem em movimento",
-        "icon": Icon(color="green", icon="subway", prefix="fa")
-    }))
+    # Cada trem com ícone de metrô verde; a posição (e a próxima estação) vem do navegador
+    seguidores = {
+        id_trem: [{"id": f"trem:{id_trem}", "tooltip": f"🚇 Trem {id_trem}", "cor": "green", "icone": "subway"}]
+        for id_trem in ids_trens
+    }
 
     # Se houver incidente selecionado, adiciona marcador de incidente e marca o dispositivo mais próximo da categoria
-    incidente = next((i for i in incident_log if i["id"] == incidente_id), None)
-    if incidente:
-        incidente_coord = trem_coord if incidente["local"] == "trem" else dict(locations)[incidente["local"]]
+    trem = trem_incidente(incidente["local"], ids_trens) if incidente else None
+    incidente_coord = dict(locations).get(incidente["local"]) if incidente and trem is None else None
+    no_incidente = []   # Marcadores no local do incidente (estação ou trem)
+    if trem is not None or incidente_coord is not None:
 
         # Remove marcador original no local do incidente para substituir pelo marcador de incidente
-        elementos = [e for e in elementos if tuple(e[0]) != tuple(incidente_coord)]
+        if incidente_coord is not None:
+            elementos = [e for e in elementos if tuple(e[0]) != tuple(incidente_coord)]
 
         # Adiciona marcador do incidente com ícone de aviso laranja
-        elementos.append((incidente_coord, {
+        no_incidente.append({
+            "id": "incidente",
             "tooltip": f"📍 Incidente: {incidente['local']} ({incidente['categoria']})",
-            "icon": Icon(color="orange", icon="exclamation-triangle", prefix="fa")
-        }))
-
-        # Filtra ESPs da mesma categoria do incidente para indicar o mais próximo
-        esps_categoria = [e for e in esps if e.get("categoria") == incidente["categoria"]]
-        if esps_categoria:
-            mais_proximo = min(
-                esps_categoria,
-                key=lambda esp: geodesic(esp["ap"]["coord"], incidente_coord).meters
-            )
-            distancia_metros = geodesic(mais_proximo["ap"]["coord"], incidente_coord).meters
-            velocidade_mps = 1.2  # Velocidade média estimada para deslocamento
-            tempo_minutos = round(distancia_metros / velocidade_mps / 60, 1)
+            "cor": "orange", "icone": "exclamation-triangle"
+        })
 
+        # ESP mais próximo da mesma categoria do incidente (já calculado no despacho de todos os incidentes)
+        mais_proximo = None
+        if atendimento:
+            client_id, distancia_metros, tempo_minutos = atendimento[0]
+            mais_proximo = next((e for e in esps if e["client_id"] == client_id), None)
+        if mais_proximo is not None:
             tooltip = (
                 f"🚘 {mais_proximo['client_id']} ({mais_proximo['categoria']})\n"
                 f"Distância: {int(distancia_metros)} m\n"
                 f"Estimativa de chegada: {tempo_minutos} min"
             )
+            if len(atendimento) > 1:
+                tooltip += "\nPróximos: " + ", ".join(f"{c} ({t} min)" for c, _, t in atendimento[1:])
 
             # Remove marcador original do ESP mais próximo e adiciona um marcador destacado
-            elementos = [e for e in elementos if tuple(e[0]) != tuple(mais_proximo["ap"]["coord"])]
+            elementos = [e for e in elementos if e[1]["id"] != f"esp:{mais_proximo['client_id']}"]
 
-            elementos.append((mais_proximo["ap"]["coord"], {
+            elementos.append((mais_proximo["coord"], {
+                "id": f"mais_proximo:{mais_proximo['client_id']}",
                 "tooltip": tooltip,
-                "icon": Icon(color="darkred", icon="user-shield", prefix="fa")
+                "cor": "darkred", "icone": "user-shield"
             }))
         else:
             # Caso não exista dispositivo da categoria para atender o incidente
             tooltip = f"❌ Nenhum dispositivo da categoria '{incidente['categoria']}' disponível nas proximidades"
-            elementos.append((incidente_coord, {
+            no_incidente.append({
+                "id": "sem_dispositivo",
                 "tooltip": tooltip,
-                "icon": Icon(color="gray", icon="ban", prefix="fa")
-            }))
+                "cor": "gray", "icone": "ban"
+            })
+
+    if trem is not None:
+        # Incidente em um trem: os marcadores dele seguem o trem, no lugar do marcador do trem
+        seguidores[trem] = [dict(dados, id=f"{dados['id']}@trem:{trem}") for dados in no_incidente]
+    else:
+        elementos += [(incidente_coord, dados) for dados in no_incidente]
+
+    # Agentes na mesma célula da grade viram um único marcador com a quantidade e as categorias
+    elementos = agrupar_marcadores(elementos, zoom, expandido)
 
     # Para cada coordenada que pode ter múltiplos marcadores, aplica deslocamento para evitar sobreposição
     coord_map = {}
@@ -178,22 +328,38 @@ def gerar_mapa(esps, n, incidente_id):
             coord_map[key] = []
         coord_map[key].append(dados)
 
+    marcadores = {}
     for coord, grupo in coord_map.items():
         total = len(grupo)
         for i, dados in enumerate(grupo):
             deslocada = deslocar_coord(coord, i, total)
-            Marker(
-                deslocada,
-                tooltip=dados["tooltip"],
-                icon=dados["icon"]
-            ).add_to(mapa)
+            marcadores[dados["id"]] = (deslocada[0], deslocada[1], dados["tooltip"], dados["cor"], dados["icone"])
+            if "quantidade" in dados:
+                marcadores[dados["id"]] += (dados["quantidade"],)
+
+    # Marcadores de um trem levam só o deslocamento entre eles: o mapa soma a posição do trem
+    for grupo in seguidores.values():
+        total = len(grupo)
+        for i, dados in enumerate(grupo):
+            deslocada = deslocar_coord((0.0, 0.0), i, total)
+            marcadores[dados["id"]] = (deslocada[0], deslocada[1], dados["tooltip"], dados["cor"], dados["icone"])
 
-    # Salva o mapa gerado em arquivo HTML e retorna o conteúdo dentro de um iframe para a interface Dash
-    mapa.save("map.html")
-    with open("map.html", "r", encoding="utf-8") as f:
-        html_data = f.read()
+    return versao_marcadores(marcadores), marcadores
 
-    return html.Iframe(srcDoc=html_data, width="100%", height="585")
+# 🔄 Catálogo recarregado: troca APs, estações e motor de despacho e descarta os mapas
+# calculados com os dados antigos. Sessões novas já recebem o mapa base e as opções novas.
+def aplicar_catalogo(novo, anterior):
+    global access_points, locations, motor_despacho, rede_trens
+    access_points = list(novo.aps)
+    locations = list(novo.estacoes)
+    motor_despacho = MotorDespacho({ap["nome"]: ap["coord"] for ap in access_points}, dict(locations))
+    rede_trens = rede_do_catalogo(novo)
+    renderizar_mapa_base.cache_clear()
+    calcular_marcadores.cache_clear()
+    calcular_ranking_incidentes.cache_clear()
+
+catalogo.ao_recarregar = aplicar_catalogo
+catalogo.iniciar()
 
 
 # ---------------- DASH APP ------------------
@@ -204,104 +370,172 @@ app = Dash(__name__, external_stylesheets=[
     "https://cdnjs.cloudflare.com/ajax/libs/font-awesome/5.15.4/css/all.min.css"
 ])
 app.title = "Monitor de Agentes"
+server = app.server  # Aplicação WSGI para o gunicorn (ex.: gunicorn -w 4 dash_acompanhamento:server)
 
-# Layout principal com container Bootstrap
-app.layout = dbc.Container([
-    # Cabeçalho com logos alinhados
-    html.Div([
-        dbc.Row([
-            dbc.Col(html.Img(src="/assets/metro_logo.png", height="60px"), width=6, style={"textAlign": "left"}),
-            dbc.Col(html.Img(src="/assets/fei_logo.png", height="60px"), width=6, style={"textAlign": "right"})
-        ], align="center", justify="between", className="mb-4"),
-        html.H2("Sistema de Tratativa de Incidentes", style={"textAlign": "center", "marginBottom": "30px"}),
-        html.H4("🚨 Reportar Incidente"),
-        # Formulário para reportar incidente: seleção de local, categoria e botão de envio
+# Layout principal com container Bootstrap (montado a cada carregamento da página,
+# assim estações e APs recarregados do catálogo aparecem sem reiniciar o dash)
+def montar_layout():
+    return dbc.Container([
+        # Cabeçalho com logos alinhados
+        html.Div([
+            dbc.Row([
+                dbc.Col(html.Img(src="/assets/metro_logo.png", height="60px"), width=6, style={"textAlign": "left"}),
+                dbc.Col(html.Img(src="/assets/fei_logo.png", height="60px"), width=6, style={"textAlign": "right"})
+            ], align="center", justify="between", className="mb-4"),
+            html.H2("Sistema de Tratativa de Incidentes", style={"textAlign": "center", "marginBottom": "30px"}),
+            html.H4("🚨 Reportar Incidente"),
+            # Formulário para reportar incidente: seleção de local, categoria e botão de envio
+            dbc.Row([
+                dbc.Col([
+                    dcc.Dropdown(
+                        id="local_incidente",
+                        options=[{"label": nome, "value": nome} for nome, _ in locations] + [
+                            {"label": f"🚇 Vagão em movimento ({id_trem})", "value": f"{prefixo_local_trem}{id_trem}"}
+                            for id_trem in rede_trens.ids
+                        ],
+                        placeholder="Local do incidente"
+                    )
+                ], width=6),
+                dbc.Col([
+                    dcc.Dropdown(
+                        id="categoria_incidente",
+                        options=[
+                            {"label": "Manutenção", "value": "manutencao"},
+                            {"label": "Segurança", "value": "seguranca"}
+                        ],
+                        placeholder="Categoria do incidente"
+                    )
+                ], width=4),
+                dbc.Col([
+                    dbc.Button("Enviar Incidente", id="botao_incidente", color="danger")
+                ], width=2)
+            ]),
+            html.Div(id="mensagem_incidente", style={"marginTop": "10px"})
+        ]),
+        html.Br(),
+        # Dropdown para escolher qual incidente visualizar
+        html.Div([
+            html.H5("📝 Incidentes registrados"),
+            dcc.Dropdown(id="incidente_selecionado", placeholder="Selecione um incidente")
+        ]),
+        html.Hr(),
+        dcc.Interval(id="interval", interval=intervalo_sem_eventos * 1000, n_intervals=0, disabled=True),  # Só sem vaga no canal de eventos
+        dcc.Interval(id="relogio_trens", interval=passo_animacao_trens * 1000, n_intervals=0),  # Move os trens no navegador
+        dcc.Store(id="tabela_trens", data=dict(rede_trens.tabela(), relogio=time.time())),  # Linhas e tabela horária dos trens
+        dcc.Store(id="evento_push"),  # Versão do último evento recebido do servidor MQTT
+        dcc.Store(id="assinatura_lista"),  # Estado que a lista de dispositivos desta sessão já mostra
+        dcc.Store(id="mostrar_esps_store", data=False),  # Guarda estado se deve mostrar todos os ESPs ou só os relacionados a incidente
+        dcc.Store(id="versao_mapa"),  # Versão dos marcadores que esta sessão já recebeu
+        dcc.Store(id="diff_mapa"),  # Diferença de marcadores a aplicar no mapa
+        dcc.Store(id="zoom_mapa", data=zoom_padrao),  # Zoom atual do mapa desta sessão (define a grade dos grupos)
+        dcc.Store(id="grupo_expandido"),  # Grupo aberto com um clique no zoom máximo
         dbc.Row([
+            dbc.Col(
+                html.Div([
+                    # Mapa interativo gerado por Folium: carregado uma vez, depois só recebe diferenças
+                    html.Div(id="mapa", children=html.Iframe(id="mapa_iframe", srcDoc=renderizar_mapa_base(), width="100%", height="585")),
+                    dbc.Button(
+                        id="botao_mostrar_esps",
+                        color="secondary",
+                        size="sm",
+                        style={"marginTop": "10px", "marginBottom": "10px"},
+                        children="👁️ Mostrar todos os dispositivos"
+                    )
+                ]),
+                width=6,
+                style={"height": "100%", "overflow": "hidden"}
+            ),
             dbc.Col([
-                dcc.Dropdown(
-                    id="local_incidente",
-                    options=[{"label": nome, "value": nome} for nome, _ in locations] + [{"label": "🚇 Vagão em movimento", "value": "trem"}],
-                    placeholder="Local do incidente"
-                )
-            ], width=6),
-            dbc.Col([
-                dcc.Dropdown(
-                    id="categoria_incidente",
-                    options=[
-                        {"label": "Manutenção", "value": "manutencao"},
-                        {"label": "Segurança", "value": "seguranca"}
+                # Lista de dispositivos: busca, filtros, ordenação e paginação feitos no servidor.
+                # A categoria é alterada direto na tabela e só a alteração é enviada.
+                html.H4("📡 Lista de Dispositivos"),
+                dcc.Input(
+                    id="busca_esps",
+                    type="search",
+                    debounce=True,
+                    placeholder="Buscar por dispositivo ou AP",
+                    style={"width": "100%", "marginBottom": "5px"}
+                ),
+                dbc.Row([
+                    dbc.Col(dcc.Dropdown(
+                        id="filtro_status",
+                        options=[{"label": rotulo, "value": status} for status, rotulo in rotulos_status.items()],
+                        placeholder="Status"
+                    ), width=3),
+                    dbc.Col(dcc.Dropdown(
+                        id="filtro_categoria",
+                        options=opcoes_categoria + [{"label": "Não definida", "value": cache_estado.categoria_padrao}],
+                        placeholder="Categoria"
+                    ), width=3),
+                    dbc.Col(dcc.Dropdown(
+                        id="filtro_estacao",
+                        options=sorted({ap["nome"] for ap in access_points}),
+                        placeholder="AP / estação"
+                    ), width=3),
+                    dbc.Col(dcc.Dropdown(
+                        id="filtro_bateria",
+                        options=[{"label": f"🔋 Acaba em {minutos} min", "value": minutos} for minutos in (15, 30, 60, 120)],
+                        placeholder="🔋 Acaba em"
+                    ), width=3)
+                ], style={"marginBottom": "5px"}),
+                html.Div(id="resumo_esps", style={"color": "gray", "fontSize": "13px", "marginBottom": "5px"}),
+                dash_table.DataTable(
+                    id="tabela_esps",
+                    columns=[
+                        {"name": "Dispositivo", "id": "client_id", "editable": False},
+                        {"name": "Categoria", "id": "categoria", "presentation": "dropdown", "editable": True},
+                        {"name": "AP", "id": "ap", "editable": False},
+                        {"name": "🔋", "id": "bateria", "type": "numeric", "editable": False},
+                        {"name": "Status", "id": "status", "editable": False},
+                        {"name": "Última", "id": "ultima", "editable": False},
+                        {"name": "Acaba em", "id": "acaba", "editable": False}
                     ],
-                    placeholder="Categoria do incidente"
-                )
-            ], width=4),
-            dbc.Col([
-                dbc.Button("Enviar Incidente", id="botao_incidente", color="danger")
-            ], width=2)
-        ]),
-        html.Div(id="mensagem_incidente", style={"marginTop": "10px"})
-    ]),
-    html.Br(),
-    # Dropdown para escolher qual incidente visualizar
-    html.Div([
-        html.H5("📝 Incidentes registrados"),
-        dcc.Dropdown(id="incidente_selecionado", placeholder="Selecione um incidente")
-    ]),
-    html.Hr(),
-    dcc.Interval(id="interval", interval=10000, n_intervals=0),  # Atualização automática a cada 10s
-    dcc.Store(id="mostrar_esps_store", data=False),  # Guarda estado se deve mostrar todos os ESPs ou só os relacionados a incidente
-    dbc.Row([
-        dbc.Col(
-            html.Div([
-                html.Div(id="mapa"),  # Mapa interativo gerado por Folium
+                    data=[],
+                    dropdown={"categoria": {"options": opcoes_categoria, "clearable": False}},
+                    page_action="custom",
+                    page_current=0,
+                    page_size=tamanho_pagina_dispositivos,
+                    sort_action="custom",
+                    sort_mode="single",
+                    sort_by=[],
+                    style_table={"overflowX": "auto"},
+                    style_cell={"fontSize": "13px", "textAlign": "left", "padding": "4px"},
+                    css=[{"selector": ".Select-menu-outer", "rule": "display: block !important"}]
+                ),
+                html.Hr(),
                 dbc.Button(
-                    id="botao_mostrar_esps",
-                    color="secondary",
+                    "📶 Mostrar Access Points",
+                    id="toggle_ap_detalhes",
+                    color="info",
                     size="sm",
-                    style={"marginTop": "10px", "marginBottom": "10px"},
-                    children="👁️ Mostrar todos os dispositivos"
-                )
-            ]),
-            width=6,
-            style={"height": "100%", "overflow": "hidden"}
-        ),
-        dbc.Col([
-            html.Div(id="lista_esps"),  # Lista textual dos dispositivos
-            html.Hr(),
-            html.H4("🛠️ Categorizar Dispositivos"),
-            html.Div(id="categorias_esp_ui"),  # UI para categorizar dispositivos
-            html.Hr(),
-            dbc.Button(
-                "📶 Mostrar Access Points",
-                id="toggle_ap_detalhes",
-                color="info",
-                size="sm",
-                style={"marginBottom": "10px"}
-            ),
-            dbc.Collapse(
-                html.Div(id="tabela_ap_detalhes"),  # Tabela com detalhes dos APs
-                id="collapse_ap_detalhes",
-                is_open=False
-            ),
-            # Legenda para facilitar entendimento dos ícones no mapa
-            html.Hr(),
-            html.H5("Legenda", style={"marginTop": "15px"}),
-            html.Ul([
-                html.Li([html.I(className="fa fa-subway", style={"marginRight": "8px", "color": "green"}), "Trem em movimento"]),
-                html.Li([html.I(className="fa fa-exclamation-triangle", style={"marginRight": "8px", "color": "orange"}), "Incidente"]),
-                html.Li([html.I(className="fa fa-microchip", style={"marginRight": "8px", "color": "green"}), "Dispositivo (manutenção / segurança)"]),
-                html.Li([html.I(className="fa fa-user-shield", style={"marginRight": "8px", "color": "darkred"}), "Dipositivo mais próximo"]),
-                html.Li([html.I(className="fa fa-ban", style={"marginRight": "8px", "color": "gray"}), "Sem dispositivo disponível"]),
-                html.Li([html.I(className="fa fa-train", style={"marginRight": "8px", "color": "red"}), "Estação"])
-            ], style={"paddingLeft": "20px", "fontSize": "14px"})
-        ], width=6, style={"maxHeight": "85vh", "overflowY": "auto"})
-    ])
-], fluid=True)
+                    style={"marginBottom": "10px"}
+                ),
+                dbc.Collapse(
+                    html.Div(id="tabela_ap_detalhes"),  # Tabela com detalhes dos APs
+                    id="collapse_ap_detalhes",
+                    is_open=False
+                ),
+                # Legenda para facilitar entendimento dos ícones no mapa
+                html.Hr(),
+                html.H5("Legenda", style={"marginTop": "15px"}),
+                html.Ul([
+                    html.Li([html.I(className="fa fa-subway", style={"marginRight": "8px", "color": "green"}), "Trem em movimento"]),
+                    html.Li([html.I(className="fa fa-exclamation-triangle", style={"marginRight": "8px", "color": "orange"}), "Incidente"]),
+                    html.Li([html.I(className="fa fa-microchip", style={"marginRight": "8px", "color": "green"}), "Dispositivo (manutenção / segurança)"]),
+                    html.Li([html.I(className="fa fa-user-shield", style={"marginRight": "8px", "color": "darkred"}), "Dipositivo mais próximo"]),
+                    html.Li([html.I(className="fa fa-ban", style={"marginRight": "8px", "color": "gray"}), "Sem dispositivo disponível"]),
+                    html.Li([html.I(className="fa fa-train", style={"marginRight": "8px", "color": "red"}), "Estação"])
+                ], style={"paddingLeft": "20px", "fontSize": "14px"})
+            ], width=6, style={"maxHeight": "85vh", "overflowY": "auto"})
+        ])
+    ], fluid=True)
+
+app.layout = montar_layout
 
 
 # CALLBACK para registrar incidente ao clicar no botão "Enviar Incidente"
 @app.callback(
     Output("mensagem_incidente", "children"),
-    Output("incidente_selecionado", "options"),
     Input("botao_incidente", "n_clicks"),
     State("local_incidente", "value"),
     State("categoria_incidente", "value"),
@@ -310,54 +544,64 @@ app.layout = dbc.Container([
 def reportar_incidente(n_clicks, local, categoria):
     if local and categoria:
         timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        incidente_id = f"{local}{categoria}{timestamp}"
-        incident_log.append({
-            "id": incidente_id,
-            "local": local,
-            "categoria": categoria,
-            "hora": timestamp
-        })
-        options = [{"label": f"{i['local']} ({i['categoria']}) - {i['hora']}", "value": i['id']} for i in incident_log]
-        return html.Div(f"✅ Incidente registrado em: {local} ({categoria})", style={"color": "green"}), options
-    return html.Div("⚠️ Selecione local e categoria antes de enviar.", style={"color": "orange"}), []
+        armazem.registrar_incidente(local, categoria, timestamp)
+        avisar_sessoes("incidentes")
+        return html.Div(f"✅ Incidente registrado em: {local} ({categoria})", style={"color": "green"})
+    return html.Div("⚠️ Selecione local e categoria antes de enviar.", style={"color": "orange"})
 
-# CALLBACK para atualizar mapa, lista de dispositivos, tabela de APs e UI de categorias periodicamente ou por seleção
+# CALLBACK para listar os incidentes registrados (inclusive os reportados em outros workers, que avisam pelo canal de eventos)
+@app.callback(
+    Output("incidente_selecionado", "options"),
+    Input("interval", "n_intervals"),
+    Input("evento_push", "data"),
+    Input("mensagem_incidente", "children"),
+    State("incidente_selecionado", "options")
+)
+def atualizar_incidentes(n, evento, mensagem, opcoes_atuais):
+    incidentes = armazem.listar_incidentes()
+    # Mesmo ranking calculado pelo mapa no mesmo estado (vem do cache): mostra o agente sugerido de cada incidente
+    agora = time.time()
+    esps_ativos = [esp for esp in cache_estado.obter().esps if status_dispositivo(esp, agora) != "inativo"]
+    ranking = despachar_incidentes(esps_ativos, agora)
+    opcoes = []
+    for i in incidentes:
+        label = f"{i['local']} ({i['categoria']}) - {i['hora']}"
+        if ranking.get(i["id"]):
+            client_id, _, tempo_minutos = ranking[i["id"]][0]
+            label += f" — 🚘 {client_id} ({tempo_minutos} min)"
+        opcoes.append({"label": label, "value": i["id"]})
+    if opcoes == opcoes_atuais:
+        return no_update
+    return opcoes
+
+# CALLBACK para atualizar mapa, tabela de APs e a assinatura da lista de dispositivos periodicamente ou por seleção
 @app.callback(
-    Output("mapa", "children"),
-    Output("lista_esps", "children"),
+    Output("diff_mapa", "data"),
+    Output("versao_mapa", "data"),
     Output("tabela_ap_detalhes", "children"),
-    Output("categorias_esp_ui", "children"),
+    Output("assinatura_lista", "data"),
     Input("interval", "n_intervals"),
+    Input("evento_push", "data"),
+    Input("zoom_mapa", "data"),
+    Input("grupo_expandido", "data"),
     State("mostrar_esps_store", "data"),
-    State("incidente_selecionado", "value")
+    State("incidente_selecionado", "value"),
+    State("versao_mapa", "data"),
+    State("assinatura_lista", "data")
 )
-def atualizar(n, mostrar_esps_clicks, incidente_id):
+def atualizar(n, evento, zoom, grupo_expandido, mostrar_esps_clicks, incidente_id, versao_anterior, assinatura_anterior):
     mostrar_todos_esps = mostrar_esps_clicks and mostrar_esps_clicks > 0
 
-    esps_ativos, esps_historico = [], []
-    agora = datetime.datetime.now()
-    # Lê dados dos dispositivos do arquivo JSON
-    if os.path.exists(data_file):
-        with open(data_file, "r") as f:
-            try:
-                all_esps = json.load(f)
-                for esp in all_esps:
-                    last_seen = datetime.datetime.strptime(esp["last_seen"], "%Y-%m-%d %H:%M:%S")
-                    delta = (agora - last_seen).total_seconds()
-                    esp["last_seen_formatado"] = last_seen.strftime("%d/%m/%Y %H:%M:%S")
-                    esp["categoria"] = esp_categorias.get(esp["client_id"], "não definida")
-                    esp["delta"] = delta
-                    esp["status"] = "conectado" if delta < 60 else esp["last_seen_formatado"]
-                    esp["bateria"] = esp.get("bateria", None)
-
-                    esps_historico.append(esp)
-                    if delta < 300:
-                        esps_ativos.append(esp)
-            except:
-                pass
+    # Snapshot compartilhado (já com categorias): nenhuma leitura ou parse aqui.
+    # O status é recalculado agora pela última mensagem: o gravado pode ter ficado velho
+    agora = time.time()
+    estado = cache_estado.obter()
+    esps_historico = estado.esps
+    situacoes = [status_dispositivo(esp, agora) for esp in esps_historico]
+    esps_ativos = [esp for esp, situacao in zip(esps_historico, situacoes) if situacao != "inativo"]
 
     # Busca incidente selecionado para filtrar dispositivos
-    incidente = next((i for i in incident_log if i["id"] == incidente_id), None)
+    incidente = armazem.incidente(incidente_id)
 
     # Define quais dispositivos mostrar no mapa (todos ou só da categoria do incidente)
     if mostrar_todos_esps:
@@ -367,46 +611,26 @@ def atualizar(n, mostrar_esps_clicks, incidente_id):
     else:
         esps_para_mapa = []
 
-    # Gera o mapa com os dispositivos filtrados e incidente selecionado
-    mapa = gerar_mapa(esps_para_mapa, n, incidente_id)
+    # Ranking de todos os incidentes abertos de uma vez, com todos os agentes ativos
+    ranking = despachar_incidentes(esps_ativos, agora)
 
-    # Gera lista textual dos dispositivos para exibição lateral
-    lista_unificada = html.Div([
-        html.H4("📡 Lista de Dispositivos"),
-        html.Ul([
-            html.Li(
-                html.Span([
-                    html.Strong(f"{esp['client_id']}"),
-                    f" ({esp['categoria']}) — AP: {esp['ap']['nome']} — ",
-                    html.Span(f"🔋 {esp['bateria']}%", style={"marginRight": "10px"}) if esp.get("bateria") is not None else "",
-                    html.Span("🟢 CONECTADO", style={"color": "green"}) if esp["status"] == "conectado"
-                    else html.Span(f"Última: {esp['status']}", style={"color": "gray"})
-                ])
-            ) for esp in esps_historico
-        ]) if esps_historico else html.P("⚠️ Nenhum dispositivo registrado.", style={"color": "gray"})
-    ])
+    # Gera os marcadores com os dispositivos filtrados e incidente selecionado
+    versao, marcadores = gerar_mapa(esps_para_mapa, agora, incidente_id, zoom or zoom_padrao, grupo_expandido, ranking)
+    historico_marcadores.guardar(versao, marcadores)
 
-    # UI para permitir alterar categoria de cada dispositivo via dropdown
-    categoria_ui = html.Div([
-        html.Div([
-            dbc.Row([
-                dbc.Col(html.Div(esp["client_id"]), width=3),
-                dbc.Col(
-                    dcc.Dropdown(
-                        id={"type": "esp_categoria", "index": esp["client_id"]},
-                        options=[
-                            {"label": "Manutenção", "value": "manutencao"},
-                            {"label": "Segurança", "value": "seguranca"}
-                        ],
-                        value=esp_categorias.get(esp["client_id"], None),
-                        placeholder="Selecionar categoria"
-                    ),
-                    width=5
-                )
-            ], style={"marginBottom": "5px"})
-            for esp in esps_historico
-        ])
-    ])
+    # Envia ao navegador só o que mudou desde a versão que a sessão já tem
+    if versao == versao_anterior:
+        diff = no_update
+    else:
+        anteriores = historico_marcadores.obter(versao_anterior) if versao_anterior else None
+        diff = calcular_diff(anteriores, marcadores)
+
+    # Se nada mudou nos dados nem no status (conectado/ativo) desde a última lista desta
+    # sessão — ex.: evento de um incidente novo ou mudança de zoom — a página da tabela não é refeita
+    conectados = situacoes.count("conectado")
+    assinatura_lista = [estado.versao, conectados, len(esps_ativos)]
+    if assinatura_lista == assinatura_anterior:
+        return diff, versao, no_update, no_update
 
     # Lista de Access Points para visualização
     tabela = html.Div([
@@ -417,7 +641,126 @@ def atualizar(n, mostrar_esps_clicks, incidente_id):
         ])
     ])
 
-    return mapa, lista_unificada, tabela, categoria_ui
+    return diff, versao, tabela, assinatura_lista
+
+# Alterações que levam a tabela de volta para a primeira página
+reiniciam_paginacao = (
+    "busca_esps.value", "filtro_status.value", "filtro_categoria.value", "filtro_estacao.value",
+    "filtro_bateria.value", "tabela_esps.sort_by"
+)
+
+# CALLBACK que monta só a página visível da tabela de dispositivos (busca, filtros e ordenação no servidor)
+@app.callback(
+    Output("tabela_esps", "data"),
+    Output("tabela_esps", "page_count"),
+    Output("tabela_esps", "page_current"),
+    Output("resumo_esps", "children"),
+    Input("assinatura_lista", "data"),
+    Input("busca_esps", "value"),
+    Input("filtro_status", "value"),
+    Input("filtro_categoria", "value"),
+    Input("filtro_estacao", "value"),
+    Input("filtro_bateria", "value"),
+    Input("tabela_esps", "page_current"),
+    Input("tabela_esps", "page_size"),
+    Input("tabela_esps", "sort_by")
+)
+def atualizar_tabela(assinatura, busca, status, categoria, estacao, acaba_em, pagina, tamanho, ordenacao):
+    # Filtro ou ordenação novos voltam para a primeira página
+    disparos = ctx.triggered_prop_ids or {}
+    if any(prop in disparos for prop in reiniciam_paginacao):
+        pagina = 0
+    pagina = pagina or 0
+    tamanho = tamanho or tamanho_pagina_dispositivos
+
+    estado = cache_estado.obter()
+    consulta = dict(busca=busca, status=status, categoria=categoria, estacao=estacao, acaba_em=acaba_em, ordenacao=ordenacao)
+    linhas, total = consulta_dispositivos.consultar(estado, time.time(), pagina=pagina, tamanho=tamanho, **consulta)
+    paginas = max(1, math.ceil(total / tamanho))
+    if pagina >= paginas:
+        # A lista encolheu: mostra a última página que ainda existe
+        pagina = paginas - 1
+        linhas, total = consulta_dispositivos.consultar(estado, time.time(), pagina=pagina, tamanho=tamanho, **consulta)
+
+    if not estado.esps:
+        resumo = "⚠️ Nenhum dispositivo registrado."
+    else:
+        resumo = f"{total} de {len(estado.esps)} dispositivos"
+        # Previsão já calculada na ingestão: só os que acabam dentro do prazo são percorridos
+        acabando = consulta_dispositivos.esgotando(estado, time.time(), minutos_alerta_bateria)
+        if acabando:
+            resumo += f" — ⚠️ {len(acabando)} com bateria acabando em até {minutos_alerta_bateria} min"
+    return linhas, paginas, pagina, resumo
+
+# CALLBACK (no navegador) que abre o canal de eventos (SSE) com o servidor:
+# cada aviso do servidor MQTT atualiza "evento_push" e dispara o callback atualizar.
+# O intervalo periódico só é ligado enquanto a aba está sem vaga ("lotado") ou sem o canal.
+app.clientside_callback(
+    """
+    function (id) {
+        if (!window.fonteEventos) {
+            window.fonteEventos = new EventSource("/eventos");
+            window.fonteEventos.onmessage = function (evento) {
+                window.dash_clientside.set_props("evento_push", {data: evento.lastEventId});
+            };
+            window.fonteEventos.addEventListener("conectado", function () {
+                window.dash_clientside.set_props("interval", {disabled: true});
+            });
+            window.fonteEventos.addEventListener("lotado", function () {
+                window.dash_clientside.set_props("interval", {disabled: false});
+            });
+            window.fonteEventos.onerror = function () {
+                if (window.fonteEventos.readyState === EventSource.CLOSED) {
+                    window.dash_clientside.set_props("interval", {disabled: false});
+                }
+            };
+        }
+        return window.dash_clientside.no_update;
+    }
+    """,
+    Output("evento_push", "data"),
+    Input("evento_push", "id")
+)
+
+# Assinante do tópico de eventos deste processo (iniciado na primeira vez que é usado)
+def obter_assinante():
+    global assinante_eventos
+    with trava_assinante:
+        if assinante_eventos is None:
+            assinante_eventos = iniciar_assinante(canal_eventos)
+    return assinante_eventos
+
+# 📣 Avisa as abas de todos os workers (pelo broker) que incidentes ou categorias mudaram
+def avisar_sessoes(tipo):
+    publicar_evento(obter_assinante(), {"tipo": tipo, "ts": time.time()})
+
+# Canal SSE: mantém a conexão aberta e envia um evento a cada aviso do servidor MQTT
+# (no máximo eventos.conexoes_sse_maximas por processo; ver eventos.fluxo_sse)
+@app.server.route("/eventos")
+def eventos_sse():
+    obter_assinante()
+    return Response(
+        fluxo_sse(canal_eventos),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# CALLBACK (no navegador) que repassa a diferença de marcadores para o iframe do mapa
+app.clientside_callback(
+    js_enviar_diff,
+    Output("mapa_iframe", "title"),
+    Input("diff_mapa", "data"),
+    State("mapa_iframe", "id")
+)
+
+# CALLBACK (no navegador) que move os trens pela tabela horária, sem chamar o servidor
+app.clientside_callback(
+    js_mover_trens,
+    Output("mapa", "title"),
+    Input("relogio_trens", "n_intervals"),
+    State("tabela_trens", "data"),
+    State("mapa_iframe", "id")
+)
 
 # CALLBACK para abrir/fechar a seção de detalhes dos Access Points
 @app.callback(
@@ -429,21 +772,22 @@ def atualizar(n, mostrar_esps_clicks, incidente_id):
 def toggle_collapse_ap(n_clicks, is_open):
     return not is_open
 
-# CALLBACK para salvar as categorias definidas para dispositivos no arquivo JSON
+# CALLBACK para salvar no banco compartilhado as categorias alteradas na tabela (só as linhas editadas)
 @app.callback(
-    Input({"type": "esp_categoria", "index": ALL}, "value"),
-    State({"type": "esp_categoria", "index": ALL}, "id"),
+    Input("tabela_esps", "data_timestamp"),
+    State("tabela_esps", "data"),
+    State("tabela_esps", "data_previous"),
     prevent_initial_call=True
 )
-def salvar_categorias(valores, ids):
-    mudou = False
-    for val, id_obj in zip(valores, ids):
-        if val and esp_categorias.get(id_obj["index"]) != val:
-            esp_categorias[id_obj["index"]] = val
-            mudou = True
-    if mudou:
-        with open(esp_categorias_file, "w") as f:
-            json.dump(esp_categorias, f, indent=2)
+def salvar_categorias(data_timestamp, linhas, linhas_anteriores):
+    alteracoes = {
+        client_id: categoria
+        for client_id, categoria in diferenca_categorias(linhas, linhas_anteriores).items()
+        if esp_categorias.get(client_id) != categoria
+    }
+    if alteracoes:
+        armazem.definir_categorias(alteracoes)   # Os outros workers percebem pela versão no banco
+        avisar_sessoes("categorias")
 
 # CALLBACK para alternar modo de mostrar/esconder dispositivos no mapa
 @app.callback(
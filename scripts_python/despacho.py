@@ -0,0 +1,182 @@
+import numpy as np
+
+# Raio médio da Terra em metros (usado na fórmula de haversine)
+raio_terra_m = 6371008.8
+
+# Velocidade média estimada de deslocamento a pé de um agente (m/s)
+velocidade_agente_mps = 1.2
+
+
+# 📐 Distância de haversine vetorizada (aceita escalares ou arrays NumPy com broadcast)
+def haversine_metros(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * raio_terra_m * np.arcsin(np.sqrt(a))
+
+
+# 🚨 Motor de despacho: encontra os agentes mais próximos de cada incidente
+class MotorDespacho:
+    """
+    Pré-calcula a matriz de distâncias AP x estação. Para agentes cuja
+    posição é a do AP em que estão conectados, a distância é calculada por
+    AP (e não por agente): para incidentes em estações é só uma coluna da
+    matriz; para pontos avulsos (ex.: trem em movimento) usa haversine
+    vetorizado sobre todos os APs de uma vez.
+
+    Agentes com posição própria (estimada por RSSI, tópico esp32/scan) não
+    usam a matriz: a distância vem de um único haversine vetorizado entre
+    as posições desses agentes e as dos incidentes.
+
+    top_k() resolve todos os incidentes abertos em uma única chamada: para
+    cada incidente ordena apenas os APs que têm agentes da categoria pedida
+    e percorre esses APs até juntar k agentes; os k agentes posicionados
+    mais próximos entram na mesma ordenação. Sem agentes posicionados o
+    custo depende do número de APs e de incidentes, não do de agentes.
+    """
+
+    def __init__(self, aps, estacoes):
+        # aps: {chave do AP: (lat, lon)}; estacoes: {nome da estação: (lat, lon)}
+        self.indice_estacao = {nome: j for j, nome in enumerate(estacoes)}
+        self.coords_estacoes = np.array([estacoes[nome] for nome in estacoes], dtype=float).reshape(-1, 2)
+
+        # Matriz AP x estação de todos os APs do catálogo em um único haversine vetorizado
+        self.indice_ap = {chave: i for i, chave in enumerate(aps)}
+        self.coords_aps = np.array([aps[chave] for chave in aps], dtype=float).reshape(-1, 2)
+        self.distancias = haversine_metros(
+            self.coords_aps[:, 0:1], self.coords_aps[:, 1:2], self.coords_estacoes[None, :, 0], self.coords_estacoes[None, :, 1]
+        )
+
+    # Adiciona um AP que não estava no catálogo (calcula sua linha da matriz de distâncias)
+    def registrar_ap(self, chave, coord):
+        indice = self.indice_ap.get(chave)
+        if indice is not None:
+            return indice
+        linha = haversine_metros(coord[0], coord[1], self.coords_estacoes[:, 0], self.coords_estacoes[:, 1])
+        self.indice_ap[chave] = len(self.indice_ap)
+        self.coords_aps = np.vstack([self.coords_aps, [coord]])
+        self.distancias = np.vstack([self.distancias, linha])
+        return self.indice_ap[chave]
+
+    # 🔹 Agrupa os agentes por categoria e AP (pode ser reaproveitado em várias chamadas de top_k)
+    def preparar_agentes(self, agentes):
+        """
+        agentes: lista de dicts {"client_id", "categoria", "ap", "coord"[, "posicao"]}, onde "ap" é a
+                 chave do AP (registrado automaticamente com "coord" se ainda não existir) e "posicao"
+                 é a posição (lat, lon) do próprio agente estimada por RSSI, quando houver
+        """
+        grupos = {}
+        posicionados = {}
+        for a in agentes:
+            posicao = a.get("posicao")
+            if posicao is not None:
+                posicionados.setdefault(a["categoria"], []).append((a["client_id"], posicao))
+                continue
+            indice = self.registrar_ap(a["ap"], a["coord"])
+            grupos.setdefault(a["categoria"], {}).setdefault(indice, []).append(a["client_id"])
+        return AgentesPreparados(grupos, posicionados)
+
+    # Matriz APs x incidentes com a distância de cada AP até cada incidente
+    def distancias_incidentes(self, incidentes):
+        dist = np.empty((len(self.indice_ap), len(incidentes)))
+        avulsos = []
+        for j, inc in enumerate(incidentes):
+            coluna = self.indice_estacao.get(inc.get("local"))
+            if coluna is None:
+                avulsos.append(j)
+            else:
+                dist[:, j] = self.distancias[:, coluna]
+        if avulsos:
+            pontos = np.array([incidentes[j]["coord"] for j in avulsos], dtype=float)
+            dist[:, avulsos] = haversine_metros(
+                self.coords_aps[:, 0:1], self.coords_aps[:, 1:2], pontos[None, :, 0], pontos[None, :, 1]
+            )
+        return dist
+
+    # Coordenadas (lat, lon) dos incidentes: a da estação para os que estão em uma, senão "coord"
+    def coords_incidentes(self, incidentes):
+        coords = np.empty((len(incidentes), 2))
+        for j, inc in enumerate(incidentes):
+            coluna = self.indice_estacao.get(inc.get("local"))
+            coords[j] = self.coords_estacoes[coluna] if coluna is not None else inc["coord"]
+        return coords
+
+    # 🔹 Top-k agentes mais próximos da mesma categoria para cada incidente
+    def top_k(self, agentes, incidentes, k=1):
+        """
+        agentes: lista de dicts (ver preparar_agentes) ou o resultado de preparar_agentes
+        incidentes: lista de dicts {"id", "categoria", "local", "coord"}; se "local" for uma estação
+                    conhecida usa a matriz pré-calculada, senão usa "coord"
+
+        Retorna {id do incidente: [(client_id, distância em metros, tempo estimado em minutos), ...]}
+        ordenado da menor para a maior distância.
+        """
+        if not isinstance(agentes, AgentesPreparados):
+            agentes = self.preparar_agentes(agentes)
+
+        resultado = {inc["id"]: [] for inc in incidentes}
+        if not incidentes:
+            return resultado
+
+        dist = self.distancias_incidentes(incidentes)
+
+        # Agentes posicionados x incidentes: um haversine por categoria para todos os incidentes dela
+        dist_posicionados = {}
+        categorias = {inc["categoria"] for inc in incidentes}
+        if categorias.intersection(agentes.posicionados):
+            pontos = self.coords_incidentes(incidentes)
+            for categoria in categorias.intersection(agentes.posicionados):
+                coords = agentes.posicionados[categoria][1]
+                dist_posicionados[categoria] = haversine_metros(
+                    coords[:, 0:1], coords[:, 1:2], pontos[None, :, 0], pontos[None, :, 1]
+                )
+
+        for j, inc in enumerate(incidentes):
+            candidatos = []   # (distância, client_id), no máximo k de cada caminho
+            grupo = agentes.por_categoria.get(inc["categoria"])
+            if grupo is not None:
+                indices, agentes_por_ap = grupo
+                dist_aps = dist[indices, j]
+                for posicao in _menores(dist_aps, k):
+                    d = float(dist_aps[posicao])
+                    for client_id in agentes_por_ap[posicao][:k - len(candidatos)]:
+                        candidatos.append((d, client_id))
+                    if len(candidatos) == k:
+                        break
+            if inc["categoria"] in dist_posicionados:
+                client_ids = agentes.posicionados[inc["categoria"]][0]
+                dist_agentes = dist_posicionados[inc["categoria"]][:, j]
+                candidatos.extend((float(dist_agentes[i]), client_ids[i]) for i in _menores(dist_agentes, k))
+                candidatos.sort(key=lambda c: c[0])
+            resultado[inc["id"]] = [
+                (client_id, d, round(d / velocidade_agente_mps / 60, 1)) for d, client_id in candidatos[:k]
+            ]
+        return resultado
+
+
+# Índices dos k menores valores, do menor para o maior
+def _menores(valores, k):
+    # Com poucos valores ordenar tudo é barato; com muitos, seleciona antes só os k menores
+    if k < len(valores):
+        ordem = np.argpartition(valores, k - 1)[:k]
+        ordem = ordem[np.argsort(valores[ordem])]
+    else:
+        ordem = np.argsort(valores)
+    return ordem.tolist()
+
+
+# 🔹 Agentes agrupados por categoria: índices dos APs ocupados e client_ids em cada AP,
+# e client_ids e posições (array n x 2) dos agentes com posição própria
+class AgentesPreparados:
+    __slots__ = ("por_categoria", "posicionados")
+
+    def __init__(self, grupos, posicionados=None):
+        self.por_categoria = {}
+        for categoria, por_ap in grupos.items():
+            indices = np.fromiter(por_ap.keys(), dtype=np.intp, count=len(por_ap))
+            self.por_categoria[categoria] = (indices, list(por_ap.values()))
+        self.posicionados = {
+            categoria: ([client_id for client_id, _ in itens], np.array([p for _, p in itens], dtype=float).reshape(-1, 2))
+            for categoria, itens in (posicionados or {}).items()
+        }
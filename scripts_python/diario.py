@@ -0,0 +1,200 @@
+import json
+import logging
+import os
+import re
+import threading
+import zlib
+
+log = logging.getLogger(__name__)
+
+# Tamanho (bytes) a partir do qual o segmento atual é fechado e um novo é aberto
+tamanho_segmento = 8 * 1024 * 1024
+
+# Intervalo (s) entre os fsync em grupo: no máximo esse tempo de eventos aceitos pode se perder numa queda
+intervalo_fsync = 0.1
+
+# Nome dos segmentos: diario_<número de sequência do primeiro registro>.log
+_padrao_segmento = re.compile(r"diario_(\d{12})\.log$")
+
+
+def _nome_segmento(primeiro_seq):
+    return f"diario_{primeiro_seq:012d}.log"
+
+
+# 📓 Diário de eventos aceitos, só com acréscimos, em segmentos rotativos e fsync em grupo
+class DiarioIngestao:
+    """
+    Cada registro recebe um número de sequência crescente e vira uma linha
+    "<crc32> <json>" no segmento atual. registrar_lote() só guarda os
+    registros em memória (O(1) por registro, pode ser chamado com a trava do
+    estado); uma thread própria escreve, faz fsync em grupo a cada
+    'intervalo_fsync' e troca de segmento ao passar de 'tamanho_segmento'.
+
+    O snapshot gravado guarda o último número de sequência que ele já
+    contém. Na partida, reproduzir(desde) devolve só os registros depois
+    dele; e, depois de cada snapshot gravado, descartar_ate() apaga os
+    segmentos que ele já cobre. Assim o trecho a reproduzir fica limitado ao
+    que chegou desde o último snapshot (mais um segmento), e a recuperação
+    leva o mesmo tempo com qualquer tempo no ar.
+
+    Uma linha cortada no meio (queda durante a escrita) ou com CRC errado
+    encerra a leitura daquele segmento.
+    """
+
+    def __init__(self, pasta, tamanho=tamanho_segmento, intervalo=intervalo_fsync):
+        self.pasta = pasta
+        self.tamanho = tamanho
+        self.intervalo = intervalo
+        os.makedirs(pasta, exist_ok=True)
+
+        self.seq = self._ultimo_seq_gravado()   # Último número de sequência atribuído
+        self._pendentes = []                    # [(seq, registro)] ainda não escritos
+        self._condicao = threading.Condition()
+        self._encerrando = False
+        self._thread = None
+        self._arquivo = None
+        self._tamanho_atual = 0
+
+        self.gravados = 0     # Registros escritos com fsync
+        self.fsyncs = 0
+        self.segmentos_apagados = 0
+
+    # Segmentos existentes em ordem: [(primeiro_seq, caminho)]
+    def segmentos(self):
+        encontrados = []
+        for nome in os.listdir(self.pasta):
+            correspondencia = _padrao_segmento.match(nome)
+            if correspondencia:
+                encontrados.append((int(correspondencia.group(1)), os.path.join(self.pasta, nome)))
+        return sorted(encontrados)
+
+    # Último número de sequência nos segmentos; corta do último segmento uma linha final incompleta
+    def _ultimo_seq_gravado(self):
+        segmentos = self.segmentos()
+        if not segmentos:
+            return 0
+        primeiro, caminho = segmentos[-1]
+        ultimo, valido = primeiro - 1, 0
+        for seq, _, fim in self._ler_linhas(caminho):
+            ultimo, valido = seq, fim
+        if valido < os.path.getsize(caminho):
+            # Sem o corte, os registros novos ficariam depois do lixo e não seriam lidos
+            with open(caminho, "r+b") as f:
+                f.truncate(valido)
+                os.fsync(f.fileno())
+        return ultimo
+
+    # Linhas válidas de um segmento: (seq, registro, posição do fim da linha); para na primeira incompleta ou corrompida
+    @staticmethod
+    def _ler_linhas(caminho):
+        fim = 0
+        with open(caminho, "rb") as f:
+            for linha in f:
+                if not linha.endswith(b"\n"):
+                    return
+                crc, _, texto = linha.rstrip(b"\n").partition(b" ")
+                try:
+                    if int(crc, 16) != zlib.crc32(texto):
+                        return
+                    seq, registro = json.loads(texto)
+                except ValueError:
+                    return
+                fim += len(linha)
+                yield seq, registro, fim
+
+    # 🔁 Registros com sequência maior que 'desde', em ordem (usado na partida, antes de iniciar)
+    def reproduzir(self, desde=0):
+        segmentos = self.segmentos()
+        for i, (primeiro, caminho) in enumerate(segmentos):
+            # Segmento inteiro já coberto pelo snapshot: o próximo começa antes de 'desde'
+            if i + 1 < len(segmentos) and segmentos[i + 1][0] <= desde + 1:
+                continue
+            for seq, registro, _ in self._ler_linhas(caminho):
+                if seq > desde:
+                    yield seq, registro
+
+    # Continua a numeração depois de 'seq' (snapshot mais novo que o diário, ex.: pasta do diário apagada)
+    def continuar_depois_de(self, seq):
+        with self._condicao:
+            self.seq = max(self.seq, seq)
+
+    # 📥 Guarda registros aceitos; devolve o número de sequência do último
+    def registrar_lote(self, registros):
+        if not registros:
+            return self.seq
+        with self._condicao:
+            for registro in registros:
+                self.seq += 1
+                self._pendentes.append((self.seq, registro))
+            return self.seq
+
+    # 🧹 Apaga os segmentos cujos registros já estão todos em um snapshot gravado até 'seq'
+    def descartar_ate(self, seq):
+        segmentos = self.segmentos()
+        for (primeiro, caminho), (proximo, _) in zip(segmentos, segmentos[1:]):
+            if proximo - 1 > seq:
+                break
+            os.remove(caminho)
+            self.segmentos_apagados += 1
+
+    def iniciar(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._executar, name="diario", daemon=True)
+            self._thread.start()
+        return self
+
+    def _executar(self):
+        while True:
+            with self._condicao:
+                if not self._encerrando:
+                    self._condicao.wait(self.intervalo)
+                lote, self._pendentes = self._pendentes, []
+                encerrando = self._encerrando
+            try:
+                self._escrever(lote)
+            except OSError as e:
+                log.error("❌ Erro ao gravar o diário de ingestão: %s", e)
+            if encerrando:
+                return
+
+    # Escreve um grupo de registros e faz um único fsync (trocando de segmento se preciso)
+    def _escrever(self, lote):
+        if not lote:
+            return
+        inicio = 0
+        while inicio < len(lote):
+            if self._arquivo is None or self._tamanho_atual >= self.tamanho:
+                self._abrir_segmento(lote[inicio][0])
+            partes = []
+            while inicio < len(lote) and self._tamanho_atual < self.tamanho:
+                texto = json.dumps(lote[inicio], separators=(",", ":")).encode()
+                linha = b"%08x %s\n" % (zlib.crc32(texto), texto)
+                partes.append(linha)
+                self._tamanho_atual += len(linha)
+                inicio += 1
+            self._arquivo.write(b"".join(partes))
+            self._arquivo.flush()
+            os.fsync(self._arquivo.fileno())
+            self.fsyncs += 1
+        self.gravados += len(lote)
+
+    def _abrir_segmento(self, primeiro_seq):
+        if self._arquivo is not None:
+            self._arquivo.close()
+        self._arquivo = open(os.path.join(self.pasta, _nome_segmento(primeiro_seq)), "ab")
+        self._tamanho_atual = self._arquivo.tell()
+
+    # Escreve o que estiver pendente e fecha o segmento atual
+    def encerrar(self):
+        with self._condicao:
+            self._encerrando = True
+            self._condicao.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        else:
+            self._escrever(self._pendentes)
+            self._pendentes = []
+        if self._arquivo is not None:
+            self._arquivo.close()
+            self._arquivo = None
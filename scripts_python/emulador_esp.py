@@ -0,0 +1,135 @@
+import argparse
+import csv
+import os
+import random
+import select
+import threading
+import time
+import tty
+
+# Tempo (s) que o ESP emulado leva para "reiniciar" e mostrar as configurações carregadas
+atraso_boot_padrao = 0.5
+
+
+# 🔌 ESP32 emulado em um pseudo-terminal, com o mesmo diálogo serial do firmware
+class EmuladorESP:
+    """
+    Reproduz o que codigo_esp/esp_programacao.ino escreve e lê na serial:
+    no boot mostra o SSID e a senha carregados; o comando "config" pede ID,
+    SSID e senha, salva e reinicia. 'porta' é o caminho do lado escravo do
+    pseudo-terminal (ex.: /dev/pts/5), aberto pelo configurador como uma
+    porta serial comum.
+
+    'probabilidade_falha' faz o ESP ignorar o comando "config" nessa
+    proporção das vezes, para testar as novas tentativas do configurador.
+    """
+
+    def __init__(self, client_id="0", ssid="METRO", senha="12345678", atraso_boot=atraso_boot_padrao,
+                 probabilidade_falha=0.0, semente=None):
+        self._mestre, self._escravo = os.openpty()
+        tty.setraw(self._escravo)  # Sem eco nem tradução de linhas, como uma UART
+        self.porta = os.ttyname(self._escravo)
+        self.configuracao = {"client_id": client_id, "ssid": ssid, "password": senha}
+        self.atraso_boot = atraso_boot
+        self.probabilidade_falha = probabilidade_falha
+        self._aleatorio = random.Random(semente)
+        self._buffer = b""
+        self._parar = threading.Event()
+        self._thread = None
+
+        self.reinicios = 0
+        self.comandos_ignorados = 0
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._executar, name=f"esp {self.porta}", daemon=True)
+        self._thread.start()
+        return self
+
+    def encerrar(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
+        os.close(self._mestre)
+        os.close(self._escravo)
+
+    def _escrever(self, texto):
+        os.write(self._mestre, (texto + "\r\n").encode())  # Serial.println termina com \r\n
+
+    # Próxima linha recebida (sem o \n) ou None se nada chegou em 'timeout' segundos
+    def _ler_linha(self, timeout=0.2):
+        while b"\n" not in self._buffer:
+            prontos, _, _ = select.select([self._mestre], [], [], timeout)
+            if not prontos:
+                return None
+            self._buffer += os.read(self._mestre, 1024)
+        linha, self._buffer = self._buffer.split(b"\n", 1)
+        return linha.decode(errors="ignore").strip()
+
+    def _boot(self):
+        time.sleep(self.atraso_boot)
+        self._escrever(f'SSID carregado: "{self.configuracao["ssid"]}"')
+        self._escrever(f'Senha carregada: "{self.configuracao["password"]}"')
+
+    def _executar(self):
+        self._boot()
+        while not self._parar.is_set():
+            if self._ler_linha() != "config":
+                continue
+            if self._aleatorio.random() < self.probabilidade_falha:
+                self.comandos_ignorados += 1
+                continue
+            self._modo_configuracao()
+
+    # Igual a entrarModoConfiguracao(): cada valor é pedido até chegar uma linha não vazia
+    def _modo_configuracao(self):
+        valores = []
+        for pedido in ("Digite novo ID (apenas número):", "Digite novo SSID:", "Digite nova senha:"):
+            self._escrever(pedido)
+            valor = ""
+            while not valor:
+                if self._parar.is_set():
+                    return
+                valor = self._ler_linha() or ""
+            valores.append(valor)
+        self.configuracao = dict(zip(("client_id", "ssid", "password"), valores))
+        self._escrever("Configuração salva. Reiniciando...")
+        self.reinicios += 1
+        self._buffer = b""
+        self._boot()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emula ESP32 em pseudo-terminais para testar o configurador serial")
+    parser.add_argument("--quantidade", type=int, default=4, help="Número de ESPs emulados")
+    parser.add_argument("--falhas", type=float, default=0.0, help="Proporção de comandos 'config' ignorados (0 a 1)")
+    parser.add_argument("--csv", help="Grava um CSV de exemplo (porta, id, ssid, senha) para configuracao_esp.py --lote")
+    parser.add_argument("--ssid", default="METRO-FEI", help="SSID usado no CSV de exemplo")
+    args = parser.parse_args()
+
+    emuladores = [EmuladorESP(probabilidade_falha=args.falhas).iniciar() for _ in range(args.quantidade)]
+    for emulador in emuladores:
+        print(f"🔌 ESP emulado em {emulador.porta}")
+
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as f:
+            escritor = csv.writer(f)
+            escritor.writerow(["porta", "id", "ssid", "senha"])
+            for i, emulador in enumerate(emuladores, start=1):
+                escritor.writerow([emulador.porta, i, args.ssid, f"senha{i:03d}"])
+        print(f"📄 Atribuições gravadas em {args.csv}: python configuracao_esp.py --lote {args.csv}")
+
+    print("Ctrl+C para encerrar.")
+    try:
+        while True:
+            time.sleep(5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for emulador in emuladores:
+            print(f"{emulador.porta}: {emulador.configuracao} (reinícios: {emulador.reinicios}, "
+                  f"comandos ignorados: {emulador.comandos_ignorados})")
+            emulador.encerrar()
+
+
+if __name__ == "__main__":
+    main()
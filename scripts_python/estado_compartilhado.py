@@ -0,0 +1,173 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Mapping
+
+from banco_dados import PoolConexoes
+
+# Tabelas do estado do dash compartilhado entre os processos (workers) do gunicorn
+esquema_estado = """
+CREATE TABLE IF NOT EXISTS incidentes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    local TEXT NOT NULL,
+    categoria TEXT NOT NULL,
+    hora TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS categorias_dispositivos (
+    client_id TEXT PRIMARY KEY,
+    categoria TEXT NOT NULL
+);
+
+-- Contador incrementado a cada alteração de categorias: os outros processos
+-- comparam com o último valor lido para saber se precisam recarregar
+CREATE TABLE IF NOT EXISTS versoes (
+    nome TEXT PRIMARY KEY,
+    versao INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO versoes (nome, versao) VALUES ('categorias', 0);
+"""
+
+# Intervalo mínimo (s) entre duas consultas da versão das categorias no mesmo processo
+intervalo_verificacao_categorias = 0.5
+
+
+# 🏷️ Categorias dos dispositivos lidas do banco compartilhado (somente leitura, como um dict)
+class CategoriasCompartilhadas(Mapping):
+    """
+    Mantém em memória uma cópia das categorias e só relê a tabela quando a
+    versão gravada no banco muda (alteração feita por qualquer processo).
+    A versão é consultada no máximo a cada 'intervalo_verificacao_categorias'
+    segundos, então get() continua sendo um acesso a dict.
+    """
+
+    def __init__(self, armazem):
+        self._armazem = armazem
+        self._trava = threading.Lock()
+        self._dados = {}
+        self._versao = None
+        self._verificado_em = 0.0
+
+    # Versão atual das categorias (recarrega a cópia local se outro processo alterou)
+    def versao(self):
+        agora = time.monotonic()
+        if agora - self._verificado_em < intervalo_verificacao_categorias:
+            return self._versao
+        with self._trava:
+            with self._armazem.pool.conexao() as con:
+                versao = con.execute("SELECT versao FROM versoes WHERE nome = 'categorias'").fetchone()[0]
+                if versao != self._versao:
+                    self._dados = dict(con.execute("SELECT client_id, categoria FROM categorias_dispositivos"))
+                    self._versao = versao
+            self._verificado_em = agora
+        return self._versao
+
+    # Força a próxima leitura a consultar o banco (ex.: logo depois de uma alteração neste processo)
+    def invalidar(self):
+        self._verificado_em = 0.0
+
+    def _atual(self):
+        self.versao()
+        return self._dados
+
+    def __getitem__(self, client_id):
+        return self._atual()[client_id]
+
+    def __iter__(self):
+        return iter(self._atual())
+
+    def __len__(self):
+        return len(self._atual())
+
+
+# 🗄️ Incidentes e categorias do dash em um SQLite (WAL) compartilhado entre processos
+class ArmazemDash:
+    """
+    Substitui a lista incident_log e o dicionário esp_categorias do módulo
+    do dash: com vários workers do gunicorn, cada processo tinha a sua cópia
+    e as gravações de esp_categorias.json se sobrescreviam.
+
+    Incidentes não mudam depois de criados, então cada processo guarda em
+    memória os que já buscou (a busca por id usa a chave primária). As
+    categorias ficam em CategoriasCompartilhadas, recarregadas só quando a
+    versão no banco muda.
+    """
+
+    def __init__(self, caminho, tamanho_pool=4):
+        self.caminho = caminho
+
+        def criar_conexao():
+            con = sqlite3.connect(caminho, check_same_thread=False, timeout=30)
+            con.execute("PRAGMA journal_mode=WAL")     # Leituras de um worker não bloqueiam a escrita de outro
+            con.execute("PRAGMA synchronous=NORMAL")
+            return con
+
+        con = criar_conexao()
+        con.executescript(esquema_estado)
+        con.close()
+        self.pool = PoolConexoes(criar_conexao, tamanho_pool)
+
+        self._incidentes = {}   # id -> incidente (cache local, incidentes são imutáveis)
+        self.categorias = CategoriasCompartilhadas(self)
+
+    # 🚨 Registra um incidente e devolve o registro criado (com o id gerado pelo banco)
+    def registrar_incidente(self, local, categoria, hora):
+        with self.pool.conexao() as con:
+            cur = con.execute(
+                "INSERT INTO incidentes (local, categoria, hora) VALUES (?, ?, ?)", (local, categoria, hora)
+            )
+            incidente = {"id": cur.lastrowid, "local": local, "categoria": categoria, "hora": hora}
+        self._incidentes[incidente["id"]] = incidente
+        return incidente
+
+    # Busca um incidente pelo id (None se não existir)
+    def incidente(self, incidente_id):
+        if incidente_id is None:
+            return None
+        incidente = self._incidentes.get(incidente_id)
+        if incidente is None:
+            with self.pool.conexao() as con:
+                linha = con.execute(
+                    "SELECT id, local, categoria, hora FROM incidentes WHERE id = ?", (incidente_id,)
+                ).fetchone()
+            if linha is None:
+                return None
+            incidente = dict(zip(("id", "local", "categoria", "hora"), linha))
+            self._incidentes[incidente["id"]] = incidente
+        return incidente
+
+    # Todos os incidentes, do mais antigo para o mais recente
+    def listar_incidentes(self):
+        with self.pool.conexao() as con:
+            linhas = con.execute("SELECT id, local, categoria, hora FROM incidentes ORDER BY id").fetchall()
+        return [dict(zip(("id", "local", "categoria", "hora"), linha)) for linha in linhas]
+
+    # 🏷️ Grava várias categorias em uma transação ({client_id: categoria}); devolve quantas foram gravadas
+    def definir_categorias(self, alteracoes):
+        if not alteracoes:
+            return 0
+        with self.pool.conexao() as con:
+            con.executemany(
+                "INSERT INTO categorias_dispositivos (client_id, categoria) VALUES (?, ?) "
+                "ON CONFLICT(client_id) DO UPDATE SET categoria = excluded.categoria",
+                list(alteracoes.items()),
+            )
+            con.execute("UPDATE versoes SET versao = versao + 1 WHERE nome = 'categorias'")
+        self.categorias.invalidar()
+        return len(alteracoes)
+
+    # Importa um esp_categorias.json antigo (só se o banco ainda não tiver nenhuma categoria)
+    def importar_categorias_json(self, caminho):
+        if len(self.categorias) or not os.path.exists(caminho):
+            return 0
+        try:
+            with open(caminho, "r") as f:
+                dados = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        return self.definir_categorias({client_id: categoria for client_id, categoria in dados.items() if categoria})
+
+    def fechar(self):
+        self.pool.fechar()
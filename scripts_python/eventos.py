@@ -0,0 +1,137 @@
+import json
+import os
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+# Tópico MQTT em que o servidor avisa que o estado dos dispositivos mudou
+topico_eventos = "metro/eventos"
+
+# Conexões SSE simultâneas por processo (variável METRO_SSE_CONEXOES). Com o worker gthread cada
+# conexão aberta prende uma thread, parada na espera do próximo evento (sem uso de CPU, só a pilha):
+# o gunicorn precisa de --threads acima deste número, com folga para os callbacks (ver README).
+variavel_conexoes_sse = "METRO_SSE_CONEXOES"
+conexoes_sse_maximas = int(os.environ.get(variavel_conexoes_sse, "64"))
+
+# Duração máxima (s) de uma conexão SSE quando há abas esperando vaga (variável METRO_SSE_DURACAO):
+# só então ela é encerrada, o navegador reconecta e as vagas se revezam
+variavel_duracao_sse = "METRO_SSE_DURACAO"
+duracao_maxima_sse = float(os.environ.get(variavel_duracao_sse, "300"))
+
+# Espera (s) pedida ao navegador antes de tentar de novo quando não há vaga
+espera_sse_lotado = 30
+
+
+# 📣 Publica um evento de mudança de estado (chamado pelo servidor MQTT)
+def publicar_evento(client, dados):
+    client.publish(topico_eventos, json.dumps(dados), qos=0)
+
+
+# 🔹 Canal de eventos dentro do processo do dash (um produtor, várias conexões SSE)
+class CanalEventos:
+    """
+    Guarda apenas o último evento e um contador de versão. Cada conexão SSE
+    espera a versão mudar; se vários eventos chegarem em rajada, quem estava
+    esperando recebe só o mais recente (os eventos são agrupados).
+
+    Também conta as conexões abertas: ocupar_conexao() recusa acima de
+    'conexoes_maximas'.
+    """
+
+    def __init__(self, conexoes_maximas=conexoes_sse_maximas):
+        self.versao = 0
+        self.ultimo = None
+        self.conexoes_maximas = conexoes_maximas
+        self.conexoes = 0
+        self.recusadas = 0
+        self._condicao = threading.Condition()
+
+    # Reserva uma vaga para uma conexão SSE; devolve False se o limite já foi atingido
+    def ocupar_conexao(self):
+        with self._condicao:
+            if self.conexoes >= self.conexoes_maximas:
+                self.recusadas += 1
+                return False
+            self.conexoes += 1
+            return True
+
+    def liberar_conexao(self):
+        with self._condicao:
+            self.conexoes -= 1
+
+    def publicar(self, dados):
+        with self._condicao:
+            self.versao += 1
+            self.ultimo = dados
+            self._condicao.notify_all()
+
+    # Espera uma versão diferente de 'versao_vista' (devolve None se estourar o tempo)
+    def aguardar(self, versao_vista, timeout):
+        with self._condicao:
+            self._condicao.wait_for(lambda: self.versao != versao_vista, timeout)
+            if self.versao == versao_vista:
+                return None
+            return self.versao, self.ultimo
+
+
+# 🔌 Assina o tópico de eventos no broker e repassa cada mensagem para o canal
+def iniciar_assinante(canal, host="localhost", porta=1883):
+    def on_connect(client, userdata, flags, reason_code, properties=None):
+        client.subscribe(topico_eventos)   # (Re)inscreve também depois de uma reconexão
+
+    def on_message(client, userdata, message):
+        try:
+            canal.publicar(json.loads(message.payload.decode()))
+        except ValueError:
+            pass
+
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    client.on_connect = on_connect
+    client.on_message = on_message
+    client.connect_async(host, porta)   # Não falha se o broker ainda não estiver no ar
+    client.loop_start()                 # Thread própria do paho, com reconexão automática
+    return client
+
+
+# 📡 Gera o fluxo Server-Sent Events enviado ao navegador
+def fluxo_sse(canal, intervalo_minimo=0.25, keepalive=15, duracao_maxima=duracao_maxima_sse,
+              espera_lotado=espera_sse_lotado):
+    """
+    Envia um evento SSE a cada mudança de versão do canal, no máximo um a cada
+    'intervalo_minimo' segundos (rajadas viram um único evento). Sem eventos,
+    manda um comentário a cada 'keepalive' segundos para manter a conexão.
+
+    Com um servidor de threads (ex.: gunicorn gthread) cada conexão aberta
+    prende uma thread. Por isso o fluxo só começa se houver vaga no canal e
+    avisa o navegador com o evento "conectado"; sem vaga, manda o evento
+    "lotado" (a página liga o intervalo periódico) e pede que tente de novo
+    em 'espera_lotado' segundos. Se alguma aba ficou sem vaga, a conexão
+    termina depois de 'duracao_maxima' segundos: o navegador reconecta
+    sozinho e as vagas se revezam. Sem ninguém esperando, ela segue aberta.
+    """
+    if not canal.ocupar_conexao():
+        yield f"retry: {int(espera_lotado * 1000)}\nevent: lotado\ndata: {{}}\n\n"
+        return
+    try:
+        versao = canal.versao
+        recusadas = canal.recusadas
+        yield "retry: 2000\nevent: conectado\ndata: {}\n\n"
+        fim = time.monotonic() + duracao_maxima
+        while True:
+            restante = fim - time.monotonic()
+            if restante <= 0:
+                if canal.recusadas == recusadas:
+                    fim += duracao_maxima   # Nenhuma aba esperando: não há por que reconectar
+                    continue
+                return
+            novo = canal.aguardar(versao, min(keepalive, restante))
+            if novo is None:
+                yield ": keepalive\n\n"
+                continue
+            time.sleep(intervalo_minimo)   # Junta os eventos que chegarem logo em seguida
+            versao, dados = canal.versao, canal.ultimo
+            yield f"id: {versao}\ndata: {json.dumps(dados)}\n\n"
+    finally:
+        # Também ao desconectar o navegador: o servidor fecha o gerador no próximo envio que falhar
+        canal.liberar_conexao()
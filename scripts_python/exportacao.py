@@ -0,0 +1,307 @@
+import argparse
+import datetime
+import itertools
+import json
+import os
+
+from banco_dados import criar_pool_sqlite
+from persistencia import gravar_json_atomico
+
+# pyarrow é opcional: só é necessário para exportar
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Linhas lidas do banco por vez (limita a memória usada na exportação)
+tamanho_lote_exportacao = 10000
+
+# Arquivo (dentro da pasta de destino) com o último dia exportado e o último id lido de cada conjunto
+arquivo_estado_exportacao = "_estado_exportacao.json"
+
+# Formato de data/hora das tabelas
+formato_data_hora = "%Y-%m-%d %H:%M:%S"
+
+# Conjuntos exportados: consulta (com "?" para o início e o fim do período, ordenada pela
+# coluna de data), colunas na ordem do SELECT e dias completos que esperam antes de exportar.
+# As permanências esperam a consolidação do histórico (linhas brutas viram intervalos depois de 1 dia).
+# Conjuntos com "id" (tabelas só com inserções e id crescente) também filtram uma faixa de ids
+# ("?" a mais para id > e id <=): linhas inseridas depois que o seu dia foi exportado, como a última
+# leitura de cada permanência que o CompactadorHistorico segura em memória, vão para uma parte
+# extra da partição daquele dia na execução seguinte.
+conjuntos = {
+    "localizacao": {
+        "sql": (
+            "SELECT g.data_hora, g.id_dispositivo, b.bssid, b.nome_estacao, t.tipo_funcionario "
+            "FROM informacoes_geolocalizacao g "
+            "JOIN bssid_estacoes b ON b.id_esp_bssid = g.id_esp_bssid "
+            "JOIN tipo_de_funcionario t ON t.id_tipo = g.id_tipo "
+            "WHERE g.data_hora >= ? AND g.data_hora < ? AND g.id > ? AND g.id <= ? ORDER BY g.data_hora"
+        ),
+        "minimo": "SELECT MIN(data_hora) FROM informacoes_geolocalizacao",
+        "id": "SELECT MAX(id) FROM informacoes_geolocalizacao",
+        "colunas": [("data_hora", "data"), ("id_dispositivo", "int"), ("bssid", "texto"),
+                    ("estacao", "texto"), ("categoria", "texto")],
+        "atraso_dias": 0,
+    },
+    "permanencias": {
+        "sql": (
+            "SELECT i.entrada, i.saida, i.id_dispositivo, b.bssid, b.nome_estacao, t.tipo_funcionario "
+            "FROM intervalos_permanencia i "
+            "JOIN bssid_estacoes b ON b.id_esp_bssid = i.id_esp_bssid "
+            "JOIN tipo_de_funcionario t ON t.id_tipo = i.id_tipo "
+            "WHERE i.entrada >= ? AND i.entrada < ? ORDER BY i.entrada"
+        ),
+        "minimo": "SELECT MIN(entrada) FROM intervalos_permanencia",
+        "colunas": [("entrada", "data"), ("saida", "data"), ("id_dispositivo", "int"), ("bssid", "texto"),
+                    ("estacao", "texto"), ("categoria", "texto")],
+        "atraso_dias": 2,
+    },
+    "bateria": {
+        "sql": (
+            "SELECT data_hora, id_dispositivo, nivel_bateria FROM informacoes_bateria "
+            "WHERE data_hora >= ? AND data_hora < ? AND id > ? AND id <= ? ORDER BY data_hora"
+        ),
+        "minimo": "SELECT MIN(data_hora) FROM informacoes_bateria",
+        "id": "SELECT MAX(id) FROM informacoes_bateria",
+        "colunas": [("data_hora", "data"), ("id_dispositivo", "int"), ("nivel_bateria", "int")],
+        "atraso_dias": 0,
+    },
+    "ocupacao": {
+        "sql": (
+            "SELECT o.inicio, o.resolucao, b.bssid, b.nome_estacao, o.categoria, o.agente_segundos, o.maximo "
+            "FROM ocupacao_estacoes o JOIN bssid_estacoes b ON b.id_esp_bssid = o.id_esp_bssid "
+            "WHERE o.inicio >= ? AND o.inicio < ? ORDER BY o.inicio"
+        ),
+        "minimo": "SELECT MIN(inicio) FROM ocupacao_estacoes",
+        "colunas": [("inicio", "data"), ("resolucao", "texto"), ("bssid", "texto"), ("estacao", "texto"),
+                    ("categoria", "texto"), ("agente_segundos", "real"), ("maximo", "int")],
+        "atraso_dias": 0,
+    },
+}
+
+# Maior id aceito quando a faixa de ids não é limitada
+_id_maximo = 2 ** 63 - 1
+
+# Extensão dos arquivos de cada formato
+extensoes = {"parquet": ".parquet", "arrow": ".arrow"}
+
+
+def _tipo_arrow(tipo):
+    return {"data": pa.timestamp("s"), "int": pa.int64(), "real": pa.float64(), "texto": pa.string()}[tipo]
+
+
+# Converte uma coluna lida do banco (SQLite devolve datas como texto; outros drivers, como datetime)
+def _coluna_arrow(valores, tipo):
+    if tipo == "data" and valores and isinstance(valores[0], str):
+        return pc.strptime(pa.array(valores, pa.string()), format=formato_data_hora, unit="s")
+    return pa.array(valores, _tipo_arrow(tipo))
+
+
+def _dia(valor):
+    return valor[:10] if isinstance(valor, str) else valor.date().isoformat()
+
+
+# ✍️ Arquivo de uma partição: escrito em um temporário e renomeado só quando completo
+class _EscritorParticao:
+    def __init__(self, caminho, esquema, formato):
+        self.caminho = caminho
+        self.caminho_tmp = caminho + ".tmp"
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        if formato == "parquet":
+            self._escritor = pq.ParquetWriter(self.caminho_tmp, esquema, compression="zstd")
+        else:
+            self._arquivo = pa.OSFile(self.caminho_tmp, "wb")
+            self._escritor = pa.ipc.new_file(self._arquivo, esquema)
+        self.formato = formato
+        self.linhas = 0
+
+    def escrever(self, tabela):
+        self._escritor.write_table(tabela)
+        self.linhas += tabela.num_rows
+
+    def concluir(self):
+        self._escritor.close()
+        if self.formato == "arrow":
+            self._arquivo.close()
+        os.replace(self.caminho_tmp, self.caminho)
+
+    def descartar(self):
+        try:
+            self._escritor.close()
+            if self.formato == "arrow":
+                self._arquivo.close()
+        finally:
+            if os.path.exists(self.caminho_tmp):
+                os.remove(self.caminho_tmp)
+
+
+# 📦 Exporta um conjunto em partições diárias, lendo o banco em lotes
+def exportar_conjunto(pool, nome, destino, desde, ate, formato="parquet", ao_concluir_dia=None,
+                      ids=(0, None), parte=0):
+    """
+    Exporta as linhas com data em [desde, ate) (datetimes) para
+    <destino>/<nome>/data=AAAA-MM-DD/parte-<parte>.<formato>, uma partição
+    por dia. Nos conjuntos com "id" só entram as linhas com id na faixa
+    (ids[0], ids[1]] (None: sem limite superior).
+    A memória usada é a de um lote (tamanho_lote_exportacao linhas), não a
+    do período. Cada partição é escrita em um temporário e só substitui a
+    anterior quando está completa; 'ao_concluir_dia(dia)' é chamada depois
+    de cada partição concluída. Devolve {dia: linhas}.
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow não está instalado; instale com: pip install pyarrow")
+    definicao = conjuntos[nome]
+    tipos = [tipo for _, tipo in definicao["colunas"]]
+    esquema = pa.schema([(coluna, _tipo_arrow(tipo)) for coluna, tipo in definicao["colunas"]])
+    extensao = extensoes[formato]
+
+    exportados = {}
+    escritor, dia_atual = None, None
+
+    def fechar_dia():
+        escritor.concluir()
+        exportados[dia_atual] = escritor.linhas
+        if ao_concluir_dia is not None:
+            ao_concluir_dia(dia_atual)
+
+    def escrever(linhas):
+        colunas = list(zip(*linhas))
+        escritor.escrever(pa.Table.from_arrays(
+            [_coluna_arrow(list(valores), tipo) for valores, tipo in zip(colunas, tipos)], schema=esquema
+        ))
+
+    try:
+        with pool.conexao() as con:
+            cur = con.cursor()
+            parametros = (desde.strftime(formato_data_hora), ate.strftime(formato_data_hora))
+            if "id" in definicao:
+                parametros += (ids[0], _id_maximo if ids[1] is None else ids[1])
+            cur.execute(definicao["sql"], parametros)
+            while True:
+                lote = cur.fetchmany(tamanho_lote_exportacao)
+                if not lote:
+                    break
+                # Separa o lote nos dias que ele contém (as linhas vêm ordenadas pela data)
+                for dia, linhas in itertools.groupby(lote, key=lambda linha: _dia(linha[0])):
+                    if dia != dia_atual:
+                        if escritor is not None:
+                            fechar_dia()
+                        dia_atual = dia
+                        caminho = os.path.join(destino, nome, f"data={dia}", f"parte-{parte}{extensao}")
+                        escritor = _EscritorParticao(caminho, esquema, formato)
+                    escrever(list(linhas))
+        if escritor is not None:
+            fechar_dia()
+            escritor = None
+    finally:
+        # Erro no meio de um dia: a partição incompleta não substitui a anterior
+        if escritor is not None:
+            escritor.descartar()
+    return exportados
+
+
+def _ler_estado(destino):
+    caminho = os.path.join(destino, arquivo_estado_exportacao)
+    if not os.path.exists(caminho):
+        return {}
+    with open(caminho, "r") as f:
+        return json.load(f)
+
+
+# 🔄 Exporta só os dias completos ainda não exportados de cada conjunto
+def exportar_incremental(pool, destino, nomes=None, formato="parquet", hoje=None, incluir_hoje=False):
+    """
+    O último dia exportado de cada conjunto fica em _estado_exportacao.json
+    na pasta de destino: cada execução começa no dia seguinte e vai até o
+    último dia completo (respeitando o atraso do conjunto). Com
+    'incluir_hoje' a partição do dia corrente também é escrita, mas não
+    entra no estado (é reescrita na próxima execução).
+
+    Nos conjuntos com "id" o estado guarda também o maior id lido (em
+    "ultimo_id"), e os dias só recebem linhas até ele. Na execução seguinte,
+    as linhas com id maior e data em um dia já exportado (inseridas
+    atrasadas) vão para parte-<primeiro id da faixa> da partição do dia,
+    sem reler o dia inteiro (que a compactação do histórico pode já ter
+    apagado do banco).
+    """
+    hoje = hoje or datetime.date.today()
+    os.makedirs(destino, exist_ok=True)
+    estado = _ler_estado(destino)
+    ultimos_ids = estado.setdefault("ultimo_id", {})
+    caminho_estado = os.path.join(destino, arquivo_estado_exportacao)
+    resultado = {}
+    for nome in nomes or conjuntos:
+        definicao = conjuntos[nome]
+        ultimo = estado.get(nome)
+        resultado[nome] = {}
+
+        # Linhas inseridas depois da execução anterior com data em dias já exportados
+        ids = (0, None)
+        if "id" in definicao:
+            with pool.conexao() as con:
+                maior_id = con.cursor().execute(definicao["id"]).fetchone()[0] or 0
+            ids = (ultimos_ids.get(nome, 0), maior_id)
+            if ultimo is not None and ids[1] > ids[0]:
+                resultado[nome].update(exportar_conjunto(
+                    pool, nome, destino, datetime.datetime(1900, 1, 1),
+                    datetime.datetime.combine(datetime.date.fromisoformat(ultimo) + datetime.timedelta(days=1), datetime.time()),
+                    formato, ids=ids, parte=ids[0] + 1,
+                ))
+            ultimos_ids[nome] = maior_id
+            gravar_json_atomico(caminho_estado, estado)
+            ids = (0, maior_id)
+
+        if ultimo is not None:
+            desde = datetime.date.fromisoformat(ultimo) + datetime.timedelta(days=1)
+        else:
+            with pool.conexao() as con:
+                minimo = con.cursor().execute(definicao["minimo"]).fetchone()[0]
+            if minimo is None:
+                continue
+            desde = datetime.date.fromisoformat(_dia(minimo))
+        ate = hoje - datetime.timedelta(days=definicao["atraso_dias"])
+
+        def registrar(dia, nome=nome):
+            estado[nome] = dia
+            gravar_json_atomico(caminho_estado, estado)
+
+        if desde < ate:
+            resultado[nome].update(exportar_conjunto(
+                pool, nome, destino,
+                datetime.datetime.combine(desde, datetime.time()), datetime.datetime.combine(ate, datetime.time()),
+                formato, ao_concluir_dia=registrar, ids=ids,
+            ))
+            # Dias sem nenhuma linha também contam como exportados
+            registrar((ate - datetime.timedelta(days=1)).isoformat())
+        if incluir_hoje and definicao["atraso_dias"] == 0:
+            inicio_hoje = datetime.datetime.combine(hoje, datetime.time())
+            resultado[nome].update(exportar_conjunto(
+                pool, nome, destino, inicio_hoje, inicio_hoje + datetime.timedelta(days=1), formato, ids=ids
+            ))
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta o histórico em Parquet/Arrow particionado por dia")
+    parser.add_argument("--banco", default="historico_geolocalizacao.db", help="Arquivo SQLite do histórico")
+    parser.add_argument("--destino", default="exportacao", help="Pasta das partições")
+    parser.add_argument("--formato", choices=sorted(extensoes), default="parquet")
+    parser.add_argument("--conjuntos", nargs="+", choices=list(conjuntos), help="Padrão: todos")
+    parser.add_argument("--incluir-hoje", action="store_true", help="Escreve também a partição (parcial) de hoje")
+    args = parser.parse_args()
+
+    pool = criar_pool_sqlite(args.banco)
+    try:
+        resultado = exportar_incremental(pool, args.destino, args.conjuntos, args.formato, incluir_hoje=args.incluir_hoje)
+    finally:
+        pool.fechar()
+    for nome, dias in resultado.items():
+        print(f"📦 {nome}: {len(dias)} partições, {sum(dias.values())} linhas")
+
+
+if __name__ == "__main__":
+    main()
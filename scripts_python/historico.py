@@ -0,0 +1,263 @@
+import argparse
+import datetime
+import logging
+import threading
+
+from banco_dados import criar_pool_sqlite, id_numerico_dispositivo
+
+log = logging.getLogger(__name__)
+
+# Intervalo máximo (s) entre duas linhas gravadas da mesma permanência.
+# Acima disso (sem leitura nesse tempo) considera-se que o dispositivo saiu e voltou.
+intervalo_heartbeat = 300
+
+# Formato de data/hora usado nas tabelas
+formato_data_hora = "%Y-%m-%d %H:%M:%S"
+
+
+def _para_datetime(valor):
+    # SQLite devolve texto; outros drivers podem já devolver datetime
+    if isinstance(valor, datetime.datetime):
+        return valor
+    return datetime.datetime.fromisoformat(valor)
+
+
+def _para_texto(valor):
+    return valor.strftime(formato_data_hora)
+
+
+# 🗜️ Filtro de gravação: só transições de AP, bordas das permanências e heartbeats
+class CompactadorHistorico:
+    """
+    Cada ESP repete o mesmo BSSID a cada 10 s. Das leituras de localização só
+    são gravadas:
+      - a primeira leitura de cada permanência (chegada ao AP ou volta depois
+        de ficar mais de 'heartbeat' segundos sem leitura);
+      - a última leitura de cada permanência (guardada em memória e gravada
+        quando a permanência termina);
+      - uma leitura intermediária sempre que a próxima deixaria mais de
+        'heartbeat' segundos sem linha gravada.
+
+    Assim duas linhas seguidas do mesmo dispositivo e do mesmo AP com até
+    'heartbeat' segundos entre elas pertencem à mesma permanência, e a
+    entrada e a saída de cada permanência são exatamente as das leituras
+    originais. filtrar() roda em uma única thread (a de estado do servidor).
+    """
+
+    def __init__(self, heartbeat=intervalo_heartbeat):
+        self.heartbeat = datetime.timedelta(seconds=heartbeat)
+        self._estado = {}   # client_id -> [bssid, data da última gravada, última leitura não gravada ou None]
+
+        self.recebidas = 0
+        self.gravadas = 0
+
+    # Devolve as leituras (data_hora, client_id, bssid, categoria) que devem ser gravadas
+    def filtrar(self, data_hora, client_id, bssid, categoria=None):
+        self.recebidas += 1
+        leitura = (data_hora, client_id, bssid, categoria)
+        instante = _para_datetime(data_hora)
+        estado = self._estado.get(client_id)
+
+        if estado is None:
+            self._estado[client_id] = [bssid, instante, None]
+            return self._gravar([leitura])
+
+        bssid_atual, ultima_gravada, pendente = estado
+        ultima_vista = _para_datetime(pendente[0]) if pendente else ultima_gravada
+        if bssid != bssid_atual or instante - ultima_vista > self.heartbeat:
+            # Fim da permanência: grava a última leitura dela e a primeira da nova
+            estado[:] = [bssid, instante, None]
+            return self._gravar([pendente, leitura] if pendente else [leitura])
+
+        if instante - ultima_gravada > self.heartbeat:
+            # Heartbeat: grava a leitura anterior para nunca passar do intervalo
+            estado[1] = ultima_vista
+            estado[2] = leitura
+            return self._gravar([pendente] if pendente else [])
+
+        estado[2] = leitura
+        return []
+
+    def _gravar(self, leituras):
+        self.gravadas += len(leituras)
+        return leituras
+
+    # Leituras ainda em memória (última de cada permanência aberta), usadas no encerramento
+    def pendentes(self):
+        leituras = []
+        for estado in self._estado.values():
+            if estado[2] is not None:
+                estado[1] = _para_datetime(estado[2][0])
+                leituras.append(estado[2])
+                estado[2] = None
+        return self._gravar(leituras)
+
+
+# 📦 Agrupa trechos (entrada, saida, chave, ...) ordenados pela entrada em permanências
+# (uma linha bruta é um trecho com entrada == saida)
+def _agrupar_permanencias(trechos, heartbeat):
+    permanencias = []
+    for entrada, saida, chave, *extra in trechos:
+        if permanencias:
+            ultima = permanencias[-1]
+            if ultima["chave"] == chave and entrada - ultima["saida"] <= heartbeat:
+                ultima["saida"] = max(ultima["saida"], saida)
+                continue
+        permanencias.append({"chave": chave, "entrada": entrada, "saida": saida, "extra": extra})
+    return permanencias
+
+
+# 🔹 Consolida as linhas brutas antigas em intervalos de permanência e apaga as linhas
+def compactar_historico(pool, antes_de, heartbeat=intervalo_heartbeat):
+    """
+    Move para intervalos_permanencia todas as linhas de informacoes_geolocalizacao
+    com data_hora < 'antes_de' (datetime). Se a primeira permanência de um
+    dispositivo continua o último intervalo já consolidado (mesmo AP e até
+    'heartbeat' segundos de diferença), o intervalo existente é estendido.
+    Tudo em uma transação. Devolve (linhas removidas, intervalos criados).
+    """
+    limite = _para_texto(antes_de)
+    folga = datetime.timedelta(seconds=heartbeat)
+    removidas = criados = 0
+    with pool.conexao() as con:
+        cur = con.cursor()
+        cur.execute(
+            "SELECT id_dispositivo, data_hora, id_esp_bssid, id_tipo FROM informacoes_geolocalizacao "
+            "WHERE data_hora < ? ORDER BY id_dispositivo, data_hora",
+            (limite,),
+        )
+        por_dispositivo = {}
+        for id_disp, data_hora, id_bssid, id_tipo in cur.fetchall():
+            instante = _para_datetime(data_hora)
+            por_dispositivo.setdefault(id_disp, []).append((instante, instante, id_bssid, id_tipo))
+            removidas += 1
+
+        novos = []
+        for id_disp, linhas in por_dispositivo.items():
+            permanencias = _agrupar_permanencias(linhas, folga)
+            cur.execute(
+                "SELECT id, id_esp_bssid, saida FROM intervalos_permanencia WHERE id_dispositivo = ? AND saida = "
+                "(SELECT MAX(saida) FROM intervalos_permanencia WHERE id_dispositivo = ?)",
+                (id_disp, id_disp),
+            )
+            ultimo = cur.fetchone()
+            primeira = permanencias[0]
+            if ultimo and ultimo[1] == primeira["chave"] and primeira["entrada"] - _para_datetime(ultimo[2]) <= folga:
+                cur.execute(
+                    "UPDATE intervalos_permanencia SET saida = ? WHERE id = ?",
+                    (_para_texto(primeira["saida"]), ultimo[0]),
+                )
+                permanencias = permanencias[1:]
+            novos.extend(
+                (id_disp, p["chave"], p["extra"][0], _para_texto(p["entrada"]), _para_texto(p["saida"]))
+                for p in permanencias
+            )
+
+        if novos:
+            cur.executemany(
+                "INSERT INTO intervalos_permanencia (id_dispositivo, id_esp_bssid, id_tipo, entrada, saida) "
+                "VALUES (?, ?, ?, ?, ?)",
+                novos,
+            )
+            criados = len(novos)
+        if removidas:
+            cur.execute("DELETE FROM informacoes_geolocalizacao WHERE data_hora < ?", (limite,))
+    return removidas, criados
+
+
+# 🧭 Reconstrói o trajeto de um agente (permanências por AP) em um intervalo de tempo
+def trajetoria(pool, client_id, inicio, fim, heartbeat=intervalo_heartbeat):
+    """
+    Junta os intervalos já consolidados com as linhas brutas recentes e
+    devolve, em ordem, [{"bssid", "nome", "entrada", "saida"}, ...] com as
+    datas recortadas para [inicio, fim] (datetimes).
+    """
+    id_disp = id_numerico_dispositivo(client_id)
+    folga = datetime.timedelta(seconds=heartbeat)
+    # Linhas brutas um pouco antes/depois da janela mostram se a permanência já vinha de antes
+    de, ate = _para_texto(inicio - folga), _para_texto(fim + folga)
+    with pool.conexao() as con:
+        cur = con.cursor()
+        cur.execute(
+            "SELECT i.entrada, i.saida, b.bssid, b.nome_estacao FROM intervalos_permanencia i "
+            "JOIN bssid_estacoes b ON b.id_esp_bssid = i.id_esp_bssid "
+            "WHERE i.id_dispositivo = ? AND i.saida >= ? AND i.entrada <= ? ORDER BY i.entrada",
+            (id_disp, de, ate),
+        )
+        consolidados = cur.fetchall()
+        cur.execute(
+            "SELECT g.data_hora, b.bssid, b.nome_estacao FROM informacoes_geolocalizacao g "
+            "JOIN bssid_estacoes b ON b.id_esp_bssid = g.id_esp_bssid "
+            "WHERE g.id_dispositivo = ? AND g.data_hora >= ? AND g.data_hora <= ? ORDER BY g.data_hora",
+            (id_disp, de, ate),
+        )
+        brutas = cur.fetchall()
+
+    # Intervalos e linhas brutas são agrupados pela mesma regra usada na consolidação
+    trechos = [(_para_datetime(entrada), _para_datetime(saida), bssid, nome) for entrada, saida, bssid, nome in consolidados]
+    for data_hora, bssid, nome in brutas:
+        instante = _para_datetime(data_hora)
+        trechos.append((instante, instante, bssid, nome))
+    trechos.sort(key=lambda t: t[0])
+
+    resultado = []
+    for p in _agrupar_permanencias(trechos, folga):
+        if p["saida"] < inicio or p["entrada"] > fim:
+            continue
+        resultado.append({
+            "bssid": p["chave"],
+            "nome": p["extra"][0],
+            "entrada": max(p["entrada"], inicio),
+            "saida": min(p["saida"], fim),
+        })
+    return resultado
+
+
+# ⏲️ Consolida periodicamente as linhas mais antigas que 'reter' (roda em uma thread própria)
+def iniciar_compactacao_periodica(pool, reter=datetime.timedelta(days=1), intervalo=3600.0,
+                                   heartbeat=intervalo_heartbeat):
+    parar = threading.Event()
+
+    def executar():
+        while not parar.wait(intervalo):
+            try:
+                removidas, criados = compactar_historico(pool, datetime.datetime.now() - reter, heartbeat)
+                if removidas:
+                    log.info("🗜️ Histórico consolidado: %d linhas em %d intervalos", removidas, criados)
+            except Exception:
+                log.exception("❌ Erro ao consolidar o histórico")
+
+    threading.Thread(target=executar, name="compactacao_historico", daemon=True).start()
+    return parar
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consolida e consulta o histórico de localização")
+    parser.add_argument("--banco", default="historico_geolocalizacao.db", help="Arquivo SQLite do histórico")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    compactar = sub.add_parser("compactar", help="Consolida as linhas brutas antigas em intervalos")
+    compactar.add_argument("--dias", type=float, default=1.0, help="Mantém brutas as linhas dos últimos N dias")
+
+    consulta = sub.add_parser("trajetoria", help="Mostra o trajeto de um agente")
+    consulta.add_argument("client_id", help="Ex.: ESP32C6_2")
+    consulta.add_argument("--inicio", required=True, help="AAAA-MM-DD HH:MM:SS")
+    consulta.add_argument("--fim", required=True, help="AAAA-MM-DD HH:MM:SS")
+    args = parser.parse_args()
+
+    pool = criar_pool_sqlite(args.banco)
+    if args.comando == "compactar":
+        antes_de = datetime.datetime.now() - datetime.timedelta(days=args.dias)
+        removidas, criados = compactar_historico(pool, antes_de)
+        print(f"✅ {removidas} linhas consolidadas em {criados} intervalos")
+    else:
+        trajeto = trajetoria(pool, args.client_id, _para_datetime(args.inicio), _para_datetime(args.fim))
+        for p in trajeto:
+            print(f"{_para_texto(p['entrada'])} → {_para_texto(p['saida'])}  {p['nome']} ({p['bssid']})")
+        if not trajeto:
+            print("⚠️ Nenhuma localização no período.")
+    pool.fechar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import argparse
+import glob
+import multiprocessing
+import os
+import re
+import threading
+
+# Variáveis de ambiente com a partição de cada processo (lidas pelo servidor_mqtt ao ser importado)
+variavel_particao = "METRO_PARTICAO"
+variavel_particoes = "METRO_PARTICOES"
+
+# Fatias dos tópicos: o firmware publica em esp32/<fatia>/<tópico>, com fatia = id do dispositivo % fatias.
+# Precisa ser igual a numFatias no esp_programacao.ino; é também o máximo de processos.
+fatias = 64
+
+# Intervalo (s) em que o supervisor confere os processos e pausa (s) antes de reiniciar um que caiu
+intervalo_supervisao = 1.0
+pausa_reinicio = 2.0
+
+# Espera máxima (s) pelo encerramento de cada processo depois do Ctrl+C
+timeout_encerramento = 30.0
+
+
+# Partição deste processo: (índice, total). Rodando sozinho, é a partição 0 de 1.
+def particao_do_ambiente():
+    total = int(os.environ.get(variavel_particoes, "1"))
+    indice = int(os.environ.get(variavel_particao, "0"))
+    if total < 1 or not 0 <= indice < total:
+        raise ValueError(f"Partição inválida: {indice} de {total}")
+    return indice, total
+
+
+# Número no fim do client_id técnico ("ESP32C6_<id>")
+_padrao_id = re.compile(rb"(\d+)$")
+
+
+# Fatia do tópico de um dispositivo pelo client_id técnico: a mesma conta do firmware (id % fatias)
+def fatia_de(client_id_raw):
+    if isinstance(client_id_raw, str):
+        client_id_raw = client_id_raw.encode()
+    encontrado = _padrao_id.search(client_id_raw)
+    return int(encontrado.group(1)) % fatias if encontrado else 0
+
+
+# Partição dona de um dispositivo: a mesma em todos os processos
+def particao_de(client_id_raw, total):
+    return fatia_de(client_id_raw) % total
+
+
+# O client_id vem antes do primeiro "|" em todos os tópicos do firmware
+def client_id_do_payload(payload):
+    return payload.partition(b"|")[0]
+
+
+# Tópico de uma fatia: esp32/bssid -> esp32/<fatia>/bssid
+def topico_da_fatia(topico, fatia):
+    prefixo, _, nome = topico.rpartition("/")
+    return f"{prefixo}/{fatia}/{nome}"
+
+
+# Tópico sem a fatia: esp32/<fatia>/bssid -> esp32/bssid (tópicos sem fatia voltam iguais)
+def topico_base(topico):
+    partes = topico.split("/")
+    if len(partes) == 3 and partes[1].isdigit():
+        return f"{partes[0]}/{partes[2]}"
+    return topico
+
+
+# Assinaturas de um processo: só as fatias da sua partição; rodando sozinho, todas. Os tópicos sem fatia
+# (firmware antigo, que não tem como escolher a partição) ficam com a partição 0, dona desses dispositivos.
+def assinaturas(topicos, particao=0, total=1):
+    if total == 1:
+        return [t for topico in topicos for t in (topico, topico_da_fatia(topico, "+"))]
+    fatiados = [topico_da_fatia(topico, fatia) for topico in topicos for fatia in range(particao, fatias, total)]
+    return list(topicos) + fatiados if particao == 0 else fatiados
+
+
+# Arquivo do snapshot de uma partição: dados_esps.json -> dados_esps.p0.json
+def caminho_particao(caminho, indice):
+    base, extensao = os.path.splitext(caminho)
+    return f"{base}.p{indice}{extensao}"
+
+
+# Snapshots de partição gravados ao lado de 'caminho' (lidos e mesclados pelo dash)
+def arquivos_particoes(caminho):
+    base, extensao = os.path.splitext(caminho)
+    padrao = re.compile(re.escape(base) + r"\.p(\d+)" + re.escape(extensao) + "$")
+    indices = {}
+    for nome in glob.glob(f"{glob.escape(base)}.p*{extensao}"):
+        correspondencia = padrao.match(nome)
+        if correspondencia:
+            indices[nome] = int(correspondencia.group(1))
+    return sorted(indices, key=indices.get)
+
+
+# Ponto de entrada de cada processo: a partição vai pelo ambiente porque o servidor se monta ao ser importado
+def _executar_particao(indice, total):
+    os.environ[variavel_particao] = str(indice)
+    os.environ[variavel_particoes] = str(total)
+    import servidor_mqtt
+    servidor_mqtt.main()
+
+
+# 🧑‍✈️ Sobe um processo por partição e reinicia o que cair, sem afetar os outros
+class SupervisorIngestao:
+    """
+    Cada processo assina só os tópicos das fatias da sua partição
+    (esp32/<fatia>/..., fatia % processos == partição), então o broker já
+    entrega cada mensagem ao processo dono do dispositivo: nada é
+    encaminhado entre processos e eles não compartilham filas. O processo
+    reiniciado recarrega o snapshot e o diário da sua partição, então só a
+    sua fatia fica parada durante o reinício (as mensagens dela nesse
+    intervalo se perdem, como com um único processo fora do ar); as outras
+    partições seguem normalmente.
+    """
+
+    def __init__(self, processos):
+        if not 1 <= processos <= fatias:
+            raise ValueError(f"Use de 1 a {fatias} processos")
+        self.total = processos
+        self._contexto = multiprocessing.get_context("spawn")
+        self.processos = [None] * processos
+        self.reinicios = 0
+
+    def _iniciar_processo(self, indice):
+        processo = self._contexto.Process(
+            target=_executar_particao, args=(indice, self.total), name=f"ingestao_p{indice}"
+        )
+        processo.start()
+        self.processos[indice] = processo
+        print(f"🚀 Partição {indice}/{self.total} no processo {processo.pid}")
+
+    def iniciar(self):
+        for indice in range(self.total):
+            self._iniciar_processo(indice)
+        return self
+
+    # Confere os processos até 'parar' ser sinalizado (ou Ctrl+C)
+    def supervisionar(self, parar=None):
+        parar = parar or threading.Event()
+        while not parar.wait(intervalo_supervisao):
+            for indice, processo in enumerate(self.processos):
+                if processo.is_alive():
+                    continue
+                print(f"⚠️ Partição {indice} encerrou (código {processo.exitcode}); reiniciando em {pausa_reinicio:.0f}s")
+                if parar.wait(pausa_reinicio):
+                    return
+                self._iniciar_processo(indice)
+                self.reinicios += 1
+
+    def encerrar(self):
+        for processo in self.processos:
+            processo.join(timeout_encerramento)
+            if processo.is_alive():
+                processo.terminate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingestão MQTT em vários processos (um por partição de dispositivos)")
+    parser.add_argument("--processos", type=int, default=min(os.cpu_count() or 2, fatias),
+                        help=f"Número de processos (padrão: núcleos da CPU, no máximo {fatias})")
+    args = parser.parse_args()
+    if not 2 <= args.processos <= fatias:
+        parser.error(f"use de 2 a {fatias} processos (com 1, rode servidor_mqtt.py diretamente)")
+
+    supervisor = SupervisorIngestao(args.processos).iniciar()
+    try:
+        supervisor.supervisionar()
+    except KeyboardInterrupt:
+        # O Ctrl+C chega a todos os processos do grupo: cada um grava o que tem pendente e sai
+        print("⏹️ Encerrando a ingestão distribuída...")
+    finally:
+        supervisor.encerrar()
+        print(f"Reinícios de partições: {supervisor.reinicios}")
+
+
+if __name__ == "__main__":
+    main()
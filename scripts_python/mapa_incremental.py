@@ -0,0 +1,305 @@
+import hashlib
+from collections import OrderedDict
+
+from branca.element import MacroElement
+from jinja2 import Template
+
+
+# 🗺️ Camada de marcadores dinâmicos embutida no mapa Folium
+class CamadaDinamica(MacroElement):
+    """
+    Adiciona ao mapa um L.layerGroup controlado por mensagens (postMessage)
+    vindas da página do Dash. Cada mensagem traz apenas a diferença desde a
+    última atualização:
+      {"completo": bool, "atualizar": {id: [lat, lon, tooltip, cor, icone]}, "remover": [id, ...]}
+    Assim o mapa base (tiles, linha e rótulos) é carregado uma única vez e
+    só os marcadores que mudaram são recriados.
+
+    Marcadores de grupo trazem um sexto valor (quantidade de agentes) e são
+    desenhados como um círculo com o número. Marcadores de um trem ("trem:<id>"
+    ou "<nome>@trem:<id>") trazem só o deslocamento em relação a ele: a
+    posição vem das mensagens "trens", calculadas pela própria página
+    (js_mover_trens), e não muda a versão dos marcadores no servidor. Clicar em um grupo aproxima o
+    mapa nele; no zoom máximo pede à página para expandi-lo. A página é
+    avisada de cada mudança de zoom, para agrupar pela grade nova.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function () {
+            var mapa = {{ this._parent.get_name() }};
+            var camada = L.layerGroup().addTo(mapa);
+            var marcadores = {};
+            var dados = {};
+            var trens = {};
+            var zoomMaximo = {{ this.zoom_maximo }};
+
+            function avisarPagina(mensagem) {
+                window.parent.postMessage(mensagem, "*");
+            }
+
+            function criarIcone(m) {
+                if (m.length > 5) {
+                    var lado = m[5] < 10 ? 30 : (m[5] < 100 ? 36 : 44);
+                    return L.divIcon({
+                        className: "",
+                        iconSize: [lado, lado],
+                        html: '<div style="width:' + lado + 'px;height:' + lado + 'px;line-height:' + lado + 'px;' +
+                              'border-radius:50%;background:' + m[3] + ';color:white;font-weight:bold;' +
+                              'text-align:center;opacity:0.85;border:2px solid white;">' + m[5] + '</div>'
+                    });
+                }
+                return L.AwesomeMarkers.icon({icon: m[4], prefix: "fa", markerColor: m[3], iconColor: "white"});
+            }
+
+            // Trem seguido por um marcador ("trem:<id>" ou "<nome>@trem:<id>"), ou null
+            function tremSeguido(id) {
+                var alvo = id.split("@").pop();
+                return alvo.indexOf("trem:") === 0 ? alvo.slice(5) : null;
+            }
+
+            // Coloca o marcador no lugar; os de um trem só aparecem depois da primeira posição dele
+            function posicionar(id) {
+                var m = dados[id];
+                var trem = tremSeguido(id);
+                var posicao = [m[0], m[1]];
+                if (trem !== null) {
+                    if (!trens[trem]) {
+                        camada.removeLayer(marcadores[id]);
+                        return;
+                    }
+                    posicao = [trens[trem][0] + m[0], trens[trem][1] + m[1]];
+                    if (id === "trem:" + trem) {
+                        marcadores[id].setTooltipContent(trens[trem][2]);
+                    }
+                }
+                marcadores[id].setLatLng(posicao);
+                camada.addLayer(marcadores[id]);
+            }
+
+            function moverTrens(posicoes) {
+                trens = posicoes;
+                Object.keys(marcadores).forEach(function (id) {
+                    if (tremSeguido(id) !== null) {
+                        posicionar(id);
+                    }
+                });
+            }
+
+            // Grupo: aproxima até as células se dividirem; no zoom máximo pede para expandir
+            function clicarGrupo(id, marcador) {
+                if (mapa.getZoom() < zoomMaximo) {
+                    mapa.setView(marcador.getLatLng(), Math.min(mapa.getZoom() + 2, zoomMaximo));
+                } else {
+                    avisarPagina({tipo: "expandir_grupo", id: id});
+                }
+            }
+
+            function aplicarDiff(diff) {
+                if (diff.completo) {
+                    camada.clearLayers();
+                    marcadores = {};
+                    dados = {};
+                }
+                (diff.remover || []).forEach(function (id) {
+                    if (marcadores[id]) {
+                        camada.removeLayer(marcadores[id]);
+                        delete marcadores[id];
+                        delete dados[id];
+                    }
+                });
+                var atualizar = diff.atualizar || {};
+                Object.keys(atualizar).forEach(function (id) {
+                    var m = atualizar[id];
+                    var texto = String(m[2]).replace(/\\n/g, "<br>");
+                    dados[id] = m;
+                    if (marcadores[id]) {
+                        marcadores[id].setIcon(criarIcone(m));
+                        marcadores[id].setTooltipContent(texto);
+                    } else {
+                        marcadores[id] = L.marker([m[0], m[1]], {icon: criarIcone(m)}).bindTooltip(texto);
+                        if (m.length > 5) {
+                            marcadores[id].on("click", function () { clicarGrupo(id, marcadores[id]); });
+                        }
+                    }
+                    posicionar(id);
+                });
+            }
+
+            window.addEventListener("message", function (evento) {
+                if (evento.data && evento.data.tipo === "diff_mapa") {
+                    aplicarDiff(evento.data.diff);
+                } else if (evento.data && evento.data.tipo === "trens") {
+                    moverTrens(evento.data.posicoes);
+                }
+            });
+            mapa.on("zoomend", function () {
+                avisarPagina({tipo: "mapa_zoom", zoom: mapa.getZoom()});
+            });
+            // Avisa a página do Dash que o mapa está pronto para receber o estado atual
+            avisarPagina({tipo: "mapa_pronto", zoom: mapa.getZoom()});
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, zoom_maximo=18):
+        super().__init__()
+        self._name = "CamadaDinamica"
+        self.zoom_maximo = zoom_maximo
+
+
+# Função JavaScript (clientside callback) que repassa a diferença para o iframe do mapa.
+# Também mantém o estado completo na página para reenviá-lo quando o iframe (re)carregar
+# e repassa ao Dash o zoom do mapa e os pedidos de expansão de grupos.
+js_enviar_diff = """
+function (diff, iframe_id) {
+    if (!diff) {
+        return window.dash_clientside.no_update;
+    }
+    if (!window.estadoMapa || diff.completo) {
+        window.estadoMapa = {};
+    }
+    (diff.remover || []).forEach(function (id) { delete window.estadoMapa[id]; });
+    Object.assign(window.estadoMapa, diff.atualizar || {});
+
+    function enviar(mensagem) {
+        var iframe = document.getElementById(iframe_id);
+        if (iframe && iframe.contentWindow) {
+            iframe.contentWindow.postMessage({tipo: "diff_mapa", diff: mensagem}, "*");
+        }
+    }
+
+    if (!window.ouvindoMapaPronto) {
+        window.ouvindoMapaPronto = true;
+        window.addEventListener("message", function (evento) {
+            if (!evento.data) {
+                return;
+            }
+            if (evento.data.tipo === "mapa_pronto") {
+                enviar({completo: true, atualizar: window.estadoMapa || {}, remover: []});
+            }
+            if (evento.data.tipo === "mapa_pronto" || evento.data.tipo === "mapa_zoom") {
+                window.dash_clientside.set_props("zoom_mapa", {data: evento.data.zoom});
+            } else if (evento.data.tipo === "expandir_grupo") {
+                window.dash_clientside.set_props("grupo_expandido", {data: evento.data.id});
+            }
+        });
+    }
+    enviar(diff);
+    return window.dash_clientside.no_update;
+}
+"""
+
+
+# Função JavaScript (clientside callback) que move os trens no navegador, sem chamar o servidor.
+# Recebe RedeTrens.tabela() e faz a mesma conta de RedeTrens.posicoes para cada trem; o relógio
+# é acertado pelo do servidor ('relogio' na tabela) para os trens baterem com o despacho.
+js_mover_trens = """
+function (n, tabela, iframe_id) {
+    if (!tabela || !tabela.ids.length) {
+        return window.dash_clientside.no_update;
+    }
+    if (window.relogioTrens !== tabela.relogio) {
+        window.relogioTrens = tabela.relogio;
+        window.desvioRelogio = tabela.relogio - Date.now() / 1000;
+    }
+
+    // Último índice com valores[i] <= x (busca binária)
+    function ultimoAte(valores, x) {
+        var inicio = 0, fim = valores.length;
+        while (inicio < fim) {
+            var meio = (inicio + fim) >> 1;
+            if (valores[meio] <= x) {
+                inicio = meio + 1;
+            } else {
+                fim = meio;
+            }
+        }
+        return inicio - 1;
+    }
+
+    // Interpolação linear como np.interp (xs crescente, valores das pontas fora do intervalo)
+    function interpolar(x, xs, ys) {
+        var i = ultimoAte(xs, x);
+        if (i < 0) {
+            return ys[0];
+        }
+        if (i >= xs.length - 1) {
+            return ys[ys.length - 1];
+        }
+        var largura = xs[i + 1] - xs[i];
+        return largura > 0 ? ys[i] + (x - xs[i]) / largura * (ys[i + 1] - ys[i]) : ys[i + 1];
+    }
+
+    var instante = Date.now() / 1000 + window.desvioRelogio;
+    var posicoes = {};
+    tabela.ids.forEach(function (id, k) {
+        var ciclo = tabela.ciclo[k];
+        var u = ((instante + tabela.defasagem[k]) % ciclo + ciclo) % ciclo;
+        var volta = u >= tabela.viagem[k];
+        var distancia = interpolar((volta ? ciclo - u : u) + tabela.desloc_tempo[k], tabela.tempos, tabela.distancias);
+
+        var i = Math.min(ultimoAte(tabela.acumulado, distancia), tabela.ultimo_trecho[k]);
+        var trecho = tabela.acumulado[i + 1] - tabela.acumulado[i];
+        var fracao = (distancia - tabela.acumulado[i]) / (trecho > 0 ? trecho : 1);
+        var a = tabela.coords[i], b = tabela.coords[i + 1];
+        var noInicio = Math.abs(fracao) <= 1e-8;
+        var noFim = Math.abs(fracao - 1) <= 1e-5 + 1e-8;
+        var parado = noInicio || noFim;
+        var proxima = tabela.estacoes[noInicio ? i : (noFim ? i + 1 : (volta ? i : i + 1))];
+
+        posicoes[id] = [
+            a[0] + fracao * (b[0] - a[0]),
+            a[1] + fracao * (b[1] - a[1]) + (parado ? 0.0005 : 0),   // Parado: ao lado do marcador da estação
+            "🚇 Trem " + id + (parado ? " (parado em " + proxima + ")" : " (próxima estação: " + proxima + ")")
+        ];
+    });
+
+    var iframe = document.getElementById(iframe_id);
+    if (iframe && iframe.contentWindow) {
+        iframe.contentWindow.postMessage({tipo: "trens", posicoes: posicoes}, "*");
+    }
+    return window.dash_clientside.no_update;
+}
+"""
+
+
+# Identificador curto de um conjunto de marcadores (muda sempre que algo no mapa muda)
+def versao_marcadores(marcadores):
+    conteudo = repr(sorted(marcadores.items())).encode("utf-8")
+    return hashlib.sha1(conteudo).hexdigest()[:16]
+
+
+# 🔹 Diferença entre dois conjuntos de marcadores {id: [lat, lon, tooltip, cor, icone(, quantidade)]}
+def calcular_diff(anteriores, atuais):
+    if anteriores is None:
+        return {"completo": True, "atualizar": dict(atuais), "remover": []}
+    atualizar = {id_: m for id_, m in atuais.items() if anteriores.get(id_) != m}
+    remover = [id_ for id_ in anteriores if id_ not in atuais]
+    return {"completo": False, "atualizar": atualizar, "remover": remover}
+
+
+# 🔹 Guarda os últimos conjuntos de marcadores enviados, indexados pela versão
+class HistoricoMarcadores:
+    """
+    Cada sessão guarda no navegador apenas a versão do que já recebeu. Com a
+    versão, o servidor encontra aqui os marcadores anteriores e envia só a
+    diferença. Se a versão não estiver mais no histórico (limite atingido),
+    o estado completo é reenviado.
+    """
+
+    def __init__(self, limite=256):
+        self.limite = limite
+        self._versoes = OrderedDict()
+
+    def guardar(self, versao, marcadores):
+        self._versoes[versao] = marcadores
+        self._versoes.move_to_end(versao)
+        while len(self._versoes) > self.limite:
+            self._versoes.popitem(last=False)
+
+    def obter(self, versao):
+        marcadores = self._versoes.get(versao)
+        if marcadores is not None:
+            self._versoes.move_to_end(versao)
+        return marcadores
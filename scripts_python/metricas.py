@@ -0,0 +1,256 @@
+import bisect
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Limites (em segundos) padrão dos histogramas de latência
+limites_latencia = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+# 🔢 Contador com rótulos (ex.: mensagens por tópico)
+class Contador:
+    def __init__(self, nome, descricao, rotulo=None):
+        self.nome = nome
+        self.descricao = descricao
+        self.rotulo = rotulo
+        self._valores = {}
+        self._trava = threading.Lock()
+
+    def inc(self, valor_rotulo=None, quantidade=1):
+        with self._trava:
+            self._valores[valor_rotulo] = self._valores.get(valor_rotulo, 0) + quantidade
+
+    def valor(self, valor_rotulo=None):
+        return self._valores.get(valor_rotulo, 0)
+
+    def exportar(self):
+        linhas = [f"# HELP {self.nome} {self.descricao}", f"# TYPE {self.nome} counter"]
+        with self._trava:
+            itens = sorted(self._valores.items(), key=lambda i: str(i[0]))
+        if not itens and self.rotulo is None:
+            itens = [(None, 0)]   # Contador sem rótulo aparece zerado desde o início
+        for valor_rotulo, valor in itens:
+            linhas.append(f"{self.nome}{_rotulos(self.rotulo, valor_rotulo)} {valor}")
+        return linhas
+
+
+# 📏 Medidor de valor instantâneo calculado na hora da leitura (ex.: tamanho de fila)
+class Medidor:
+    def __init__(self, nome, descricao, obter_valor):
+        self.nome = nome
+        self.descricao = descricao
+        self.obter_valor = obter_valor
+
+    def exportar(self):
+        return [f"# HELP {self.nome} {self.descricao}", f"# TYPE {self.nome} gauge", f"{self.nome} {self.obter_valor()}"]
+
+
+# 🔢 Contador mantido por outro componente e lido na hora da exportação (ex.: descartes de uma fila)
+class ContadorCalculado(Medidor):
+    def exportar(self):
+        return [f"# HELP {self.nome} {self.descricao}", f"# TYPE {self.nome} counter", f"{self.nome} {self.obter_valor()}"]
+
+
+# ⏱️ Taxa por segundo (média da janela dos últimos 'janela' segundos), por rótulo
+class Taxa:
+    def __init__(self, nome, descricao, rotulo=None, janela=10):
+        self.nome = nome
+        self.descricao = descricao
+        self.rotulo = rotulo
+        self.janela = janela
+        self._series = {}   # valor do rótulo -> {segundo: contagem}
+        self._trava = threading.Lock()
+
+    def inc(self, valor_rotulo=None, quantidade=1):
+        segundo = int(time.time())
+        with self._trava:
+            serie = self._series.get(valor_rotulo)
+            if serie is None:
+                serie = self._series[valor_rotulo] = {}
+            serie[segundo] = serie.get(segundo, 0) + quantidade
+            if len(serie) > self.janela + 1:
+                for antigo in [s for s in serie if s < segundo - self.janela]:
+                    del serie[antigo]
+
+    def valor(self, valor_rotulo=None):
+        # Considera só os segundos completos da janela (o segundo atual ainda está em andamento)
+        atual = int(time.time())
+        with self._trava:
+            serie = self._series.get(valor_rotulo, {})
+            total = sum(c for s, c in serie.items() if atual - self.janela <= s < atual)
+        return total / self.janela
+
+    def exportar(self):
+        linhas = [f"# HELP {self.nome} {self.descricao}", f"# TYPE {self.nome} gauge"]
+        with self._trava:
+            rotulos = sorted(self._series, key=str)
+        for valor_rotulo in rotulos:
+            linhas.append(f"{self.nome}{_rotulos(self.rotulo, valor_rotulo)} {self.valor(valor_rotulo)}")
+        return linhas
+
+
+# 📊 Histograma de durações com limites fixos
+class Histograma:
+    def __init__(self, nome, descricao, rotulo=None, limites=limites_latencia):
+        self.nome = nome
+        self.descricao = descricao
+        self.rotulo = rotulo
+        self.limites = tuple(limites)
+        self._series = {}   # valor do rótulo -> [contagens por faixa..., soma, total]
+        self._trava = threading.Lock()
+
+    def observar(self, valor, valor_rotulo=None):
+        faixa = bisect.bisect_left(self.limites, valor)
+        with self._trava:
+            serie = self._series.get(valor_rotulo)
+            if serie is None:
+                serie = self._series[valor_rotulo] = [0] * (len(self.limites) + 1) + [0.0, 0]
+            serie[faixa] += 1
+            serie[-2] += valor
+            serie[-1] += 1
+
+    # Uso: "with histograma.medir('rotulo'):" mede o tempo do bloco
+    def medir(self, valor_rotulo=None):
+        return _Cronometro(self, valor_rotulo)
+
+    def exportar(self):
+        linhas = [f"# HELP {self.nome} {self.descricao}", f"# TYPE {self.nome} histogram"]
+        with self._trava:
+            series = {k: list(v) for k, v in self._series.items()}
+        for valor_rotulo, serie in sorted(series.items(), key=lambda i: str(i[0])):
+            acumulado = 0
+            for limite, contagem in zip(self.limites + ("+Inf",), serie):
+                acumulado += contagem
+                rotulos = _rotulos(self.rotulo, valor_rotulo, le=limite)
+                linhas.append(f"{self.nome}_bucket{rotulos} {acumulado}")
+            linhas.append(f"{self.nome}_sum{_rotulos(self.rotulo, valor_rotulo)} {serie[-2]}")
+            linhas.append(f"{self.nome}_count{_rotulos(self.rotulo, valor_rotulo)} {serie[-1]}")
+        return linhas
+
+
+class _Cronometro:
+    def __init__(self, histograma, valor_rotulo):
+        self.histograma = histograma
+        self.valor_rotulo = valor_rotulo
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.histograma.observar(time.perf_counter() - self.inicio, self.valor_rotulo)
+
+
+def _rotulos(rotulo, valor_rotulo, le=None):
+    partes = []
+    if rotulo is not None and valor_rotulo is not None:
+        partes.append(f'{rotulo}="{valor_rotulo}"')
+    if le is not None:
+        partes.append(f'le="{le}"')
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+# 🔹 Conjunto de métricas exportado no formato texto do Prometheus
+class RegistroMetricas:
+    def __init__(self):
+        self._metricas = []
+
+    def adicionar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def contador(self, nome, descricao, rotulo=None):
+        return self.adicionar(Contador(nome, descricao, rotulo))
+
+    def medidor(self, nome, descricao, obter_valor):
+        return self.adicionar(Medidor(nome, descricao, obter_valor))
+
+    def contador_calculado(self, nome, descricao, obter_valor):
+        return self.adicionar(ContadorCalculado(nome, descricao, obter_valor))
+
+    def taxa(self, nome, descricao, rotulo=None, janela=10):
+        return self.adicionar(Taxa(nome, descricao, rotulo, janela))
+
+    def histograma(self, nome, descricao, rotulo=None, limites=limites_latencia):
+        return self.adicionar(Histograma(nome, descricao, rotulo, limites))
+
+    def exportar(self):
+        linhas = []
+        for metrica in self._metricas:
+            linhas.extend(metrica.exportar())
+        return "\n".join(linhas) + "\n"
+
+
+# 🌐 Servidor HTTP local com o endpoint /metrics (roda em uma thread própria)
+def iniciar_servidor_metricas(registro, porta=9100, host="127.0.0.1"):
+    class Manipulador(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            corpo = registro.exportar().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def log_message(self, formato, *args):
+            pass   # Não polui o terminal com cada leitura do /metrics
+
+    servidor = ThreadingHTTPServer((host, porta), Manipulador)
+    threading.Thread(target=servidor.serve_forever, name="metricas", daemon=True).start()
+    return servidor
+
+
+# 🔇 Filtro de log por amostragem: limita quantas mensagens iguais passam por intervalo
+class FiltroAmostragem(logging.Filter):
+    """
+    Deixa passar no máximo 'limite' registros por 'intervalo' segundos para
+    cada mensagem-modelo (registro.msg) abaixo do nível 'nivel_sempre'.
+    Registros de ERROR para cima sempre passam. Quando uma janela fecha, o
+    próximo registro que passar informa quantos foram suprimidos.
+    """
+
+    def __init__(self, limite=5, intervalo=10.0, nivel_sempre=logging.ERROR):
+        super().__init__()
+        self.limite = limite
+        self.intervalo = intervalo
+        self.nivel_sempre = nivel_sempre
+        self._janelas = {}   # mensagem-modelo -> [início da janela, aceitos, suprimidos]
+        self._trava = threading.Lock()
+
+    def filter(self, registro):
+        if registro.levelno >= self.nivel_sempre:
+            return True
+        agora = time.monotonic()
+        with self._trava:
+            janela = self._janelas.get(registro.msg)
+            if janela is None or agora - janela[0] >= self.intervalo:
+                suprimidos = janela[2] if janela else 0
+                self._janelas[registro.msg] = [agora, 1, 0]
+                if suprimidos:
+                    registro.msg = f"{registro.msg} (+{suprimidos} suprimidas)"
+                return True
+            if janela[1] < self.limite:
+                janela[1] += 1
+                return True
+            janela[2] += 1
+            return False
+
+
+# 🪵 Configura o log do processo com nível e amostragem e devolve o logger 'nome' (servidor MQTT e dash).
+# A saída fica no logger raiz: os registros das threads dos módulos (catálogo, gravador do banco,
+# ocupação, snapshot...), cada um no logger com o nome do módulo, passam pelo mesmo formato e filtro.
+def configurar_log(nome, nivel=logging.INFO, limite=5, intervalo=10.0):
+    raiz = logging.getLogger()
+    if not any(isinstance(filtro, FiltroAmostragem) for saida in raiz.handlers for filtro in saida.filters):
+        saida = logging.StreamHandler()
+        saida.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        saida.addFilter(FiltroAmostragem(limite, intervalo))
+        raiz.addHandler(saida)
+    raiz.setLevel(nivel)
+    logger = logging.getLogger(nome)
+    logger.setLevel(nivel)
+    return logger
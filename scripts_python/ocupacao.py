@@ -0,0 +1,296 @@
+import datetime
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from banco_dados import categoria_padrao
+
+log = logging.getLogger(__name__)
+
+# Resoluções dos agregados: nome -> largura do balde em segundos
+resolucoes = {"minuto": 60, "hora": 3600, "dia": 86400}
+
+# Por quanto tempo (s) cada resolução fica em memória (a tabela no banco guarda mais)
+retencao_memoria = {"minuto": 2 * 86400, "hora": 35 * 86400, "dia": 400 * 86400}
+
+# Sem leitura por esse tempo (s) o agente deixa de contar na ocupação do AP (mesmo limite do "ativo" no dash)
+segundos_ausencia = 300
+
+# Diferença (s) do fuso local para o UTC: baldes de hora e dia começam na hora cheia / meia-noite locais
+deslocamento_fuso = int(datetime.datetime.now().astimezone().utcoffset().total_seconds())
+
+# Formato do início do balde na tabela (o mesmo das outras tabelas do histórico)
+formato_data_hora = "%Y-%m-%d %H:%M:%S"
+
+
+def inicio_balde(instante, largura):
+    instante = int(instante)
+    return instante - (instante + deslocamento_fuso) % largura
+
+
+# 📊 Ocupação por AP e categoria em baldes de minuto, hora e dia, atualizada a cada leitura
+class AgregadorOcupacao:
+    """
+    Mantém o número de agentes em cada (AP, categoria) e, para cada balde de
+    tempo, a integral desse número (agente-segundos) e o máximo atingido.
+    A ocupação média do balde é agente_segundos / largura do balde.
+
+    Cada leitura custa O(1): só a chave de onde o agente saiu e a chave para
+    onde ele foi são acumuladas até o instante da leitura. consolidar()
+    (chamado periodicamente) tira os agentes sem leitura há mais de
+    'ausencia' segundos e leva todas as chaves até o instante atual, para
+    que os baldes reflitam também os períodos sem mudança.
+
+    consultar() lê direto os baldes prontos: o custo depende só do número de
+    baldes pedidos, não do número de leituras.
+    """
+
+    def __init__(self, categoria_de=None, ausencia=segundos_ausencia):
+        self.categoria_de = categoria_de or (lambda client_id: categoria_padrao)
+        self.ausencia = ausencia
+        self._trava = threading.Lock()
+
+        self._agentes = OrderedDict()   # client_id -> [chave, última leitura]; ordem = leitura mais antiga primeiro
+        self._contagem = {}             # (bssid, categoria) -> [agentes, acumulado até]
+        self._baldes = {nome: {} for nome in resolucoes}   # nome -> {(inicio, bssid, categoria): [agente_segundos, maximo]}
+        self._chaves = set()            # (bssid, categoria) que já tiveram algum balde (APs x categorias)
+        self._alterados = set()         # (nome, inicio, bssid, categoria) ainda não gravados no banco
+        self._proxima_limpeza = 0.0
+
+        self.leituras = 0
+
+    # 🔹 Registra a leitura de um agente em um AP no instante (segundos desde a época)
+    def registrar(self, client_id, bssid, instante):
+        with self._trava:
+            self._registrar(client_id, bssid, instante)
+
+    # Várias leituras [(client_id, bssid, instante), ...] com uma única aquisição da trava
+    def registrar_lote(self, leituras):
+        with self._trava:
+            for client_id, bssid, instante in leituras:
+                self._registrar(client_id, bssid, instante)
+
+    def _registrar(self, client_id, bssid, instante):
+        self.leituras += 1
+        chave = (bssid, self.categoria_de(client_id))
+        agente = self._agentes.get(client_id)
+        if agente is None:
+            self._agentes[client_id] = [chave, instante]
+            self._somar(chave, 1, instante)
+            return
+        if agente[0] != chave:
+            self._somar(agente[0], -1, instante)
+            self._somar(chave, 1, instante)
+            agente[0] = chave
+        agente[1] = max(agente[1], instante)
+        self._agentes.move_to_end(client_id)
+
+    # Muda a contagem de uma chave a partir do instante (acumula antes o período anterior)
+    def _somar(self, chave, delta, instante):
+        estado = self._contagem.get(chave)
+        if estado is None:
+            estado = self._contagem[chave] = [0, instante]
+        self._acumular(chave, estado, instante)
+        estado[0] += delta
+        if estado[0] > 0:
+            for nome, largura in resolucoes.items():
+                balde = self._balde(nome, inicio_balde(instante, largura), chave)
+                balde[1] = max(balde[1], estado[0])
+        elif estado[0] == 0:
+            del self._contagem[chave]
+
+    # Soma agentes x tempo de [acumulado até, ate) nos baldes de cada resolução
+    def _acumular(self, chave, estado, ate):
+        agentes, desde = estado
+        if ate <= desde:
+            return  # Leitura fora de ordem (ex.: vinda de outro trabalhador): conta a partir do já acumulado
+        if agentes:
+            for nome, largura in resolucoes.items():
+                t = desde
+                while t < ate:
+                    inicio = inicio_balde(t, largura)
+                    fim = min(inicio + largura, ate)
+                    balde = self._balde(nome, inicio, chave)
+                    balde[0] += agentes * (fim - t)
+                    balde[1] = max(balde[1], agentes)
+                    t = fim
+        estado[1] = ate
+
+    def _balde(self, nome, inicio, chave):
+        baldes = self._baldes[nome]
+        balde = baldes.get((inicio, chave[0], chave[1]))
+        if balde is None:
+            balde = baldes[(inicio, chave[0], chave[1])] = [0.0, 0]
+            self._chaves.add(chave)
+        self._alterados.add((nome, inicio, chave[0], chave[1]))
+        return balde
+
+    # ⏲️ Remove agentes ausentes, leva todas as chaves até 'agora' e descarta baldes antigos
+    def consolidar(self, agora):
+        with self._trava:
+            limite = agora - self.ausencia
+            while self._agentes:
+                client_id, (chave, ultima) = next(iter(self._agentes.items()))
+                if ultima >= limite:
+                    break
+                # Saiu no instante da última leitura somado ao tempo de ausência tolerado
+                del self._agentes[client_id]
+                self._somar(chave, -1, ultima + self.ausencia)
+            for chave, estado in self._contagem.items():
+                self._acumular(chave, estado, agora)
+
+            # Baldes fora da retenção: verificados no máximo uma vez por hora
+            if agora >= self._proxima_limpeza:
+                self._proxima_limpeza = agora + resolucoes["hora"]
+                for nome, retencao in retencao_memoria.items():
+                    corte = agora - retencao
+                    baldes = self._baldes[nome]
+                    for chave_balde in [c for c in baldes if c[0] < corte]:
+                        del baldes[chave_balde]
+
+    # Ocupação neste momento: {(bssid, categoria): agentes}
+    def ocupacao_atual(self):
+        with self._trava:
+            return {chave: estado[0] for chave, estado in self._contagem.items()}
+
+    # 🔎 Baldes de uma resolução em [inicio, fim): lista de {"inicio", "bssid", "categoria", "media", "maximo"}
+    def consultar(self, resolucao, inicio, fim, bssid=None, categoria=None):
+        largura = resolucoes[resolucao]
+        baldes = self._baldes[resolucao]
+        resultado = []
+        with self._trava:
+            chaves = [(b, c) for b, c in self._chaves
+                      if (bssid is None or b == bssid) and (categoria is None or c == categoria)]
+            t = inicio_balde(inicio, largura)
+            while t < fim:
+                for b, c in chaves:
+                    balde = baldes.get((t, b, c))
+                    if balde is not None:
+                        resultado.append({"inicio": t, "bssid": b, "categoria": c,
+                                          "media": balde[0] / largura, "maximo": balde[1]})
+                t += largura
+        return resultado
+
+    # Baldes alterados desde a última chamada: [(resolucao, inicio, bssid, categoria, agente_segundos, maximo)]
+    def retirar_alterados(self):
+        with self._trava:
+            linhas = []
+            for nome, inicio, bssid, categoria in self._alterados:
+                balde = self._baldes[nome].get((inicio, bssid, categoria))
+                if balde is not None:
+                    linhas.append((nome, inicio, bssid, categoria, balde[0], balde[1]))
+            self._alterados.clear()
+            return linhas
+
+    # Devolve à lista de alterados os baldes de uma gravação que falhou (a próxima retirada os inclui de novo)
+    def devolver_alterados(self, linhas):
+        with self._trava:
+            self._alterados.update((nome, inicio, bssid, categoria) for nome, inicio, bssid, categoria, _, _ in linhas)
+
+
+def _para_texto(instante):
+    return datetime.datetime.fromtimestamp(instante).strftime(formato_data_hora)
+
+
+# 💾 Grava os baldes alterados na tabela ocupacao_estacoes somando só o que mudou
+class GravacaoOcupacao:
+    """
+    O agregador começa vazio a cada partida do servidor e, na ingestão em
+    vários processos (ingestao_distribuida.py), cada processo vê só os
+    agentes da sua partição. Por isso o valor de um balde em memória nunca
+    substitui o que está na tabela: é somada só a diferença de
+    agente_segundos desde a última gravação deste objeto, e o máximo fica o
+    maior entre o gravado e o atual (com várias partições, um limite
+    inferior do máximo da estação inteira).
+
+    Uso: gravar = GravacaoOcupacao(); gravar_alterados(agregador, pool, gravar).
+    """
+
+    def __init__(self):
+        self._gravados = {}   # (resolucao, inicio, bssid, categoria) -> agente_segundos já somados
+        self._proxima_limpeza = 0.0
+
+    def __call__(self, pool, linhas):
+        if not linhas:
+            return 0
+        deltas = []
+        for nome, inicio, bssid, categoria, agente_segundos, maximo in linhas:
+            chave = (nome, inicio, bssid, categoria)
+            deltas.append((nome, _para_texto(inicio), categoria, agente_segundos - self._gravados.get(chave, 0), maximo, bssid))
+        with pool.conexao() as con:
+            con.executemany(
+                "INSERT INTO ocupacao_estacoes (resolucao, inicio, id_esp_bssid, categoria, agente_segundos, maximo) "
+                "SELECT ?, ?, id_esp_bssid, ?, ?, ? FROM bssid_estacoes WHERE bssid = ? "
+                "ON CONFLICT (resolucao, inicio, id_esp_bssid, categoria) "
+                "DO UPDATE SET agente_segundos = ocupacao_estacoes.agente_segundos + excluded.agente_segundos, "
+                "maximo = MAX(ocupacao_estacoes.maximo, excluded.maximo)",
+                deltas,
+            )
+        # Só depois do commit: se a gravação falhar, gravar_alterados devolve os baldes ao agregador
+        # e a próxima gravação soma a diferença inteira desde a última que deu certo
+        for nome, inicio, bssid, categoria, agente_segundos, maximo in linhas:
+            self._gravados[(nome, inicio, bssid, categoria)] = agente_segundos
+        self._limpar()
+        return len(linhas)
+
+    # Esquece os baldes que o agregador já tirou da memória (não mudam mais)
+    def _limpar(self):
+        agora = time.time()
+        if agora < self._proxima_limpeza:
+            return
+        self._proxima_limpeza = agora + 3600
+        self._gravados = {
+            chave: valor for chave, valor in self._gravados.items()
+            if chave[1] >= agora - retencao_memoria[chave[0]] - resolucoes[chave[0]]
+        }
+
+
+# 💾 Retira os baldes alterados do agregador e grava; se a gravação falhar, eles voltam para a próxima
+def gravar_alterados(agregador, pool, gravar):
+    linhas = agregador.retirar_alterados()
+    try:
+        return gravar(pool, linhas)
+    except Exception:
+        agregador.devolver_alterados(linhas)
+        raise
+
+
+# 🔎 Lê os agregados gravados (para outros processos, ex.: dash ou scripts do relatório)
+def ler_ocupacao(pool, resolucao, inicio, fim, bssid=None, categoria=None):
+    sql = (
+        "SELECT o.inicio, b.bssid, b.nome_estacao, o.categoria, o.agente_segundos, o.maximo "
+        "FROM ocupacao_estacoes o JOIN bssid_estacoes b ON b.id_esp_bssid = o.id_esp_bssid "
+        "WHERE o.resolucao = ? AND o.inicio >= ? AND o.inicio < ?"
+    )
+    parametros = [resolucao, _para_texto(inicio_balde(inicio, resolucoes[resolucao])), _para_texto(fim)]
+    if bssid is not None:
+        sql += " AND b.bssid = ?"
+        parametros.append(bssid)
+    if categoria is not None:
+        sql += " AND o.categoria = ?"
+        parametros.append(categoria)
+    with pool.conexao() as con:
+        linhas = con.execute(sql + " ORDER BY o.inicio", parametros).fetchall()
+    largura = resolucoes[resolucao]
+    return [
+        {"inicio": texto, "bssid": b, "nome": nome, "categoria": c, "media": agente_segundos / largura, "maximo": maximo}
+        for texto, b, nome, c, agente_segundos, maximo in linhas
+    ]
+
+
+# ⏲️ Consolida o agregador e grava os baldes alterados a cada 'intervalo' segundos (thread própria)
+def iniciar_consolidacao_ocupacao(agregador, pool, intervalo=10.0, relogio=time.time, gravar=None):
+    gravar = gravar or GravacaoOcupacao()
+    parar = threading.Event()
+
+    def executar():
+        while not parar.wait(intervalo):
+            try:
+                agregador.consolidar(relogio())
+                gravar_alterados(agregador, pool, gravar)
+            except Exception:
+                log.exception("❌ Erro ao gravar a ocupação das estações")
+
+    threading.Thread(target=executar, name="ocupacao", daemon=True).start()
+    return parar
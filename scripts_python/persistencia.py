@@ -0,0 +1,142 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+# 💾 Grava um arquivo JSON de forma atômica (arquivo temporário + rename)
+def gravar_json_atomico(caminho, dados, indent=2):
+    """
+    Escreve 'dados' em um arquivo temporário no mesmo diretório e depois
+    substitui o arquivo final com os.replace. Quem lê o arquivo (ex.: o dash)
+    nunca enxerga um JSON pela metade.
+    """
+    diretorio = os.path.dirname(os.path.abspath(caminho))
+    fd, caminho_tmp = tempfile.mkstemp(prefix=".tmp_", suffix=".json", dir=diretorio)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(dados, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(caminho_tmp, caminho)
+        _sincronizar_diretorio(diretorio)
+    except BaseException:
+        # Em caso de erro remove o temporário para não deixar lixo na pasta
+        if os.path.exists(caminho_tmp):
+            os.remove(caminho_tmp)
+        raise
+
+
+# Garante que a troca de nome do arquivo sobreviva a uma queda de energia (no Windows não há como abrir a pasta)
+def _sincronizar_diretorio(diretorio):
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(diretorio, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# 🔹 Persistência "write-behind": acumula alterações em memória e grava em lote
+class PersistenciaAssincrona:
+    """
+    Em vez de reescrever o arquivo a cada mensagem MQTT, as alterações são
+    apenas marcadas (marcar_alteracao) e uma thread em segundo plano grava o
+    snapshot quando:
+      - passou 'intervalo' segundos desde a primeira alteração pendente, ou
+      - o número de alterações pendentes atingiu 'limite_alteracoes'.
+
+    'obter_snapshot' é uma função sem argumentos que devolve os dados a serem
+    gravados. Ela é chamada com 'trava' adquirida, então quem altera o estado
+    deve usar a mesma trava. 'ao_gravar', se informada, é chamada depois de
+    cada gravação concluída (ex.: para avisar o dash que há dados novos).
+    """
+
+    def __init__(self, caminho, obter_snapshot, trava=None, intervalo=2.0, limite_alteracoes=500, ao_gravar=None):
+        self.caminho = caminho
+        self.obter_snapshot = obter_snapshot
+        self.ao_gravar = ao_gravar
+        self.trava = trava or threading.Lock()
+        self.intervalo = intervalo
+        self.limite_alteracoes = limite_alteracoes
+
+        self.alteracoes_pendentes = 0
+        self.primeira_pendente = None   # Momento (monotônico) da alteração pendente mais antiga
+        self.gravacoes = 0              # Quantidade de gravações feitas (útil para diagnóstico)
+        self.ultima_gravacao = None     # Duração da última gravação em segundos
+
+        self._condicao = threading.Condition()
+        self._encerrando = False
+        self._thread = None
+
+    # Inicia a thread de gravação em segundo plano
+    def iniciar(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._executar, name="persistencia", daemon=True)
+            self._thread.start()
+        return self
+
+    # Registra que o estado mudou (chamado a cada mensagem processada)
+    def marcar_alteracao(self, quantidade=1):
+        with self._condicao:
+            if self.alteracoes_pendentes == 0:
+                # Primeira alteração pendente: acorda a thread para contar o prazo
+                self.primeira_pendente = time.monotonic()
+                self._condicao.notify()
+            self.alteracoes_pendentes += quantidade
+            if self.alteracoes_pendentes >= self.limite_alteracoes:
+                self._condicao.notify()
+
+    # Grava imediatamente o snapshot atual (usado também no encerramento)
+    def gravar_agora(self):
+        with self._condicao:
+            self.alteracoes_pendentes = 0
+            self.primeira_pendente = None
+        inicio = time.monotonic()
+        with self.trava:
+            dados = self.obter_snapshot()
+        gravar_json_atomico(self.caminho, dados)
+        self.ultima_gravacao = time.monotonic() - inicio
+        self.gravacoes += 1
+        if self.ao_gravar is not None:
+            self.ao_gravar()
+
+    # Laço da thread: espera até o prazo ou o limite de alterações e grava
+    def _executar(self):
+        while True:
+            with self._condicao:
+                while not self._encerrando:
+                    if self.alteracoes_pendentes >= self.limite_alteracoes:
+                        break
+                    if self.primeira_pendente is None:
+                        self._condicao.wait()
+                        continue
+                    restante = self.primeira_pendente + self.intervalo - time.monotonic()
+                    if restante <= 0:
+                        break
+                    self._condicao.wait(restante)
+                if self._encerrando:
+                    return
+            try:
+                self.gravar_agora()
+            except Exception:
+                log.exception("❌ Erro ao gravar snapshot")
+                self.marcar_alteracao()  # Mantém pendente para tentar de novo
+                time.sleep(self.intervalo)
+
+    # Encerra a thread e grava o que estiver pendente
+    def encerrar(self):
+        with self._condicao:
+            self._encerrando = True
+            pendente = self.alteracoes_pendentes > 0
+            self._condicao.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if pendente:
+            self.gravar_agora()
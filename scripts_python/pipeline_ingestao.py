@@ -0,0 +1,175 @@
+import logging
+import queue
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# Marcador colocado nas filas para encerrar as threads
+_FIM = object()
+
+
+# 🔹 Pipeline de ingestão em estágios separados por filas limitadas
+class PipelineIngestao:
+    """
+    Estágios:
+      1. Loop de rede do MQTT: só chama enfileirar() com a mensagem bruta.
+         Nunca bloqueia; se a fila de entrada estiver cheia a mensagem é
+         descartada e contada em 'descartados_entrada'.
+      2. Trabalhadores de interpretação ('trabalhadores' threads): chamam
+         interpretar(topico, payload, recebido_em), que devolve um evento já
+         validado ou None (mensagem inválida, contada em 'invalidos').
+         Com 'chave' (função payload -> chave do dispositivo), cada
+         trabalhador tem a sua fila e as mensagens de um mesmo dispositivo
+         vão sempre para o mesmo trabalhador, chegando ao estágio 3 na ordem
+         em que foram recebidas. Sem 'chave' os trabalhadores dividem uma
+         fila só, e a ordem entre eles não é garantida. São threads: com o
+         GIL a interpretação não roda em paralelo, os trabalhadores só
+         tiram esse trabalho do loop de rede (para usar mais núcleos, veja
+         ingestao_distribuida.py).
+      3. Consumidor de estado (uma thread): junta os eventos em lote e chama
+         aplicar(lista_de_eventos) para atualizar o estado e a persistência.
+         Se esse estágio atrasar, a fila de estado enche e os trabalhadores
+         esperam (contrapressão), o que acaba enchendo a fila de entrada.
+    """
+
+    def __init__(self, interpretar, aplicar, trabalhadores=2, tamanho_fila=50000,
+                 tamanho_fila_estado=50000, tamanho_lote=1000, chave=None):
+        self.interpretar = interpretar
+        self.aplicar = aplicar
+        self.trabalhadores = trabalhadores
+        self.tamanho_lote = tamanho_lote
+        self.chave = chave
+
+        # Uma fila por trabalhador (dividindo 'tamanho_fila') com 'chave'; sem ela, uma fila compartilhada
+        if chave is None:
+            self.filas_entrada = [queue.Queue(maxsize=tamanho_fila)]
+        else:
+            self.filas_entrada = [queue.Queue(maxsize=max(1, tamanho_fila // trabalhadores)) for _ in range(trabalhadores)]
+        self.fila_estado = queue.Queue(maxsize=tamanho_fila_estado)
+
+        # Contadores (lidos por estatisticas())
+        self.recebidos = 0
+        self.descartados_entrada = 0
+        self.invalidos = 0
+        self.erros = 0
+        self.interpretados = 0
+        self.aplicados = 0
+        self.lotes = 0
+        self.esperas_contrapressao = 0   # Vezes em que um trabalhador esperou a fila de estado
+
+        self._trava_contadores = threading.Lock()
+        self._threads_trabalho = []
+        self._thread_estado = None
+
+    # Fila de entrada da mensagem: a do trabalhador do dispositivo, ou a compartilhada
+    def _fila_de(self, payload):
+        if len(self.filas_entrada) == 1:
+            return self.filas_entrada[0]
+        return self.filas_entrada[hash(self.chave(payload)) % len(self.filas_entrada)]
+
+    # Mensagens aguardando interpretação (somando as filas dos trabalhadores)
+    def tamanho_fila_entrada(self):
+        return sum(fila.qsize() for fila in self.filas_entrada)
+
+    # 📥 Chamado pelo on_message: apenas guarda a mensagem bruta na fila
+    def enfileirar(self, topico, payload):
+        self.recebidos += 1   # Só a thread de rede incrementa este contador
+        try:
+            self._fila_de(payload).put_nowait((topico, payload, time.time()))
+        except queue.Full:
+            self.descartados_entrada += 1
+            return False
+        return True
+
+    # Inicia os trabalhadores e o consumidor de estado
+    def iniciar(self):
+        if self._thread_estado is not None:
+            return self
+        for i in range(self.trabalhadores):
+            fila = self.filas_entrada[i % len(self.filas_entrada)]
+            t = threading.Thread(target=self._trabalhar, args=(fila,), name=f"interpretacao_{i}", daemon=True)
+            t.start()
+            self._threads_trabalho.append(t)
+        self._thread_estado = threading.Thread(target=self._consumir_estado, name="estado", daemon=True)
+        self._thread_estado.start()
+        return self
+
+    # Processa tudo o que já está nas filas e encerra as threads
+    def encerrar(self):
+        if self._thread_estado is None:
+            return
+        for i in range(len(self._threads_trabalho)):
+            self.filas_entrada[i % len(self.filas_entrada)].put(_FIM)
+        for t in self._threads_trabalho:
+            t.join()
+        self.fila_estado.put(_FIM)
+        self._thread_estado.join()
+        self._threads_trabalho = []
+        self._thread_estado = None
+
+    # Estágio 2: interpreta e valida as mensagens brutas
+    def _trabalhar(self, fila_entrada):
+        while True:
+            item = fila_entrada.get()
+            if item is _FIM:
+                return
+            try:
+                evento = self.interpretar(*item)
+            except Exception as e:
+                with self._trava_contadores:
+                    self.erros += 1
+                log.warning("❌ Erro ao interpretar mensagem: %s", e)   # Por mensagem: passa pela amostragem
+                continue
+            if evento is None:
+                with self._trava_contadores:
+                    self.invalidos += 1
+                continue
+            try:
+                self.fila_estado.put_nowait(evento)
+            except queue.Full:
+                with self._trava_contadores:
+                    self.esperas_contrapressao += 1
+                self.fila_estado.put(evento)   # Espera o consumidor de estado liberar espaço
+            with self._trava_contadores:
+                self.interpretados += 1
+
+    # Estágio 3: aplica os eventos ao estado em lote
+    def _consumir_estado(self):
+        encerrar = False
+        while not encerrar:
+            evento = self.fila_estado.get()
+            if evento is _FIM:
+                break
+            lote = [evento]
+            while len(lote) < self.tamanho_lote:
+                try:
+                    evento = self.fila_estado.get_nowait()
+                except queue.Empty:
+                    break
+                if evento is _FIM:
+                    encerrar = True
+                    break
+                lote.append(evento)
+            try:
+                self.aplicar(lote)
+            except Exception:
+                self.erros += 1
+                log.exception("❌ Erro ao aplicar eventos ao estado")
+            self.aplicados += len(lote)
+            self.lotes += 1
+
+    # Resumo dos contadores e da ocupação das filas
+    def estatisticas(self):
+        return {
+            "recebidos": self.recebidos,
+            "descartados_entrada": self.descartados_entrada,
+            "invalidos": self.invalidos,
+            "erros": self.erros,
+            "interpretados": self.interpretados,
+            "aplicados": self.aplicados,
+            "lotes": self.lotes,
+            "esperas_contrapressao": self.esperas_contrapressao,
+            "fila_entrada": self.tamanho_fila_entrada(),
+            "fila_estado": self.fila_estado.qsize(),
+        }
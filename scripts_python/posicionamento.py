@@ -0,0 +1,182 @@
+import json
+import os
+
+import numpy as np
+
+from persistencia import gravar_json_atomico
+
+# RSSI (dBm) usado para um AP que não apareceu na varredura
+rssi_ausente = -100.0
+
+# Expoente de perda de percurso: peso do AP no centroide = 10 ** (rssi / (10 * expoente))
+expoente_perda = 2.5
+
+# Quantos APs mais fortes de cada varredura entram no centroide ponderado
+aps_centroide = 3
+
+# Vizinhos usados no kNN contra as impressões digitais (fingerprints)
+vizinhos_knn = 3
+
+# Linhas processadas por vez no kNN (limita a memória da matriz de distâncias)
+tamanho_bloco = 1024
+
+
+# 📡 Interpreta o payload de varredura "bssid=rssi;bssid=rssi;..." (sem o client_id)
+def interpretar_varredura(texto):
+    leituras = []
+    for item in texto.split(";"):
+        if not item:
+            continue
+        bssid, separador, rssi = item.partition("=")
+        if not separador:
+            raise ValueError(f"Leitura sem '=': {item!r}")
+        leituras.append((bssid.strip(), float(rssi)))
+    return leituras
+
+
+# 🧭 Motor de posicionamento por RSSI, vetorizado sobre todas as varreduras de uma janela
+class MotorPosicionamento:
+    """
+    Cada varredura é um dict {BSSID normalizado: RSSI em dBm}; BSSIDs fora do
+    catálogo são ignorados. localizar() recebe a lista de varreduras de uma
+    janela (um lote do pipeline) e devolve todas as posições de uma vez:
+
+      - centroide ponderado: média das coordenadas dos 'aps_centroide' APs
+        mais fortes, com peso 10 ** (rssi / (10 * expoente_perda)). Calculado
+        sobre as leituras em formato esparso (linha, AP, rssi), então o custo
+        não depende do número de APs do catálogo;
+      - kNN: compara o vetor de RSSI com as impressões digitais (pontos de
+        referência com RSSI medido) e faz a média das 'vizinhos_knn'
+        coordenadas mais próximas no espaço de sinal, com peso 1/distância.
+
+    No modo "auto" usa kNN quando há impressões suficientes e a varredura
+    ouviu pelo menos um AP das impressões; nos demais casos usa o centroide.
+    """
+
+    def __init__(self, aps, impressoes=()):
+        # aps: sequência de dicts {"bssid", "coord"} (ex.: Catalogo.aps)
+        aps = list(aps)
+        self.bssids = [ap["bssid"] for ap in aps]
+        self.indice = {bssid: i for i, bssid in enumerate(self.bssids)}
+        self.coords = np.array([ap["coord"] for ap in aps], dtype=float).reshape(-1, 2)
+        self.definir_impressoes(impressoes)
+
+    # Monta a matriz de impressões (pontos x APs que aparecem nas impressões)
+    def definir_impressoes(self, impressoes):
+        """
+        impressoes: lista de {"coord": (lat, lon), "rssi": {bssid: rssi}}
+        """
+        self.impressoes = list(impressoes)
+        colunas = sorted({b for imp in self.impressoes for b in imp["rssi"] if b in self.indice}, key=self.indice.get)
+        # Coluna na matriz de impressões de cada AP do catálogo (-1 = AP sem impressão)
+        self._coluna_impressao = np.full(len(self.bssids), -1, dtype=np.intp)
+        self._coluna_impressao[[self.indice[b] for b in colunas]] = np.arange(len(colunas))
+
+        self._rssi_impressoes = np.full((len(self.impressoes), len(colunas)), rssi_ausente, dtype=np.float32)
+        for i, imp in enumerate(self.impressoes):
+            for bssid, rssi in imp["rssi"].items():
+                if bssid in self.indice:
+                    self._rssi_impressoes[i, self._coluna_impressao[self.indice[bssid]]] = rssi
+        self._normas_impressoes = (self._rssi_impressoes ** 2).sum(axis=1)
+        self._coords_impressoes = np.array([imp["coord"] for imp in self.impressoes], dtype=float).reshape(-1, 2)
+
+    # Converte as varreduras para o formato esparso (linha, índice do AP, rssi)
+    def _esparso(self, varreduras):
+        linhas, colunas, valores = [], [], []
+        indice = self.indice
+        for linha, varredura in enumerate(varreduras):
+            for bssid, rssi in varredura.items():
+                coluna = indice.get(bssid)
+                if coluna is not None:
+                    linhas.append(linha)
+                    colunas.append(coluna)
+                    valores.append(rssi)
+        return (np.array(linhas, dtype=np.intp), np.array(colunas, dtype=np.intp),
+                np.array(valores, dtype=float))
+
+    # 🔹 Centroide ponderado dos APs mais fortes; devolve (coords, índice do AP mais forte)
+    def centroide(self, varreduras, esparso=None):
+        n = len(varreduras)
+        linhas, colunas, valores = esparso if esparso is not None else self._esparso(varreduras)
+        coords = np.full((n, 2), np.nan)
+        mais_forte = np.full(n, -1, dtype=np.intp)
+        if len(linhas) == 0:
+            return coords, mais_forte
+
+        # Ordena por linha e, dentro da linha, do mais forte para o mais fraco
+        ordem = np.lexsort((-valores, linhas))
+        linhas, colunas, valores = linhas[ordem], colunas[ordem], valores[ordem]
+        inicio_linha = np.searchsorted(linhas, linhas, side="left")
+        posicao = np.arange(len(linhas)) - inicio_linha
+        mais_forte[linhas[posicao == 0]] = colunas[posicao == 0]
+
+        usados = posicao < aps_centroide
+        linhas, colunas, valores = linhas[usados], colunas[usados], valores[usados]
+        pesos = 10.0 ** (valores / (10.0 * expoente_perda))
+        soma = np.bincount(linhas, pesos, minlength=n)
+        lat = np.bincount(linhas, pesos * self.coords[colunas, 0], minlength=n)
+        lon = np.bincount(linhas, pesos * self.coords[colunas, 1], minlength=n)
+        com_ap = soma > 0
+        coords[com_ap, 0] = lat[com_ap] / soma[com_ap]
+        coords[com_ap, 1] = lon[com_ap] / soma[com_ap]
+        return coords, mais_forte
+
+    # 🔹 kNN contra as impressões digitais (linhas sem AP das impressões ficam NaN)
+    def knn(self, varreduras, esparso=None):
+        n = len(varreduras)
+        coords = np.full((n, 2), np.nan)
+        total = len(self.impressoes)
+        if total == 0 or self._rssi_impressoes.shape[1] == 0:
+            return coords
+        linhas, colunas, valores = esparso if esparso is not None else self._esparso(varreduras)
+        colunas_imp = self._coluna_impressao[colunas]
+        validas = colunas_imp >= 0
+        linhas, colunas_imp, valores = linhas[validas], colunas_imp[validas], valores[validas]
+        k = min(vizinhos_knn, total)
+
+        for inicio in range(0, n, tamanho_bloco):
+            fim = min(inicio + tamanho_bloco, n)
+            no_bloco = (linhas >= inicio) & (linhas < fim)
+            if not no_bloco.any():
+                continue
+            rssi = np.full((fim - inicio, self._rssi_impressoes.shape[1]), rssi_ausente, dtype=np.float32)
+            rssi[linhas[no_bloco] - inicio, colunas_imp[no_bloco]] = valores[no_bloco]
+
+            # Distância euclidiana ao quadrado no espaço de sinal: |a|² + |b|² - 2ab
+            dist2 = (rssi ** 2).sum(axis=1)[:, None] + self._normas_impressoes[None, :] - 2.0 * (rssi @ self._rssi_impressoes.T)
+            np.maximum(dist2, 0, out=dist2)
+            if k < total:
+                vizinhos = np.argpartition(dist2, k - 1, axis=1)[:, :k]
+            else:
+                vizinhos = np.broadcast_to(np.arange(total), (fim - inicio, total))
+            pesos = 1.0 / (np.sqrt(np.take_along_axis(dist2, vizinhos, axis=1)) + 1e-3)
+            estimadas = (pesos[:, :, None] * self._coords_impressoes[vizinhos]).sum(axis=1) / pesos.sum(axis=1)[:, None]
+
+            ouviu = np.zeros(fim - inicio, dtype=bool)
+            ouviu[linhas[no_bloco] - inicio] = True
+            coords[inicio:fim][ouviu] = estimadas[ouviu]
+        return coords
+
+    # 🧭 Posição de cada varredura: devolve (array n x 2, lista com o BSSID mais forte de cada uma)
+    def localizar(self, varreduras, metodo="auto"):
+        esparso = self._esparso(varreduras)
+        coords, mais_forte = self.centroide(varreduras, esparso)
+        if metodo == "knn" or (metodo == "auto" and len(self.impressoes) >= vizinhos_knn):
+            por_knn = self.knn(varreduras, esparso)
+            com_knn = ~np.isnan(por_knn[:, 0])
+            coords[com_knn] = por_knn[com_knn]
+        bssids = [self.bssids[i] if i >= 0 else None for i in mais_forte.tolist()]
+        return coords, bssids
+
+
+# 📄 Lê as impressões digitais gravadas (lista vazia se o arquivo não existir)
+def carregar_impressoes(caminho):
+    if not os.path.exists(caminho):
+        return []
+    with open(caminho, "r", encoding="utf-8") as f:
+        return [{"coord": tuple(i["coord"]), "rssi": dict(i["rssi"])} for i in json.load(f)]
+
+
+# 💾 Grava as impressões digitais (ex.: depois de uma coleta em campo)
+def salvar_impressoes(caminho, impressoes):
+    gravar_json_atomico(caminho, [{"coord": list(i["coord"]), "rssi": i["rssi"]} for i in impressoes])
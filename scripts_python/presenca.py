@@ -0,0 +1,170 @@
+import heapq
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# Tempo (s) desde a última mensagem para o dispositivo deixar de contar como conectado / ativo
+segundos_conectado = 60
+segundos_ativo = 300
+
+# Situações de presença, da mais recente para a mais antiga
+situacoes = ("conectado", "ativo", "inativo")
+_ordem = {situacao: i for i, situacao in enumerate(situacoes)}
+
+
+# Situação de um dispositivo pelo atraso da última mensagem (para quem não recebe as transições)
+def situacao_presenca(last_seen_ts, agora, conectado=segundos_conectado, ativo=segundos_ativo):
+    atraso = agora - last_seen_ts
+    if atraso < conectado:
+        return "conectado"
+    if atraso < ativo:
+        return "ativo"
+    return "inativo"
+
+
+# ⏲️ Presença dos dispositivos com prazos em um heap: cada transição acontece no instante exato
+class MotorPresenca:
+    """
+    Cada dispositivo tem uma situação (conectado -> ativo -> inativo) e um
+    prazo válido no heap, o próximo instante que pode mudá-la. Uma mensagem
+    nova só atualiza a última leitura (O(1)): o prazo não sai do heap;
+    quando ele vence, a situação é recalculada e, se a leitura avançou, o
+    prazo volta ao heap adiado. Só uma volta para "conectado" que precise de
+    um prazo mais cedo empurra uma entrada nova (a antiga fica marcada como
+    vencida e é descartada ao sair do heap). Assim o heap fica com cerca de
+    um item por dispositivo, mesmo com milhares de mensagens por segundo.
+
+    Uma thread própria dorme até o prazo mais próximo e chama
+    'ao_mudar(transicoes)' com [(client_id, anterior, nova, last_seen_ts)]
+    no momento em que cada dispositivo muda de situação. Mensagens de um
+    dispositivo ativo ou inativo (ou novo, com anterior None) geram a
+    transição de volta para conectado na própria chamada de registrar_lote.
+    """
+
+    def __init__(self, ao_mudar=None, conectado=segundos_conectado, ativo=segundos_ativo, relogio=time.time):
+        self.ao_mudar = ao_mudar
+        self.limites = {"conectado": conectado, "ativo": ativo}
+        self.relogio = relogio
+
+        self._dispositivos = {}   # client_id -> [última leitura, situação, prazo válido no heap ou None]
+        self._heap = []           # (prazo, client_id)
+        self._condicao = threading.Condition()
+        self._parar = False
+        self._thread = None
+
+        self.transicoes = 0
+
+    # 🔹 Registra leituras [(client_id, instante), ...]; devolve (e avisa) as transições para conectado
+    def registrar_lote(self, leituras):
+        transicoes = []
+        with self._condicao:
+            agora = self.relogio()
+            prazo_anterior = self._heap[0][0] if self._heap else None
+            for client_id, instante in leituras:
+                estado = self._dispositivos.get(client_id)
+                if estado is None:
+                    estado = self._dispositivos[client_id] = [instante, None, None]
+                elif instante > estado[0]:
+                    estado[0] = instante
+                else:
+                    continue   # Leitura fora de ordem: não muda nada
+                situacao = situacao_presenca(estado[0], agora, self.limites["conectado"], self.limites["ativo"])
+                # Uma leitura só torna a situação mais recente; envelhecer é papel dos prazos
+                if estado[1] is None or _ordem[situacao] < _ordem[estado[1]]:
+                    transicoes.append((client_id, estado[1], situacao, estado[0]))
+                    estado[1] = situacao
+                    self._agendar(client_id, estado)
+            # Prazo novo antes do que a thread está esperando: acorda para recalcular a espera
+            if self._heap and (prazo_anterior is None or self._heap[0][0] < prazo_anterior):
+                self._condicao.notify()
+        self._avisar(transicoes)
+        return transicoes
+
+    def registrar(self, client_id, instante):
+        return self.registrar_lote([(client_id, instante)])
+
+    # Garante um prazo válido até a próxima mudança (um prazo já agendado mais cedo é mantido)
+    def _agendar(self, client_id, estado):
+        limite = self.limites.get(estado[1])
+        if limite is None:
+            return   # Inativo: nada a esperar até a próxima mensagem
+        prazo = estado[0] + limite
+        if estado[2] is not None and estado[2] <= prazo:
+            return   # Quando vencer, a situação é recalculada com a leitura mais recente
+        heapq.heappush(self._heap, (prazo, client_id))
+        estado[2] = prazo
+
+    # Aplica os prazos vencidos até 'agora' e devolve as transições (sem chamar ao_mudar)
+    def _processar(self, agora):
+        transicoes = []
+        while self._heap and self._heap[0][0] <= agora:
+            prazo, client_id = heapq.heappop(self._heap)
+            estado = self._dispositivos[client_id]
+            if estado[2] != prazo:
+                continue   # Entrada substituída por um prazo mais cedo
+            estado[2] = None
+            situacao = situacao_presenca(estado[0], agora, self.limites["conectado"], self.limites["ativo"])
+            if situacao != estado[1]:
+                transicoes.append((client_id, estado[1], situacao, estado[0]))
+                estado[1] = situacao
+            self._agendar(client_id, estado)
+        return transicoes
+
+    # Processa os prazos vencidos até 'agora' (usado pela thread e em testes com relógio próprio)
+    def processar(self, agora=None):
+        with self._condicao:
+            transicoes = self._processar(self.relogio() if agora is None else agora)
+        self._avisar(transicoes)
+        return transicoes
+
+    def _avisar(self, transicoes):
+        if transicoes:
+            self.transicoes += len(transicoes)
+            if self.ao_mudar is not None:
+                self.ao_mudar(transicoes)
+
+    # Situação atual de um dispositivo (None se nunca foi visto)
+    def situacao(self, client_id):
+        with self._condicao:
+            estado = self._dispositivos.get(client_id)
+            return estado[1] if estado else None
+
+    # Quantos dispositivos em cada situação
+    def contagem(self):
+        with self._condicao:
+            contagem = dict.fromkeys(situacoes, 0)
+            for estado in self._dispositivos.values():
+                contagem[estado[1]] += 1
+            return contagem
+
+    def iniciar(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._executar, name="presenca", daemon=True)
+            self._thread.start()
+        return self
+
+    def _executar(self):
+        while True:
+            with self._condicao:
+                while not self._parar:
+                    espera = self._heap[0][0] - self.relogio() if self._heap else None
+                    if espera is not None and espera <= 0:
+                        break
+                    self._condicao.wait(espera)
+                if self._parar:
+                    return
+                transicoes = self._processar(self.relogio())
+            try:
+                self._avisar(transicoes)
+            except Exception:
+                log.exception("❌ Erro ao avisar mudanças de presença")
+
+    def encerrar(self):
+        with self._condicao:
+            self._parar = True
+            self._condicao.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,183 @@
+import json
+import os
+
+from bateria import EstimadorBateria
+
+
+# 🔹 Registro compacto de um dispositivo ESP
+class Dispositivo:
+    """
+    Estado de um ESP em memória. Usa __slots__ para não ter um dict por
+    instância e guarda apenas o BSSID do AP atual: os dados do AP (id, nome,
+    coordenadas) ficam na tabela de APs compartilhada pelo registro. 'coord'
+    só existe quando a posição foi estimada por RSSI (tópico esp32/scan), e
+    'scan_ts' guarda o instante dessa varredura.
+    'last_seen_ts' é numérico (segundos desde a época) e 'status' é mantido
+    pelo motor de presença, então quem lê não precisa converter datas.
+    'estimador_bateria' só existe depois da primeira leitura de bateria (ou
+    de restaurar um snapshot que tinha a estimativa).
+    """
+
+    __slots__ = ("client_id", "bssid", "last_seen_ts", "status", "bateria", "coord", "scan_ts", "estimador_bateria")
+
+    def __init__(self, client_id):
+        self.client_id = client_id
+        self.bssid = None          # BSSID do Access Point atual (chave da tabela de APs)
+        self.last_seen_ts = None   # Última vez que foi visto (segundos desde a época)
+        self.status = None         # Situação de presença: conectado, ativo ou inativo
+        self.bateria = None        # Percentual de bateria
+        self.coord = None          # Posição (lat, lon) estimada por RSSI, se houver
+        self.scan_ts = None        # Instante da última varredura aplicada (segundos desde a época)
+        self.estimador_bateria = None  # Nível suavizado, consumo e previsão de esgotamento
+
+    # Campos da estimativa de bateria gravados no snapshot (vazio sem leituras de bateria)
+    def previsao_bateria(self):
+        estimador = self.estimador_bateria
+        if estimador is None:
+            return {}
+        return {
+            "bateria_suavizada": round(estimador.nivel, 1),
+            "consumo_bateria": estimador.consumo,
+            "esgotamento_ts": estimador.esgotamento_ts,
+        }
+
+    # Converte para o formato de dict usado pelo dash (com os dados do AP)
+    def para_dict(self, tabela_aps):
+        return {
+            "client_id": self.client_id,
+            "ap": tabela_aps.get(self.bssid) if self.bssid else None,
+            "last_seen_ts": self.last_seen_ts,
+            "status": self.status,
+            "bateria": self.bateria,
+            "coord": self.coord,
+            "bateria_suavizada": None,
+            "consumo_bateria": None,
+            "esgotamento_ts": None,
+            **self.previsao_bateria(),
+        }
+
+
+# 🔹 Registro indexado de dispositivos (busca O(1) por client_id)
+class RegistroDispositivos:
+    def __init__(self, tabela_aps):
+        self.tabela_aps = tabela_aps   # Dicionário BSSID -> dados do AP (compartilhado, não copiado)
+        self._dispositivos = {}
+
+    # Busca um ESP já registrado ou cria um novo
+    def obter(self, client_id):
+        esp = self._dispositivos.get(client_id)
+        if esp is None:
+            esp = Dispositivo(client_id)
+            self._dispositivos[client_id] = esp
+        return esp
+
+    def __len__(self):
+        return len(self._dispositivos)
+
+    def __iter__(self):
+        return iter(self._dispositivos.values())
+
+    def __contains__(self, client_id):
+        return client_id in self._dispositivos
+
+    # Gera o snapshot compacto gravado em dados_esps.json
+    def serializar(self):
+        """
+        Formato do snapshot:
+          {"aps": {bssid: dados do AP}, "dispositivos": [{client_id, bssid, last_seen_ts, status, bateria[, coord]}, ...]}
+        Cada AP aparece uma única vez, mesmo com milhares de dispositivos conectados a ele.
+        "coord" e "scan_ts" só são gravados para dispositivos com posição estimada por RSSI e
+        bateria_suavizada, consumo_bateria, esgotamento_ts e bateria_ts (instante da
+        última leitura de bateria) só para os que já enviaram a bateria.
+        """
+        aps_usados = {}
+        dispositivos = []
+        for esp in self._dispositivos.values():
+            if esp.bssid is not None and esp.bssid not in aps_usados:
+                aps_usados[esp.bssid] = self.tabela_aps.get(esp.bssid)
+            item = {
+                "client_id": esp.client_id,
+                "bssid": esp.bssid,
+                "last_seen_ts": esp.last_seen_ts,
+                "status": esp.status,
+                "bateria": esp.bateria,
+            }
+            if esp.coord is not None:
+                item["coord"] = esp.coord
+            if esp.scan_ts is not None:
+                item["scan_ts"] = esp.scan_ts
+            if esp.estimador_bateria is not None:
+                item.update(esp.previsao_bateria(), bateria_ts=esp.estimador_bateria.ultimo_ts)
+            dispositivos.append(item)
+        return {"aps": aps_usados, "dispositivos": dispositivos}
+
+    # Recarrega um snapshot gravado por serializar() (ao reiniciar o servidor); devolve quantos dispositivos
+    def restaurar(self, dados):
+        """
+        A estimativa de bateria é retomada do nível suavizado e do consumo
+        gravados (ver EstimadorBateria.retomar), então a previsão de
+        esgotamento continua valendo logo após o reinício. Snapshots no
+        formato antigo de lista são ignorados.
+        """
+        if not isinstance(dados, dict):
+            return 0
+        itens = dados.get("dispositivos", [])
+        for item in itens:
+            esp = self.obter(item["client_id"])
+            esp.bssid = item.get("bssid")
+            esp.last_seen_ts = item.get("last_seen_ts")
+            esp.status = item.get("status")
+            esp.bateria = item.get("bateria")
+            esp.coord = tuple(item["coord"]) if item.get("coord") else None
+            esp.scan_ts = item.get("scan_ts")
+            # Snapshots anteriores ao bateria_ts: a última mensagem é a melhor aproximação da última leitura
+            instante_bateria = item.get("bateria_ts") or item.get("last_seen_ts")
+            if item.get("bateria_suavizada") is not None and instante_bateria is not None:
+                esp.estimador_bateria = EstimadorBateria().retomar(
+                    instante_bateria, item["bateria_suavizada"], item.get("consumo_bateria")
+                )
+        return len(itens)
+
+    # Lista de dicts no formato usado pelo dash
+    def para_dicts(self):
+        return [esp.para_dict(self.tabela_aps) for esp in self._dispositivos.values()]
+
+
+# 🔹 Converte um snapshot (compacto ou no formato antigo de lista) em lista de dicts
+def expandir_snapshot(dados):
+    """
+    Snapshots antigos trazem "last_seen" em texto no lugar de "last_seen_ts"
+    e "status"; esses campos são repassados como vieram, para a conversão
+    ficar com quem lê (cache_estado).
+    """
+    # Formato antigo: lista de dicts com o AP completo em cada dispositivo
+    if isinstance(dados, list):
+        return dados
+
+    aps = dados.get("aps", {})
+    esps = []
+    for item in dados.get("dispositivos", []):
+        bssid = item.get("bssid")
+        ap = aps.get(bssid) if bssid else None
+        esps.append({
+            "client_id": item["client_id"],
+            "ap": ap,
+            "last_seen_ts": item.get("last_seen_ts"),
+            "status": item.get("status"),
+            "bateria": item.get("bateria"),
+            "coord": item.get("coord"),
+            "bateria_suavizada": item.get("bateria_suavizada"),
+            "consumo_bateria": item.get("consumo_bateria"),
+            "esgotamento_ts": item.get("esgotamento_ts"),
+        })
+        if "last_seen" in item:
+            esps[-1]["last_seen"] = item["last_seen"]
+    return esps
+
+
+# 🔹 Lê dados_esps.json e devolve a lista de dispositivos (usado pelo dash)
+def ler_snapshot(caminho):
+    if not os.path.exists(caminho):
+        return []
+    with open(caminho, "r") as f:
+        return expandir_snapshot(json.load(f))
@@ -0,0 +1,170 @@
+import numpy as np
+from geopy.distance import geodesic
+
+# Velocidade média do trem em movimento entre duas estações (m/s)
+velocidade_trem_mps = 40 / 3.6
+
+# Tempo (s) que o trem fica parado em cada estação (inclusive nas pontas, antes de voltar)
+parada_estacao_s = 30.0
+
+
+# 🛤️ Geometria e tabela horária de uma linha (estações em ordem, ida e volta)
+class Linha:
+    """
+    Guarda a distância geodésica acumulada de cada estação ao longo da
+    polilinha e a tabela horária de uma viagem de ida: para cada estação o
+    instante de chegada e de partida. A volta é a ida espelhada, então um
+    ciclo completo dura 2 x duracao_viagem.
+    """
+
+    def __init__(self, nome, estacoes, trens=1, velocidade=velocidade_trem_mps, parada=parada_estacao_s):
+        # estacoes: [(nome, (lat, lon)), ...] na ordem da linha
+        if len(estacoes) < 2:
+            raise ValueError(f"A linha {nome!r} precisa de pelo menos duas estações")
+        self.nome = nome
+        self.trens = trens
+        self.nomes_estacoes = [nome_estacao for nome_estacao, _ in estacoes]
+        self.coords = np.array([coord for _, coord in estacoes], dtype=float)
+
+        trechos = [geodesic(a, b).meters for a, b in zip(self.coords[:-1], self.coords[1:])]
+        self.acumulado = np.concatenate(([0.0], np.cumsum(trechos)))
+        self.comprimento = float(self.acumulado[-1])
+
+        # Chegada na estação i: tempo rodando até ela + paradas nas i estações anteriores
+        chegada = self.acumulado / velocidade + parada * np.arange(len(estacoes))
+        self.tempos = np.column_stack((chegada, chegada + parada)).ravel()
+        self.distancias = np.repeat(self.acumulado, 2)
+        self.duracao_viagem = float(self.tempos[-1])
+
+
+# 🚇 Posição de todos os trens da rede em um instante, com uma única busca binária
+class RedeTrens:
+    """
+    As tabelas de todas as linhas são concatenadas em arrays únicos, cada
+    linha deslocada para depois da anterior (com folga), tanto na distância
+    quanto no tempo. Assim, para qualquer número de trens e linhas:
+      - instante -> distância ao longo da linha é um np.interp sobre a
+        tabela horária da rede;
+      - distância -> coordenada é um np.searchsorted sobre as distâncias
+        acumuladas da rede, seguido de interpolação no trecho.
+
+    Os trens de uma linha saem igualmente espaçados no ciclo de ida e volta.
+    """
+
+    def __init__(self, linhas):
+        self.linhas = list(linhas)
+
+        coords, acumulado, tempos, distancias = [], [], [], []
+        ids, linha_trem, defasagem, ciclo, viagem, desloc_dist, desloc_tempo, ultimo_trecho = [], [], [], [], [], [], [], []
+        base_dist = base_tempo = 0.0
+        base_indice = 0
+        for linha in self.linhas:
+            n = len(linha.nomes_estacoes)
+            coords.append(linha.coords)
+            acumulado.append(linha.acumulado + base_dist)
+            tempos.append(linha.tempos + base_tempo)
+            distancias.append(linha.distancias + base_dist)
+            duracao_ciclo = 2 * linha.duracao_viagem
+            for k in range(linha.trens):
+                ids.append(f"{linha.nome}-{k + 1}")
+                linha_trem.append(linha)
+                defasagem.append(duracao_ciclo * k / linha.trens)
+                ciclo.append(duracao_ciclo)
+                viagem.append(linha.duracao_viagem)
+                desloc_dist.append(base_dist)
+                desloc_tempo.append(base_tempo)
+                ultimo_trecho.append(base_indice + n - 2)
+            base_dist += linha.comprimento + 1.0
+            base_tempo += linha.duracao_viagem + 1.0
+            base_indice += n
+
+        self.ids = ids
+        self.linha_trem = linha_trem
+        self.nomes_estacoes = [nome for linha in self.linhas for nome in linha.nomes_estacoes]
+        self._coords = np.concatenate(coords) if coords else np.empty((0, 2))
+        self._acumulado = np.concatenate(acumulado) if acumulado else np.empty(0)
+        self._tempos = np.concatenate(tempos) if tempos else np.empty(0)
+        self._distancias = np.concatenate(distancias) if distancias else np.empty(0)
+        self._defasagem = np.array(defasagem)
+        self._ciclo = np.array(ciclo)
+        self._viagem = np.array(viagem)
+        self._desloc_dist = np.array(desloc_dist)
+        self._desloc_tempo = np.array(desloc_tempo)
+        self._ultimo_trecho = np.array(ultimo_trecho, dtype=np.intp)
+
+    # 🔹 Posições de todos os trens no instante (segundos desde a época)
+    def posicoes(self, instante):
+        """
+        Retorna (coords, distancias, sentidos, proximas, parados):
+          - coords: array (trens, 2) com (lat, lon);
+          - distancias: metros desde a primeira estação da linha;
+          - sentidos: +1 na ida, -1 na volta;
+          - proximas: índice (em nomes_estacoes) da próxima estação, ou da
+            estação em que o trem está parado;
+          - parados: True para os trens parados em uma estação.
+        """
+        if not self.ids:
+            vazio = np.empty(0)
+            return np.empty((0, 2)), vazio, vazio, np.empty(0, dtype=np.intp), np.empty(0, dtype=bool)
+
+        u = np.mod(instante + self._defasagem, self._ciclo)
+        volta = u >= self._viagem
+        tempo = np.where(volta, self._ciclo - u, u)
+        distancia_rede = np.interp(tempo + self._desloc_tempo, self._tempos, self._distancias)
+
+        # Trecho (estação i -> i + 1) que contém cada trem, limitado ao último trecho da sua linha
+        i = np.searchsorted(self._acumulado, distancia_rede, side="right") - 1
+        i = np.minimum(i, self._ultimo_trecho)
+        comprimento_trecho = self._acumulado[i + 1] - self._acumulado[i]
+        fracao = (distancia_rede - self._acumulado[i]) / np.where(comprimento_trecho > 0, comprimento_trecho, 1.0)
+        coords = self._coords[i] + fracao[:, None] * (self._coords[i + 1] - self._coords[i])
+
+        # Parado em uma estação (início do trecho ou, no último trecho, o fim): ela mesma é a "próxima"
+        no_inicio = np.isclose(fracao, 0.0)
+        no_fim = np.isclose(fracao, 1.0)
+        proximas = np.where(no_inicio, i, np.where(no_fim, i + 1, np.where(volta, i, i + 1)))
+        return coords, distancia_rede - self._desloc_dist, np.where(volta, -1, 1), proximas, no_inicio | no_fim
+
+    # Posições como {id do trem: {"linha", "coord", "sentido", "proxima", "parado"}}
+    def estado(self, instante):
+        coords, _, sentidos, proximas, parados = self.posicoes(instante)
+        return {
+            id_trem: {
+                "linha": linha.nome,
+                "coord": (lat, lon),
+                "sentido": sentido,
+                "proxima": self.nomes_estacoes[proxima],
+                "parado": parado,
+            }
+            for id_trem, linha, (lat, lon), sentido, proxima, parado in zip(
+                self.ids, self.linha_trem, coords.tolist(), sentidos.tolist(), proximas.tolist(), parados.tolist()
+            )
+        }
+
+    # 🌐 Tabelas da rede em listas (JSON) para o navegador mover os trens com a mesma conta de posicoes
+    def tabela(self):
+        return {
+            "ids": self.ids,
+            "estacoes": self.nomes_estacoes,
+            "coords": self._coords.tolist(),
+            "acumulado": self._acumulado.tolist(),
+            "tempos": self._tempos.tolist(),
+            "distancias": self._distancias.tolist(),
+            "defasagem": self._defasagem.tolist(),
+            "ciclo": self._ciclo.tolist(),
+            "viagem": self._viagem.tolist(),
+            "desloc_tempo": self._desloc_tempo.tolist(),
+            "ultimo_trecho": self._ultimo_trecho.tolist(),
+        }
+
+
+# 🗂️ Rede montada a partir das linhas do catálogo
+def rede_do_catalogo(catalogo, velocidade=velocidade_trem_mps, parada=parada_estacao_s):
+    return RedeTrens([
+        Linha(
+            linha["nome"],
+            [(nome, catalogo.estacoes_por_nome[nome]) for nome in linha["estacoes"]],
+            trens=linha["trens"], velocidade=velocidade, parada=parada,
+        )
+        for linha in catalogo.linhas
+    ])
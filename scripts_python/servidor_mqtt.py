@@ -1,107 +1,507 @@
-import json
 import datetime
+import functools
+import json
+import logging
+import os
+import threading
+import time
 import paho.mqtt.client as mqtt
 
+from banco_dados import GravadorBanco, categoria_padrao, criar_pool_sqlite
+from bateria import EstimadorBateria
+from catalogo import abrir_catalogo, caminho_catalogo_padrao
+from diario import DiarioIngestao
+from estado_compartilhado import ArmazemDash
+from eventos import publicar_evento
+from historico import CompactadorHistorico, iniciar_compactacao_periodica
+from ingestao_distribuida import assinaturas, caminho_particao, client_id_do_payload, particao_de, particao_do_ambiente, topico_base
+from metricas import RegistroMetricas, configurar_log, iniciar_servidor_metricas
+from ocupacao import AgregadorOcupacao, GravacaoOcupacao, gravar_alterados, iniciar_consolidacao_ocupacao
+from persistencia import PersistenciaAssincrona
+from pipeline_ingestao import PipelineIngestao
+from posicionamento import MotorPosicionamento, carregar_impressoes, interpretar_varredura
+from presenca import MotorPresenca, segundos_ativo, segundos_conectado, situacoes
+from registro_dispositivos import RegistroDispositivos
+
 # Arquivo JSON para armazenar dados recebidos dos ESPs
 data_file = "dados_esps.json"
 
-# Lista de Access Points (APs) conhecidos com BSSID, nome e coordenadas
-access_points_detalhados = {
-    "7A:37:16:2B:8D:5D": {"id": "AP-1", "nome": "São Paulo-Morumbi e Jardim Guedala", "coord": (-23.5995, -46.7152)},
-    "02:9B:CD:05:1E:BE": {"id": "AP-2", "nome": "Jardim Guedala e Morumbi", "coord": (-23.6050, -46.7140)},
-    "68:D4:0C:D5:2D:9F": {"id": "AP-3", "nome": "Morumbi e Paraisópolis", "coord": (-23.6120, -46.7135)},
-    "C4:6E:1F:95:82:A7": {"id": "AP-4", "nome": "Paraisópolis e Américo Maurano", "coord": (-23.6225, -46.7136)},
-    "58:10:8C:96:6C:76": {"id": "AP-5", "nome": "Vila Andrade e Jardim Jussara", "coord": (-23.6375, -46.7120)},
-}
-
-# Mapeia nomes técnicos dos dispositivos ESP para nomes amigáveis
-nome_dispositivos = {
-    "ESP32C6_1": "Agente_1",
-    "ESP32C6_2": "Agente_2",
-    "ESP32C6_3": "Agente_3",
-    "ESP32C6_4": "Agente_4",
-}
-
-# Lista com todos os ESPs conectados (será populada dinamicamente)
-connected_esps = []
-
-# 🔹 Função utilitária para buscar um ESP já registrado ou criar um novo
+# Parâmetros da gravação em segundo plano (write-behind) do arquivo JSON
+intervalo_gravacao = 0.5     # Grava no máximo a cada 0,5 segundo...
+limite_alteracoes = 500      # ...ou antes, se acumular 500 alterações pendentes
+
+# Diário dos eventos aceitos (segmentos com fsync em grupo). Na partida o estado é refeito pelo
+# último snapshot mais o trecho do diário depois dele; segmentos já cobertos pelo snapshot são apagados.
+pasta_diario = "diario_ingestao"
+
+# Banco SQLite com o histórico de localização e bateria (mesmas tabelas do script SQL)
+banco_file = "historico_geolocalizacao.db"
+
+# Parâmetros do pipeline de ingestão
+trabalhadores_ingestao = 2   # Threads que interpretam as mensagens (cada dispositivo sempre na mesma, para manter a ordem)
+tamanho_fila_ingestao = 50000  # Mensagens brutas aguardando interpretação (acima disso são descartadas)
+
+# Métricas (formato Prometheus em http://127.0.0.1:9100/metrics) e logs
+metricas_porta = 9100
+nivel_log = logging.INFO     # DEBUG mostra cada mensagem recebida (com amostragem)
+log_limite_amostragem = 5    # Máximo de logs iguais...
+log_intervalo_amostragem = 10.0  # ...a cada 10 segundos
+
+# Catálogo de APs (BSSID, nome e coordenadas), estações e nomes amigáveis dos dispositivos.
+# "arquivo" lê catalogo.json; "banco" lê as tabelas bssid_estacoes e estoque_dispositivos.
+# Alterações na fonte são recarregadas sem reiniciar o servidor. Use a mesma fonte no dash_acompanhamento.py.
+fonte_catalogo = "arquivo"
+catalogo_file = caminho_catalogo_padrao
+
+# Impressões digitais de RSSI (pontos de referência) usadas no posicionamento por kNN.
+# Sem o arquivo, as varreduras do tópico esp32/scan são localizadas por centroide ponderado.
+impressoes_file = "impressoes_rssi.json"
+
+# Por quanto tempo (s) a posição de uma varredura prevalece sobre o BSSID do tópico esp32/bssid.
+# O firmware antigo envia os dois a cada ciclo (10 s): o BSSID do mesmo ciclo não apaga a posição
+# por RSSI nem é gravado de novo no histórico; sem varreduras por esse tempo, o BSSID volta a valer.
+segundos_varredura_valida = 30
+
+# Histórico no banco: só transições de AP e um heartbeat a cada 300 s por dispositivo.
+# Linhas com mais de 1 dia viram intervalos de permanência (consolidação a cada hora).
+intervalo_heartbeat_historico = 300
+dias_historico_bruto = 1
+intervalo_compactacao_historico = 3600.0
+
+# Ocupação por AP e categoria (baldes de minuto, hora e dia), gravada na tabela ocupacao_estacoes.
+# As categorias são as definidas no dash (estado_dash.db, compartilhado com ele).
+estado_dash_file = "estado_dash.db"
+intervalo_ocupacao = 10.0
+
+# Tópicos publicados pelos ESPs. O firmware publica em esp32/<fatia>/<tópico> (fatia = id % 64);
+# as versões antigas, direto em esp32/<tópico>. Os dois são interpretados como esp32/<tópico>.
+topicos_esp = ("esp32/bssid", "esp32/battery", "esp32/scan")
+
+# Ingestão em vários processos (python ingestao_distribuida.py): cada processo assina só as fatias
+# da sua partição (fatia % processos), então o broker entrega a ele só os dispositivos de que é dono.
+# Os tópicos sem fatia do firmware antigo são assinados só pela partição 0, dona desses dispositivos.
+# Grava o próprio snapshot (dados_esps.p<N>.json, mesclados pelo dash) e expõe as métricas na porta
+# metricas_porta + N. Rodando este arquivo diretamente, é a partição 0 de 1 e assina todos os tópicos.
+particao, total_particoes = particao_do_ambiente()
+distribuida = total_particoes > 1
+if distribuida:
+    data_file = caminho_particao(data_file, particao)
+    pasta_diario = caminho_particao(pasta_diario, particao)
+    metricas_porta += particao
+
+# 🪵 Log com nível e amostragem: mensagens repetidas por mensagem são limitadas por intervalo
+log = configurar_log(f"servidor_mqtt.p{particao}" if distribuida else "servidor_mqtt", nivel_log, log_limite_amostragem, log_intervalo_amostragem)
+
+# 📊 Métricas da ingestão
+metricas = RegistroMetricas()
+m_mensagens = metricas.contador("ingestao_mensagens_total", "Mensagens MQTT recebidas", rotulo="topico")
+m_taxa = metricas.taxa("ingestao_mensagens_por_segundo", "Mensagens MQTT por segundo (média de 10 s)", rotulo="topico")
+m_falhas = metricas.contador("ingestao_falhas_interpretacao_total", "Mensagens rejeitadas na interpretação", rotulo="motivo")
+m_legados = metricas.contador("ingestao_topicos_sem_fatia_total", "Mensagens do firmware antigo (tópicos sem fatia) recebidas pela partição 0", rotulo="topico")
+m_bssid_desconhecido = metricas.contador("ingestao_bssid_desconhecido_total", "Mensagens com BSSID não cadastrado")
+m_latencia = metricas.histograma("ingestao_estagio_segundos", "Latência por estágio da ingestão", rotulo="estagio")
+m_gravacao_json = metricas.histograma("persistencia_gravacao_segundos", "Duração de cada gravação do dados_esps.json")
+m_gravacao_banco = metricas.histograma("banco_gravacao_lote_segundos", "Duração de cada lote gravado no banco")
+m_presenca = metricas.contador("presenca_transicoes_total", "Mudanças de situação de presença", rotulo="situacao")
+
+# Banco SQLite com o histórico (também é a fonte do catálogo quando fonte_catalogo = "banco")
+pool_banco = criar_pool_sqlite(banco_file)
+
+# 🔄 Catálogo recarregado: troca a tabela de APs do registro e sincroniza os APs no banco
+def aplicar_catalogo(novo, anterior):
+    global motor_posicionamento
+    motor_posicionamento = MotorPosicionamento(novo.aps, carregar_impressoes(impressoes_file))
+    with trava_estado:
+        registro_esps.tabela_aps = novo.por_bssid
+    gravador_banco.sincronizar_aps(novo.por_bssid)
+    persistencia.marcar_alteracao()   # Regrava o snapshot com os dados novos dos APs
+    log.info("🗂️ Catálogo recarregado: %d APs, %d dispositivos nomeados (versão %s)",
+             len(novo.aps), len(novo.nomes_dispositivos), novo.versao)
+
+catalogo = abrir_catalogo(fonte_catalogo, pool_banco, catalogo_file, ao_recarregar=aplicar_catalogo)
+
+# 🧭 Posicionamento por RSSI das varreduras recebidas (refeito quando o catálogo muda)
+motor_posicionamento = MotorPosicionamento(catalogo.atual.aps, carregar_impressoes(impressoes_file))
+
+# Registro indexado por client_id com todos os ESPs conectados (populado dinamicamente)
+registro_esps = RegistroDispositivos(catalogo.atual.por_bssid)
+
+# Trava que protege registro_esps entre a thread do MQTT e a de gravação
+trava_estado = threading.Lock()
+
+# 📓 Diário de ingestão: registrado junto com a aplicação de cada lote, com trava_estado
+diario = DiarioIngestao(pasta_diario)
+seq_snapshot = 0   # Último registro do diário contido no snapshot sendo gravado
+
+# Snapshot com o número do último registro do diário que ele já contém
+def serializar_estado():
+    global seq_snapshot
+    dados = registro_esps.serializar()
+    dados["seq_diario"] = seq_snapshot = diario.seq
+    return dados
+
+# 📣 Avisa o dash (tópico metro/eventos) que há um snapshot novo gravado.
+# Como só é chamada após cada gravação, rajadas de mensagens viram um único evento.
+def avisar_dash():
+    m_gravacao_json.observar(persistencia.ultima_gravacao)
+    diario.descartar_ate(seq_snapshot)   # O snapshot gravado já cobre esses segmentos
+    publicar_evento(client, {"tipo": "estado", "gravacao": persistencia.gravacoes, "ts": time.time()})
+
+persistencia = PersistenciaAssincrona(
+    data_file,
+    serializar_estado,          # Chamada com trava_estado adquirida
+    trava=trava_estado,
+    intervalo=intervalo_gravacao,
+    limite_alteracoes=limite_alteracoes,
+    ao_gravar=avisar_dash,
+)
+
+# Categoria de cada dispositivo definida no dash: vai para o histórico (id_tipo) e para a ocupação
+categorias_dash = ArmazemDash(estado_dash_file).categorias
+
+def categoria_de(client_id):
+    return categorias_dash.get(client_id, categoria_padrao)
+
+# Ocupação por estação: atualizada a cada leitura de localização
+agregador_ocupacao = AgregadorOcupacao(categoria_de=categoria_de)
+# Soma nos baldes da tabela só o que mudou: o que foi gravado antes de reiniciar (ou por outra partição) é mantido
+gravar_ocupacao = GravacaoOcupacao()
+
+# Gravador em lote do histórico no banco (fila limitada, não bloqueia o loop do MQTT)
+compactador_historico = CompactadorHistorico(intervalo_heartbeat_historico)
+gravador_banco = GravadorBanco(
+    pool_banco,
+    ao_gravar_lote=lambda duracao, quantidade: m_gravacao_banco.observar(duracao),
+    compactador=compactador_historico,
+)
+gravador_banco.sincronizar_aps(catalogo.atual.por_bssid)
+
+# ⏲️ Presença: o motor avisa cada mudança conectado -> ativo -> inativo no instante em que acontece
+def ao_mudar_presenca(transicoes):
+    with trava_estado:
+        for client_id, anterior, nova, visto_em in transicoes:
+            esp = registro_esps.obter(client_id)
+            # Uma leitura mais nova já aplicada ao registro vale mais que uma transição atrasada
+            if esp.last_seen_ts is None or esp.last_seen_ts <= visto_em:
+                esp.status = nova
+    inativos = []
+    for client_id, anterior, nova, visto_em in transicoes:
+        m_presenca.inc(nova)
+        if nova == "inativo" and anterior is not None:   # anterior None: já estava parado ao retomar o snapshot
+            inativos.append(client_id)
+            log.warning("📴 %s sem mensagens desde %s: inativo", client_id, texto_data(visto_em))
+    if inativos:
+        publicar_evento(client, {"tipo": "presenca", "situacao": "inativo", "dispositivos": inativos, "ts": time.time()})
+    persistencia.marcar_alteracao(len(transicoes))   # O status novo vai para o snapshot
+
+motor_presenca = MotorPresenca(ao_mudar_presenca, segundos_conectado, segundos_ativo)
+
+# 🔹 Função utilitária para buscar um ESP já registrado ou criar um novo (busca O(1))
 def get_esp(client_id):
-    for esp in connected_esps:
-        if esp["client_id"] == client_id:
-            return esp
-    # Se não existir, cria um novo registro
-    new_esp = {
-        "client_id": client_id,
-        "ap": None,          # Access Point atual
-        "last_seen": None,   # Última vez que foi visto
-        "bateria": None      # Percentual de bateria
-    }
-    connected_esps.append(new_esp)
-    return new_esp
-
-# Função chamada quando uma mensagem MQTT é recebida
-def on_message(client, userdata, message):
-    global connected_esps
-    payload = message.payload.decode()  # Decodifica o conteúdo para string
-    topic = message.topic               # Obtém o tópico da mensagem
-    print(f"📡 MQTT RECEBIDO ({topic}): {payload}")
+    return registro_esps.obter(client_id)
+
+# Data/hora em texto para o banco e os logs (formatada uma vez por segundo, não por mensagem)
+@functools.lru_cache(maxsize=8)
+def _texto_segundo(segundo):
+    return datetime.datetime.fromtimestamp(segundo).strftime("%Y-%m-%d %H:%M:%S")
+
+def texto_data(instante):
+    return _texto_segundo(int(instante))
+
+# esp32/<fatia>/<tópico> -> esp32/<tópico> (poucos tópicos distintos: calculado uma vez por tópico)
+topico_sem_fatia = functools.lru_cache(maxsize=1024)(topico_base)
+
+# 🔎 Interpreta e valida uma mensagem (roda nos trabalhadores do pipeline, fora do loop de rede)
+def interpretar_mensagem(topic, payload_bruto, recebido_em):
+    inicio = time.time()
+    m_latencia.observar(inicio - recebido_em, "fila_entrada")
+    with m_latencia.medir("interpretacao"):
+        return _interpretar(topic, payload_bruto, recebido_em)
+
+def _interpretar(topico_recebido, payload_bruto, recebido_em):
+    payload = payload_bruto.decode(errors="replace")  # Decodifica o conteúdo para string
+    log.debug("📡 MQTT RECEBIDO (%s): %s", topico_recebido, payload)
+    topic = topico_sem_fatia(topico_recebido)
 
-    # Data/hora atual formatada
-    current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    if distribuida and topic == topico_recebido:
+        # Firmware antigo (tópico sem fatia): só a partição 0 assina, e ela é dona de todos esses dispositivos
+        m_legados.inc(topic)
+    elif distribuida and particao_de(client_id_do_payload(payload_bruto), total_particoes) != particao:
+        # Dispositivo de outra partição (fatia no tópico diferente da do client_id): o estado dele é de outro processo
+        m_falhas.inc("particao_errada")
+        log.warning("❌ Mensagem de outra partição em %s: %s", topic, payload)
+        return None
+
+    # Uma única versão do catálogo para toda a mensagem (a recarga só troca a referência)
+    catalogo_atual = catalogo.atual
+
+    # Data/hora do recebimento formatada (só para o banco e os logs; o estado guarda recebido_em)
+    current_time = texto_data(recebido_em)
 
     # 🛰️ Tratamento para mensagens de localização (BSSID)
     if topic == "esp32/bssid":
         parts = payload.split("|")
         if len(parts) != 2:
-            print("❌ Formato inválido para bssid!")
-            return
+            m_falhas.inc("formato_bssid")
+            log.warning("❌ Formato inválido para bssid: %s", payload)
+            return None
         client_id_raw, bssid = parts
-        # Converte ID técnico em nome amigável, se existir no dicionário
-        client_id = nome_dispositivos.get(client_id_raw, client_id_raw)
+        # Converte ID técnico em nome amigável, se existir no catálogo
+        client_id = catalogo_atual.nome_dispositivo(client_id_raw)
 
-        # Verifica se o BSSID recebido é conhecido
-        ap_info = access_points_detalhados.get(bssid)
-        if not ap_info:
-            print("❌ BSSID desconhecido:", bssid)
-            return
-
-        # Atualiza informações do ESP
-        esp = get_esp(client_id)
-        esp["ap"] = ap_info
-        esp["last_seen"] = current_time
-        print(f"✅ {client_id} conectado ao {ap_info['id']} em {current_time}")
+        # Verifica se o BSSID recebido é conhecido (índice por BSSID normalizado)
+        ap = catalogo_atual.ap_por_bssid(bssid)
+        if ap is None:
+            m_bssid_desconhecido.inc()
+            log.warning("❌ BSSID desconhecido: %s", bssid)
+            return None
+        return ("bssid", client_id_raw, client_id, ap["bssid"], current_time, recebido_em)
 
     # 🔋 Tratamento para mensagens de bateria
     elif topic == "esp32/battery":
         parts = payload.split("|")
         if len(parts) != 2:
-            print("❌ Formato inválido para bateria!")
-            return
+            m_falhas.inc("formato_bateria")
+            log.warning("❌ Formato inválido para bateria: %s", payload)
+            return None
         client_id_raw, battery_str = parts
-        client_id = nome_dispositivos.get(client_id_raw, client_id_raw)
+        client_id = catalogo_atual.nome_dispositivo(client_id_raw)
 
         # Converte o nível de bateria para inteiro
         try:
             battery = int(battery_str)
         except ValueError:
-            print("⚠️ Nível de bateria inválido:", battery_str)
-            return
+            m_falhas.inc("bateria_invalida")
+            log.warning("⚠️ Nível de bateria inválido: %s", battery_str)
+            return None
+        return ("bateria", client_id_raw, client_id, battery, current_time, recebido_em)
+
+    # 🧭 Varredura com o RSSI de vários APs: "ESP32C6_<id>|bssid=rssi;bssid=rssi;..."
+    elif topic == "esp32/scan":
+        client_id_raw, separador, texto_leituras = payload.partition("|")
+        try:
+            if not separador:
+                raise ValueError("sem '|'")
+            leituras = interpretar_varredura(texto_leituras)
+        except ValueError:
+            m_falhas.inc("formato_scan")
+            log.warning("❌ Formato inválido para scan: %s", payload)
+            return None
+        client_id = catalogo_atual.nome_dispositivo(client_id_raw)
+
+        # Mantém só os APs do catálogo, já com o BSSID normalizado
+        varredura = {}
+        for bssid, rssi in leituras:
+            ap = catalogo_atual.ap_por_bssid(bssid)
+            if ap is not None:
+                varredura[ap["bssid"]] = rssi
+        if not varredura:
+            m_bssid_desconhecido.inc()
+            log.warning("❌ Nenhum BSSID conhecido na varredura: %s", payload)
+            return None
+        return ("scan", client_id_raw, client_id, varredura, current_time, recebido_em)
 
-        # Atualiza informações do ESP
-        esp = get_esp(client_id)
-        esp["bateria"] = battery
-        esp["last_seen"] = current_time
-        print(f"🔋 Bateria atualizada para {client_id}: {battery}%")
+    m_falhas.inc("topico_desconhecido")
+    return None
 
-    # 💾 Salva os dados atualizados no arquivo JSON
-    with open(data_file, "w") as f:
-        json.dump(connected_esps, f, indent=2)
+# Aplica um registro do diário ao estado, com trava_estado (o mesmo caminho na ingestão e na recuperação).
+# Devolve True quando o registro muda a localização (e deve ir para o histórico e a ocupação).
+def aplicar_registro(registro):
+    tipo, client_id, instante, valor = registro[:4]
+    esp = get_esp(client_id)
+    if esp.last_seen_ts is None or instante > esp.last_seen_ts:
+        esp.last_seen_ts = instante
+    if tipo == "bssid":
+        # BSSID do mesmo ciclo de uma varredura (ou mais antigo que ela): a posição por RSSI prevalece
+        if esp.scan_ts is not None and instante < esp.scan_ts + segundos_varredura_valida:
+            return False
+        esp.bssid = valor   # Referência à tabela de APs, sem copiar o dict do AP
+        esp.coord = None    # Sem varredura a posição volta a ser a do AP
+        return True
+    elif tipo == "posicao":
+        if valor is None or (esp.scan_ts is not None and instante < esp.scan_ts):
+            return False
+        esp.bssid = valor                     # AP mais forte da varredura
+        esp.coord = (registro[4], registro[5])  # Posição estimada pelo RSSI
+        esp.scan_ts = instante
+        return True
+    else:
+        esp.bateria = valor
+        # Nível suavizado, consumo e previsão de esgotamento (O(1) por leitura)
+        if esp.estimador_bateria is None:
+            esp.estimador_bateria = EstimadorBateria()
+        esp.estimador_bateria.atualizar(instante, valor)
+        return False
 
-# 🔧 Configura e inicia o cliente MQTT
+# 🗂️ Aplica um lote de eventos já validados ao estado (roda na thread de estado do pipeline)
+def aplicar_eventos(eventos):
+    # 🧭 Localiza de uma vez todas as varreduras do lote (fora da trava do estado)
+    posicoes = {}
+    indices_scan = [i for i, evento in enumerate(eventos) if evento[0] == "scan"]
+    if indices_scan:
+        with m_latencia.medir("posicionamento"):
+            coords, bssids = motor_posicionamento.localizar([eventos[i][3] for i in indices_scan])
+        for i, (lat, lon), bssid in zip(indices_scan, coords.tolist(), bssids):
+            posicoes[i] = ((round(lat, 6), round(lon, 6)), bssid)
+
+    # Registros do diário: o que cada evento muda no estado, já com a posição das varreduras
+    registros = []
+    for i, (tipo, client_id_raw, client_id, valor, current_time, recebido_em) in enumerate(eventos):
+        if tipo == "scan":
+            coord, bssid = posicoes[i]
+            # Varredura sem AP conhecido só atualiza o last_seen
+            registros.append(("posicao", client_id, recebido_em, bssid) + (coord if bssid is not None else ()))
+        else:
+            registros.append((tipo, client_id, recebido_em, valor))
+
+    with m_latencia.medir("aplicacao_lote"), trava_estado:
+        localizou = [aplicar_registro(registro) for registro in registros]
+        diario.registrar_lote(registros)
+
+    # Presença: volta para conectado (o status é gravado por ao_mudar_presenca)
+    motor_presenca.registrar_lote([(evento[2], evento[5]) for evento in eventos])
+
+    # Histórico no banco, ocupação e logs fora da trava do estado
+    agora = time.time()
+    aps = catalogo.atual.por_bssid
+    leituras_ocupacao = []
+    for i, (tipo, client_id_raw, client_id, valor, current_time, recebido_em) in enumerate(eventos):
+        m_latencia.observar(agora - recebido_em, "ponta_a_ponta")
+        if tipo == "bssid":
+            if localizou[i]:   # Uma localização por ciclo: o BSSID que acompanha uma varredura é ignorado
+                gravador_banco.registrar_localizacao(current_time, client_id_raw, valor, categoria_de(client_id))
+                leituras_ocupacao.append((client_id, valor, recebido_em))
+                log.info("✅ %s conectado ao %s em %s", client_id, aps[valor]["id"] if valor in aps else valor, current_time)
+        elif tipo == "scan":
+            coord, bssid = posicoes[i]
+            if localizou[i]:
+                gravador_banco.registrar_localizacao(current_time, client_id_raw, bssid, categoria_de(client_id))
+                leituras_ocupacao.append((client_id, bssid, recebido_em))
+                log.debug("🧭 %s localizado em %s (AP mais forte %s)", client_id, coord, bssid)
+        else:
+            gravador_banco.registrar_bateria(current_time, client_id_raw, valor)
+            log.info("🔋 Bateria atualizada para %s: %s%%", client_id, valor)
+
+    if leituras_ocupacao:
+        agregador_ocupacao.registrar_lote(leituras_ocupacao)
+
+    # 💾 Apenas marca as alterações; a gravação do JSON é feita em segundo plano
+    persistencia.marcar_alteracao(len(eventos))
+
+# Pipeline: o loop de rede só enfileira, os trabalhadores interpretam e uma thread aplica ao estado.
+# As mensagens de um dispositivo passam sempre pelo mesmo trabalhador e chegam ao estado em ordem.
+pipeline = PipelineIngestao(
+    interpretar_mensagem,
+    aplicar_eventos,
+    trabalhadores=trabalhadores_ingestao,
+    tamanho_fila=tamanho_fila_ingestao,
+    chave=client_id_do_payload,
+)
+
+# Métricas lidas na hora da consulta: filas e descartes
+metricas.medidor("ingestao_fila_entrada", "Mensagens aguardando interpretação", pipeline.tamanho_fila_entrada)
+metricas.medidor("ingestao_fila_estado", "Eventos aguardando aplicação ao estado", pipeline.fila_estado.qsize)
+metricas.contador_calculado("ingestao_descartes_total", "Mensagens descartadas com a fila de entrada cheia", lambda: pipeline.descartados_entrada)
+metricas.contador_calculado("ingestao_esperas_contrapressao_total", "Esperas por espaço na fila de estado", lambda: pipeline.esperas_contrapressao)
+metricas.medidor("banco_fila", "Eventos aguardando gravação no banco", gravador_banco.fila.qsize)
+metricas.contador_calculado("banco_descartes_total", "Eventos descartados com a fila do banco cheia", lambda: gravador_banco.descartados)
+metricas.contador_calculado("historico_leituras_total", "Leituras de localização recebidas pelo compactador", lambda: compactador_historico.recebidas)
+metricas.contador_calculado("historico_gravadas_total", "Leituras de localização liberadas para o banco", lambda: compactador_historico.gravadas)
+metricas.medidor("ocupacao_agentes_presentes", "Agentes contados na ocupação das estações", lambda: sum(agregador_ocupacao.ocupacao_atual().values()))
+metricas.contador_calculado("diario_registros_total", "Registros gravados no diário com fsync", lambda: diario.gravados)
+metricas.contador_calculado("diario_fsyncs_total", "fsync em grupo do diário", lambda: diario.fsyncs)
+metricas.medidor("diario_segmentos", "Segmentos do diário em disco", lambda: len(diario.segmentos()))
+metricas.medidor("dispositivos_registrados", "Dispositivos no registro", lambda: len(registro_esps))
+for _situacao in situacoes:
+    metricas.medidor(f"presenca_dispositivos_{_situacao}", f"Dispositivos na situação {_situacao}",
+                     lambda situacao=_situacao: motor_presenca.contagem()[situacao])
+metricas.medidor("catalogo_aps", "APs no catálogo atual", lambda: len(catalogo.atual.aps))
+metricas.contador_calculado("catalogo_recargas_total", "Recargas do catálogo desde a partida", lambda: catalogo.recargas)
+
+# Função chamada quando uma mensagem MQTT é recebida: só guarda a mensagem bruta na fila
+# (com o tópico recebido: a interpretação precisa saber se ele veio com fatia)
+def on_message(client, userdata, message):
+    topico = topico_sem_fatia(message.topic)
+    m_mensagens.inc(topico)
+    m_taxa.inc(topico)
+    pipeline.enfileirar(message.topic, message.payload)
+
+# ♻️ Refaz o estado na partida: último snapshot gravado + registros do diário depois dele
+def restaurar_estado():
+    inicio = time.monotonic()
+    dados = {}
+    if os.path.exists(data_file):
+        try:
+            with open(data_file, "r") as f:
+                dados = json.load(f)
+        except (OSError, ValueError) as e:
+            log.warning("⚠️ Snapshot %s ilegível, refazendo só pelo diário: %s", data_file, e)
+    seq = dados.get("seq_diario", 0) if isinstance(dados, dict) else 0
+    diario.continuar_depois_de(seq)
+    with trava_estado:
+        quantidade = registro_esps.restaurar(dados)
+        reproduzidos = 0
+        for _, registro in diario.reproduzir(seq):
+            aplicar_registro(registro)
+            reproduzidos += 1
+        vistos = [(esp.client_id, esp.last_seen_ts) for esp in registro_esps if esp.last_seen_ts is not None]
+    motor_presenca.registrar_lote(vistos)
+    if quantidade or reproduzidos:
+        log.info("♻️ %d dispositivos do snapshot e %d registros do diário em %.2fs (%d dispositivos)",
+                 quantidade, reproduzidos, time.monotonic() - inicio, len(registro_esps))
+    if reproduzidos:
+        persistencia.marcar_alteracao(reproduzidos)   # Novo snapshot já com o trecho reproduzido
+
+# 🔧 Configura o cliente MQTT
 client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
 client.on_message = on_message
-client.connect("localhost", 1883)          # Conecta ao broker MQTT local
-client.subscribe("esp32/bssid")            # Inscreve para receber mensagens de localização
-client.subscribe("esp32/battery")          # Inscreve para receber mensagens de bateria
-client.loop_forever()                      # Mantém a conexão ativa e processa mensagens
+
+# 🚀 Conecta ao broker e inicia todos os estágios
+def main():
+    restaurar_estado()                         # Retoma os dispositivos do último snapshot e do diário
+    client.connect("localhost", 1883)          # Conecta ao broker MQTT local
+    # Localização (BSSID), bateria e varreduras com RSSI; em vários processos, só as fatias desta partição
+    # (e, na partição 0, também os tópicos sem fatia do firmware antigo)
+    client.subscribe([(topico, 0) for topico in assinaturas(topicos_esp, particao, total_particoes)])
+    diario.iniciar()                           # Inicia a gravação do diário (fsync em grupo)
+    persistencia.iniciar()                     # Inicia a gravação do JSON em segundo plano
+    gravador_banco.iniciar()                   # Inicia a gravação do histórico no banco
+    pipeline.iniciar()                         # Inicia os trabalhadores e a thread de estado
+    catalogo.iniciar()                         # Passa a verificar alterações no catálogo
+    motor_presenca.iniciar()                   # Passa a avisar as mudanças de presença nos prazos
+    parar_ocupacao = iniciar_consolidacao_ocupacao(
+        agregador_ocupacao, pool_banco, intervalo_ocupacao, gravar=gravar_ocupacao
+    )
+    if particao == 0:
+        # A compactação trabalha no banco inteiro: com vários processos, só a partição 0 a executa
+        parar_compactacao = iniciar_compactacao_periodica(
+            pool_banco,
+            reter=datetime.timedelta(days=dias_historico_bruto),
+            intervalo=intervalo_compactacao_historico,
+            heartbeat=intervalo_heartbeat_historico,
+        )
+    else:
+        parar_compactacao = threading.Event()
+    servidor_metricas = iniciar_servidor_metricas(metricas, metricas_porta)
+    log.info("📊 Métricas em http://127.0.0.1:%s/metrics", metricas_porta)
+    try:
+        client.loop_forever()                  # Mantém a conexão ativa e processa mensagens
+    except KeyboardInterrupt:
+        log.info("⏹️ Encerrando servidor MQTT...")
+    finally:
+        client.disconnect()
+        catalogo.encerrar()
+        motor_presenca.encerrar()
+        parar_compactacao.set()
+        parar_ocupacao.set()
+        servidor_metricas.shutdown()
+        pipeline.encerrar()                    # Processa o que ainda está nas filas
+        log.info("📊 Pipeline: %s", pipeline.estatisticas())
+        persistencia.encerrar()                # Grava as alterações pendentes antes de sair
+        diario.encerrar()
+        agregador_ocupacao.consolidar(time.time())
+        gravar_alterados(agregador_ocupacao, pool_banco, gravar_ocupacao)
+        gravador_banco.encerrar()              # Grava os eventos que ainda estão na fila
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+import argparse
+import math
+import random
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+from catalogo import ler_catalogo_arquivo
+from ingestao_distribuida import fatia_de, topico_da_fatia
+
+# Tópicos e formato publicados pelo firmware (codigo_esp/esp_programacao.ino), que os envia na
+# fatia do dispositivo: esp32/<id % 64>/bssid etc.
+topico_bssid = "esp32/bssid"
+topico_bateria = "esp32/battery"
+prefixo_client_id = "ESP32C6_"
+
+# Intervalo de envio do firmware (scanInterval = 10 s)
+intervalo_envio_padrao = 10.0
+
+# Padrões de deslocamento entre os APs
+padroes_roaming = ("fixo", "linha", "aleatorio")
+
+# Modelo de sinal usado no modo varredura (esp32/scan)
+topico_varredura = "esp32/scan"
+rssi_1m = -30.0            # RSSI a 1 metro do AP
+expoente_perda_sim = 2.5   # Expoente de perda de percurso
+ruido_rssi = 3.0           # Desvio padrão do ruído (dB)
+rssi_minimo = -90.0        # APs mais fracos que isso não aparecem na varredura
+max_aps_varredura = 8      # Igual ao firmware (maxAPsScan)
+afastamento_max_graus = 0.0015  # Afastamento máximo do agente em relação ao AP (~150 m)
+
+
+# 🤖 Estado de um ESP32-C6 virtual
+class AgenteVirtual:
+    __slots__ = ("client_id", "topicos", "indice_ap", "sentido", "bateria", "proximo_envio")
+
+    def __init__(self, client_id, indice_ap, bateria, proximo_envio):
+        self.client_id = client_id
+        fatia = fatia_de(client_id)
+        self.topicos = {topico: topico_da_fatia(topico, fatia) for topico in (topico_bssid, topico_bateria, topico_varredura)}
+        self.indice_ap = indice_ap
+        self.sentido = 1              # Sentido do deslocamento ao longo da linha (+1 ou -1)
+        self.bateria = bateria        # Nível em % (float; o firmware envia inteiro)
+        self.proximo_envio = proximo_envio
+
+
+# 🔹 Frota de agentes virtuais que gera as mesmas mensagens do firmware
+class SimuladorFrota:
+    """
+    Cada agente envia a cada 'intervalo_envio' segundos o par de mensagens do
+    firmware: "ESP32C6_<id>|<bssid>" em esp32/<fatia>/bssid e
+    "ESP32C6_<id>|<bateria>" em esp32/<fatia>/battery. Os envios começam com
+    fases aleatórias (como ESPs ligados em momentos diferentes).
+
+    Com 'varredura=True' a mensagem de BSSID é trocada pela de esp32/scan
+    ("ESP32C6_<id>|bssid=rssi;..."), com RSSI calculado por um modelo de
+    perda de percurso a partir de uma posição próxima ao AP atual.
+
+    Antes de cada envio o agente pode trocar de AP ('prob_troca_ap'):
+      - "fixo": nunca troca;
+      - "linha": vai para o AP vizinho, na ordem da linha, e volta no fim;
+      - "aleatorio": salta para qualquer AP.
+
+    A geração não depende do broker: gerar_mensagens() é usada tanto pelo
+    publicador MQTT quanto pelo benchmark, que injeta as mensagens direto no
+    servidor.
+    """
+
+    def __init__(self, quantidade, bssids=None, intervalo_envio=intervalo_envio_padrao, padrao="linha",
+                 prob_troca_ap=0.2, consumo_bateria=0.05, primeiro_id=1, semente=None, varredura=False):
+        if padrao not in padroes_roaming:
+            raise ValueError(f"Padrão de roaming inválido: {padrao} (use {', '.join(padroes_roaming)})")
+        # Sem lista explícita usa os APs do catálogo, na ordem da linha
+        if bssids is None:
+            aps = ler_catalogo_arquivo().aps
+            self.bssids = [ap["bssid"] for ap in aps]
+            self.coords = [ap["coord"] for ap in aps]
+        else:
+            self.bssids = list(bssids)
+            self.coords = None
+        if varredura and self.coords is None:
+            raise ValueError("O modo varredura precisa das coordenadas dos APs do catálogo")
+        self.varredura = varredura
+        self.intervalo_envio = intervalo_envio
+        self.padrao = padrao
+        self.prob_troca_ap = prob_troca_ap
+        self.consumo_bateria = consumo_bateria   # Pontos percentuais por envio
+        self.aleatorio = random.Random(semente)
+
+        agora = time.monotonic()
+        self.agentes = [
+            AgenteVirtual(
+                f"{prefixo_client_id}{primeiro_id + i}",
+                self.aleatorio.randrange(len(self.bssids)),
+                self.aleatorio.uniform(40, 100),
+                agora + self.aleatorio.uniform(0, intervalo_envio),
+            )
+            for i in range(quantidade)
+        ]
+
+    def __len__(self):
+        return len(self.agentes)
+
+    # Move o agente de acordo com o padrão de roaming
+    def _mover(self, agente):
+        if self.padrao == "fixo" or self.aleatorio.random() >= self.prob_troca_ap:
+            return
+        if self.padrao == "aleatorio":
+            agente.indice_ap = self.aleatorio.randrange(len(self.bssids))
+            return
+        proximo = agente.indice_ap + agente.sentido
+        if not 0 <= proximo < len(self.bssids):
+            agente.sentido = -agente.sentido
+            proximo = agente.indice_ap + agente.sentido
+        agente.indice_ap = max(0, min(proximo, len(self.bssids) - 1))
+
+    # Varredura simulada: RSSI de cada AP visto de um ponto próximo ao AP atual
+    def _payload_varredura(self, agente):
+        lat0, lon0 = self.coords[agente.indice_ap]
+        lat = lat0 + self.aleatorio.uniform(-afastamento_max_graus, afastamento_max_graus)
+        lon = lon0 + self.aleatorio.uniform(-afastamento_max_graus, afastamento_max_graus)
+        leituras = []
+        for bssid, (lat_ap, lon_ap) in zip(self.bssids, self.coords):
+            # Distância plana aproximada (suficiente para poucos quilômetros)
+            dy = (lat - lat_ap) * 111320.0
+            dx = (lon - lon_ap) * 111320.0 * math.cos(math.radians(lat))
+            distancia = max(1.0, math.hypot(dx, dy))
+            rssi = rssi_1m - 10 * expoente_perda_sim * math.log10(distancia) + self.aleatorio.gauss(0, ruido_rssi)
+            if rssi >= rssi_minimo or bssid == self.bssids[agente.indice_ap]:
+                leituras.append((rssi, bssid))
+        leituras.sort(reverse=True)
+        return ";".join(f"{bssid}={int(rssi)}" for rssi, bssid in leituras[:max_aps_varredura])
+
+    # Par de mensagens (tópico, payload) de um envio do agente
+    def _mensagens(self, agente):
+        self._mover(agente)
+        agente.bateria = max(0.0, agente.bateria - self.consumo_bateria)
+        if self.varredura:
+            localizacao = (agente.topicos[topico_varredura], f"{agente.client_id}|{self._payload_varredura(agente)}".encode())
+        else:
+            localizacao = (agente.topicos[topico_bssid], f"{agente.client_id}|{self.bssids[agente.indice_ap]}".encode())
+        return [
+            localizacao,
+            (agente.topicos[topico_bateria], f"{agente.client_id}|{int(agente.bateria)}".encode()),
+        ]
+
+    # Mensagens dos agentes cujo próximo envio já venceu
+    def gerar_mensagens(self, agora=None):
+        agora = time.monotonic() if agora is None else agora
+        mensagens = []
+        for agente in self.agentes:
+            if agente.proximo_envio <= agora:
+                mensagens.extend(self._mensagens(agente))
+                agente.proximo_envio += self.intervalo_envio
+                if agente.proximo_envio <= agora:
+                    # Laço atrasado: retoma a cadência a partir de agora, sem acumular envios
+                    agente.proximo_envio = agora + self.intervalo_envio
+        return mensagens
+
+    # Um envio de todos os agentes de uma vez (usado pelo benchmark)
+    def rodada(self):
+        mensagens = []
+        for agente in self.agentes:
+            mensagens.extend(self._mensagens(agente))
+        return mensagens
+
+    # 🌩️ Tempestade de reconexão: todos enviam juntos e passam a ter a mesma fase
+    def tempestade_reconexao(self, agora=None):
+        """
+        Reproduz a volta do broker ou do Wi-Fi depois de uma queda: todos os
+        ESPs reconectam ao mesmo tempo, enviam imediatamente e, como o
+        firmware reinicia a contagem do intervalo, continuam sincronizados
+        (rajadas de 'quantidade' x 2 mensagens a cada intervalo).
+        """
+        agora = time.monotonic() if agora is None else agora
+        mensagens = self.rodada()
+        for agente in self.agentes:
+            agente.proximo_envio = agora + self.intervalo_envio
+        return mensagens
+
+
+# 📤 Publica as mensagens da frota em um broker usando um conjunto de conexões MQTT
+class PublicadorMQTT:
+    """
+    Uma conexão por agente não escala para milhares de agentes em uma única
+    máquina; as mensagens são distribuídas entre 'conexoes' clientes paho
+    (cada agente sempre usa a mesma conexão, preservando a ordem das suas
+    mensagens).
+    """
+
+    def __init__(self, host="localhost", porta=1883, conexoes=4):
+        self.host = host
+        self.porta = porta
+        self.publicadas = 0
+        self.clientes = []
+        for i in range(conexoes):
+            cliente = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=f"simulador_frota_{i}")
+            cliente.max_queued_messages_set(0)   # Sem limite: a contrapressão fica no broker
+            self.clientes.append(cliente)
+
+    def conectar(self):
+        for cliente in self.clientes:
+            cliente.connect(self.host, self.porta)
+            cliente.loop_start()
+
+    def desconectar(self):
+        for cliente in self.clientes:
+            cliente.disconnect()
+            cliente.loop_stop()
+
+    # Derruba e refaz todas as conexões ao mesmo tempo
+    def reconectar(self):
+        self.desconectar()
+        self.conectar()
+
+    def publicar(self, mensagens):
+        total = len(self.clientes)
+        for topico, payload in mensagens:
+            # O client_id vem antes do "|": o mesmo agente sempre cai na mesma conexão
+            indice = hash(payload.split(b"|", 1)[0]) % total
+            self.clientes[indice].publish(topico, payload, qos=0)
+        self.publicadas += len(mensagens)
+
+
+# ▶️ Roda a frota contra o broker por 'duracao' segundos
+def executar(simulador, publicador, duracao=60.0, intervalo_tempestade=None, passo=0.05, parar=None):
+    parar = parar or threading.Event()
+    inicio = time.monotonic()
+    proxima_tempestade = inicio + intervalo_tempestade if intervalo_tempestade else None
+    ultimo_relatorio = inicio
+    publicadas_relatorio = 0
+
+    while not parar.is_set():
+        agora = time.monotonic()
+        if duracao and agora - inicio >= duracao:
+            break
+        if proxima_tempestade is not None and agora >= proxima_tempestade:
+            print(f"🌩️ Tempestade de reconexão: {len(simulador)} agentes")
+            publicador.reconectar()
+            publicador.publicar(simulador.tempestade_reconexao(agora))
+            proxima_tempestade = agora + intervalo_tempestade
+        else:
+            publicador.publicar(simulador.gerar_mensagens(agora))
+
+        if agora - ultimo_relatorio >= 5:
+            taxa = (publicador.publicadas - publicadas_relatorio) / (agora - ultimo_relatorio)
+            print(f"📤 {publicador.publicadas} mensagens publicadas ({taxa:.0f}/s)")
+            ultimo_relatorio, publicadas_relatorio = agora, publicador.publicadas
+        parar.wait(passo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simula uma frota de ESP32-C6 publicando no broker MQTT")
+    parser.add_argument("--agentes", type=int, default=100, help="Quantidade de agentes virtuais")
+    parser.add_argument("--primeiro-id", type=int, default=1000, help="ID do primeiro agente (ESP32C6_<id>)")
+    parser.add_argument("--intervalo", type=float, default=intervalo_envio_padrao, help="Segundos entre envios de cada agente")
+    parser.add_argument("--padrao", choices=padroes_roaming, default="linha", help="Padrão de deslocamento entre APs")
+    parser.add_argument("--prob-troca", type=float, default=0.2, help="Probabilidade de trocar de AP a cada envio")
+    parser.add_argument("--varredura", action="store_true", help="Envia varreduras com RSSI (esp32/scan) em vez do BSSID")
+    parser.add_argument("--tempestade", type=float, default=None, help="Segundos entre tempestades de reconexão")
+    parser.add_argument("--duracao", type=float, default=60.0, help="Duração da simulação em segundos (0 = sem fim)")
+    parser.add_argument("--conexoes", type=int, default=4, help="Conexões MQTT usadas para publicar")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--porta", type=int, default=1883)
+    args = parser.parse_args()
+
+    simulador = SimuladorFrota(args.agentes, intervalo_envio=args.intervalo, padrao=args.padrao,
+                               prob_troca_ap=args.prob_troca, primeiro_id=args.primeiro_id, varredura=args.varredura)
+    publicador = PublicadorMQTT(args.host, args.porta, args.conexoes)
+    publicador.conectar()
+    print(f"🚀 Simulando {args.agentes} agentes ({args.padrao}, envio a cada {args.intervalo:g} s)")
+    try:
+        executar(simulador, publicador, args.duracao, args.tempestade)
+    except KeyboardInterrupt:
+        print("⏹️ Encerrando simulação...")
+    finally:
+        publicador.desconectar()
+        print(f"✅ Total publicado: {publicador.publicadas} mensagens")
+
+
+if __name__ == "__main__":
+    main()
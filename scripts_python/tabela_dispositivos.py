@@ -0,0 +1,141 @@
+from collections import OrderedDict
+from itertools import takewhile
+
+from bateria import minutos_restantes
+from presenca import segundos_ativo, segundos_conectado, situacao_presenca
+
+# Rótulos do status exibidos na tabela
+rotulos_status = {"conectado": "🟢 Conectado", "ativo": "🟡 Ativo", "inativo": "⚪ Inativo"}
+
+# Ordenações guardadas por versão do snapshot (cada sessão pode ordenar por uma coluna diferente)
+tamanho_cache_ordens = 16
+
+
+# Status calculado pela última mensagem no instante da consulta (o gravado no snapshot pode estar velho)
+def status_dispositivo(esp, agora):
+    return situacao_presenca(esp["last_seen_ts"], agora, segundos_conectado, segundos_ativo)
+
+
+# Chaves de ordenação de cada coluna (status ordena pela última mensagem: mais recente = mais conectado)
+def _chave_ordenacao(coluna):
+    if coluna == "bateria":
+        return lambda e: (e.get("bateria") is None, e.get("bateria") or 0)
+    if coluna in ("status", "ultima"):
+        return lambda e: -e["last_seen_ts"]
+    if coluna == "acaba":
+        return lambda e: (e.get("esgotamento_ts") is None, e.get("esgotamento_ts") or 0)
+    if coluna == "ap":
+        return lambda e: e["ap"]["nome"]
+    if coluna == "categoria":
+        return lambda e: e.get("categoria") or ""
+    return lambda e: e["client_id"]
+
+
+# 📋 Consulta paginada da lista de dispositivos, feita no servidor
+class ConsultaDispositivos:
+    """
+    O navegador recebe só a página visível da tabela. Busca (client_id ou
+    nome do AP), filtros por status, categoria, estação e previsão de fim da
+    bateria e a ordenação são aplicados aqui sobre o snapshot compartilhado
+    do CacheEstado.
+
+    A ordem de cada coluna é calculada uma vez por versão do snapshot e
+    reaproveitada por todas as sessões; cada consulta só percorre essa ordem
+    aplicando os filtros e corta a página pedida.
+    """
+
+    def __init__(self, sem_categoria=None):
+        # Categoria do snapshot que significa "sem categoria" (mostrada vazia na tabela)
+        self.sem_categoria = sem_categoria
+        self._ordens = OrderedDict()   # (versao, coluna, decrescente) -> tupla de registros
+
+    def _ordenados(self, snapshot, coluna, decrescente):
+        chave = (snapshot.versao, coluna, decrescente)
+        ordem = self._ordens.get(chave)
+        if ordem is None:
+            ordem = tuple(sorted(snapshot.esps, key=_chave_ordenacao(coluna), reverse=decrescente))
+            self._ordens[chave] = ordem
+            while len(self._ordens) > tamanho_cache_ordens:
+                self._ordens.popitem(last=False)
+        else:
+            self._ordens.move_to_end(chave)
+        return ordem
+
+    # Devolve (linhas da página, total de dispositivos que passam nos filtros)
+    def consultar(self, snapshot, agora, busca=None, status=None, categoria=None, estacao=None,
+                  acaba_em=None, ordenacao=None, pagina=0, tamanho=20):
+        """
+        ordenacao: lista no formato sort_by do DataTable ([{"column_id", "direction"}]);
+        só a primeira coluna é usada. acaba_em: só os dispositivos com bateria
+        prevista para acabar nesses minutos.
+        """
+        limite_esgotamento = agora + acaba_em * 60 if acaba_em else None
+        coluna, decrescente = "client_id", False
+        if ordenacao:
+            coluna = ordenacao[0]["column_id"]
+            decrescente = ordenacao[0]["direction"] == "desc"
+        busca = (busca or "").strip().lower()
+
+        inicio = pagina * tamanho
+        total = 0
+        pagina_atual = []
+        for esp in self._ordenados(snapshot, coluna, decrescente):
+            if categoria and esp.get("categoria") != categoria:
+                continue
+            if estacao and esp["ap"]["nome"] != estacao:
+                continue
+            if busca and busca not in esp["client_id"].lower() and busca not in esp["ap"]["nome"].lower():
+                continue
+            if limite_esgotamento is not None and (esp.get("esgotamento_ts") is None or esp["esgotamento_ts"] > limite_esgotamento):
+                continue
+            situacao = status_dispositivo(esp, agora)
+            if status and situacao != status:
+                continue
+            if inicio <= total < inicio + tamanho:
+                pagina_atual.append(self._linha(esp, situacao, agora))
+            total += 1
+        return pagina_atual, total
+
+    # 🔋 Dispositivos com bateria prevista para acabar em 'minutos' (do que acaba antes ao que acaba depois)
+    def esgotando(self, snapshot, agora, minutos):
+        """
+        Usa a ordem por previsão de esgotamento já guardada para a versão do
+        snapshot: percorre só os dispositivos que entram no resultado.
+        """
+        limite = agora + minutos * 60
+        return list(takewhile(
+            lambda e: e.get("esgotamento_ts") is not None and e["esgotamento_ts"] <= limite,
+            self._ordenados(snapshot, "acaba", False),
+        ))
+
+    def _linha(self, esp, situacao, agora):
+        categoria = esp.get("categoria")
+        return {
+            "id": esp["client_id"],
+            "client_id": esp["client_id"],
+            "categoria": None if categoria == self.sem_categoria else categoria,
+            "ap": esp["ap"]["nome"],
+            "bateria": esp.get("bateria"),
+            "status": rotulos_status[situacao],
+            "ultima": esp["last_seen_formatado"],
+            "acaba": _texto_restante(minutos_restantes(esp, agora)),
+        }
+
+
+# Tempo até acabar a bateria em texto curto ("45 min", "3h10"); vazio sem previsão
+def _texto_restante(minutos):
+    if minutos is None:
+        return ""
+    if minutos < 60:
+        return f"{minutos:.0f} min"
+    return f"{int(minutos // 60)}h{int(minutos % 60):02d}"
+
+
+# Categorias alteradas pelo usuário entre duas versões da página ({client_id: categoria})
+def diferenca_categorias(linhas, linhas_anteriores):
+    anteriores = {linha["client_id"]: linha.get("categoria") for linha in linhas_anteriores or ()}
+    return {
+        linha["client_id"]: linha["categoria"]
+        for linha in linhas or ()
+        if linha.get("categoria") and linha["client_id"] in anteriores and anteriores[linha["client_id"]] != linha["categoria"]
+    }
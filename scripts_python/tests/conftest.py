@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Os scripts ficam soltos em scripts_python/ (sem pacote): os testes os importam pelo nome do módulo
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
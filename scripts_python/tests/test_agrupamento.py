@@ -0,0 +1,49 @@
+import agrupamento
+from agrupamento import agrupar_marcadores, zoom_maximo
+
+
+def _agente(client_id, coord, categoria="manutencao"):
+    return coord, {"id": client_id, "tooltip": client_id, "cor": "green", "icone": "user", "categoria": categoria}
+
+
+def _estacao(coord):
+    return coord, {"id": "estacao:Sé", "tooltip": "Sé", "cor": "gray", "icone": "train"}
+
+
+def test_agentes_na_mesma_celula_viram_um_grupo():
+    elementos = [
+        _estacao((-23.55, -46.63)),
+        _agente("A", (-23.55, -46.63)),
+        _agente("B", (-23.55, -46.63), "seguranca"),
+        _agente("C", (-23.60, -46.70)),
+    ]
+    saida = agrupar_marcadores(elementos, zoom=14)
+
+    ids = [dados["id"] for _, dados in saida]
+    assert "estacao:Sé" in ids and "C" in ids
+    (grupo,) = [dados for _, dados in saida if dados["id"].startswith("grupo:14:")]
+    assert grupo["quantidade"] == 2
+    assert "• manutencao: 1" in grupo["tooltip"] and "• seguranca: 1" in grupo["tooltip"]
+
+
+def test_sem_agentes_passa_direto():
+    elementos = [_estacao((-23.55, -46.63))]
+    assert agrupar_marcadores(elementos) == elementos
+
+
+def test_zoom_maior_separa_os_agentes():
+    elementos = [_agente("A", (-23.5500, -46.6300)), _agente("B", (-23.5520, -46.6320))]
+    assert len(agrupar_marcadores(elementos, zoom=8)) == 1
+    assert len(agrupar_marcadores(elementos, zoom=zoom_maximo)) == 2
+
+
+def test_grupo_expandido_no_zoom_maximo(monkeypatch):
+    monkeypatch.setattr(agrupamento, "limite_expansao", 2)
+    elementos = [_agente(c, (-23.55, -46.63)) for c in "ABC"]
+    (_, grupo), = agrupar_marcadores(elementos, zoom=zoom_maximo)
+
+    saida = agrupar_marcadores(elementos, zoom=zoom_maximo, expandido=grupo["id"])
+    ids = [dados["id"] for _, dados in saida]
+    assert ids[:2] == ["A", "B"]
+    assert ids[2] == grupo["id"] + ":restantes"
+    assert saida[2][1]["quantidade"] == 1
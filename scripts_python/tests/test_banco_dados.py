@@ -0,0 +1,68 @@
+import pytest
+
+from banco_dados import GravadorBanco, criar_pool_sqlite, id_numerico_dispositivo
+
+tabela_aps = {"aa:aa": {"nome": "Sé", "coord": [-23.55, -46.63]}, "bb:bb": {"nome": "Luz", "coord": [-23.53, -46.63]}}
+
+
+@pytest.fixture
+def pool(tmp_path):
+    return criar_pool_sqlite(str(tmp_path / "historico.db"))
+
+
+def _contar(pool, tabela):
+    with pool.conexao() as con:
+        return con.execute(f"SELECT COUNT(*) FROM {tabela}").fetchone()[0]
+
+
+def test_id_numerico_dispositivo():
+    assert id_numerico_dispositivo("ESP32C6_42") == 42
+    assert id_numerico_dispositivo("sem_numero") == id_numerico_dispositivo("sem_numero") >= 0
+
+
+def test_grava_em_lotes_do_tamanho_configurado(pool):
+    gravador = GravadorBanco(pool, tamanho_lote=3, intervalo=60)
+    gravador.sincronizar_aps(tabela_aps)
+    for i in range(5):
+        gravador.registrar_localizacao("2024-05-01 10:00:00", f"ESP32C6_{i}", "aa:aa", "manutencao")
+    gravador.registrar_bateria("2024-05-01 10:00:00", "ESP32C6_0", 80)
+    gravador.registrar_bateria("2024-05-01 10:00:01", "ESP32C6_0", 79)
+
+    # Tudo já na fila ao iniciar: lotes de 3, 3 e 1 (o último fechado pelo encerramento)
+    gravador.iniciar().encerrar()
+    assert gravador.lotes == 3
+    assert gravador.gravados == 7
+    assert _contar(pool, "informacoes_geolocalizacao") == 5
+    assert _contar(pool, "informacoes_bateria") == 2
+    assert _contar(pool, "estoque_dispositivos") == 5
+    assert _contar(pool, "tipo_de_funcionario") == 1
+
+
+def test_ap_nao_cadastrado_e_ignorado(pool):
+    gravador = GravadorBanco(pool)
+    gravador.sincronizar_aps(tabela_aps)
+    gravador.gravar_lote([("localizacao", "2024-05-01 10:00:00", "ESP32C6_1", "cc:cc", "manutencao")])
+    assert gravador.gravados == 0
+    assert _contar(pool, "informacoes_geolocalizacao") == 0
+
+
+def test_fila_cheia_descarta_sem_bloquear(pool):
+    gravador = GravadorBanco(pool, tamanho_fila=2)
+    resultados = [gravador.registrar_bateria("2024-05-01 10:00:00", "ESP32C6_1", n) for n in range(3)]
+    assert resultados == [True, True, False]
+    assert gravador.estatisticas()["descartados"] == 1
+
+
+def test_erro_no_lote_e_contado_e_desfeito(pool):
+    gravador = GravadorBanco(pool)
+    gravador.sincronizar_aps(tabela_aps)
+    # nivel_bateria NOT NULL: a transação inteira é desfeita
+    gravador._gravar_com_tratamento([
+        ("localizacao", "2024-05-01 10:00:00", "ESP32C6_1", "aa:aa", "manutencao"),
+        ("bateria", "2024-05-01 10:00:00", "ESP32C6_1", None),
+    ])
+    assert gravador.erros == 1
+    assert _contar(pool, "informacoes_geolocalizacao") == 0
+
+    gravador.gravar_lote([("localizacao", "2024-05-01 10:00:01", "ESP32C6_1", "aa:aa", "manutencao")])
+    assert _contar(pool, "informacoes_geolocalizacao") == 1
@@ -0,0 +1,72 @@
+import pytest
+
+from bateria import EstimadorBateria, minutos_restantes
+
+
+def _descarregar(estimador, inicio, nivel, leituras, passo=60, queda=1.0):
+    for i in range(leituras):
+        estimador.atualizar(inicio + i * passo, nivel - i * queda)
+    return estimador
+
+
+def test_primeira_leitura_sem_previsao():
+    estimador = EstimadorBateria().atualizar(1000, 80)
+    assert estimador.nivel == 80
+    assert estimador.consumo is None
+    assert estimador.esgotamento_ts is None
+
+
+def test_descarga_linear():
+    estimador = _descarregar(EstimadorBateria(), 1000, 100, 20)   # 1 ponto por minuto
+    assert estimador.consumo == pytest.approx(60, abs=0.01)
+    restante = estimador.esgotamento_ts - estimador.ultimo_ts
+    assert restante == pytest.approx(estimador.nivel * 60)
+
+
+def test_retomar_mantem_a_previsao_gravada():
+    original = _descarregar(EstimadorBateria(), 1000, 100, 20)
+    retomado = EstimadorBateria().retomar(original.ultimo_ts, original.nivel, original.consumo)
+    assert retomado.consumo == pytest.approx(original.consumo, abs=0.01)
+    assert retomado.esgotamento_ts == pytest.approx(original.esgotamento_ts, abs=1)
+
+    # As leituras seguintes continuam a mesma descarga
+    _descarregar(retomado, original.ultimo_ts + 60, original.nivel - 1, 5)
+    assert retomado.consumo == pytest.approx(60, rel=0.05)
+
+
+def test_retomar_sem_consumo():
+    retomado = EstimadorBateria().retomar(1000, 80)
+    assert (retomado.nivel, retomado.consumo, retomado.esgotamento_ts) == (80, None, None)
+    retomado.atualizar(1060, 79)
+    assert retomado.consumo is None
+
+
+def test_poucas_leituras_ou_pouco_espalhamento():
+    assert _descarregar(EstimadorBateria(), 1000, 100, 2).consumo is None
+    assert _descarregar(EstimadorBateria(), 1000, 100, 10, passo=5).consumo is None
+
+
+def test_leitura_fora_de_ordem_ignorada():
+    estimador = _descarregar(EstimadorBateria(), 1000, 100, 10)
+    nivel, ultimo_ts = estimador.nivel, estimador.ultimo_ts
+    estimador.atualizar(ultimo_ts - 30, 0)
+    assert (estimador.nivel, estimador.ultimo_ts) == (nivel, ultimo_ts)
+
+
+def test_recarga_recomeca_a_estimativa():
+    estimador = _descarregar(EstimadorBateria(), 1000, 60, 20)
+    estimador.atualizar(estimador.ultimo_ts + 60, 95)
+    assert estimador.nivel == 95
+    assert estimador.consumo is None
+
+
+def test_nivel_subindo_sem_esgotamento():
+    estimador = _descarregar(EstimadorBateria(), 1000, 50, 10, queda=-0.5)
+    assert estimador.consumo < 0
+    assert estimador.esgotamento_ts is None
+
+
+def test_minutos_restantes():
+    assert minutos_restantes({"esgotamento_ts": None}, 0) is None
+    assert minutos_restantes({"esgotamento_ts": 1200}, 600) == 10
+    assert minutos_restantes({"esgotamento_ts": 600}, 1200) == 0
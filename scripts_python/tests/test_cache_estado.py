@@ -0,0 +1,81 @@
+import datetime
+import itertools
+import json
+import os
+
+from cache_estado import CacheEstado
+
+aps = {"aa:aa": {"id": 1, "nome": "Sé", "coord": [-23.55, -46.63]}}
+
+# mtime sempre diferente, mesmo com regravações no mesmo instante
+_segundos = itertools.count(1)
+
+
+def _gravar(caminho, dispositivos):
+    with open(caminho, "w") as f:
+        json.dump({"aps": aps, "dispositivos": dispositivos}, f)
+    segundo = next(_segundos)
+    os.utime(caminho, (segundo, segundo))
+
+
+def _dispositivo(client_id, last_seen="2024-05-01 10:00:00", bssid="aa:aa", bateria=80):
+    return {"client_id": client_id, "bssid": bssid, "last_seen": last_seen, "bateria": bateria}
+
+
+def test_sem_arquivo_fica_vazio(tmp_path):
+    cache = CacheEstado(str(tmp_path / "dados_esps.json"), {})
+    assert cache.obter().esps == ()
+
+
+def test_le_uma_vez_enquanto_o_arquivo_nao_muda(tmp_path):
+    caminho = tmp_path / "dados_esps.json"
+    _gravar(caminho, [_dispositivo("ESP_1"), _dispositivo("ESP_2", bssid=None)])
+    cache = CacheEstado(str(caminho), {"ESP_1": "seguranca"})
+
+    snapshot = cache.obter()
+    assert cache.obter() is snapshot
+    assert cache.recargas == 1
+
+    (esp,) = snapshot.esps   # ESP_2 ainda sem AP não aparece
+    assert esp["categoria"] == "seguranca"
+    assert esp["ap"]["coord"] == (-23.55, -46.63)
+    esperado = datetime.datetime(2024, 5, 1, 10, 0, 0)
+    assert esp["last_seen_ts"] == esperado.timestamp()
+    assert esp["last_seen_formatado"] == "01/05/2024 10:00:00"
+    assert snapshot.por_client_id["ESP_1"] is esp
+
+
+def test_arquivo_novo_gera_versao_nova(tmp_path):
+    caminho = tmp_path / "dados_esps.json"
+    _gravar(caminho, [_dispositivo("ESP_1")])
+    cache = CacheEstado(str(caminho), {})
+    versao = cache.obter().versao
+
+    _gravar(caminho, [_dispositivo("ESP_1", bateria=70)])
+    snapshot = cache.obter()
+    assert snapshot.versao == versao + 1
+    assert snapshot.esps[0]["bateria"] == 70
+    assert cache.recargas == 2
+
+
+def test_categoria_alterada_sem_reler_o_arquivo(tmp_path):
+    caminho = tmp_path / "dados_esps.json"
+    _gravar(caminho, [_dispositivo("ESP_1")])
+    categorias = {}
+    cache = CacheEstado(str(caminho), categorias)
+    assert cache.obter().esps[0]["categoria"] == "não definida"
+
+    categorias["ESP_1"] = "manutencao"
+    cache.categorias_alteradas()
+    assert cache.obter().esps[0]["categoria"] == "manutencao"
+    assert cache.recargas == 1
+
+
+def test_arquivo_ilegivel_mantem_o_ultimo_estado(tmp_path):
+    caminho = tmp_path / "dados_esps.json"
+    _gravar(caminho, [_dispositivo("ESP_1")])
+    cache = CacheEstado(str(caminho), {})
+    snapshot = cache.obter()
+
+    caminho.write_text("{ pela metade")
+    assert cache.obter().esps == snapshot.esps
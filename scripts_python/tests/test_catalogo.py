@@ -0,0 +1,119 @@
+import itertools
+import json
+import os
+
+import pytest
+
+from banco_dados import GravadorBanco, criar_pool_sqlite
+from catalogo import Catalogo, abrir_catalogo, catalogo_de_arquivo, ler_catalogo_arquivo, ler_catalogo_banco, normalizar_bssid
+
+# mtime sempre diferente, mesmo com regravações no mesmo instante
+_segundos = itertools.count(1)
+
+
+def _dados(nome_se="Sé", bssid_se="aa:bb:cc:dd:ee:01"):
+    return {
+        "aps": [
+            {"id": "AP-1", "nome": nome_se, "bssid": bssid_se, "coord": [-23.5503, -46.6339]},
+            {"id": "AP-2", "nome": "Luz", "bssid": "AA-BB-CC-DD-EE-02", "coord": [-23.5365, -46.6333]},
+        ],
+        "estacoes": [{"nome": "Sé", "coord": [-23.5503, -46.6339]}],
+        "dispositivos": {"ESP32C6_1": "Agente Ana"},
+    }
+
+
+def _gravar(caminho, dados):
+    caminho.write_text(json.dumps(dados) if isinstance(dados, dict) else dados, encoding="utf-8")
+    segundo = next(_segundos)
+    os.utime(caminho, (segundo, segundo))
+
+
+def test_normalizar_bssid():
+    assert normalizar_bssid("aa-bb-cc-dd-ee-ff") == "AA:BB:CC:DD:EE:FF"
+    assert normalizar_bssid(" aabb.ccdd.eeff ") == "AA:BB:CC:DD:EE:FF"
+    assert normalizar_bssid("aa:bb:cc") is None
+    assert normalizar_bssid("zz:bb:cc:dd:ee:ff") is None
+
+
+def test_indices_do_catalogo(tmp_path):
+    caminho = tmp_path / "catalogo.json"
+    _gravar(caminho, _dados())
+    catalogo = ler_catalogo_arquivo(str(caminho))
+
+    assert catalogo.ap_por_bssid("AA:BB:CC:DD:EE:02")["nome"] == "Luz"
+    assert catalogo.ap_por_bssid("aa:bb:cc:dd:ee:01")["id"] == "AP-1"
+    assert catalogo.ap_por_bssid("00:00:00:00:00:00") is None
+    assert catalogo.por_id["AP-2"]["coord"] == (-23.5365, -46.6333)
+    assert catalogo.nome_dispositivo("ESP32C6_1") == "Agente Ana"
+    assert catalogo.nome_dispositivo("ESP32C6_2") == "ESP32C6_2"
+
+
+def test_bssid_invalido_ou_repetido():
+    with pytest.raises(ValueError):
+        Catalogo([{"id": "AP-1", "nome": "Sé", "bssid": "xx", "coord": [0, 0]}], [], {})
+    repetidos = [{"id": f"AP-{i}", "nome": "Sé", "bssid": "AA:BB:CC:DD:EE:01", "coord": [0, 0]} for i in (1, 2)]
+    with pytest.raises(ValueError):
+        Catalogo(repetidos, [], {})
+
+
+def test_verificar_troca_so_quando_o_conteudo_muda(tmp_path):
+    caminho = tmp_path / "catalogo.json"
+    _gravar(caminho, _dados())
+    trocas = []
+    catalogo = catalogo_de_arquivo(str(caminho), ao_recarregar=lambda novo, anterior: trocas.append((novo, anterior)))
+    original = catalogo.atual
+
+    assert catalogo.verificar() is False              # Arquivo não mudou
+    _gravar(caminho, _dados())
+    assert catalogo.verificar() is False              # Mudou o mtime, mas o conteúdo é o mesmo
+    assert catalogo.atual is original
+
+    _gravar(caminho, _dados(nome_se="Sé (plataforma 2)"))
+    assert catalogo.verificar() is True
+    assert catalogo.atual.ap_por_bssid("AA:BB:CC:DD:EE:01")["nome"] == "Sé (plataforma 2)"
+    assert trocas == [(catalogo.atual, original)]
+    assert catalogo.recargas == 1
+
+
+def test_verificar_mantem_o_anterior_se_o_arquivo_for_invalido(tmp_path):
+    caminho = tmp_path / "catalogo.json"
+    _gravar(caminho, _dados())
+    catalogo = catalogo_de_arquivo(str(caminho))
+    original = catalogo.atual
+
+    _gravar(caminho, "{ pela metade")
+    assert catalogo.verificar() is False
+    _gravar(caminho, _dados(bssid_se="invalido"))
+    assert catalogo.verificar() is False
+    assert catalogo.atual is original
+
+
+def test_catalogo_do_banco(tmp_path):
+    caminho = tmp_path / "catalogo.json"
+    _gravar(caminho, _dados())
+    pool = criar_pool_sqlite(str(tmp_path / "historico.db"))
+    with pool.conexao() as con:
+        con.execute("INSERT INTO bssid_estacoes (bssid, nome_estacao, latitude, longitude) "
+                    "VALUES ('AA:BB:CC:DD:EE:09', 'Bresser', '-23.546', '-46.607')")
+        con.executemany("INSERT INTO estoque_dispositivos VALUES (?, ?, ?)", [(1, 1, 1), (7, 7, 1), (8, 8, 0)])
+
+    catalogo = ler_catalogo_banco(pool, ler_catalogo_arquivo(str(caminho)))
+    assert [ap["nome"] for ap in catalogo.aps] == ["Bresser"]
+    assert catalogo.nome_dispositivo("ESP32C6_1") == "Agente Ana"    # Apelido do arquivo
+    assert catalogo.nome_dispositivo("ESP32C6_7") == "Agente_7"
+    assert "ESP32C6_8" not in catalogo.nomes_dispositivos            # Inativo no estoque
+    assert catalogo.estacoes_por_nome["Sé"] == (-23.5503, -46.6339)
+
+
+def test_dispositivo_cadastrado_pelo_gravador_fica_fora_do_catalogo(tmp_path):
+    caminho = tmp_path / "catalogo.json"
+    _gravar(caminho, _dados())
+    pool = criar_pool_sqlite(str(tmp_path / "historico.db"))
+    gravador = GravadorBanco(pool)
+    gravador.sincronizar_aps({"AA:BB:CC:DD:EE:09": {"nome": "Bresser", "coord": (-23.546, -46.607)}})
+    gravador.gravar_lote([("localizacao", "2024-05-01 10:00:00", "ESP32C6_5", "AA:BB:CC:DD:EE:09", "manutencao")])
+
+    catalogo = abrir_catalogo("banco", pool, str(caminho))
+    assert "ESP32C6_5" not in catalogo.atual.nomes_dispositivos
+    with pytest.raises(ValueError):
+        abrir_catalogo("outra", pool, str(caminho))
@@ -0,0 +1,39 @@
+import pytest
+
+pytest.importorskip("serial")
+
+from configuracao_esp import distribuir_portas, ler_atribuicoes
+
+
+def _csv(tmp_path, texto):
+    caminho = tmp_path / "atribuicoes.csv"
+    caminho.write_text(texto, encoding="utf-8")
+    return str(caminho)
+
+
+def test_le_atribuicoes_com_porta_opcional(tmp_path):
+    caminho = _csv(tmp_path, "id,ssid,senha,porta\n1,Metro,abc,/dev/ttyUSB3\n2, Metro ,abc,\n")
+    assert ler_atribuicoes(caminho) == [
+        {"porta": "/dev/ttyUSB3", "id": "1", "ssid": "Metro", "senha": "abc"},
+        {"porta": None, "id": "2", "ssid": "Metro", "senha": "abc"},
+    ]
+
+
+def test_linha_invalida_indica_o_numero(tmp_path):
+    caminho = _csv(tmp_path, "id,ssid,senha\n1,Metro,abc\nx,Metro,abc\n")
+    with pytest.raises(ValueError, match="Linha 3"):
+        ler_atribuicoes(caminho)
+
+
+def test_portas_fixas_primeiro_e_livres_em_ordem():
+    atribuicoes = [
+        {"porta": None, "id": "1"},
+        {"porta": "/dev/ttyUSB0", "id": "2"},
+        {"porta": None, "id": "3"},
+        {"porta": None, "id": "4"},
+    ]
+    tarefas, sem_porta = distribuir_portas(atribuicoes, ["/dev/ttyUSB2", "/dev/ttyUSB0", "/dev/ttyUSB1"])
+    assert [(t["id"], t["porta"]) for t in tarefas] == [
+        ("1", "/dev/ttyUSB1"), ("2", "/dev/ttyUSB0"), ("3", "/dev/ttyUSB2"),
+    ]
+    assert [a["id"] for a in sem_porta] == ["4"]
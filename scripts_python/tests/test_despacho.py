@@ -0,0 +1,105 @@
+import pytest
+
+from despacho import MotorDespacho, haversine_metros, velocidade_agente_mps
+
+aps = {"ap_se": (-23.5503, -46.6339), "ap_luz": (-23.5365, -46.6333), "ap_paraiso": (-23.5757, -46.6409)}
+estacoes = {"Sé": (-23.5503, -46.6339), "Luz": (-23.5365, -46.6333), "Paraíso": (-23.5757, -46.6409)}
+
+
+def _agente(client_id, ap, categoria="manutencao"):
+    return {"client_id": client_id, "categoria": categoria, "ap": ap, "coord": aps.get(ap, (-23.56, -46.65))}
+
+
+def test_haversine():
+    # 1 grau de latitude ~ 111,2 km
+    assert haversine_metros(0.0, 0.0, 1.0, 0.0) == pytest.approx(111_195, rel=1e-3)
+    assert haversine_metros(-23.55, -46.63, -23.55, -46.63) == 0
+
+
+def test_matriz_do_catalogo_igual_a_registrar_ap_um_por_um():
+    motor = MotorDespacho(aps, estacoes)
+    um_por_um = MotorDespacho({}, estacoes)
+    for chave, coord in aps.items():
+        um_por_um.registrar_ap(chave, coord)
+    assert motor.indice_ap == um_por_um.indice_ap
+    assert motor.distancias == pytest.approx(um_por_um.distancias)
+    assert motor.distancias.shape == (3, 3)
+    assert MotorDespacho({}, estacoes).distancias.shape == (0, 3)
+
+
+def test_top_k_por_estacao_ordenado_e_por_categoria():
+    motor = MotorDespacho(aps, estacoes)
+    agentes = [
+        _agente("A", "ap_luz"),
+        _agente("B", "ap_paraiso"),
+        _agente("C", "ap_se", "seguranca"),
+        _agente("D", "ap_se"),
+    ]
+    resultado = motor.top_k(agentes, [{"id": 1, "categoria": "manutencao", "local": "Sé", "coord": estacoes["Sé"]}], k=2)
+
+    (primeiro, segundo), = resultado.values()
+    assert primeiro[:2] == ("D", 0.0)
+    assert segundo[0] == "A"
+    distancia = haversine_metros(*aps["ap_luz"], *estacoes["Sé"])
+    assert segundo[1] == pytest.approx(distancia)
+    assert segundo[2] == round(distancia / velocidade_agente_mps / 60, 1)
+
+
+def test_varios_incidentes_em_uma_chamada():
+    motor = MotorDespacho(aps, estacoes)
+    agentes = [_agente("A", "ap_luz"), _agente("B", "ap_paraiso"), _agente("C", "ap_se", "seguranca")]
+    incidentes = [
+        {"id": "luz", "categoria": "manutencao", "local": "Luz", "coord": estacoes["Luz"]},
+        {"id": "paraiso", "categoria": "manutencao", "local": "Paraíso", "coord": estacoes["Paraíso"]},
+        {"id": "trem", "categoria": "seguranca", "local": "Trem 1", "coord": (-23.545, -46.634)},
+        {"id": "ninguem", "categoria": "limpeza", "local": "Sé", "coord": estacoes["Sé"]},
+    ]
+    resultado = motor.top_k(agentes, incidentes, k=1)
+
+    assert resultado["luz"][0][0] == "A"
+    assert resultado["paraiso"][0][0] == "B"
+    # Ponto fora das estações: haversine até o AP do agente
+    assert resultado["trem"][0][1] == pytest.approx(haversine_metros(*aps["ap_se"], -23.545, -46.634))
+    assert resultado["ninguem"] == []
+
+
+def test_k_maior_que_os_agentes_e_varios_no_mesmo_ap():
+    motor = MotorDespacho(aps, estacoes)
+    agentes = [_agente("A", "ap_se"), _agente("B", "ap_se"), _agente("C", "ap_luz")]
+    (ranking,) = motor.top_k(agentes, [{"id": 1, "categoria": "manutencao", "local": "Sé"}], k=5).values()
+    assert [c for c, _, _ in ranking] == ["A", "B", "C"]
+
+
+def test_ap_novo_registrado_pelo_agente():
+    motor = MotorDespacho(aps, estacoes)
+    (ranking,) = motor.top_k([_agente("A", "ap_novo")], [{"id": 1, "categoria": "manutencao", "local": "Sé"}]).values()
+    assert ranking[0][1] == pytest.approx(haversine_metros(-23.56, -46.65, *estacoes["Sé"]))
+    assert "ap_novo" in motor.indice_ap
+
+
+def test_agente_com_posicao_por_rssi_usa_a_propria_coordenada():
+    motor = MotorDespacho(aps, estacoes)
+    # Conectado ao AP da Luz, mas a varredura o coloca quase na Sé
+    perto = dict(_agente("A", "ap_luz"), posicao=(-23.5510, -46.6339))
+    agentes = [perto, _agente("B", "ap_se"), _agente("C", "ap_paraiso"), _agente("D", "ap_luz", "seguranca")]
+    incidentes = [
+        {"id": "luz", "categoria": "manutencao", "local": "Luz"},
+        {"id": "trem", "categoria": "manutencao", "local": "Trem 1", "coord": (-23.5515, -46.6339)},
+        {"id": "seguranca", "categoria": "seguranca", "local": "Sé"},
+    ]
+    resultado = motor.top_k(agentes, incidentes, k=3)
+
+    # A distância do agente posicionado é até a posição dele, não até o AP
+    assert [c for c, _, _ in resultado["luz"]] == ["B", "A", "C"]
+    assert resultado["luz"][1][1] == pytest.approx(haversine_metros(-23.5510, -46.6339, *estacoes["Luz"]))
+    assert resultado["trem"][0][0] == "A"
+    assert resultado["trem"][0][1] == pytest.approx(haversine_metros(-23.5510, -46.6339, -23.5515, -46.6339))
+    assert [c for c, _, _ in resultado["seguranca"]] == ["D"]
+
+
+def test_k_agentes_entre_aps_e_posicionados():
+    motor = MotorDespacho(aps, estacoes)
+    agentes = [_agente("A", "ap_se"), _agente("B", "ap_se")]
+    agentes += [dict(_agente(f"P{i}", "ap_paraiso"), posicao=(-23.5503 - 0.001 * i, -46.6339)) for i in (1, 2, 3)]
+    (ranking,) = motor.top_k(agentes, [{"id": 1, "categoria": "manutencao", "local": "Sé"}], k=3).values()
+    assert [c for c, _, _ in ranking] == ["A", "B", "P1"]
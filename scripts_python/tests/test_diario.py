@@ -0,0 +1,61 @@
+import os
+
+from diario import DiarioIngestao
+
+
+def _gravar(pasta, registros, **kwargs):
+    diario = DiarioIngestao(str(pasta), **kwargs)
+    seq = diario.registrar_lote(registros)
+    diario.encerrar()   # Sem a thread: escreve o pendente na própria chamada
+    return seq
+
+
+def test_reproduz_depois_do_snapshot(tmp_path):
+    assert _gravar(tmp_path, [{"n": i} for i in range(5)]) == 5
+
+    diario = DiarioIngestao(str(tmp_path))
+    assert diario.seq == 5
+    assert list(diario.reproduzir()) == [(i + 1, {"n": i}) for i in range(5)]
+    assert list(diario.reproduzir(desde=3)) == [(4, {"n": 3}), (5, {"n": 4})]
+
+
+def test_linha_cortada_no_fim_e_truncada(tmp_path):
+    _gravar(tmp_path, [{"n": 0}, {"n": 1}])
+    (_, caminho), = DiarioIngestao(str(tmp_path)).segmentos()
+    tamanho_valido = os.path.getsize(caminho)
+    with open(caminho, "ab") as f:
+        f.write(b'0badc0de [3,{"n":')   # Queda no meio da escrita
+
+    diario = DiarioIngestao(str(tmp_path))
+    assert diario.seq == 2
+    assert os.path.getsize(caminho) == tamanho_valido
+
+    # Os registros novos continuam a numeração e são lidos depois da recuperação
+    diario.registrar_lote([{"n": 2}])
+    diario.encerrar()
+    assert [seq for seq, _ in DiarioIngestao(str(tmp_path)).reproduzir()] == [1, 2, 3]
+
+
+def test_crc_errado_encerra_a_leitura_do_segmento(tmp_path):
+    _gravar(tmp_path, [{"n": 0}, {"n": 1}, {"n": 2}])
+    (_, caminho), = DiarioIngestao(str(tmp_path)).segmentos()
+    with open(caminho, "rb") as f:
+        linhas = f.readlines()
+    linhas[1] = b"00000000" + linhas[1][8:]
+    with open(caminho, "wb") as f:
+        f.writelines(linhas)
+
+    assert list(DiarioIngestao(str(tmp_path)).reproduzir()) == [(1, {"n": 0})]
+
+
+def test_rotacao_e_descarte_dos_segmentos_cobertos(tmp_path):
+    _gravar(tmp_path, [{"n": i} for i in range(20)], tamanho=100)
+    diario = DiarioIngestao(str(tmp_path), tamanho=100)
+    segmentos = diario.segmentos()
+    assert len(segmentos) > 2
+
+    # Snapshot até o início do terceiro segmento: os dois primeiros já estão nele
+    coberto = segmentos[2][0] - 1
+    diario.descartar_ate(coberto)
+    assert diario.segmentos() == segmentos[2:]
+    assert [seq for seq, _ in diario.reproduzir(desde=coberto)] == list(range(coberto + 1, 21))
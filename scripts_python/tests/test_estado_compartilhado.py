@@ -0,0 +1,54 @@
+import json
+
+import estado_compartilhado
+from estado_compartilhado import ArmazemDash
+
+
+def test_incidentes_com_id_do_banco(tmp_path):
+    armazem = ArmazemDash(str(tmp_path / "estado.db"))
+    primeiro = armazem.registrar_incidente("Sé", "seguranca", "08:00:00")
+    segundo = armazem.registrar_incidente("trem", "limpeza", "08:01:00")
+
+    assert segundo["id"] == primeiro["id"] + 1
+    assert armazem.listar_incidentes() == [primeiro, segundo]
+    assert armazem.incidente(None) is None
+    assert armazem.incidente(999) is None
+
+    # Outro processo enxerga o incidente pela chave primária
+    outro = ArmazemDash(armazem.caminho)
+    assert outro.incidente(segundo["id"]) == segundo
+    armazem.fechar()
+    outro.fechar()
+
+
+def test_categorias_alteradas_em_outro_processo(tmp_path, monkeypatch):
+    monkeypatch.setattr(estado_compartilhado, "intervalo_verificacao_categorias", 0)
+    armazem = ArmazemDash(str(tmp_path / "estado.db"))
+    outro = ArmazemDash(armazem.caminho)
+
+    versao = outro.categorias.versao()
+    assert dict(outro.categorias) == {}
+    assert armazem.definir_categorias({"a": "manutencao", "b": "seguranca"}) == 2
+    assert armazem.definir_categorias({}) == 0
+
+    assert outro.categorias.versao() == versao + 1
+    assert outro.categorias.get("a") == "manutencao"
+    assert len(outro.categorias) == 2
+
+    armazem.definir_categorias({"a": "limpeza"})
+    assert outro.categorias["a"] == "limpeza"
+    armazem.fechar()
+    outro.fechar()
+
+
+def test_importa_json_so_com_banco_vazio(tmp_path):
+    caminho_json = tmp_path / "esp_categorias.json"
+    caminho_json.write_text(json.dumps({"a": "manutencao", "b": None}))
+    armazem = ArmazemDash(str(tmp_path / "estado.db"))
+
+    assert armazem.importar_categorias_json(str(caminho_json)) == 1
+    assert dict(armazem.categorias) == {"a": "manutencao"}
+    caminho_json.write_text(json.dumps({"c": "limpeza"}))
+    assert armazem.importar_categorias_json(str(caminho_json)) == 0
+    assert armazem.importar_categorias_json(str(tmp_path / "nao_existe.json")) == 0
+    armazem.fechar()
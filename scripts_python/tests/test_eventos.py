@@ -0,0 +1,64 @@
+import json
+import threading
+import time
+
+from eventos import CanalEventos, fluxo_sse
+
+
+def test_aguardar_devolve_o_evento_mais_recente():
+    canal = CanalEventos()
+    assert canal.aguardar(0, timeout=0.01) is None
+
+    canal.publicar({"n": 1})
+    canal.publicar({"n": 2})   # Rajada: quem estava na versão 0 recebe só o último
+    assert canal.aguardar(0, timeout=0.01) == (2, {"n": 2})
+    assert canal.aguardar(2, timeout=0.01) is None
+
+
+def test_aguardar_acorda_com_a_publicacao():
+    canal = CanalEventos()
+    threading.Timer(0.05, canal.publicar, args=({"ok": True},)).start()
+    assert canal.aguardar(0, timeout=5) == (1, {"ok": True})
+
+
+def test_fluxo_sse_envia_keepalive_e_eventos():
+    canal = CanalEventos()
+    fluxo = fluxo_sse(canal, intervalo_minimo=0, keepalive=0.01)
+    assert next(fluxo) == "retry: 2000\nevent: conectado\ndata: {}\n\n"
+    assert next(fluxo) == ": keepalive\n\n"
+
+    canal.publicar({"dispositivos": 3})
+    assert next(fluxo) == f"id: 1\ndata: {json.dumps({'dispositivos': 3})}\n\n"
+    fluxo.close()
+    assert canal.conexoes == 0
+
+
+def test_sem_vaga_so_pede_para_tentar_depois():
+    canal = CanalEventos(conexoes_maximas=1)
+    aberto = fluxo_sse(canal, keepalive=0.01)
+    next(aberto)
+
+    # A página recebe "lotado" e passa a se atualizar pelo intervalo até conseguir uma vaga
+    recusado = list(fluxo_sse(canal, espera_lotado=30))
+    assert recusado == ["retry: 30000\nevent: lotado\ndata: {}\n\n"]
+    assert (canal.conexoes, canal.recusadas) == (1, 1)
+
+    # Ao desconectar, a vaga volta
+    aberto.close()
+    assert canal.ocupar_conexao()
+
+
+def test_conexao_so_termina_se_alguma_aba_ficou_sem_vaga():
+    canal = CanalEventos(conexoes_maximas=1)
+    fluxo = fluxo_sse(canal, keepalive=0.01, duracao_maxima=0.05)
+    assert next(fluxo) == "retry: 2000\nevent: conectado\ndata: {}\n\n"
+
+    # Passada a duração máxima sem ninguém esperando, a conexão segue aberta
+    time.sleep(0.1)
+    assert next(fluxo) == ": keepalive\n\n"
+    assert canal.conexoes == 1
+
+    # Com uma aba recusada, ela termina no fim do próximo período e a vaga é liberada
+    assert list(fluxo_sse(canal)) == ["retry: 30000\nevent: lotado\ndata: {}\n\n"]
+    assert set(fluxo) == {": keepalive\n\n"}
+    assert canal.conexoes == 0
@@ -0,0 +1,82 @@
+import datetime
+
+from banco_dados import GravadorBanco, criar_pool_sqlite
+from historico import CompactadorHistorico, compactar_historico, trajetoria
+
+inicio = datetime.datetime(2024, 5, 1, 8, 0, 0)
+
+
+def _texto(segundos):
+    return (inicio + datetime.timedelta(seconds=segundos)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _leituras(compactador, leituras, client_id="ESP32C6_1"):
+    gravadas = []
+    for segundos, bssid in leituras:
+        gravadas.extend(compactador.filtrar(_texto(segundos), client_id, bssid))
+    return [(d, b) for d, _, b, _ in gravadas]
+
+
+def test_grava_so_as_bordas_das_permanencias():
+    compactador = CompactadorHistorico(heartbeat=300)
+    leituras = [(s, "ap1") for s in range(0, 100, 10)] + [(s, "ap2") for s in range(100, 150, 10)]
+    gravadas = _leituras(compactador, leituras)
+
+    # Chegada ao ap1, última leitura no ap1 e chegada ao ap2; a última do ap2 fica pendente
+    assert gravadas == [(_texto(0), "ap1"), (_texto(90), "ap1"), (_texto(100), "ap2")]
+    assert [(d, b) for d, _, b, _ in compactador.pendentes()] == [(_texto(140), "ap2")]
+    assert (compactador.recebidas, compactador.gravadas) == (15, 4)
+
+
+def test_heartbeat_grava_uma_leitura_intermediaria():
+    compactador = CompactadorHistorico(heartbeat=300)
+    gravadas = _leituras(compactador, [(s, "ap1") for s in range(0, 620, 10)])
+    instantes = [d for d, _ in gravadas]
+    assert instantes == [_texto(0), _texto(300), _texto(600)]
+
+
+def test_volta_depois_de_sumir_abre_permanencia_nova():
+    compactador = CompactadorHistorico(heartbeat=300)
+    gravadas = _leituras(compactador, [(0, "ap1"), (10, "ap1"), (1000, "ap1")])
+    assert gravadas == [(_texto(0), "ap1"), (_texto(10), "ap1"), (_texto(1000), "ap1")]
+
+
+def _pool_com_leituras(tmp_path, leituras):
+    pool = criar_pool_sqlite(str(tmp_path / "historico.db"))
+    gravador = GravadorBanco(pool)
+    gravador.sincronizar_aps({"ap1": {"nome": "Sé", "coord": (0, 0)}, "ap2": {"nome": "Luz", "coord": (0, 1)}})
+    compactador = CompactadorHistorico(heartbeat=300)
+    lote = []
+    for segundos, bssid in leituras:
+        for data_hora, client_id, b, categoria in compactador.filtrar(_texto(segundos), "ESP32C6_1", bssid, "manutencao"):
+            lote.append(("localizacao", data_hora, client_id, b, categoria))
+    lote.extend(("localizacao", d, c, b, cat) for d, c, b, cat in compactador.pendentes())
+    gravador.gravar_lote(lote)
+    return pool
+
+
+def test_compactar_e_reconstruir_o_trajeto(tmp_path):
+    leituras = [(s, "ap1") for s in range(0, 600, 10)] + [(s, "ap2") for s in range(600, 900, 10)]
+    pool = _pool_com_leituras(tmp_path, leituras)
+    fim = inicio + datetime.timedelta(hours=1)
+    antes = trajetoria(pool, "ESP32C6_1", inicio, fim)
+
+    removidas, criados = compactar_historico(pool, inicio + datetime.timedelta(seconds=700))
+    assert criados == 2 and removidas > 0
+
+    # O trajeto é o mesmo com parte consolidada e parte ainda bruta
+    assert trajetoria(pool, "ESP32C6_1", inicio, fim) == antes
+    assert [(p["nome"], p["entrada"], p["saida"]) for p in antes] == [
+        ("Sé", inicio, inicio + datetime.timedelta(seconds=590)),
+        ("Luz", inicio + datetime.timedelta(seconds=600), inicio + datetime.timedelta(seconds=890)),
+    ]
+
+
+def test_compactar_de_novo_estende_o_ultimo_intervalo(tmp_path):
+    pool = _pool_com_leituras(tmp_path, [(s, "ap1") for s in range(0, 900, 10)])
+    compactar_historico(pool, inicio + datetime.timedelta(seconds=400))
+    compactar_historico(pool, inicio + datetime.timedelta(hours=1))
+
+    with pool.conexao() as con:
+        intervalos = con.execute("SELECT entrada, saida FROM intervalos_permanencia").fetchall()
+    assert intervalos == [(_texto(0), _texto(890))]
@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+from ingestao_distribuida import (
+    arquivos_particoes, assinaturas, caminho_particao, client_id_do_payload, fatia_de, fatias, particao_de,
+    topico_base, topico_da_fatia,
+)
+
+
+def test_fatia_igual_a_do_firmware():
+    # Firmware: fatia = id do dispositivo % numFatias
+    assert fatia_de(b"ESP32C6_130") == 130 % fatias
+    assert fatia_de("ESP32C6_130") == 130 % fatias
+    assert fatia_de(b"sem_numero") == 0
+
+
+@pytest.mark.parametrize("total", [1, 2, 3, 4, 7, fatias])
+def test_particao_assina_a_fatia_dos_seus_dispositivos(total):
+    for numero in range(0, 500, 7):
+        client_id = f"ESP32C6_{numero}".encode()
+        particao = particao_de(client_id, total)
+        assert 0 <= particao < total
+        topico = topico_da_fatia("esp32/bssid", fatia_de(client_id))
+        if total > 1:
+            assert topico in assinaturas(["esp32/bssid"], particao, total)
+            outras = [p for p in range(total) if p != particao]
+            assert all(topico not in assinaturas(["esp32/bssid"], p, total) for p in outras)
+
+
+def test_topicos_sem_fatia_so_na_particao_0():
+    topicos = ["esp32/bssid", "esp32/scan"]
+    assert set(topicos) <= set(assinaturas(topicos, 0, 3))
+    assert not set(topicos) & set(assinaturas(topicos, 1, 3))
+    assert not set(topicos) & set(assinaturas(topicos, 2, 3))
+
+
+def test_assinaturas_de_um_processo_so():
+    assert assinaturas(["esp32/bssid"]) == ["esp32/bssid", "esp32/+/bssid"]
+
+
+def test_topicos_e_payload():
+    assert topico_da_fatia("esp32/scan", 5) == "esp32/5/scan"
+    assert topico_base("esp32/5/scan") == "esp32/scan"
+    assert topico_base("esp32/scan") == "esp32/scan"
+    assert client_id_do_payload(b"ESP32C6_7|aa:bb|-60") == b"ESP32C6_7"
+
+
+def test_arquivos_das_particoes(tmp_path):
+    caminho = str(tmp_path / "dados_esps.json")
+    for indice in (10, 2, 0):
+        open(caminho_particao(caminho, indice), "w").close()
+    (tmp_path / "dados_esps.pX.json").write_text("{}")
+    assert [os.path.basename(p) for p in arquivos_particoes(caminho)] == [
+        "dados_esps.p0.json", "dados_esps.p2.json", "dados_esps.p10.json",
+    ]
@@ -0,0 +1,31 @@
+from mapa_incremental import HistoricoMarcadores, calcular_diff, versao_marcadores
+
+
+def test_primeiro_envio_completo():
+    atuais = {"a": [1, 2, "A", "red", "user"]}
+    assert calcular_diff(None, atuais) == {"completo": True, "atualizar": atuais, "remover": []}
+
+
+def test_diff_so_com_o_que_mudou():
+    anteriores = {"a": [1, 2, "A", "red", "user"], "b": [3, 4, "B", "red", "user"], "c": [5, 6, "C", "red", "user"]}
+    atuais = {"a": [1, 2, "A", "red", "user"], "b": [3, 4.5, "B", "red", "user"], "d": [7, 8, "D", "red", "user"]}
+    diff = calcular_diff(anteriores, atuais)
+    assert diff["completo"] is False
+    assert diff["atualizar"] == {"b": atuais["b"], "d": atuais["d"]}
+    assert diff["remover"] == ["c"]
+    assert calcular_diff(atuais, dict(atuais)) == {"completo": False, "atualizar": {}, "remover": []}
+
+
+def test_versao_nao_depende_da_ordem():
+    assert versao_marcadores({"a": [1], "b": [2]}) == versao_marcadores({"b": [2], "a": [1]})
+    assert versao_marcadores({"a": [1]}) != versao_marcadores({"a": [2]})
+
+
+def test_historico_descarta_a_versao_mais_antiga():
+    historico = HistoricoMarcadores(limite=2)
+    historico.guardar("v1", {"a": 1})
+    historico.guardar("v2", {"a": 2})
+    historico.obter("v1")               # v1 usada por último: v2 sai primeiro
+    historico.guardar("v3", {"a": 3})
+    assert historico.obter("v2") is None
+    assert historico.obter("v1") == {"a": 1}
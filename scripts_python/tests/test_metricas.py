@@ -0,0 +1,55 @@
+import logging
+
+from metricas import FiltroAmostragem, RegistroMetricas
+
+
+def test_exportacao_no_formato_do_prometheus():
+    registro = RegistroMetricas()
+    mensagens = registro.contador("mensagens_total", "Mensagens", rotulo="topico")
+    registro.contador("falhas_total", "Falhas")
+    registro.medidor("fila", "Fila", lambda: 7)
+    mensagens.inc("esp32/bssid", 2)
+    mensagens.inc("esp32/battery")
+
+    linhas = registro.exportar().splitlines()
+    assert "# TYPE mensagens_total counter" in linhas
+    assert 'mensagens_total{topico="esp32/battery"} 1' in linhas
+    assert 'mensagens_total{topico="esp32/bssid"} 2' in linhas
+    assert "falhas_total 0" in linhas   # Sem rótulo: aparece zerado desde o início
+    assert "# TYPE fila gauge" in linhas and "fila 7" in linhas
+
+
+def test_contador_calculado_sai_como_counter():
+    registro = RegistroMetricas()
+    descartes = []
+    registro.contador_calculado("descartes_total", "Descartes", lambda: len(descartes))
+    descartes.extend([1, 2, 3])
+
+    linhas = registro.exportar().splitlines()
+    assert "# TYPE descartes_total counter" in linhas
+    assert "descartes_total 3" in linhas
+
+
+def test_histograma_acumula_as_faixas():
+    registro = RegistroMetricas()
+    latencia = registro.histograma("latencia_segundos", "Latência", limites=(0.1, 1.0))
+    for valor in (0.05, 0.5, 0.7, 3.0):
+        latencia.observar(valor)
+
+    linhas = registro.exportar().splitlines()
+    assert 'latencia_segundos_bucket{le="0.1"} 1' in linhas
+    assert 'latencia_segundos_bucket{le="1.0"} 3' in linhas
+    assert 'latencia_segundos_bucket{le="+Inf"} 4' in linhas
+    assert "latencia_segundos_count 4" in linhas
+
+
+def _registro_log(mensagem, nivel=logging.WARNING):
+    return logging.LogRecord("teste", nivel, __file__, 1, mensagem, None, None)
+
+
+def test_filtro_de_amostragem_limita_por_mensagem():
+    filtro = FiltroAmostragem(limite=2, intervalo=60)
+    passaram = [filtro.filter(_registro_log("fila cheia")) for _ in range(5)]
+    assert passaram == [True, True, False, False, False]
+    assert filtro.filter(_registro_log("outra mensagem"))
+    assert filtro.filter(_registro_log("fila cheia", logging.ERROR))   # Erros sempre passam
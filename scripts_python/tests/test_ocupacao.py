@@ -0,0 +1,145 @@
+import time
+
+import pytest
+
+import ocupacao
+from banco_dados import criar_pool_sqlite
+from ocupacao import AgregadorOcupacao, GravacaoOcupacao, gravar_alterados, inicio_balde, ler_ocupacao
+
+
+@pytest.fixture(autouse=True)
+def sem_fuso(monkeypatch):
+    monkeypatch.setattr(ocupacao, "deslocamento_fuso", 0)
+
+
+def _categoria(client_id):
+    return "seguranca" if client_id.startswith("S") else "manutencao"
+
+
+def _por_inicio(resultado):
+    return {(r["inicio"], r["bssid"]): (r["media"], r["maximo"]) for r in resultado}
+
+
+def test_inicio_balde():
+    assert inicio_balde(3661.5, 60) == 3660
+    assert inicio_balde(3661, 3600) == 3600
+    assert inicio_balde(86399, 86400) == 0
+
+
+def test_agente_segundos_e_maximo_por_balde():
+    base = 1_700_000_000 - 1_700_000_000 % 86400
+    agregador = AgregadorOcupacao(_categoria)
+    agregador.registrar("A", "ap1", base)
+    agregador.registrar("B", "ap1", base + 30)
+    agregador.registrar("A", "ap2", base + 90)   # A muda de AP no meio do segundo minuto
+    agregador.consolidar(base + 120)
+
+    minutos = _por_inicio(agregador.consultar("minuto", base, base + 120))
+    assert minutos[(base, "ap1")] == (90 / 60, 2)
+    assert minutos[(base + 60, "ap1")] == (90 / 60, 2)
+    assert minutos[(base + 60, "ap2")] == (30 / 60, 1)
+
+    (hora,) = agregador.consultar("hora", base, base + 3600, bssid="ap1")
+    assert hora["media"] == pytest.approx(180 / 3600)
+    assert hora["maximo"] == 2
+    assert agregador.ocupacao_atual() == {("ap1", "manutencao"): 1, ("ap2", "manutencao"): 1}
+
+
+def test_categorias_em_chaves_separadas():
+    base = 1_700_000_000 - 1_700_000_000 % 86400
+    agregador = AgregadorOcupacao(_categoria)
+    agregador.registrar_lote([("A", "ap1", base), ("S1", "ap1", base)])
+    agregador.consolidar(base + 60)
+
+    (seguranca,) = agregador.consultar("minuto", base, base + 60, categoria="seguranca")
+    assert (seguranca["media"], seguranca["maximo"]) == (1.0, 1)
+
+
+def test_agente_ausente_sai_depois_da_tolerancia():
+    base = 1_700_000_000 - 1_700_000_000 % 86400
+    agregador = AgregadorOcupacao(_categoria, ausencia=300)
+    agregador.registrar("A", "ap1", base)
+    agregador.consolidar(base + 1000)
+
+    assert agregador.ocupacao_atual() == {}
+    (hora,) = agregador.consultar("hora", base, base + 3600)
+    assert hora["media"] == pytest.approx(300 / 3600)
+
+
+def _pool(tmp_path):
+    pool = criar_pool_sqlite(str(tmp_path / "historico.db"))
+    with pool.conexao() as con:
+        con.execute("INSERT INTO bssid_estacoes (bssid, nome_estacao) VALUES ('ap1', 'Sé')")
+    return pool
+
+
+def _agente_segundos(pool, resolucao):
+    with pool.conexao() as con:
+        return con.execute(
+            "SELECT SUM(agente_segundos), MAX(maximo) FROM ocupacao_estacoes WHERE resolucao = ?", (resolucao,)
+        ).fetchone()
+
+
+def test_gravacao_soma_so_o_que_mudou(tmp_path):
+    # Instantes recentes: a limpeza da gravação usa o relógio de verdade
+    base = inicio_balde(time.time(), 3600) - 3600
+    pool = _pool(tmp_path)
+    agregador = AgregadorOcupacao(_categoria)
+    gravar = GravacaoOcupacao()
+
+    agregador.registrar("A", "ap1", base)
+    agregador.consolidar(base + 20)
+    assert gravar(pool, agregador.retirar_alterados()) == 3
+    assert agregador.retirar_alterados() == []
+    agregador.consolidar(base + 50)
+    gravar(pool, agregador.retirar_alterados())
+    assert _agente_segundos(pool, "hora") == (50, 1)
+    (minuto,) = ler_ocupacao(pool, "minuto", base, base + 60)
+    assert (minuto["nome"], minuto["media"], minuto["maximo"]) == ("Sé", 50 / 60, 1)
+
+    # Reinício do servidor: agregador e gravação novos somam ao que já está na tabela
+    agregador = AgregadorOcupacao(_categoria)
+    agregador.registrar("B", "ap1", base + 100)
+    agregador.registrar("C", "ap1", base + 100)
+    agregador.consolidar(base + 110)
+    GravacaoOcupacao()(pool, agregador.retirar_alterados())
+    assert _agente_segundos(pool, "hora") == (70, 2)
+
+
+def test_gravacao_soma_as_particoes(tmp_path):
+    base = inicio_balde(time.time(), 3600) - 3600
+    pool = _pool(tmp_path)
+    particoes = [(AgregadorOcupacao(_categoria), GravacaoOcupacao()) for _ in range(2)]
+    particoes[0][0].registrar("A", "ap1", base)
+    particoes[1][0].registrar("B", "ap1", base + 30)
+
+    for agora in (base + 40, base + 50):
+        for agregador, gravar in particoes:
+            agregador.consolidar(agora)
+            gravar(pool, agregador.retirar_alterados())
+    # A: 50 s, B: 20 s; cada partição só viu o seu agente
+    assert _agente_segundos(pool, "hora") == (70, 1)
+
+
+class PoolFora:
+    def conexao(self):
+        raise ConnectionError("banco fora do ar")
+
+
+def test_baldes_voltam_quando_a_gravacao_falha(tmp_path):
+    base = inicio_balde(time.time(), 3600) - 3600
+    pool = _pool(tmp_path)
+    agregador = AgregadorOcupacao(_categoria)
+    gravar = GravacaoOcupacao()
+
+    # O agente sai no primeiro minuto: o balde desse minuto não muda mais
+    agregador.registrar("A", "ap1", base)
+    agregador.registrar("A", "ap2", base + 40)
+    agregador.consolidar(base + 70)
+    with pytest.raises(ConnectionError):
+        gravar_alterados(agregador, PoolFora(), gravar)
+
+    gravar_alterados(agregador, pool, gravar)
+    (minuto,) = ler_ocupacao(pool, "minuto", base, base + 60)
+    assert minuto["media"] == 40 / 60
+    assert _agente_segundos(pool, "hora") == (40, 1)
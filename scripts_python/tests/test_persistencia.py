@@ -0,0 +1,76 @@
+import json
+import os
+import threading
+
+from persistencia import PersistenciaAssincrona, gravar_json_atomico
+
+
+def _ler(caminho):
+    with open(caminho) as f:
+        return json.load(f)
+
+
+def test_gravacao_atomica_substitui_sem_deixar_temporario(tmp_path):
+    caminho = tmp_path / "dados.json"
+    gravar_json_atomico(str(caminho), [{"a": 1}])
+    gravar_json_atomico(str(caminho), [{"a": 2}])
+    assert _ler(caminho) == [{"a": 2}]
+    assert os.listdir(tmp_path) == ["dados.json"]
+
+
+def test_grava_ao_atingir_o_limite_de_alteracoes(tmp_path):
+    caminho = tmp_path / "dados.json"
+    estado = {"n": 0}
+    gravou = threading.Event()
+    persistencia = PersistenciaAssincrona(str(caminho), lambda: dict(estado), intervalo=60, limite_alteracoes=3)
+    gravar_original = persistencia.gravar_agora
+
+    def gravar_e_avisar():
+        gravar_original()
+        gravou.set()
+    persistencia.gravar_agora = gravar_e_avisar
+
+    persistencia.iniciar()
+    try:
+        for n in range(1, 4):
+            estado["n"] = n
+            persistencia.marcar_alteracao()
+        assert gravou.wait(5)   # Bem antes do intervalo de 60 s
+        assert _ler(caminho) == {"n": 3}
+        assert persistencia.alteracoes_pendentes == 0
+    finally:
+        persistencia.encerrar()
+
+
+def test_grava_depois_do_intervalo(tmp_path):
+    caminho = tmp_path / "dados.json"
+    gravou = threading.Event()
+    persistencia = PersistenciaAssincrona(str(caminho), lambda: {"ok": True}, intervalo=0.05, limite_alteracoes=1000)
+    gravar_original = persistencia.gravar_agora
+
+    def gravar_e_avisar():
+        gravar_original()
+        gravou.set()
+    persistencia.gravar_agora = gravar_e_avisar
+
+    persistencia.iniciar()
+    try:
+        persistencia.marcar_alteracao()
+        assert gravou.wait(5)
+        assert persistencia.gravacoes == 1
+    finally:
+        persistencia.encerrar()
+
+
+def test_encerrar_grava_o_pendente(tmp_path):
+    caminho = tmp_path / "dados.json"
+    persistencia = PersistenciaAssincrona(str(caminho), lambda: {"final": 1}, intervalo=60).iniciar()
+    persistencia.marcar_alteracao()
+    persistencia.encerrar()
+    assert _ler(caminho) == {"final": 1}
+
+
+def test_sem_alteracao_nao_grava(tmp_path):
+    caminho = tmp_path / "dados.json"
+    PersistenciaAssincrona(str(caminho), lambda: {}, intervalo=0.01).iniciar().encerrar()
+    assert not caminho.exists()
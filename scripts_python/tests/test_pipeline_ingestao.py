@@ -0,0 +1,59 @@
+from pipeline_ingestao import PipelineIngestao
+
+
+def _interpretar(topico, payload, recebido_em):
+    if payload == b"invalido":
+        return None
+    if payload == b"erro":
+        raise ValueError("payload com erro")
+    return (topico, payload)
+
+
+def test_todas_as_mensagens_chegam_ao_estado_em_lotes():
+    aplicados = []
+    pipeline = PipelineIngestao(_interpretar, aplicados.extend, trabalhadores=3, tamanho_lote=10)
+    pipeline.iniciar()
+    for i in range(200):
+        pipeline.enfileirar("esp32/bssid", b"%d" % i)
+    pipeline.encerrar()
+
+    assert sorted(int(p) for _, p in aplicados) == list(range(200))
+    estatisticas = pipeline.estatisticas()
+    assert estatisticas["aplicados"] == estatisticas["interpretados"] == 200
+    assert estatisticas["lotes"] >= 20
+
+
+def test_ordem_de_cada_dispositivo_mantida_com_chave():
+    aplicados = []
+    pipeline = PipelineIngestao(_interpretar, aplicados.extend, trabalhadores=4, tamanho_lote=7,
+                                chave=lambda payload: payload.partition(b"|")[0]).iniciar()
+    for i in range(50):
+        for dispositivo in range(20):
+            pipeline.enfileirar("esp32/bssid", b"ESP_%d|%d" % (dispositivo, i))
+    pipeline.encerrar()
+
+    por_dispositivo = {}
+    for _, payload in aplicados:
+        dispositivo, _, i = payload.partition(b"|")
+        por_dispositivo.setdefault(dispositivo, []).append(int(i))
+    assert len(por_dispositivo) == 20
+    assert all(sequencia == list(range(50)) for sequencia in por_dispositivo.values())
+
+
+def test_invalidos_e_erros_contados():
+    aplicados = []
+    pipeline = PipelineIngestao(_interpretar, aplicados.extend, trabalhadores=1).iniciar()
+    for payload in (b"1", b"invalido", b"erro", b"2"):
+        pipeline.enfileirar("esp32/bssid", payload)
+    pipeline.encerrar()
+
+    assert [p for _, p in aplicados] == [b"1", b"2"]
+    estatisticas = pipeline.estatisticas()
+    assert (estatisticas["invalidos"], estatisticas["erros"]) == (1, 1)
+
+
+def test_fila_de_entrada_cheia_descarta_sem_bloquear():
+    pipeline = PipelineIngestao(_interpretar, lambda lote: None, tamanho_fila=2)
+    resultados = [pipeline.enfileirar("esp32/bssid", b"%d" % i) for i in range(3)]
+    assert resultados == [True, True, False]
+    assert pipeline.estatisticas()["descartados_entrada"] == 1
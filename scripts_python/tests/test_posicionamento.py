@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+import posicionamento
+from posicionamento import MotorPosicionamento, carregar_impressoes, interpretar_varredura, salvar_impressoes
+
+aps = [
+    {"bssid": "AA:00:00:00:00:01", "coord": (0.0, 0.0)},
+    {"bssid": "AA:00:00:00:00:02", "coord": (0.0, 1.0)},
+    {"bssid": "AA:00:00:00:00:03", "coord": (1.0, 0.0)},
+    {"bssid": "AA:00:00:00:00:04", "coord": (1.0, 1.0)},
+]
+b1, b2, b3, b4 = (ap["bssid"] for ap in aps)
+
+
+def test_interpretar_varredura():
+    assert interpretar_varredura(f"{b1}=-40;{b2}=-71.5;") == [(b1, -40.0), (b2, -71.5)]
+    with pytest.raises(ValueError):
+        interpretar_varredura(f"{b1}-40")
+
+
+def test_centroide_pondera_pelo_sinal():
+    motor = MotorPosicionamento(aps)
+    coords, bssids = motor.localizar([{b1: -50, b2: -50}, {b1: -40, b2: -80}], metodo="centroide")
+
+    assert coords[0] == pytest.approx([0.0, 0.5])            # Sinais iguais: ponto médio
+    assert 0 < coords[1][1] < 0.5                            # Puxado para o AP mais forte
+    peso_forte, peso_fraco = 10 ** (-40 / 25), 10 ** (-80 / 25)
+    assert coords[1][1] == pytest.approx(peso_fraco / (peso_forte + peso_fraco))
+    assert bssids == [b1, b1]
+
+
+def test_centroide_usa_so_os_aps_mais_fortes(monkeypatch):
+    monkeypatch.setattr(posicionamento, "aps_centroide", 2)
+    motor = MotorPosicionamento(aps)
+    coords, mais_forte = motor.centroide([{b1: -60, b2: -60, b4: -90}])
+    assert coords[0] == pytest.approx([0.0, 0.5])   # O AP 4, mais fraco, fica de fora
+    assert mais_forte[0] in (0, 1)
+
+
+def test_varredura_sem_ap_conhecido():
+    motor = MotorPosicionamento(aps)
+    coords, bssids = motor.localizar([{"FF:FF:FF:FF:FF:FF": -30}, {}])
+    assert np.isnan(coords).all()
+    assert bssids == [None, None]
+
+
+def test_knn_usa_as_impressoes_mais_parecidas():
+    impressoes = [
+        {"coord": (0.1, 0.1), "rssi": {b1: -40, b2: -80, b3: -80}},
+        {"coord": (0.1, 0.9), "rssi": {b1: -80, b2: -40, b3: -80}},
+        {"coord": (0.9, 0.1), "rssi": {b1: -80, b2: -80, b3: -40}},
+        {"coord": (0.9, 0.9), "rssi": {b4: -40}},
+    ]
+    motor = MotorPosicionamento(aps, impressoes)
+    coords, _ = motor.localizar([{b1: -40, b2: -80, b3: -80}, {b4: -35}], metodo="knn")
+
+    # Igual à primeira impressão: ela domina a média ponderada por 1/distância
+    assert coords[0] == pytest.approx([0.1, 0.1], abs=1e-3)
+    assert coords[1][0] > 0.5 and coords[1][1] > 0.5
+
+
+def test_auto_sem_impressoes_usa_o_centroide():
+    motor = MotorPosicionamento(aps)
+    auto, _ = motor.localizar([{b1: -50, b4: -50}])
+    centroide, _ = motor.localizar([{b1: -50, b4: -50}], metodo="centroide")
+    assert auto == pytest.approx(centroide)
+
+
+def test_knn_em_blocos_igual_a_um_bloco_so(monkeypatch):
+    gerador = np.random.default_rng(7)
+    impressoes = [{"coord": tuple(gerador.random(2)), "rssi": {b: float(gerador.uniform(-90, -30)) for b in (b1, b2, b3, b4)}}
+                  for _ in range(20)]
+    varreduras = [{b: float(gerador.uniform(-90, -30)) for b in (b1, b2, b3)} for _ in range(50)]
+    motor = MotorPosicionamento(aps, impressoes)
+    inteiro = motor.knn(varreduras)
+    monkeypatch.setattr(posicionamento, "tamanho_bloco", 7)
+    assert motor.knn(varreduras) == pytest.approx(inteiro)
+
+
+def test_impressoes_salvas_e_lidas(tmp_path):
+    caminho = str(tmp_path / "impressoes.json")
+    assert carregar_impressoes(caminho) == []
+    impressoes = [{"coord": (0.5, 0.5), "rssi": {b1: -60.0}}]
+    salvar_impressoes(caminho, impressoes)
+    assert carregar_impressoes(caminho) == impressoes
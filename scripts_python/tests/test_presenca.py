@@ -0,0 +1,65 @@
+from presenca import MotorPresenca, situacao_presenca
+
+
+class Relogio:
+    def __init__(self):
+        self.agora = 0.0
+
+    def __call__(self):
+        return self.agora
+
+
+def _motor():
+    relogio = Relogio()
+    avisos = []
+    return MotorPresenca(avisos.extend, conectado=60, ativo=300, relogio=relogio), relogio, avisos
+
+
+def test_situacao_presenca():
+    assert situacao_presenca(0, 59, 60, 300) == "conectado"
+    assert situacao_presenca(0, 60, 60, 300) == "ativo"
+    assert situacao_presenca(0, 300, 60, 300) == "inativo"
+
+
+def test_transicoes_no_prazo_exato():
+    motor, _, avisos = _motor()
+    assert motor.registrar("A", 0) == [("A", None, "conectado", 0)]
+
+    assert motor.processar(59.9) == []
+    assert motor.processar(60) == [("A", "conectado", "ativo", 0)]
+    assert motor.processar(299.9) == []
+    assert motor.processar(300) == [("A", "ativo", "inativo", 0)]
+    assert len(avisos) == 3
+    assert motor.contagem() == {"conectado": 0, "ativo": 0, "inativo": 1}
+
+
+def test_mensagem_nova_adia_o_prazo():
+    motor, relogio, _ = _motor()
+    motor.registrar("A", 0)
+    relogio.agora = 30
+    assert motor.registrar("A", 30) == []   # Já conectado: só a última leitura muda
+
+    assert motor.processar(60) == []
+    assert motor.processar(90) == [("A", "conectado", "ativo", 30)]
+    assert len(motor._heap) == 1
+
+
+def test_volta_para_conectado_na_mensagem():
+    motor, relogio, avisos = _motor()
+    motor.registrar("A", 0)
+    motor.processar(400)
+    assert motor.situacao("A") == "inativo"
+
+    relogio.agora = 500
+    assert motor.registrar("A", 500) == [("A", "inativo", "conectado", 500)]
+    assert motor.processar(559) == []
+    assert motor.processar(560) == [("A", "conectado", "ativo", 500)]
+    assert avisos[-1] == ("A", "conectado", "ativo", 500)
+
+
+def test_leitura_fora_de_ordem_ignorada():
+    motor, relogio, _ = _motor()
+    relogio.agora = 100
+    motor.registrar("A", 100)
+    assert motor.registrar("A", 10) == []
+    assert motor.processar(159) == []
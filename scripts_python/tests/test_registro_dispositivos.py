@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from bateria import EstimadorBateria
+from registro_dispositivos import RegistroDispositivos, expandir_snapshot, ler_snapshot
+
+tabela_aps = {
+    "aa:aa": {"id": 1, "nome": "Sé", "coord": [-23.55, -46.63]},
+    "bb:bb": {"id": 2, "nome": "Luz", "coord": [-23.53, -46.63]},
+}
+
+
+def _registro():
+    registro = RegistroDispositivos(tabela_aps)
+    for client_id, bssid, bateria in [("ESP_1", "aa:aa", 90), ("ESP_2", "aa:aa", 50), ("ESP_3", "bb:bb", None)]:
+        esp = registro.obter(client_id)
+        esp.bssid = bssid
+        esp.last_seen_ts = 1714568400.0
+        esp.bateria = bateria
+    estimador = registro.obter("ESP_1").estimador_bateria = EstimadorBateria()
+    for minuto in range(0, 60, 5):
+        estimador.atualizar(1714568400.0 + minuto * 60, 90 - minuto / 5)
+    registro.obter("ESP_4")   # Ainda sem AP
+    return registro
+
+
+def test_obter_devolve_o_mesmo_dispositivo():
+    registro = RegistroDispositivos(tabela_aps)
+    assert registro.obter("ESP_1") is registro.obter("ESP_1")
+    assert len(registro) == 1 and "ESP_1" in registro
+
+
+def test_snapshot_guarda_cada_ap_uma_vez():
+    snapshot = _registro().serializar()
+    assert snapshot["aps"] == tabela_aps
+    assert [d["bssid"] for d in snapshot["dispositivos"]] == ["aa:aa", "aa:aa", "bb:bb", None]
+
+
+def test_previsao_de_bateria_so_de_quem_enviou():
+    dispositivos = _registro().serializar()["dispositivos"]
+    assert dispositivos[0]["bateria_suavizada"] > 0 and dispositivos[0]["consumo_bateria"] > 0
+    assert "consumo_bateria" not in dispositivos[1]
+
+
+def test_snapshot_expandido_igual_ao_formato_do_dash(tmp_path):
+    registro = _registro()
+    caminho = tmp_path / "dados_esps.json"
+    caminho.write_text(json.dumps(registro.serializar()))
+
+    assert ler_snapshot(str(caminho)) == registro.para_dicts()
+    assert ler_snapshot(str(tmp_path / "nao_existe.json")) == []
+
+
+def test_restaurar_o_snapshot_gravado():
+    original = _registro()
+    original.obter("ESP_3").coord = (-23.54, -46.63)
+    original.obter("ESP_3").scan_ts = 1714568395.0
+    registro = RegistroDispositivos(tabela_aps)
+
+    assert registro.restaurar(json.loads(json.dumps(original.serializar()))) == 4
+    esp = registro.obter("ESP_3")
+    assert (esp.bssid, esp.last_seen_ts, esp.coord) == ("bb:bb", 1714568400.0, (-23.54, -46.63))
+    assert (esp.scan_ts, registro.obter("ESP_1").scan_ts) == (1714568395.0, None)
+    assert registro.restaurar([{"client_id": "ESP_9"}]) == 0
+
+    # A previsão de bateria continua a mesma depois do reinício
+    assert registro.obter("ESP_1").previsao_bateria() == pytest.approx(original.obter("ESP_1").previsao_bateria())
+    assert registro.obter("ESP_1").estimador_bateria.ultimo_ts == original.obter("ESP_1").estimador_bateria.ultimo_ts
+    assert registro.obter("ESP_2").estimador_bateria is None
+
+
+def test_formato_antigo_em_lista():
+    antigo = [{"client_id": "ESP_1", "ap": tabela_aps["aa:aa"], "last_seen": "x", "bateria": 10}]
+    assert expandir_snapshot(antigo) == antigo
@@ -0,0 +1,82 @@
+import json
+
+import numpy as np
+import pytest
+
+from rotas import Linha, RedeTrens
+
+estacoes_a = [("A1", (0.0, 0.0)), ("A2", (0.01, 0.0)), ("A3", (0.02, 0.0))]
+estacoes_b = [("B1", (1.0, 1.0)), ("B2", (1.0, 1.01))]
+
+
+def test_tabela_horaria_da_linha():
+    linha = Linha("A", estacoes_a, velocidade=10.0, parada=30.0)
+    trecho = linha.acumulado[1]
+    assert trecho == pytest.approx(1105.7, rel=1e-3)
+    assert linha.comprimento == pytest.approx(2 * trecho, rel=1e-6)
+    # Chegada e partida de cada estação: parada de 30 s em todas, inclusive na última
+    esperado = [0, 30, 30 + trecho / 10, 60 + trecho / 10, 60 + 2 * trecho / 10, 90 + 2 * trecho / 10]
+    assert linha.tempos == pytest.approx(esperado)
+    assert linha.duracao_viagem == pytest.approx(esperado[-1])
+
+    with pytest.raises(ValueError):
+        Linha("curta", estacoes_a[:1])
+
+
+def test_posicao_na_ida_e_na_volta():
+    linha = Linha("A", estacoes_a, velocidade=10.0, parada=30.0)
+    rede = RedeTrens([linha])
+    meio_primeiro_trecho = 30 + linha.acumulado[1] / 20
+
+    coords, distancias, sentidos, proximas, parados = rede.posicoes(meio_primeiro_trecho)
+    assert coords[0] == pytest.approx([0.005, 0.0])
+    assert distancias[0] == pytest.approx(linha.acumulado[1] / 2)
+    assert (sentidos[0], rede.nomes_estacoes[proximas[0]], parados[0]) == (1, "A2", False)
+
+    # Na volta, o mesmo ponto do trecho é alcançado no instante espelhado do ciclo
+    estado = rede.estado(2 * linha.duracao_viagem - meio_primeiro_trecho)["A-1"]
+    assert estado["coord"] == pytest.approx((0.005, 0.0))
+    assert (estado["sentido"], estado["proxima"], estado["parado"]) == (-1, "A1", False)
+
+    # Parado na última estação antes de voltar
+    estado = rede.estado(linha.duracao_viagem - 10)["A-1"]
+    assert (estado["proxima"], estado["parado"]) == ("A3", True)
+
+
+def test_varias_linhas_e_trens_defasados():
+    linha_a = Linha("A", estacoes_a, trens=2, velocidade=10.0, parada=30.0)
+    linha_b = Linha("B", estacoes_b, velocidade=10.0, parada=30.0)
+    rede = RedeTrens([linha_a, linha_b])
+    assert rede.ids == ["A-1", "A-2", "B-1"]
+
+    estado = rede.estado(0.0)
+    # O segundo trem da linha A começa meio ciclo depois: parado na última estação
+    assert (estado["A-1"]["proxima"], estado["A-1"]["parado"]) == ("A1", True)
+    assert (estado["A-2"]["proxima"], estado["A-2"]["parado"]) == ("A3", True)
+    # A linha B não é afetada pelo deslocamento da rede concatenada
+    assert estado["B-1"]["coord"] == pytest.approx((1.0, 1.0))
+
+    coords, *_ = rede.posicoes(100.0)
+    sozinha = RedeTrens([linha_b]).posicoes(100.0)[0]
+    assert coords[2] == pytest.approx(sozinha[0])
+
+
+def test_rede_vazia():
+    coords, distancias, sentidos, proximas, parados = RedeTrens([]).posicoes(0.0)
+    assert coords.shape == (0, 2)
+    assert len(distancias) == len(sentidos) == len(proximas) == len(parados) == 0
+    assert isinstance(parados, np.ndarray)
+
+
+def test_tabela_para_o_navegador():
+    linha_a = Linha("A", estacoes_a, trens=2, velocidade=10.0, parada=30.0)
+    rede = RedeTrens([linha_a, Linha("B", estacoes_b)])
+    tabela = json.loads(json.dumps(rede.tabela()))   # Vai para o navegador em um dcc.Store
+
+    assert tabela["ids"] == ["A-1", "A-2", "B-1"]
+    assert tabela["estacoes"] == ["A1", "A2", "A3", "B1", "B2"]
+    assert len(tabela["coords"]) == len(tabela["acumulado"]) == 5
+    assert len(tabela["tempos"]) == len(tabela["distancias"]) == 10
+    for campo in ("defasagem", "ciclo", "viagem", "desloc_tempo", "ultimo_trecho"):
+        assert len(tabela[campo]) == 3
+    assert tabela["ultimo_trecho"] == [1, 1, 3]
@@ -0,0 +1,77 @@
+from cache_estado import SnapshotEstado
+from tabela_dispositivos import ConsultaDispositivos, diferenca_categorias, status_dispositivo
+
+agora = 10_000.0
+
+
+def _esp(numero, estacao, atraso, categoria="não definida", bateria=None):
+    return {
+        "client_id": f"ESP32C6_{numero:02d}",
+        "ap": {"nome": estacao},
+        "categoria": categoria,
+        "bateria": bateria,
+        "last_seen_ts": agora - atraso,
+        "last_seen_formatado": "-",
+    }
+
+
+def _snapshot(versao=1):
+    esps = [_esp(n, "Sé" if n % 2 else "Luz", atraso=n * 10) for n in range(25)]
+    esps[3]["categoria"] = "manutencao"
+    esps[4]["categoria"] = "manutencao"
+    return SnapshotEstado(esps, versao)
+
+
+def test_status_pelo_atraso():
+    assert status_dispositivo({"last_seen_ts": agora - 10}, agora) == "conectado"
+    assert status_dispositivo({"last_seen_ts": agora - 120}, agora) == "ativo"
+    assert status_dispositivo({"last_seen_ts": agora - 600}, agora) == "inativo"
+    # O status gravado no snapshot pode estar velho: vale o atraso no instante da consulta
+    assert status_dispositivo({"last_seen_ts": agora - 10, "status": "inativo"}, agora) == "conectado"
+
+
+def test_paginacao_corta_so_a_pagina_pedida():
+    consulta = ConsultaDispositivos(sem_categoria="não definida")
+    linhas, total = consulta.consultar(_snapshot(), agora, pagina=2, tamanho=10)
+    assert total == 25
+    assert [l["client_id"] for l in linhas] == [f"ESP32C6_{n:02d}" for n in range(20, 25)]
+    assert linhas[0]["categoria"] is None
+
+
+def test_filtros_e_busca():
+    consulta = ConsultaDispositivos()
+    snapshot = _snapshot()
+
+    _, total = consulta.consultar(snapshot, agora, estacao="Sé")
+    assert total == 12
+    linhas, total = consulta.consultar(snapshot, agora, categoria="manutencao")
+    assert [l["client_id"] for l in linhas] == ["ESP32C6_03", "ESP32C6_04"]
+    # conectado: atraso < 60 s -> números 0 a 5
+    _, total = consulta.consultar(snapshot, agora, status="conectado")
+    assert total == 6
+    _, total = consulta.consultar(snapshot, agora, busca="luz", status="conectado")
+    assert total == 3
+    _, total = consulta.consultar(snapshot, agora, busca="c6_1")
+    assert total == 10
+
+
+def test_ordenacao_reaproveitada_por_versao():
+    consulta = ConsultaDispositivos()
+    snapshot = _snapshot()
+    ordem = [{"column_id": "ultima", "direction": "asc"}]
+    linhas, _ = consulta.consultar(snapshot, agora, ordenacao=ordem, tamanho=3)
+    assert [l["client_id"] for l in linhas] == ["ESP32C6_00", "ESP32C6_01", "ESP32C6_02"]
+    linhas, _ = consulta.consultar(snapshot, agora, ordenacao=[{"column_id": "ultima", "direction": "desc"}], tamanho=1)
+    assert linhas[0]["client_id"] == "ESP32C6_24"
+
+    consulta.consultar(snapshot, agora, ordenacao=ordem)
+    assert len(consulta._ordens) == 2
+    consulta.consultar(_snapshot(versao=2), agora, ordenacao=ordem)
+    assert len(consulta._ordens) == 3
+
+
+def test_diferenca_so_com_categorias_editadas():
+    anteriores = [{"client_id": "a", "categoria": None}, {"client_id": "b", "categoria": "seguranca"}]
+    linhas = [{"client_id": "a", "categoria": "manutencao"}, {"client_id": "b", "categoria": "seguranca"},
+              {"client_id": "c", "categoria": "limpeza"}]
+    assert diferenca_categorias(linhas, anteriores) == {"a": "manutencao"}